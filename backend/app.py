@@ -1,6 +1,9 @@
-from fastapi import FastAPI, Depends, Query, Response, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Depends, Query, Request, Response, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
+from utils.file_manager import PRECOMPRESSED_TYPES
 from sqlalchemy.orm import Session
 
 from fastapi import HTTPException
@@ -8,42 +11,50 @@ from database.models import InvoiceStatus
 from database.invoices_utils import update_invoice, InvoiceNotFound
 
 from database.db_utils import get_db, init_db
+from database.async_db import async_endpoint, run_db, dispose_async_engine
+from auth.session import require_session, sessions
+from auth.password_pool import password_pool, PasswordPoolBusy
+from notifications.scheduler import start_scheduler, stop_scheduler
 from database.models import Owner, Unit, Tenant, ContractStatus, InvoiceStatus, AttachmentType, UserRole
 
 from database.owners_utils import (
-    add_owner, update_owner, delete_owner, get_owner, list_owners, attach_owner_file, detach_owner_file, export_owners_to_csv,
-    OwnerNotFound, OwnerExists, ValidationError, add_owner_with_attachments
+    add_owner, update_owner, delete_owner, get_owner, list_owners, attach_owner_file, detach_owner_file, export_owners_to_csv, export_owners_query,
+    OwnerNotFound, OwnerExists, ValidationError, add_owner_with_attachments, count_owners
 )
+from database.pagination import InvalidCursor
+from database.export_utils import EXPORT_FORMATS, ExportFormatError, stream_export
+from utils.change_tracking import version_tag, http_date, is_not_modified
+from utils.json_response import trusted_json
 from database.units_utils import (
-    add_unit, update_unit, delete_unit, get_unit, list_units, attach_unit_file, detach_unit_file, export_units_to_csv,
+    add_unit, update_unit, delete_unit, get_unit, list_units, attach_unit_file, detach_unit_file, export_units_to_csv, export_units_query,
     UnitNotFound, UnitExists, ValidationError as UnitValidationError
 )
 from database.tenants_utils import (
-    add_tenant, update_tenant, delete_tenant, get_tenant, list_tenants, attach_tenant_file, detach_tenant_file, export_tenants_to_csv,
+    add_tenant, update_tenant, delete_tenant, get_tenant, list_tenants, attach_tenant_file, detach_tenant_file, export_tenants_to_csv, export_tenants_query,
     TenantNotFound, TenantExists, ValidationError as TenantValidationError
 )
 from database.contracts_utils import (
-    add_contract, update_contract, delete_contract, get_contract, list_contracts, attach_contract_file, detach_contract_file, export_contracts_to_csv,
+    add_contract, update_contract, delete_contract, get_contract, list_contracts, attach_contract_file, detach_contract_file, export_contracts_to_csv, export_contracts_query,
     ContractNotFound, ContractExists, ValidationError as ContractValidationError
 )
 from database.payments_utils import (
-    add_payment, update_payment, delete_payment, get_payment, list_payments, export_payments_to_csv,
+    add_payment, update_payment, delete_payment, get_payment, list_payments, export_payments_to_csv, export_payments_query,
     PaymentNotFound, ValidationError as PaymentValidationError
 )
 from database.invoices_utils import (
-    add_invoice, update_invoice, delete_invoice, get_invoice, list_invoices, attach_invoice_file, detach_invoice_file, export_invoices_to_csv,
+    add_invoice, update_invoice, delete_invoice, get_invoice, list_invoices, attach_invoice_file, detach_invoice_file, export_invoices_to_csv, export_invoices_query,
     InvoiceNotFound, ValidationError as InvoiceValidationError
 )
 from database.attachments_utils import (
-    add_attachment, update_attachment, delete_attachment, get_attachment, list_attachments, export_attachments_to_csv,
-    AttachmentNotFound, ValidationError as AttachmentValidationError
+    add_attachment, update_attachment, delete_attachment, get_attachment, list_attachments, export_attachments_to_csv, export_attachments_query,
+    attachment_rows, AttachmentNotFound, ValidationError as AttachmentValidationError
 )
 from database.auditlog_utils import (
-    add_audit_log, get_audit_log, delete_audit_log, list_audit_logs, export_auditlogs_to_csv,
+    add_audit_log, get_audit_log, delete_audit_log, list_audit_logs, export_auditlogs_to_csv, export_auditlogs_query,
     AuditLogNotFound
 )
 from database.users_utils import (
-    add_user, update_user, delete_user, get_user, list_users, export_users_to_csv,
+    add_user, update_user, delete_user, get_user, list_users, export_users_to_csv, export_users_query,
     UserNotFound, UserExists, ValidationError as UserValidationError
 )
 
@@ -55,7 +66,9 @@ from datetime import date, datetime
 app = FastAPI(
     title="Property Management API",
     description="API متكامل لإدارة الممتلكات مع تحقق وصلاحيات JWT",
-    version="2.0.0"
+    version="2.0.0",
+    # كل المسارات تتطلب رمز جلسة ما عدا auth.public_paths (auth/session.py)
+    dependencies=[Depends(require_session)],
 )
 
 app.add_middleware(CORSMiddleware,
@@ -64,10 +77,32 @@ app.add_middleware(CORSMiddleware,
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# ضغط الاستجابات الكبيرة (القوائم) إذا كان العميل يقبل gzip؛ المرفقات المضغوطة أصلاً تُرسل كما هي
+app.add_middleware(GZipMiddleware, minimum_size=1024,
+                   exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + PRECOMPRESSED_TYPES)
 
 @app.on_event("startup")
 def on_startup():
     init_db()
+    # المهام الدورية (انتقال حالات العقود والفواتير) مع اللحاق بما فات أثناء توقف السيرفر
+    start_scheduler()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_scheduler()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await dispose_async_engine()
+
+@app.on_event("startup")
+def start_password_pool():
+    # عمليات bcrypt جاهزة قبل أول تسجيل دخول
+    password_pool.start()
+
+@app.on_event("shutdown")
+def stop_password_pool():
+    password_pool.shutdown()
 
 # ========== Schemas Pydantic ==========
 class AttachmentIn(BaseModel):
@@ -116,31 +151,51 @@ class OwnerOut(BaseModel):
     model_config = {"from_attributes": True}
 
 # ========== LOGIN ==========
-from passlib.context import CryptContext
-from database.models import User
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from auth import user_manager
+from auth.session import SessionError
 
 class LoginRequest(BaseModel):
     username: str
     password: str
 
-def verify_password(plain_password, password_hash):
-    return pwd_context.verify(plain_password, password_hash)
-
-def get_user_by_username(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+@app.exception_handler(SessionError)
+def session_error_handler(request, exc):
+    return JSONResponse(status_code=401, content={"detail": str(exc)}, headers={"WWW-Authenticate": "Bearer"})
 
 @app.post("/api/login")
-def login(request: LoginRequest, db: Session = Depends(get_db)):
-    user = get_user_by_username(db, request.username)
-    if not user or not user.is_active:
-        return {"success": False, "message": "اسم المستخدم غير موجود أو غير نشط"}
-    if verify_password(request.password, user.password_hash):
-        # يمكنك هنا تسجيل وقت الدخول الأخير في user.last_login إذا رغبت
-        return {"success": True, "message": "تم تسجيل الدخول بنجاح"}
-    else:
-        return {"success": False, "message": "كلمة المرور غير صحيحة"}
+async def login(request: LoginRequest):
+    # bcrypt مرة واحدة هنا؛ الطلبات التالية تحمل الرمز (Authorization: Bearer)
+    try:
+        token = await user_manager.login(request.username, request.password)
+    except user_manager.AuthenticationFailed as exc:
+        return {"success": False, "message": str(exc)}
+    return {"success": True, "message": "تم تسجيل الدخول بنجاح", **token}
+
+@app.exception_handler(PasswordPoolBusy)
+def password_pool_busy_handler(request, exc):
+    return JSONResponse(status_code=503, content={"success": False, "message": str(exc), "detail": str(exc)},
+                        headers={"Retry-After": "1"})
+
+@app.get("/api/auth/password-pool")
+async def password_pool_stats(request: Request):
+    # مؤشرات مجمع bcrypt: الطابور، المرفوض، زمن الانتظار والتنفيذ
+    session = request.state.session
+    if session is not None and session.role != UserRole.admin.value:
+        raise HTTPException(status_code=403, detail="للمدير فقط")
+    return password_pool.stats()
+
+@app.post("/api/logout")
+async def logout(request: Request):
+    session = request.state.session
+    if session is not None:
+        sessions.revoke(session.sid, session.expires_at)
+    return {"success": True, "message": "تم تسجيل الخروج"}
+
+@app.get("/api/session")
+async def current_session(request: Request):
+    # المستخدم الحالي من الرمز وذاكرة الجلسات (بدون قاعدة بيانات)
+    session = request.state.session
+    return {"authenticated": session is not None, "user": session.to_dict() if session else None}
 
 # ========== استثناءات HTTP مخصصة ==========
 @app.exception_handler(OwnerNotFound)
@@ -155,9 +210,81 @@ def owner_exists_handler(request, exc):
 def validation_error_handler(request, exc):
     return JSONResponse(status_code=400, content={"detail": str(exc)})
 
+@app.exception_handler(InvalidCursor)
+def invalid_cursor_handler(request, exc):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(ExportFormatError)
+def export_format_error_handler(request, exc):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+def export_response(query, filename: str, fmt: str = "csv", compress: bool = False):
+    # تصدير متدفق: الملف يُرسل على أجزاء (chunked) بدون تحميله كاملاً في الذاكرة
+    stmt, header = query
+    media_type, extension = EXPORT_FORMATS[fmt]
+    body = stream_export(stmt, header, fmt, compress)
+    filename = f"{filename}.{extension}"
+    if compress:
+        media_type = "application/gzip"
+        filename += ".gz"
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+def set_cursor_headers(response: Response, result: dict):
+    # مؤشرات الصفحة التالية/السابقة في الترويسات حتى تبقى أجسام القوائم كما هي
+    if result.get("next_cursor"):
+        response.headers["X-Next-Cursor"] = result["next_cursor"]
+    if result.get("prev_cursor"):
+        response.headers["X-Prev-Cursor"] = result["prev_cursor"]
+
+def page_rows(db: Session, rows, entity: str, extended: bool = False):
+    # صفوف profile="rows" كـ dict جاهزة للإرسال (نفس حقول *_to_schema) مع مرفقات الصفحة باستعلام واحد
+    attachments = attachment_rows(db, entity, [row.id for row in rows], extended)
+    fields = rows[0]._fields if rows else ()
+    data = []
+    for row in rows:
+        item = dict(zip(fields, row))
+        item["created_at"] = str(item["created_at"]) if item["created_at"] else None
+        item["updated_at"] = str(item["updated_at"]) if item["updated_at"] else None
+        item["attachments"] = attachments.get(row.id, [])
+        data.append(item)
+    return data
+
+# ========== التخزين المؤقت عبر HTTP (ETag / طلبات مشروطة) ==========
+# الجداول التي يعتمد عليها تمثيل كل مورد (العلاقات المعروضة مثل اسم المالك والمرفقات)
+OWNER_TABLES = ("owners", "attachments")
+UNIT_TABLES = ("units", "owners", "attachments")
+TENANT_TABLES = ("tenants", "attachments")
+CONTRACT_TABLES = ("contracts", "units", "tenants", "attachments")
+INVOICE_TABLES = ("invoices", "attachments")
+
+class NotModified(Exception):
+    def __init__(self, headers):
+        self.headers = headers
+
+@app.exception_handler(NotModified)
+def not_modified_handler(request, exc):
+    return Response(status_code=304, headers=exc.headers)
+
+def conditional_get(*tables):
+    """
+    Dependency: يحسب ETag/Last-Modified من عدادات الجداول قبل تنفيذ الاستعلام،
+    ويرجع 304 بدون جسم إذا كانت نسخة العميل (If-None-Match / If-Modified-Since) ما زالت صالحة.
+    """
+    async def dependency(request: Request, response: Response):
+        etag, last_modified = await run_db(version_tag, tables)
+        # no-cache: يخزن العميل النسخة لكن يتحقق منها في كل طلب
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if last_modified:
+            headers["Last-Modified"] = http_date(last_modified)
+        if is_not_modified(request.headers, etag, last_modified):
+            raise NotModified(headers)
+        response.headers.update(headers)
+    return dependency
+
 # ========== Endpoints (CRUD + Attachments + Export) ==========
 
 @app.post("/owners/", response_model=OwnerOut)
+@async_endpoint(write=True)
 def api_add_owner(owner: OwnerCreate, db: Session = Depends(get_db)):
     new_owner = add_owner_with_attachments(
         db=db,
@@ -172,68 +299,99 @@ def api_add_owner(owner: OwnerCreate, db: Session = Depends(get_db)):
     return owner_to_schema(new_owner)
 
 @app.put("/owners/{owner_id}", response_model=OwnerOut)
+@async_endpoint(write=True)
 def api_update_owner(owner_id: int, owner: OwnerUpdate, db: Session = Depends(get_db)):
     updated_owner = update_owner(db, owner_id, **owner.dict(exclude_unset=True))
     return owner_to_schema(updated_owner)
 
 @app.delete("/owners/{owner_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_delete_owner(owner_id: int, db: Session = Depends(get_db)):
     delete_owner(db, owner_id)
     return {"msg": "تم الحذف بنجاح"}
 
-@app.get("/owners/{owner_id}", response_model=OwnerOut)
+@app.get("/owners/count", response_model=dict, dependencies=[Depends(conditional_get(*OWNER_TABLES))])
+@async_endpoint
+def api_count_owners(
+    db: Session = Depends(get_db),
+    filter_name: Optional[str] = None,
+    filter_registration_number: Optional[str] = None,
+    filter_nationality: Optional[str] = None,
+):
+    return count_owners(
+        db,
+        filter_name=filter_name,
+        filter_registration_number=filter_registration_number,
+        filter_nationality=filter_nationality
+    )
+
+@app.get("/owners/{owner_id}", response_model=OwnerOut, dependencies=[Depends(conditional_get(*OWNER_TABLES))])
+@async_endpoint
 def api_get_owner(owner_id: int, db: Session = Depends(get_db)):
     owner, attachments = get_owner(db, owner_id, attachment_type=None)
     return owner_to_schema(owner, attachments)
 
-@app.get("/owners/", response_model=dict)
+@app.get("/owners/", response_model=dict, dependencies=[Depends(conditional_get(*OWNER_TABLES))])
+@async_endpoint
 def api_list_owners(
+    response: Response,
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(50, le=200),  # زيادة العدد الأقصى للعناصر في الصفحة من 100 إلى 200
     filter_name: Optional[str] = None,
     filter_registration_number: Optional[str] = None,
     filter_nationality: Optional[str] = None,
+    cursor: Optional[str] = None,
+    keyset: bool = False
 ):
     result = list_owners(
-        db=db, page=page, per_page=per_page,
+        db=db, page=page, per_page=per_page, cursor=cursor, keyset=keyset,
         filter_name=filter_name,
         filter_registration_number=filter_registration_number,
-        filter_nationality=filter_nationality
+        filter_nationality=filter_nationality,
+        profile="rows"
     )
+    set_cursor_headers(response, result)
+    data = page_rows(db, result["data"], "owner")
+
+    # وضع المؤشر: لا يوجد COUNT هنا، العدد يُجلب من /owners/count عند الحاجة
+    if "total" not in result:
+        return trusted_json({
+            "data": data,
+            "per_page": per_page,
+            "next_cursor": result["next_cursor"],
+            "prev_cursor": result["prev_cursor"]
+        }, response)
     
     # حساب إجمالي عدد الصفحات
     total_pages = (result["total"] + per_page - 1) // per_page if result["total"] > 0 else 1
     
     # إعداد الاستجابة بتنسيق جديد يتضمن معلومات الصفحات
     output = {
-        "data": [owner_to_schema(o) for o in result["data"]],
+        "data": data,
         "total": result["total"],
         "page": page,
         "per_page": per_page,
         "total_pages": total_pages
     }
     
-    return output
+    return trusted_json(output, response)
 
 @app.post("/owners/{owner_id}/attachments/", response_model=AttachmentInfo)
+@async_endpoint(write=True)
 def api_attach_owner_file(owner_id: int, filepath: str, filetype: str, attachment_type: AttachmentType, db: Session = Depends(get_db), notes: Optional[str] = None):
     att = attach_owner_file(db, owner_id, filepath, filetype, attachment_type, notes)
     return AttachmentInfo.from_orm(att)
 
 @app.delete("/owners/attachments/{attachment_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_detach_owner_file(attachment_id: int, db: Session = Depends(get_db)):
     detach_owner_file(db, attachment_id)
     return {"msg": "تم حذف المرفق بنجاح"}
 
 @app.get("/owners/export/csv")
-def api_export_owners_csv(db: Session = Depends(get_db)):
-    csv_data = export_owners_to_csv(db)
-    return Response(
-        csv_data,
-        headers={"Content-Disposition": "attachment; filename=owners.csv"},
-        media_type="text/csv"
-    )
+def api_export_owners_csv(format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"), gzip: bool = False):
+    return export_response(export_owners_query(), "owners", format, gzip)
 
 # ========== دالة تحويل ORM إلى Pydantic ==========
 def owner_to_schema(owner, attachments=None):
@@ -276,7 +434,7 @@ from pydantic import BaseModel, constr
 
 from database.models import Owner, UnitStatus, AttachmentType
 from database.units_utils import (
-    add_unit, update_unit, delete_unit, get_unit, list_units, attach_unit_file, detach_unit_file, export_units_to_csv,
+    add_unit, update_unit, delete_unit, get_unit, list_units, attach_unit_file, detach_unit_file, export_units_to_csv, export_units_query,
     UnitNotFound, UnitExists, ValidationError
 )
 from database.db_utils import get_db
@@ -348,6 +506,7 @@ def validation_error_handler(request, exc):
 # ==== Endpoints: CRUD + مرفقات + تصدير للوحدات ====
 
 @app.post("/units/", response_model=UnitOut)
+@async_endpoint(write=True)
 def api_add_unit(unit: UnitCreate, db: Session = Depends(get_db)):
     new_unit = add_unit(
         db=db,
@@ -365,62 +524,68 @@ def api_add_unit(unit: UnitCreate, db: Session = Depends(get_db)):
     return unit_to_schema(new_unit, db)
 
 @app.put("/units/{unit_id}", response_model=UnitOut)
+@async_endpoint(write=True)
 def api_update_unit(unit_id: int, unit: UnitUpdate, db: Session = Depends(get_db)):
     updated_unit = update_unit(db, unit_id, **unit.dict(exclude_unset=True))
     return unit_to_schema(updated_unit, db)
 
 @app.delete("/units/{unit_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_delete_unit(unit_id: int, db: Session = Depends(get_db)):
     delete_unit(db, unit_id)
     return {"msg": "تم الحذف بنجاح"}
 
-@app.get("/units/{unit_id}", response_model=UnitOut)
+@app.get("/units/{unit_id}", response_model=UnitOut, dependencies=[Depends(conditional_get(*UNIT_TABLES))])
+@async_endpoint
 def api_get_unit(unit_id: int, db: Session = Depends(get_db)):
     unit, attachments = get_unit(db, unit_id, attachment_type=None)
     return unit_to_schema(unit, db, attachments)
 
-@app.get("/units/", response_model=List[UnitOut])
+@app.get("/units/", response_model=List[UnitOut], dependencies=[Depends(conditional_get(*UNIT_TABLES))])
+@async_endpoint
 def api_list_units(
+    response: Response,
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, le=100),
     filter_unit_number: Optional[str] = None,
     filter_owner_id: Optional[int] = None,
-    filter_status: Optional[UnitStatus] = None
+    filter_status: Optional[UnitStatus] = None,
+    cursor: Optional[str] = None,
+    keyset: bool = False
 ):
     result = list_units(
-        db=db, page=page, per_page=per_page,
+        db=db, page=page, per_page=per_page, cursor=cursor, keyset=keyset,
         filter_unit_number=filter_unit_number,
         filter_owner_id=filter_owner_id,
-        filter_status=filter_status
+        filter_status=filter_status,
+        profile="rows"
     )
-    return [unit_to_schema(unit, db) for unit in result["data"]]
+    set_cursor_headers(response, result)
+    return trusted_json(page_rows(db, result["data"], "unit"), response)
 
 @app.post("/units/{unit_id}/attachments/", response_model=UnitAttachmentInfo)
+@async_endpoint(write=True)
 def api_attach_unit_file(unit_id: int, filepath: str, filetype: str, attachment_type: AttachmentType, db: Session = Depends(get_db), notes: Optional[str] = None):
     att = attach_unit_file(db, unit_id, filepath, filetype, attachment_type, notes)
     return UnitAttachmentInfo.from_orm(att)
 
 @app.delete("/units/attachments/{attachment_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_detach_unit_file(attachment_id: int, db: Session = Depends(get_db)):
     detach_unit_file(db, attachment_id)
     return {"msg": "تم حذف المرفق بنجاح"}
 
 @app.get("/units/export/csv")
-def api_export_units_csv(db: Session = Depends(get_db)):
-    csv_data = export_units_to_csv(db)
-    return Response(
-        csv_data,
-        headers={"Content-Disposition": "attachment; filename=units.csv"},
-        media_type="text/csv"
-    )
+def api_export_units_csv(format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"), gzip: bool = False):
+    return export_response(export_units_query(), "units", format, gzip)
 
 # ==== تحويل من ORM إلى Pydantic ====
 def unit_to_schema(unit, db: Session, attachments=None):
     if unit is None:
         return None
-    # اسم المالك
-    owner = db.query(Owner).get(unit.owner_id) if unit.owner_id else None
+    # اسم المالك (من العلاقة المحملة مسبقاً في list_units)
+    owner = unit.owner if unit.owner_id else None
     owner_name = owner.name if owner else None
     # المرفقات
     if attachments is None and hasattr(unit, "attachments"):
@@ -463,7 +628,7 @@ from pydantic import BaseModel, constr, EmailStr
 from database.models import AttachmentType
 from database.tenants_utils import (
     add_tenant, update_tenant, delete_tenant, get_tenant, list_tenants,
-    attach_tenant_file, detach_tenant_file, export_tenants_to_csv,
+    attach_tenant_file, detach_tenant_file, export_tenants_to_csv, export_tenants_query,
     TenantNotFound, TenantExists, ValidationError
 )
 from database.db_utils import get_db
@@ -496,6 +661,9 @@ class TenantAttachmentInfo(BaseModel):
     filetype: str
     attachment_type: str
     notes: Optional[str] = None
+    filename: Optional[str] = None
+    size: Optional[int] = None
+    content_type: Optional[str] = None
     model_config = {"from_attributes": True}
 
 class TenantOut(BaseModel):
@@ -529,6 +697,7 @@ def validation_error_handler(request, exc):
 # ==== Endpoints: CRUD + مرفقات + تصدير للمستأجرين ====
 
 @app.post("/tenants/", response_model=TenantOut)
+@async_endpoint(write=True)
 def api_add_tenant(tenant: TenantCreate, db: Session = Depends(get_db)):
     new_tenant = add_tenant(
         db=db,
@@ -545,6 +714,7 @@ def api_add_tenant(tenant: TenantCreate, db: Session = Depends(get_db)):
     return tenant_to_schema(new_tenant)
 
 @app.put("/tenants/{tenant_id}", response_model=TenantOut)
+@async_endpoint(write=True)
 def api_update_tenant(tenant_id: int, tenant: TenantCreate, db: Session = Depends(get_db)):
     updated_tenant = update_tenant(
         db=db,
@@ -563,50 +733,55 @@ def api_update_tenant(tenant_id: int, tenant: TenantCreate, db: Session = Depend
 
 
 @app.delete("/tenants/{tenant_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_delete_tenant(tenant_id: int, db: Session = Depends(get_db)):
     delete_tenant(db, tenant_id)
     return {"msg": "تم الحذف بنجاح"}
 
-@app.get("/tenants/{tenant_id}", response_model=TenantOut)
+@app.get("/tenants/{tenant_id}", response_model=TenantOut, dependencies=[Depends(conditional_get(*TENANT_TABLES))])
+@async_endpoint
 def api_get_tenant(tenant_id: int, db: Session = Depends(get_db)):
     tenant, attachments = get_tenant(db, tenant_id, attachment_type=None)
     return tenant_to_schema(tenant, attachments)
 
-@app.get("/tenants/", response_model=List[TenantOut])
+@app.get("/tenants/", response_model=List[TenantOut], dependencies=[Depends(conditional_get(*TENANT_TABLES))])
+@async_endpoint
 def api_list_tenants(
+    response: Response,
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, le=100),
     filter_name: Optional[str] = None,
     filter_national_id: Optional[str] = None,
-    filter_phone: Optional[str] = None
+    filter_phone: Optional[str] = None,
+    cursor: Optional[str] = None,
+    keyset: bool = False
 ):
     result = list_tenants(
-        db=db, page=page, per_page=per_page,
+        db=db, page=page, per_page=per_page, cursor=cursor, keyset=keyset,
         filter_name=filter_name,
         filter_national_id=filter_national_id,
-        filter_phone=filter_phone
+        filter_phone=filter_phone,
+        profile="rows"
     )
-    return [tenant_to_schema(t) for t in result["data"]]
+    set_cursor_headers(response, result)
+    return trusted_json(page_rows(db, result["data"], "tenant", extended=True), response)
 
 @app.post("/tenants/{tenant_id}/attachments/", response_model=TenantAttachmentInfo)
+@async_endpoint(write=True)
 def api_attach_tenant_file(tenant_id: int, filepath: str, filetype: str, attachment_type: AttachmentType, db: Session = Depends(get_db), notes: Optional[str] = None):
     att = attach_tenant_file(db, tenant_id, filepath, filetype, attachment_type, notes)
     return TenantAttachmentInfo.from_orm(att)
 
 @app.delete("/tenants/attachments/{attachment_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_detach_tenant_file(attachment_id: int, db: Session = Depends(get_db)):
     detach_tenant_file(db, attachment_id)
     return {"msg": "تم حذف المرفق بنجاح"}
 
 @app.get("/tenants/export/csv")
-def api_export_tenants_csv(db: Session = Depends(get_db)):
-    csv_data = export_tenants_to_csv(db)
-    return Response(
-        csv_data,
-        headers={"Content-Disposition": "attachment; filename=tenants.csv"},
-        media_type="text/csv"
-    )
+def api_export_tenants_csv(format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"), gzip: bool = False):
+    return export_response(export_tenants_query(), "tenants", format, gzip)
 
 # ==== تحويل من ORM إلى Pydantic ====
 def tenant_to_schema(tenant, attachments=None):
@@ -620,7 +795,10 @@ def tenant_to_schema(tenant, attachments=None):
             filepath=a.filepath,
             filetype=a.filetype,
             attachment_type=a.attachment_type.value,
-            notes=a.notes
+            notes=a.notes,
+            filename=a.filename,
+            size=a.size,
+            content_type=a.content_type
         )
         for a in (attachments or [])
     ]
@@ -650,7 +828,7 @@ from datetime import date
 from database.models import Unit, Tenant, ContractStatus, AttachmentType
 from database.contracts_utils import (
     add_contract, update_contract, delete_contract, get_contract, list_contracts,
-    attach_contract_file, detach_contract_file, export_contracts_to_csv,
+    attach_contract_file, detach_contract_file, export_contracts_to_csv, export_contracts_query,
     ContractNotFound, ContractExists, ValidationError
 )
 from database.db_utils import get_db
@@ -726,6 +904,7 @@ def validation_error_handler(request, exc):
 # ==== Endpoints: CRUD + مرفقات + تصدير للعقود ====
 
 @app.post("/contracts/", response_model=ContractOut)
+@async_endpoint(write=True)
 def api_add_contract(contract: ContractCreate, db: Session = Depends(get_db)):
     new_contract = add_contract(
         db=db,
@@ -745,64 +924,71 @@ def api_add_contract(contract: ContractCreate, db: Session = Depends(get_db)):
 
 
 @app.put("/contracts/{contract_id}", response_model=ContractOut)
+@async_endpoint(write=True)
 def api_update_contract(contract_id: int, contract: ContractUpdate, db: Session = Depends(get_db)):
     updated_contract = update_contract(db, contract_id, **contract.dict(exclude_unset=True))
     return contract_to_schema(updated_contract, db)
 
 @app.delete("/contracts/{contract_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_delete_contract(contract_id: int, db: Session = Depends(get_db)):
     delete_contract(db, contract_id)
     return {"msg": "تم الحذف بنجاح"}
 
-@app.get("/contracts/{contract_id}", response_model=ContractOut)
+@app.get("/contracts/{contract_id}", response_model=ContractOut, dependencies=[Depends(conditional_get(*CONTRACT_TABLES))])
+@async_endpoint
 def api_get_contract(contract_id: int, db: Session = Depends(get_db)):
     contract, attachments = get_contract(db, contract_id, attachment_type=None)
     return contract_to_schema(contract, db, attachments)
 
-@app.get("/contracts/", response_model=List[ContractOut])
+@app.get("/contracts/", response_model=List[ContractOut], dependencies=[Depends(conditional_get(*CONTRACT_TABLES))])
+@async_endpoint
 def api_list_contracts(
+    response: Response,
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, le=100),
     filter_contract_number: Optional[str] = None,
     filter_unit_id: Optional[int] = None,
     filter_tenant_id: Optional[int] = None,
-    filter_status: Optional[ContractStatus] = None
+    filter_status: Optional[ContractStatus] = None,
+    cursor: Optional[str] = None,
+    keyset: bool = False
 ):
     result = list_contracts(
-        db=db, page=page, per_page=per_page,
+        db=db, page=page, per_page=per_page, cursor=cursor, keyset=keyset,
         filter_contract_number=filter_contract_number,
         filter_unit_id=filter_unit_id,
         filter_tenant_id=filter_tenant_id,
-        filter_status=filter_status
+        filter_status=filter_status,
+        profile="rows"
     )
-    return [contract_to_schema(c, db) for c in result["data"]]
+    set_cursor_headers(response, result)
+    return trusted_json(page_rows(db, result["data"], "contract"), response)
 
 @app.post("/contracts/{contract_id}/attachments/", response_model=ContractAttachmentInfo)
+@async_endpoint(write=True)
 def api_attach_contract_file(contract_id: int, filepath: str, filetype: str, attachment_type: AttachmentType, db: Session = Depends(get_db), notes: Optional[str] = None):
     att = attach_contract_file(db, contract_id, filepath, filetype, attachment_type, notes)
     return ContractAttachmentInfo.from_orm(att)
 
 @app.delete("/contracts/attachments/{attachment_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_detach_contract_file(attachment_id: int, db: Session = Depends(get_db)):
     detach_contract_file(db, attachment_id)
     return {"msg": "تم حذف المرفق بنجاح"}
 
 @app.get("/contracts/export/csv")
-def api_export_contracts_csv(db: Session = Depends(get_db)):
-    csv_data = export_contracts_to_csv(db)
-    return Response(
-        csv_data,
-        headers={"Content-Disposition": "attachment; filename=contracts.csv"},
-        media_type="text/csv"
-    )
+def api_export_contracts_csv(format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"), gzip: bool = False):
+    return export_response(export_contracts_query(), "contracts", format, gzip)
 
 # ==== تحويل من ORM إلى Pydantic مع جلب اسم الوحدة واسم المستأجر ====
 def contract_to_schema(contract, db: Session, attachments=None):
     if contract is None:
         return None
-    unit = db.query(Unit).get(contract.unit_id) if contract.unit_id else None
-    tenant = db.query(Tenant).get(contract.tenant_id) if contract.tenant_id else None
+    # الوحدة والمستأجر من العلاقات المحملة مسبقاً في list_contracts
+    unit = contract.unit if contract.unit_id else None
+    tenant = contract.tenant if contract.tenant_id else None
     unit_number = unit.unit_number if unit else None
     tenant_name = tenant.name if tenant else None
     if attachments is None and hasattr(contract, "attachments"):
@@ -846,7 +1032,7 @@ from pydantic import BaseModel
 from datetime import date
 
 from database.payments_utils import (
-    add_payment, update_payment, delete_payment, get_payment, list_payments, export_payments_to_csv,
+    add_payment, update_payment, delete_payment, get_payment, list_payments, export_payments_to_csv, export_payments_query,
     PaymentNotFound, ValidationError
 )
 from database.db_utils import get_db
@@ -893,6 +1079,7 @@ def validation_error_handler(request, exc):
 # ==== Endpoints: CRUD + تصدير للدفعات ====
 
 @app.post("/payments/", response_model=PaymentOut)
+@async_endpoint(write=True)
 def api_add_payment(payment: PaymentCreate, db: Session = Depends(get_db)):
     new_payment = add_payment(
         db=db,
@@ -907,43 +1094,46 @@ def api_add_payment(payment: PaymentCreate, db: Session = Depends(get_db)):
     return PaymentOut.from_orm(new_payment)
 
 @app.put("/payments/{payment_id}", response_model=PaymentOut)
+@async_endpoint(write=True)
 def api_update_payment(payment_id: int, payment: PaymentUpdate, db: Session = Depends(get_db)):
     updated_payment = update_payment(db, payment_id, **payment.dict(exclude_unset=True))
     return PaymentOut.from_orm(updated_payment)
 
 @app.delete("/payments/{payment_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_delete_payment(payment_id: int, db: Session = Depends(get_db)):
     delete_payment(db, payment_id)
     return {"msg": "تم الحذف بنجاح"}
 
 @app.get("/payments/{payment_id}", response_model=PaymentOut)
+@async_endpoint
 def api_get_payment(payment_id: int, db: Session = Depends(get_db)):
     payment = get_payment(db, payment_id)
     return PaymentOut.from_orm(payment)
 
 @app.get("/payments/", response_model=List[PaymentOut])
+@async_endpoint
 def api_list_payments(
+    response: Response,
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, le=100),
     filter_contract_id: Optional[int] = None,
-    filter_is_late: Optional[bool] = None
+    filter_is_late: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    keyset: bool = False
 ):
     result = list_payments(
-        db=db, page=page, per_page=per_page,
+        db=db, page=page, per_page=per_page, cursor=cursor, keyset=keyset,
         filter_contract_id=filter_contract_id,
         filter_is_late=filter_is_late
     )
+    set_cursor_headers(response, result)
     return [PaymentOut.from_orm(p) for p in result["data"]]
 
 @app.get("/payments/export/csv")
-def api_export_payments_csv(db: Session = Depends(get_db)):
-    csv_data = export_payments_to_csv(db)
-    return Response(
-        csv_data,
-        headers={"Content-Disposition": "attachment; filename=payments.csv"},
-        media_type="text/csv"
-    )
+def api_export_payments_csv(format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"), gzip: bool = False):
+    return export_response(export_payments_query(), "payments", format, gzip)
 
 
 
@@ -958,7 +1148,7 @@ from datetime import date
 from database.models import InvoiceStatus, AttachmentType
 from database.invoices_utils import (
     add_invoice, update_invoice, delete_invoice, get_invoice, list_invoices,
-    attach_invoice_file, detach_invoice_file, export_invoices_to_csv,
+    attach_invoice_file, detach_invoice_file, export_invoices_to_csv, export_invoices_query,
     InvoiceNotFound, ValidationError
 )
 from database.db_utils import get_db
@@ -1013,6 +1203,7 @@ def validation_error_handler(request, exc):
 # ==== Endpoints: CRUD + مرفقات + تصدير للفواتير ====
 
 @app.post("/invoices/", response_model=InvoiceOut)
+@async_endpoint(write=True)
 def api_add_invoice(invoice: InvoiceCreate, db: Session = Depends(get_db)):
     new_invoice = add_invoice(
         db=db,
@@ -1026,53 +1217,61 @@ def api_add_invoice(invoice: InvoiceCreate, db: Session = Depends(get_db)):
     return invoice_to_schema(new_invoice)
 
 @app.put("/invoices/{invoice_id}", response_model=InvoiceOut)
+@async_endpoint(write=True)
 def api_update_invoice(invoice_id: int, invoice: InvoiceUpdate, db: Session = Depends(get_db)):
     updated_invoice = update_invoice(db, invoice_id, **invoice.dict(exclude_unset=True))
     return invoice_to_schema(updated_invoice)
 
 @app.delete("/invoices/{invoice_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_delete_invoice(invoice_id: int, db: Session = Depends(get_db)):
     delete_invoice(db, invoice_id)
     return {"msg": "تم الحذف بنجاح"}
 
-@app.get("/invoices/{invoice_id}", response_model=InvoiceOut)
+@app.get("/invoices/{invoice_id}", response_model=InvoiceOut, dependencies=[Depends(conditional_get(*INVOICE_TABLES))])
+@async_endpoint
 def api_get_invoice(invoice_id: int, db: Session = Depends(get_db)):
     invoice, attachments = get_invoice(db, invoice_id, attachment_type=None)
     return invoice_to_schema(invoice, attachments)
 
-@app.get("/invoices/", response_model=List[InvoiceOut])
+@app.get("/invoices/", response_model=List[InvoiceOut], dependencies=[Depends(conditional_get(*INVOICE_TABLES))])
+@async_endpoint
 def api_list_invoices(
+    response: Response,
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, le=100),
     filter_contract_id: Optional[int] = None,
-    filter_status: Optional[InvoiceStatus] = None
+    filter_status: Optional[InvoiceStatus] = None,
+    cursor: Optional[str] = None,
+    keyset: bool = False
 ):
     result = list_invoices(
-        db=db, page=page, per_page=per_page,
+        db=db, page=page, per_page=per_page, cursor=cursor, keyset=keyset,
         filter_contract_id=filter_contract_id,
         filter_status=filter_status
     )
+    set_cursor_headers(response, result)
     return [invoice_to_schema(inv) for inv in result["data"]]
 
 @app.post("/invoices/{invoice_id}/attachments/", response_model=InvoiceAttachmentInfo)
+@async_endpoint(write=True)
 def api_attach_invoice_file(invoice_id: int, filepath: str, filetype: str, attachment_type: AttachmentType, db: Session = Depends(get_db), notes: Optional[str] = None):
     att = attach_invoice_file(db, invoice_id, filepath, filetype, attachment_type, notes)
     return InvoiceAttachmentInfo.from_orm(att)
 
 @app.delete("/invoices/attachments/{attachment_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_detach_invoice_file(attachment_id: int, db: Session = Depends(get_db)):
     detach_invoice_file(db, attachment_id)
     return {"msg": "تم حذف المرفق بنجاح"}
 
-@app.get("/invoices/export/csv")
-
-
 # ==== تحويل حالة الفاتورة إلى مدفوعة أو غير مدفوعة ====
 
 
 
 @app.post("/invoices/{invoice_id}/set_paid", response_model=InvoiceOut)
+@async_endpoint(write=True)
 def api_set_invoice_paid(invoice_id: int, db: Session = Depends(get_db)):
     """
     Endpoint يجعل الفاتورة مدفوعة
@@ -1084,6 +1283,7 @@ def api_set_invoice_paid(invoice_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="الفاتورة غير موجودة")
 
 @app.post("/invoices/{invoice_id}/set_unpaid", response_model=InvoiceOut)
+@async_endpoint(write=True)
 def api_set_invoice_unpaid(invoice_id: int, db: Session = Depends(get_db)):
     """
     Endpoint يرجع الفاتورة غير مدفوعة
@@ -1093,13 +1293,10 @@ def api_set_invoice_unpaid(invoice_id: int, db: Session = Depends(get_db)):
         return invoice_to_schema(inv)
     except InvoiceNotFound:
         raise HTTPException(status_code=404, detail="الفاتورة غير موجودة")
-def api_export_invoices_csv(db: Session = Depends(get_db)):
-    csv_data = export_invoices_to_csv(db)
-    return Response(
-        csv_data,
-        headers={"Content-Disposition": "attachment; filename=invoices.csv"},
-        media_type="text/csv"
-    )
+
+@app.get("/invoices/export/csv")
+def api_export_invoices_csv(format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"), gzip: bool = False):
+    return export_response(export_invoices_query(), "invoices", format, gzip)
 
 # ==== تحويل من ORM إلى Pydantic ====
 def invoice_to_schema(invoice, attachments=None):
@@ -1139,10 +1336,18 @@ from pydantic import BaseModel, constr
 
 from database.models import AttachmentType
 from database.attachments_utils import (
-    add_attachment, update_attachment, delete_attachment, get_attachment, list_attachments, export_attachments_to_csv,
-    AttachmentNotFound, ValidationError
+    add_attachment, update_attachment, delete_attachment, get_attachment, list_attachments, export_attachments_to_csv, export_attachments_query,
+    add_stored_attachment, list_entity_attachments, ATTACHMENT_ENTITIES,
+    AttachmentNotFound, AttachmentTargetNotFound, ValidationError
 )
 from database.db_utils import get_db
+from utils.file_manager import (
+    storage_config, get_store, detect_content_type, check_content_type, file_extension, attachment_path,
+    FileTooLarge, FileTypeNotAllowed, StoredFileMissing
+)
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+import enum
 
 # ==== Schemas ====
 class AttachmentCreate(BaseModel):
@@ -1179,13 +1384,54 @@ class AttachmentOut(BaseModel):
     invoice_id: Optional[int]
     notes: Optional[str]
     uploaded_at: Optional[str]
+    filename: Optional[str] = None
+    sha256: Optional[str] = None
+    size: Optional[int] = None
+    content_type: Optional[str] = None
     model_config = {"from_attributes": True}
 
+AttachmentEntity = enum.Enum("AttachmentEntity", {name: name for name in ATTACHMENT_ENTITIES}, type=str)
+
+def attachment_to_schema(att):
+    return AttachmentOut(
+        id=att.id,
+        filepath=att.filepath,
+        filetype=att.filetype,
+        attachment_type=att.attachment_type.value,
+        owner_id=att.owner_id,
+        unit_id=att.unit_id,
+        tenant_id=att.tenant_id,
+        contract_id=att.contract_id,
+        invoice_id=att.invoice_id,
+        notes=att.notes,
+        uploaded_at=str(att.uploaded_at) if att.uploaded_at else None,
+        filename=att.filename,
+        sha256=att.sha256,
+        size=att.size,
+        content_type=att.content_type,
+    )
+
 # ==== استثناءات HTTP ====
 @app.exception_handler(AttachmentNotFound)
 def attachment_not_found_handler(request, exc):
     return JSONResponse(status_code=404, content={"detail": str(exc)})
 
+@app.exception_handler(AttachmentTargetNotFound)
+def attachment_target_not_found_handler(request, exc):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+@app.exception_handler(StoredFileMissing)
+def stored_file_missing_handler(request, exc):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+@app.exception_handler(FileTooLarge)
+def file_too_large_handler(request, exc):
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
+
+@app.exception_handler(FileTypeNotAllowed)
+def file_type_not_allowed_handler(request, exc):
+    return JSONResponse(status_code=415, content={"detail": str(exc)})
+
 @app.exception_handler(ValidationError)
 def validation_error_handler(request, exc):
     return JSONResponse(status_code=400, content={"detail": str(exc)})
@@ -1193,6 +1439,7 @@ def validation_error_handler(request, exc):
 # ==== Endpoints: CRUD + تصدير وفلترة للمرفقات ====
 
 @app.post("/attachments/", response_model=AttachmentOut)
+@async_endpoint(write=True)
 def api_add_attachment(attachment: AttachmentCreate, db: Session = Depends(get_db)):
     att = add_attachment(
         db=db,
@@ -1206,25 +1453,30 @@ def api_add_attachment(attachment: AttachmentCreate, db: Session = Depends(get_d
         invoice_id=attachment.invoice_id,
         notes=attachment.notes
     )
-    return AttachmentOut.from_orm(att)
+    return attachment_to_schema(att)
 
 @app.put("/attachments/{attachment_id}", response_model=AttachmentOut)
+@async_endpoint(write=True)
 def api_update_attachment(attachment_id: int, attachment: AttachmentUpdate, db: Session = Depends(get_db)):
     att = update_attachment(db, attachment_id, **attachment.dict(exclude_unset=True))
-    return AttachmentOut.from_orm(att)
+    return attachment_to_schema(att)
 
 @app.delete("/attachments/{attachment_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_delete_attachment(attachment_id: int, db: Session = Depends(get_db)):
     delete_attachment(db, attachment_id)
     return {"msg": "تم الحذف بنجاح"}
 
 @app.get("/attachments/{attachment_id}", response_model=AttachmentOut)
+@async_endpoint
 def api_get_attachment(attachment_id: int, db: Session = Depends(get_db)):
     att = get_attachment(db, attachment_id)
-    return AttachmentOut.from_orm(att)
+    return attachment_to_schema(att)
 
 @app.get("/attachments/", response_model=List[AttachmentOut])
+@async_endpoint
 def api_list_attachments(
+    response: Response,
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(30, le=100),
@@ -1234,9 +1486,11 @@ def api_list_attachments(
     tenant_id: Optional[int] = None,
     contract_id: Optional[int] = None,
     invoice_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    keyset: bool = False
 ):
     result = list_attachments(
-        db=db, page=page, per_page=per_page,
+        db=db, page=page, per_page=per_page, cursor=cursor, keyset=keyset,
         filter_type=filter_type,
         owner_id=owner_id,
         unit_id=unit_id,
@@ -1244,20 +1498,82 @@ def api_list_attachments(
         contract_id=contract_id,
         invoice_id=invoice_id,
     )
-    return [AttachmentOut.from_orm(a) for a in result["data"]]
+    set_cursor_headers(response, result)
+    return [attachment_to_schema(a) for a in result["data"]]
 
 @app.get("/attachments/export/csv")
 def api_export_attachments_csv(
-    db: Session = Depends(get_db),
-    filter_type: Optional[AttachmentType] = None
+    filter_type: Optional[AttachmentType] = None,
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    gzip: bool = False
 ):
-    csv_data = export_attachments_to_csv(db, filter_type=filter_type)
-    return Response(
-        csv_data,
-        headers={"Content-Disposition": "attachment; filename=attachments.csv"},
-        media_type="text/csv"
+    return export_response(export_attachments_query(filter_type=filter_type), "attachments", format, gzip)
+
+# ==== رفع وتنزيل محتوى المرفقات (مخزن حسب البصمة) ====
+
+def _save_stored_attachment(db, entity, entity_id, stored, filename, attachment_type, notes):
+    att = add_stored_attachment(
+        db, entity, entity_id, stored, get_store().relative_path(stored.sha256),
+        file_extension(stored.content_type, filename), filename, attachment_type, notes,
+    )
+    return attachment_to_schema(att)
+
+@app.post("/attachments/{entity}/{entity_id}", response_model=AttachmentOut)
+async def api_upload_attachment(
+    entity: AttachmentEntity,
+    entity_id: int,
+    request: Request,
+    filename: Optional[str] = Query(None, max_length=256),
+    attachment_type: AttachmentType = AttachmentType.general,
+    notes: Optional[str] = None
+):
+    """
+    جسم الطلب هو محتوى الملف نفسه (application/octet-stream أو نوعه)، والاسم في ?filename=.
+    يُقرأ ويُكتب ويُحسب sha256 جزءاً جزءاً أثناء الاستقبال. entity_id = 0: مرفق مؤقت يُربط عند حفظ الكيان.
+    """
+    if request.headers.get("content-type", "").startswith("multipart/"):
+        raise FileTypeNotAllowed("أرسل محتوى الملف مباشرة في جسم الطلب وليس multipart/form-data")
+    config = storage_config()
+    max_bytes = config["max_upload_mb"] * 1024 * 1024
+    if int(request.headers.get("content-length") or 0) > max_bytes:
+        raise FileTooLarge(f"حجم الملف أكبر من الحد المسموح ({config['max_upload_mb']}MB)")
+
+    incoming = get_store(config).incoming(max_bytes)
+    try:
+        async for chunk in request.stream():
+            incoming.write(chunk)
+        if incoming.size == 0:
+            raise ValidationError("الملف فارغ")
+        content_type = detect_content_type(incoming.head, filename)
+        check_content_type(content_type, config)
+        stored = await run_in_threadpool(incoming.commit, content_type)
+    except BaseException:
+        incoming.discard()
+        raise
+    return await run_db(
+        _save_stored_attachment, entity.value, entity_id, stored, filename, attachment_type, notes, write=True
     )
 
+@app.get("/attachments/download/{attachment_id}")
+@async_endpoint
+def api_download_attachment(attachment_id: int, request: Request, db: Session = Depends(get_db)):
+    # FileResponse يرسل الملف من القرص مباشرة (pathsend إذا دعمه السيرفر) ويدعم Range / If-Range
+    att = get_attachment(db, attachment_id)
+    path = attachment_path(att)
+    etag = f'"{att.sha256}"'
+    if is_not_modified(request.headers, etag, None):
+        return Response(status_code=304, headers={"ETag": etag})
+    return FileResponse(
+        path, media_type=att.content_type or "application/octet-stream",
+        filename=att.filename or f"attachment-{att.id}.{att.filetype}",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"},
+    )
+
+@app.get("/attachments/{entity}/{entity_id}", response_model=List[AttachmentOut])
+@async_endpoint
+def api_entity_attachments(entity: AttachmentEntity, entity_id: int, db: Session = Depends(get_db)):
+    return [attachment_to_schema(a) for a in list_entity_attachments(db, entity.value, entity_id)]
+
 #======================================
 from fastapi import Depends, Query, Response
 from fastapi.responses import JSONResponse
@@ -1267,7 +1583,7 @@ from datetime import datetime
 from pydantic import BaseModel
 
 from database.auditlog_utils import (
-    add_audit_log, get_audit_log, delete_audit_log, list_audit_logs, export_auditlogs_to_csv,
+    add_audit_log, get_audit_log, delete_audit_log, list_audit_logs, export_auditlogs_to_csv, export_auditlogs_query,
     AuditLogNotFound
 )
 from database.db_utils import get_db
@@ -1302,6 +1618,7 @@ def validation_error_handler(request, exc):
 # ==== Endpoints: CRUD + تصدير وفلترة لسجل التدقيق ====
 
 @app.post("/auditlog/", response_model=AuditLogOut)
+@async_endpoint(write=True)
 def api_add_audit_log(log: AuditLogCreate, db: Session = Depends(get_db)):
     new_log = add_audit_log(
         db=db,
@@ -1314,45 +1631,48 @@ def api_add_audit_log(log: AuditLogCreate, db: Session = Depends(get_db)):
     return AuditLogOut.from_orm(new_log)
 
 @app.get("/auditlog/{log_id}", response_model=AuditLogOut)
+@async_endpoint
 def api_get_audit_log(log_id: int, db: Session = Depends(get_db)):
     log = get_audit_log(db, log_id)
     return AuditLogOut.from_orm(log)
 
 @app.delete("/auditlog/{log_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_delete_audit_log(log_id: int, db: Session = Depends(get_db)):
     delete_audit_log(db, log_id)
     return {"msg": "تم حذف السجل بنجاح"}
 
 @app.get("/auditlog/", response_model=List[AuditLogOut])
+@async_endpoint
 def api_list_audit_logs(
+    response: Response,
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(50, le=100),
     filter_user: Optional[str] = None,
     filter_table: Optional[str] = None,
-    filter_action: Optional[str] = None
+    filter_action: Optional[str] = None,
+    cursor: Optional[str] = None,
+    keyset: bool = False
 ):
     result = list_audit_logs(
-        db=db, page=page, per_page=per_page,
+        db=db, page=page, per_page=per_page, cursor=cursor, keyset=keyset,
         filter_user=filter_user,
         filter_table=filter_table,
         filter_action=filter_action
     )
+    set_cursor_headers(response, result)
     return [AuditLogOut.from_orm(log) for log in result["data"]]
 
 @app.get("/auditlog/export/csv")
 def api_export_auditlog_csv(
-    db: Session = Depends(get_db),
     filter_user: Optional[str] = None,
     filter_table: Optional[str] = None,
-    filter_action: Optional[str] = None
+    filter_action: Optional[str] = None,
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    gzip: bool = False
 ):
-    csv_data = export_auditlogs_to_csv(db, filter_user=filter_user, filter_table=filter_table, filter_action=filter_action)
-    return Response(
-        csv_data,
-        headers={"Content-Disposition": "attachment; filename=auditlog.csv"},
-        media_type="text/csv"
-    )
+    return export_response(export_auditlogs_query(filter_user=filter_user, filter_table=filter_table, filter_action=filter_action), "auditlog", format, gzip)
 
 #======================================
 from fastapi import Depends, Query, Response
@@ -1364,7 +1684,7 @@ from pydantic import BaseModel, constr
 
 from database.models import UserRole
 from database.users_utils import (
-    add_user, update_user, delete_user, get_user, list_users, export_users_to_csv,
+    add_user, update_user, delete_user, get_user, list_users, export_users_to_csv, export_users_query,
     UserNotFound, UserExists, ValidationError
 )
 from database.db_utils import get_db
@@ -1372,13 +1692,15 @@ from database.db_utils import get_db
 # ==== Schemas ====
 class UserCreate(BaseModel):
     username: constr(min_length=3, max_length=32)
-    password_hash: constr(min_length=6, max_length=256)
+    password: Optional[constr(min_length=6, max_length=128)] = None   # يُشفر على السيرفر (مجمع bcrypt)
+    password_hash: Optional[constr(min_length=6, max_length=256)] = None
     role: UserRole
     is_active: Optional[bool] = True
     last_login: Optional[datetime] = None
 
 class UserUpdate(BaseModel):
     username: Optional[constr(min_length=3, max_length=32)] = None
+    password: Optional[constr(min_length=6, max_length=128)] = None
     password_hash: Optional[constr(min_length=6, max_length=256)] = None
     role: Optional[UserRole] = None
     is_active: Optional[bool] = None
@@ -1409,34 +1731,47 @@ def validation_error_handler(request, exc):
 
 # ==== Endpoints: CRUD + تصدير للمستخدمين ====
 
+# كلمة المرور تُشفر في مجمع bcrypt قبل دخول مسار الكتابة (لا يُحجز الكاتب الوحيد أثناء التشفير)
 @app.post("/users/", response_model=UserOut)
-def api_add_user(user: UserCreate, db: Session = Depends(get_db)):
-    new_user = add_user(
-        db=db,
-        username=user.username,
-        password_hash=user.password_hash,
-        role=user.role.name if isinstance(user.role, UserRole) else user.role,
-        is_active=user.is_active,
-        last_login=user.last_login
-    )
-    return UserOut.from_orm(new_user)
+async def api_add_user(user: UserCreate):
+    password_hash = await password_pool.hash(user.password) if user.password else user.password_hash
+    if not password_hash:
+        raise ValidationError("كلمة المرور مطلوبة")
+
+    def create(db):
+        new_user = add_user(
+            db=db,
+            username=user.username,
+            password_hash=password_hash,
+            role=user.role.name if isinstance(user.role, UserRole) else user.role,
+            is_active=user.is_active,
+            last_login=user.last_login
+        )
+        return UserOut.from_orm(new_user)
+    return await run_db(create, write=True)
 
 @app.put("/users/{user_id}", response_model=UserOut)
-def api_update_user(user_id: int, user: UserUpdate, db: Session = Depends(get_db)):
-    updated_user = update_user(db, user_id, **user.dict(exclude_unset=True))
-    return UserOut.from_orm(updated_user)
+async def api_update_user(user_id: int, user: UserUpdate):
+    changes = user.dict(exclude_unset=True)
+    password = changes.pop("password", None)
+    if password:
+        changes["password_hash"] = await password_pool.hash(password)
+    return await run_db(lambda db: UserOut.from_orm(update_user(db, user_id, **changes)), write=True)
 
 @app.delete("/users/{user_id}", response_model=dict)
+@async_endpoint(write=True)
 def api_delete_user(user_id: int, db: Session = Depends(get_db)):
     delete_user(db, user_id)
     return {"msg": "تم حذف المستخدم"}
 
 @app.get("/users/{user_id}", response_model=UserOut)
+@async_endpoint
 def api_get_user(user_id: int, db: Session = Depends(get_db)):
     user = get_user(db, user_id)
     return UserOut.from_orm(user)
 
 @app.get("/users/", response_model=List[UserOut])
+@async_endpoint
 def api_list_users(
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
@@ -1454,10 +1789,334 @@ def api_list_users(
     return [UserOut.from_orm(u) for u in result["data"]]
 
 @app.get("/users/export/csv")
-def api_export_users_csv(db: Session = Depends(get_db)):
-    csv_data = export_users_to_csv(db)
-    return Response(
-        csv_data,
-        headers={"Content-Disposition": "attachment; filename=users.csv"},
-        media_type="text/csv"
-    )
\ No newline at end of file
+def api_export_users_csv(format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"), gzip: bool = False):
+    return export_response(export_users_query(), "users", format, gzip)
+
+#======================================
+from fastapi import Depends
+from sqlalchemy.orm import Session
+
+from database.dashboard_utils import get_dashboard_summary
+from database.db_utils import get_db
+from utils.json_response import trusted_json
+
+# ==== Endpoint: لوحة التحكم (من جداول الملخص المحدثة تلقائياً) ====
+
+@app.get("/dashboard/", response_model=dict)
+@async_endpoint
+def api_get_dashboard(db: Session = Depends(get_db)):
+    return trusted_json(get_dashboard_summary(db))
+
+#======================================
+from fastapi import Depends, Query
+from sqlalchemy.orm import Session
+
+from database.search_utils import search, SEARCH_ENTITIES
+from database.db_utils import get_db
+
+# ==== Endpoint: بحث موحد (FTS5 مع تطبيع عربي وبحث بالبادئة) ====
+
+@app.get("/search/", response_model=List[dict])
+@async_endpoint
+def api_search(
+    db: Session = Depends(get_db),
+    q: str = Query(..., min_length=1),
+    entities: Optional[str] = Query(None, description="owners,tenants,units,contracts"),
+    limit: int = Query(20, ge=1, le=100)
+):
+    wanted = [e.strip() for e in entities.split(",")] if entities else list(SEARCH_ENTITIES)
+    return search(db, q, wanted, limit)
+
+#======================================
+from fastapi import Depends, Query
+from sqlalchemy.orm import Session
+
+from database.sync_utils import changes_since, parse_token, InvalidSyncToken, UnknownSyncEntity
+from utils.change_tracking import current_token
+from database.db_utils import get_db
+
+# ==== استثناءات HTTP للمزامنة ====
+@app.exception_handler(InvalidSyncToken)
+def invalid_sync_token_handler(request, exc):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(UnknownSyncEntity)
+def unknown_sync_entity_handler(request, exc):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+# ==== Endpoint: مزامنة تزايدية (الصفوف المعدلة/المحذوفة منذ رمز التغيير) ====
+
+SYNC_SCHEMAS = {
+    "owners": lambda row, db: owner_to_schema(row),
+    "units": unit_to_schema,
+    "tenants": lambda row, db: tenant_to_schema(row),
+}
+
+@app.get("/sync/{entity}", response_model=dict)
+@async_endpoint
+def api_sync(entity: str, db: Session = Depends(get_db), since: Optional[str] = None):
+    """
+    بدون since: يرجع الرمز الحالي فقط (يُطلب مع التحميل الكامل الأول).
+    مع since: {"token", "changed", "deleted", "reset"}؛ reset=True يعني إعادة التحميل الكامل.
+    """
+    if entity not in SYNC_SCHEMAS:
+        raise UnknownSyncEntity(f"لا توجد مزامنة للكيان {entity}")
+    if since is None:
+        return {"entity": entity, "token": current_token(db), "changed": [], "deleted": [], "reset": True}
+    result = changes_since(db, entity, parse_token(since))
+    to_schema = SYNC_SCHEMAS[entity]
+    return {
+        "entity": entity,
+        "token": result["token"],
+        "changed": [to_schema(row, db) for row in result["changed"]],
+        "deleted": result["deleted"],
+        "reset": result["reset"],
+    }
+
+#======================================
+import asyncio
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from database.async_db import run_db
+from utils.event_bus import bus, format_sse
+
+# ==== Endpoint: بث أحداث التغيير للواجهات (Server-Sent Events) ====
+
+EVENTS_HEARTBEAT = 15  # ثوانٍ؛ تعليق keep-alive يمنع الوسطاء من قطع الاتصال الخامل
+
+@app.get("/events")
+async def api_events(request: Request):
+    """
+    بث SSE: حدث change لكل commit يعدّل البيانات {"token", "tables", "rows"}.
+    أول حدث hello يحمل الرمز الحالي حتى يزامن العميل ما فاته أثناء الانقطاع، و reset يعني أن المشترك تأخر.
+    """
+    sub = bus.subscribe()
+    token = await run_db(current_token)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n" + format_sse({"type": "hello", "token": token})
+            while not await request.is_disconnected():
+                try:
+                    item = await asyncio.wait_for(sub.get(), EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(item)
+        finally:
+            bus.unsubscribe(sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+#======================================
+from fastapi import Depends, Query, Response
+from sqlalchemy.orm import Session
+
+from notifications.notifier import list_notifications, count_unread, mark_read, NotificationNotFound
+from notifications.scheduler import get_scheduler, list_jobs
+from database.db_utils import get_db
+
+# ==== Schemas ====
+class NotificationOut(BaseModel):
+    id: int
+    rule: str
+    table_name: str
+    row_id: int
+    message: str
+    is_read: bool
+    created_at: Optional[str]
+
+class NotificationsRead(BaseModel):
+    ids: Optional[List[int]] = None  # بدونها: كل غير المقروء
+
+# ==== استثناءات HTTP ====
+@app.exception_handler(NotificationNotFound)
+def notification_not_found_handler(request, exc):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+# ==== Endpoints: الإشعارات والمهام الدورية ====
+
+@app.get("/notifications/", response_model=List[NotificationOut])
+@async_endpoint
+def api_list_notifications(
+    response: Response,
+    db: Session = Depends(get_db),
+    per_page: int = Query(50, le=200),
+    unread_only: bool = False,
+    filter_rule: Optional[str] = None,
+    cursor: Optional[str] = None
+):
+    result = list_notifications(db, per_page=per_page, unread_only=unread_only, filter_rule=filter_rule, cursor=cursor)
+    set_cursor_headers(response, result)
+    return [
+        NotificationOut(id=n.id, rule=n.rule, table_name=n.table_name, row_id=n.row_id, message=n.message,
+                        is_read=n.is_read, created_at=str(n.created_at) if n.created_at else None)
+        for n in result["data"]
+    ]
+
+@app.get("/notifications/unread-count", response_model=dict)
+@async_endpoint
+def api_count_unread_notifications(db: Session = Depends(get_db)):
+    return {"unread": count_unread(db)}
+
+@app.post("/notifications/read", response_model=dict)
+@async_endpoint(write=True)
+def api_mark_notifications_read(body: NotificationsRead, db: Session = Depends(get_db)):
+    return {"updated": mark_read(db, body.ids)}
+
+@app.get("/scheduler/jobs", response_model=List[dict])
+@async_endpoint
+def api_list_jobs(db: Session = Depends(get_db)):
+    return list_jobs(db)
+
+@app.post("/scheduler/jobs/{name}/run", response_model=dict)
+def api_run_job(name: str):
+    scheduler = get_scheduler()
+    if not scheduler.has_job(name):
+        raise HTTPException(status_code=404, detail="المهمة غير موجودة")
+    return scheduler.run_job(name)
+
+#======================================
+from fastapi import Depends, Query
+from sqlalchemy.orm import Session
+
+from reports.reports import run_report, REPORTS, ReportError, UnknownReport
+from database.db_utils import get_db
+
+# ==== استثناءات HTTP للتقارير ====
+@app.exception_handler(ReportError)
+def report_error_handler(request, exc):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(UnknownReport)
+def unknown_report_handler(request, exc):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+# ==== Endpoints: التقارير (rent_roll, collection, aging, occupancy, revenue) ====
+
+@app.get("/reports/", response_model=List[dict])
+def api_list_reports():
+    return [{"name": name, "params": list(params)} for name, (_, _, params) in REPORTS.items()]
+
+@app.get("/reports/{name}", response_model=dict)
+@async_endpoint
+def api_run_report(
+    name: str,
+    db: Session = Depends(get_db),
+    as_of: Optional[date] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    group_by: Optional[str] = Query(None, description="building | owner")
+):
+    return run_report(db, name, as_of=as_of, start=start, end=end, group_by=group_by)
+
+#======================================
+from database.backup_restore import (
+    create_backup, list_backups, verify_backup, BackupError, BackupNotFound, RestoreError
+)
+
+# ==== استثناءات HTTP للنسخ الاحتياطي ====
+@app.exception_handler(BackupError)
+def backup_error_handler(request, exc):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(BackupNotFound)
+def backup_not_found_handler(request, exc):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+@app.exception_handler(RestoreError)
+def restore_error_handler(request, exc):
+    return JSONResponse(status_code=422, content={"detail": str(exc)})
+
+# ==== Endpoints: النسخ الاحتياطي (الاستعادة من سطر الأوامر فقط والسيرفر متوقف) ====
+
+@app.get("/backups/", response_model=List[dict])
+def api_list_backups():
+    return list_backups()
+
+@app.post("/backups/", response_model=dict)
+def api_create_backup(label: Optional[str] = None):
+    result = create_backup(label=label)
+    result["chunks"] = len(result["chunks"])  # مثل /backups/ (البصمات في ملف الـ manifest)
+    return result
+
+@app.post("/backups/{backup_id}/verify", response_model=dict)
+def api_verify_backup(backup_id: str, quick: bool = False):
+    return verify_backup(backup_id, check="quick" if quick else "integrity")
+
+#======================================
+from fastapi import Query, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+
+from database.import_utils import (
+    IMPORT_ENTITIES, ImportJob, ImportFormatError, import_config, import_format, read_chunks
+)
+from utils.file_manager import FileTooLarge
+import enum
+import os
+import tempfile
+
+ImportEntity = enum.Enum("ImportEntity", {name: name for name in IMPORT_ENTITIES}, type=str)
+
+# ==== استثناءات HTTP للاستيراد ====
+@app.exception_handler(ImportFormatError)
+def import_format_error_handler(request, exc):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+# ==== Endpoints: الاستيراد الجماعي (CSV / XLSX) ====
+
+def _next_prepared(job, chunks):
+    # قراءة الدفعة التالية وتحويلها خارج حلقة الأحداث؛ None في نهاية الملف
+    chunk = next(chunks, None)
+    return None if chunk is None else job.prepare(chunk)
+
+@app.post("/import/{entity}", response_model=dict)
+async def api_import(
+    entity: ImportEntity,
+    request: Request,
+    filename: Optional[str] = Query(None, max_length=256),
+    format: Optional[str] = Query(None, description="csv | xlsx (افتراضياً من امتداد filename)"),
+    dry_run: bool = False,
+    skip_existing: bool = False
+):
+    """
+    جسم الطلب هو الملف نفسه (مثل رفع المرفقات). يُحفظ مؤقتاً ثم يُستورد على دفعات، كل دفعة معاملة
+    واحدة في مسار الكتابة، فتستمر الطلبات الأخرى بين الدفعات. يرجع تقرير الاستيراد مع أخطاء الأسطر.
+    """
+    fmt = import_format(filename, format)
+    config = import_config()
+    max_bytes = config["max_upload_mb"] * 1024 * 1024
+    if int(request.headers.get("content-length") or 0) > max_bytes:
+        raise FileTooLarge(f"حجم الملف أكبر من الحد المسموح ({config['max_upload_mb']}MB)")
+    session = request.state.session
+    job = ImportJob(entity.value, source=filename, dry_run=dry_run, skip_existing=skip_existing,
+                    user=session.username if session is not None else "system", config=config)
+
+    fd, path = tempfile.mkstemp(prefix="import-", suffix=f".{fmt}")
+    try:
+        size = 0
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > max_bytes:
+                    raise FileTooLarge(f"حجم الملف أكبر من الحد المسموح ({config['max_upload_mb']}MB)")
+                f.write(chunk)
+        if size == 0:
+            raise ImportFormatError("الملف فارغ")
+        chunks = read_chunks(path, fmt, config["chunk_rows"])
+        try:
+            while True:
+                prepared = await run_in_threadpool(_next_prepared, job, chunks)
+                if prepared is None:
+                    break
+                if prepared:
+                    await run_db(job.write, prepared, write=True)
+        finally:
+            chunks.close()
+    finally:
+        os.remove(path)
+    return job.report()
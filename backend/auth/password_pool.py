@@ -0,0 +1,166 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.config import get_section
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# ========== مجمع bcrypt (Password Pool) ==========
+# bcrypt مقصود أن يكون بطيئاً (~350ms للتحقق بكلفة 12). داخل threads السيرفر تستهلك موجة تسجيلات الدخول
+# (بداية الدوام) الـ threadpool والمعالج فتتأخر طلبات القوائم والتعديل. هنا يُنفذ التحقق والتشفير في عمليات
+# منفصلة بعدد محدود وبأولوية أقل (nice)، والطلب الذي يتجاوز max_pending يُرفض فوراً (503 مع Retry-After)
+# بدل أن يتراكم. الدالة المنفذة من auth_utils (العملية الفرعية تستوردها فقط، بدون قاعدة البيانات).
+# الإعدادات في auth.passwords (config/config.yaml)، والقياس: python -m benchmarks.bench_password_pool
+# عمليات spawn تستورد الوحدة الرئيسية من جديد: سكربت يشغّل التطبيق بنفسه يحتاج if __name__ == "__main__"
+# (كما مع uvicorn.run)، أو processes: false.
+
+class PasswordPoolBusy(Exception): pass
+
+DEFAULT_PASSWORD_CONFIG = {
+    "workers": 0,           # 0 = نصف أنوية المعالج (1 على الأقل)
+    "processes": True,      # false: threads مخصصة بنفس الحد (بدون عمليات منفصلة)
+    "max_pending": 32,      # تحقق/تشفير قيد الانتظار أو التنفيذ؛ ما بعده يُرفض
+    "bcrypt_rounds": 12,    # كلفة الـ hash الجديد (كل +1 يضاعف الزمن)؛ القديم يُتحقق منه بكلفته
+    "nice": 10,             # أولوية عمليات bcrypt على POSIX (أعلى = أقل أولوية من السيرفر)
+}
+
+def password_config():
+    return get_section("auth", {"passwords": DEFAULT_PASSWORD_CONFIG})["passwords"]
+
+def _lower_priority(nice):
+    # initializer في كل عملية bcrypt
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+
+def _timed_call(fn, args):
+    # زمن التنفيذ داخل العامل؛ الفرق عن الزمن الكلي = الانتظار في الطابور
+    started = time.perf_counter()
+    return fn(*args), time.perf_counter() - started
+
+def _hash(password, rounds):
+    from auth_utils import get_password_hash
+    return get_password_hash(password, rounds)
+
+def _verify(password, password_hash):
+    from auth_utils import verify_password
+    try:
+        return verify_password(password, password_hash)
+    except ValueError:
+        # hash غير معروف (مستخدم أُدخل بكلمة مرور غير مشفرة)
+        return False
+
+class PasswordPool:
+    def __init__(self, config=None):
+        config = config or password_config()
+        self.workers = config["workers"] or max(1, (os.cpu_count() or 2) // 2)
+        self.processes = config["processes"]
+        self.max_pending = config["max_pending"]
+        self.rounds = config["bcrypt_rounds"]
+        self.nice = config["nice"]
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.reset_stats()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.processes:
+                    # spawn: لا نسخ لـ threads السيرفر وحلقة asyncio (fork)، ونفس السلوك على Windows
+                    self._executor = ProcessPoolExecutor(
+                        self.workers, mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_lower_priority, initargs=(self.nice,),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="bcrypt")
+            return self._executor
+
+    def start(self):
+        # تشغيل العمليات واستيراد passlib مسبقاً حتى لا يدفع أول تسجيل دخول زمن الإقلاع
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(_timed_call, _verify, ("", ""))
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _submit(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._metrics["rejected"] += 1
+                raise PasswordPoolBusy("الخادم مشغول بتسجيلات دخول أخرى، أعد المحاولة بعد قليل")
+            self._pending += 1
+            self._metrics["peak_pending"] = max(self._metrics["peak_pending"], self._pending)
+        started = time.perf_counter()
+        try:
+            result, run_seconds = await asyncio.wrap_future(self._get_executor().submit(_timed_call, fn, args))
+        except BrokenProcessPool:
+            # عملية bcrypt توقفت فجأة: مجمع جديد للطلب التالي
+            logger.exception("توقف مجمع bcrypt، سيُعاد إنشاؤه")
+            self.shutdown()
+            self._record(failed=True)
+            raise
+        except BaseException:
+            self._record(failed=True)
+            raise
+        self._record(wait=time.perf_counter() - started - run_seconds, run=run_seconds)
+        return result
+
+    def _record(self, wait=0.0, run=0.0, failed=False):
+        with self._lock:
+            self._pending -= 1
+            metrics = self._metrics
+            if failed:
+                metrics["failed"] += 1
+                return
+            metrics["completed"] += 1
+            metrics["wait_seconds"] += wait
+            metrics["run_seconds"] += run
+            metrics["max_wait_seconds"] = max(metrics["max_wait_seconds"], wait)
+
+    async def hash(self, password):
+        return await self._submit(_hash, password, self.rounds)
+
+    async def verify(self, password, password_hash):
+        return await self._submit(_verify, password, password_hash)
+
+    # للاستخدام خارج السيرفر (سطر الأوامر، السكربتات)
+    def hash_sync(self, password):
+        return _hash(password, self.rounds)
+
+    def verify_sync(self, password, password_hash):
+        return _verify(password, password_hash)
+
+    def reset_stats(self):
+        self._metrics = {"completed": 0, "rejected": 0, "failed": 0, "peak_pending": self._pending,
+                         "wait_seconds": 0.0, "run_seconds": 0.0, "max_wait_seconds": 0.0}
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            pending = self._pending
+        completed = metrics["completed"] or 1
+        return {
+            "workers": self.workers,
+            "processes": self.processes,
+            "bcrypt_rounds": self.rounds,
+            "max_pending": self.max_pending,
+            "pending": pending,
+            "peak_pending": metrics["peak_pending"],
+            "completed": metrics["completed"],
+            "rejected": metrics["rejected"],
+            "failed": metrics["failed"],
+            "avg_wait_ms": round(metrics["wait_seconds"] / completed * 1000, 2),
+            "max_wait_ms": round(metrics["max_wait_seconds"] * 1000, 2),
+            "avg_run_ms": round(metrics["run_seconds"] / completed * 1000, 2),
+        }
+
+password_pool = PasswordPool()
@@ -0,0 +1,255 @@
+from collections import OrderedDict
+from datetime import timedelta
+from fastapi import Request
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from database.models import User
+from database.async_db import run_db
+from utils.config import get_section
+import auth_utils
+import hashlib
+import logging
+import os
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# ========== جلسات الدخول بالرموز (Token Sessions) ==========
+# /api/login يتحقق من كلمة المرور (bcrypt) مرة واحدة ويصدر رمز JWT موقعاً، والعميل يرسله في كل طلب:
+#     Authorization: Bearer <token>
+# التحقق من الطلب بدون قاعدة بيانات وبدون bcrypt: توقيع HMAC (أو الرمز نفسه من ذاكرة الرموز الموثقة)،
+# ثم حالة المستخدم (نشط، بصمة كلمة المرور، الدور) من ذاكرة مؤقتة تُحمّل من القاعدة مرة كل user_cache_seconds.
+# تعديل المستخدم أو حذفه يمسح حالته من الذاكرة بعد الـ commit، فالتعطيل وتغيير كلمة المرور يُبطلان رموزه فوراً.
+# الذاكرة داخل العملية (process) مثل ناقل الأحداث: مع عدة workers يصل التعديل للباقين خلال user_cache_seconds،
+# وتسجيل الخروج (إبطال الجلسة sid) يسري على الـ worker الذي استقبله فقط.
+
+class SessionError(Exception): pass
+class SecretKeyError(Exception): pass
+
+DEFAULT_AUTH_CONFIG = {
+    "required": True,           # false: الطلبات بدون رمز تُقبل (الرمز المرسل يُتحقق منه دائماً)
+    "secret_key": "",           # مفتاح التوقيع؛ PROPERTY_SECRET_KEY في البيئة له الأولوية
+    "secret_key_file": "",      # بدون مفتاح: مفتاح عشوائي يُنشأ أول مرة ويُحفظ هنا ("" = ~/.property_management/secret_key)
+    "token_minutes": auth_utils.ACCESS_TOKEN_EXPIRE_MINUTES,
+    "user_cache_seconds": 60,
+    "token_cache_size": 4096,   # رموز موثقة محفوظة (بدون إعادة فك التوقيع)
+    "public_paths": ["/api/login", "/docs", "/redoc", "/openapi.json"],
+}
+
+# مفتاح المستخدمين المعدلين داخل session.info حتى الـ commit
+CHANGED_USERS_KEY = "changed_users"
+
+def auth_config():
+    return get_section("auth", DEFAULT_AUTH_CONFIG)
+
+def secret_key_path(config):
+    return config["secret_key_file"] or os.path.join(os.path.expanduser("~"), ".property_management", "secret_key")
+
+def load_secret_key(config):
+    """
+    مفتاح توقيع الرموز: PROPERTY_SECRET_KEY ثم auth.secret_key، وإلا مفتاح عشوائي يُنشأ عند أول تشغيل ويُحفظ
+    خارج المستودع (secret_key_file) فتبقى الرموز صالحة بعد إعادة التشغيل وتشترك فيه كل الـ workers.
+    المفتاح الافتراضي المكتوب في auth_utils معروف للجميع: يُرفض إذا كانت الرموز مطلوبة.
+    """
+    key = os.environ.get("PROPERTY_SECRET_KEY") or config["secret_key"]
+    if key:
+        if key == auth_utils.SECRET_KEY and config["required"]:
+            raise SecretKeyError("auth.secret_key هو المفتاح الافتراضي المنشور في auth_utils؛ غيّره أو اتركه فارغاً")
+        return key
+    path = secret_key_path(config)
+    try:
+        with open(path, encoding="utf-8") as f:
+            key = f.read().strip()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+    except OSError as exc:
+        raise SecretKeyError(f"تعذر قراءة مفتاح توقيع الرموز من {path}: {exc}")
+    key = secrets.token_urlsafe(48)
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        # O_EXCL: أول worker ينشئ الملف، والباقون يقرؤون مفتاحه
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError as exc:
+        raise SecretKeyError(f"تعذر حفظ مفتاح توقيع الرموز في {path}: {exc}. حدد auth.secret_key أو PROPERTY_SECRET_KEY")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(key)
+    logger.warning("تم إنشاء مفتاح توقيع جديد للرموز في %s", path)
+    return key
+
+def password_fingerprint(password_hash):
+    # جزء من بصمة الـ hash داخل الرمز: تغيير كلمة المرور يبطل كل الرموز السابقة (بدون كشف الـ hash نفسه)
+    return hashlib.sha256(password_hash.encode("utf-8")).hexdigest()[:16]
+
+class SessionUser:
+    """المستخدم الحالي للطلب (request.state.session)"""
+
+    def __init__(self, id, username, role, sid, expires_at):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.sid = sid
+        self.expires_at = expires_at
+
+    def to_dict(self):
+        return {"id": self.id, "username": self.username, "role": self.role, "expires_at": self.expires_at}
+
+class UserState:
+    """ما يلزم للتحقق من رموز المستخدم: يُحمّل من القاعدة ويُحفظ في الذاكرة"""
+
+    def __init__(self, username, role, is_active, fingerprint):
+        self.username = username
+        self.role = role
+        self.is_active = is_active
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_user(cls, username, role, is_active, password_hash):
+        return cls(username, getattr(role, "value", role), bool(is_active), password_fingerprint(password_hash))
+
+# حالة مستخدم محذوف: كل رموزه مرفوضة
+MISSING_USER = UserState(None, None, False, None)
+
+def load_user_state(db: Session, user_id):
+    row = db.execute(
+        select(User.username, User.role, User.is_active, User.password_hash).where(User.id == user_id)
+    ).first()
+    return UserState.from_user(*row) if row else MISSING_USER
+
+class SessionManager:
+    def __init__(self, config=None):
+        config = config or auth_config()
+        self.required = config["required"]
+        self.token_minutes = config["token_minutes"]
+        self.user_cache_seconds = config["user_cache_seconds"]
+        self.public_paths = frozenset(config["public_paths"])
+        self._secret = load_secret_key(config)
+        self._lock = threading.Lock()
+        self._tokens = OrderedDict()   # رمز -> claims (موثق التوقيع)
+        self._token_cache_size = config["token_cache_size"]
+        self._users = {}               # معرف المستخدم -> (وقت الانتهاء، UserState)
+        self._revoked = {}             # sid -> وقت انتهاء الرمز (يُحذف بعده)
+        self.generation = 0            # يزيد مع كل مسح: حالة حُمّلت قبل تعديل مستخدم لا تُحفظ بعده
+
+    # ---------- إصدار الرموز ----------
+    def issue(self, user_id, username, role, is_active, password_hash):
+        """رمز جديد لمستخدم تحقق من كلمة مروره: {access_token, token_type, expires_at, expires_in}"""
+        state = UserState.from_user(username, role, is_active, password_hash)
+        expires_in = self.token_minutes * 60
+        expires_at = int(time.time()) + expires_in
+        claims = {
+            "sub": str(user_id),
+            "name": username,
+            "role": state.role,
+            "sid": secrets.token_urlsafe(12),
+            "pwd": state.fingerprint,
+        }
+        token = auth_utils.create_access_token(claims, timedelta(seconds=expires_in), secret_key=self._secret)
+        # الطلب التالي لا يحتاج تحميل حالة المستخدم
+        self.store_state(user_id, state)
+        return {"access_token": token, "token_type": "bearer", "expires_at": expires_at, "expires_in": expires_in}
+
+    # ---------- التحقق ----------
+    def decode(self, token):
+        now = time.time()
+        with self._lock:
+            claims = self._tokens.get(token)
+            if claims is not None:
+                self._tokens.move_to_end(token)
+        if claims is None:
+            claims = auth_utils.decode_access_token(token, secret_key=self._secret)
+            if not claims or not str(claims.get("sub", "")).isdigit() or "sid" not in claims:
+                raise SessionError("رمز الدخول غير صالح")
+            with self._lock:
+                self._tokens[token] = claims
+                while len(self._tokens) > self._token_cache_size:
+                    self._tokens.popitem(last=False)
+        if claims["exp"] <= now:
+            with self._lock:
+                self._tokens.pop(token, None)
+            raise SessionError("انتهت صلاحية رمز الدخول")
+        return claims
+
+    def cached_state(self, user_id):
+        entry = self._users.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def store_state(self, user_id, state, generation=None):
+        if generation is None or generation == self.generation:
+            self._users[user_id] = (time.monotonic() + self.user_cache_seconds, state)
+        return state
+
+    def check(self, claims, state):
+        if not state.is_active:
+            raise SessionError("المستخدم غير موجود أو غير نشط")
+        if claims.get("pwd") != state.fingerprint:
+            raise SessionError("تغيرت كلمة المرور، يلزم تسجيل الدخول من جديد")
+        if claims["sid"] in self._revoked:
+            raise SessionError("تم تسجيل الخروج من هذه الجلسة")
+        return SessionUser(int(claims["sub"]), state.username, state.role, claims["sid"], claims["exp"])
+
+    # ---------- الإبطال ----------
+    def revoke(self, sid, expires_at):
+        now = time.time()
+        with self._lock:
+            # الرموز المنتهية مرفوضة أصلاً: لا داعي لتذكرها
+            for old in [s for s, exp in self._revoked.items() if exp <= now]:
+                del self._revoked[old]
+            self._revoked[sid] = expires_at
+
+    def forget_users(self, user_ids):
+        # بعد commit في أي thread (الـ threadpool أو run_sync)
+        with self._lock:
+            self.generation += 1
+            for user_id in user_ids:
+                self._users.pop(user_id, None)
+
+sessions = SessionManager()
+
+async def require_session(request: Request):
+    """
+    Dependency على مستوى التطبيق: يتحقق من رمز الطلب ويضع المستخدم في request.state.session.
+    بدون قاعدة بيانات إلا عند انتهاء حالة المستخدم في الذاكرة (مرة كل user_cache_seconds لكل مستخدم).
+    """
+    request.state.session = None
+    if request.url.path in sessions.public_paths:
+        return None
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        if sessions.required:
+            raise SessionError("يلزم تسجيل الدخول")
+        return None
+    claims = sessions.decode(token.strip())
+    user_id = int(claims["sub"])
+    state = sessions.cached_state(user_id)
+    if state is None:
+        generation = sessions.generation
+        state = sessions.store_state(user_id, await run_db(load_user_state, user_id), generation)
+    request.state.session = sessions.check(claims, state)
+    return request.state.session
+
+# ---------- مسح حالة المستخدمين المعدلين بعد الـ commit ----------
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    ids = [obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, User)]
+    if ids:
+        session.info.setdefault(CHANGED_USERS_KEY, set()).update(ids)
+
+@event.listens_for(Session, "after_commit")
+def _forget_changed_users(session):
+    ids = session.info.pop(CHANGED_USERS_KEY, None)
+    if ids:
+        sessions.forget_users(ids)
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_changed_users(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(CHANGED_USERS_KEY, None)
@@ -0,0 +1,89 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database.models import User, UserRole
+from database.users_utils import add_user
+from database.async_db import run_db
+from auth.session import sessions
+from auth.password_pool import password_pool
+from datetime import datetime
+import argparse
+import getpass
+
+# ========== تسجيل الدخول وإدارة حسابات الدخول ==========
+# الدخول على ثلاث مراحل حتى لا يحجز bcrypt (مئات الملي ثانية) اتصالاً بقاعدة البيانات أو مسار الكتابة:
+#   1) قراءة المستخدم (مسار القراءة)  2) bcrypt في مجمع العمليات بدون جلسة (auth/password_pool.py)
+#   3) تسجيل last_login (مسار الكتابة)
+# بعدها يصدر رمز الجلسة (auth/session.py) ولا يتكرر bcrypt حتى تسجيل الدخول التالي.
+
+class AuthenticationFailed(Exception): pass
+
+def login_candidate(db: Session, username):
+    row = db.execute(
+        select(User.id, User.username, User.role, User.is_active, User.password_hash).where(User.username == username)
+    ).first()
+    if row is None or not row.is_active:
+        raise AuthenticationFailed("اسم المستخدم غير موجود أو غير نشط")
+    return row
+
+def record_login(db: Session, user_id):
+    user = db.get(User, user_id)
+    if user is None or not user.is_active:
+        raise AuthenticationFailed("اسم المستخدم غير موجود أو غير نشط")
+    user.last_login = datetime.utcnow()
+    db.commit()
+    return user.id, user.username, user.role, user.is_active, user.password_hash
+
+async def login(username, password):
+    """{access_token, token_type, expires_at, expires_in, user} أو AuthenticationFailed"""
+    candidate = await run_db(login_candidate, username)
+    if not await password_pool.verify(password, candidate.password_hash):
+        raise AuthenticationFailed("كلمة المرور غير صحيحة")
+    user_id, username, role, is_active, password_hash = await run_db(record_login, candidate.id, write=True)
+    if password_hash != candidate.password_hash:
+        # تغيرت كلمة المرور أثناء التحقق
+        raise AuthenticationFailed("كلمة المرور غير صحيحة")
+    token = sessions.issue(user_id, username, role, is_active, password_hash)
+    token["user"] = {"id": user_id, "username": username, "role": role.value}
+    return token
+
+def create_user(db: Session, username, password, role="staff", is_active=True):
+    return add_user(db, username=username, password_hash=password_pool.hash_sync(password), role=role, is_active=is_active)
+
+def set_password(db: Session, username, password):
+    # تغيير الـ hash يبطل كل رموز المستخدم (بصمة كلمة المرور داخل الرمز)
+    user = db.execute(select(User).where(User.username == username)).scalar_one_or_none()
+    if user is None:
+        raise AuthenticationFailed("اسم المستخدم غير موجود")
+    user.password_hash = password_pool.hash_sync(password)
+    db.commit()
+    return user
+
+# ---------- سطر الأوامر: إنشاء أول مستخدم أو إعادة تعيين كلمة المرور ----------
+# من مجلد backend:  python -m auth.user_manager create-user admin --role admin
+#                   python -m auth.user_manager set-password admin
+def main(argv=None):
+    from database.db_utils import init_db, SessionLocal
+
+    parser = argparse.ArgumentParser(prog="python -m auth.user_manager")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create-user")
+    create.add_argument("username")
+    create.add_argument("--role", choices=list(UserRole.__members__), default="staff")
+    create.add_argument("--password", help="بدونه تُطلب كلمة المرور من الطرفية")
+    reset = commands.add_parser("set-password")
+    reset.add_argument("username")
+    reset.add_argument("--password")
+    args = parser.parse_args(argv)
+
+    password = args.password or getpass.getpass("كلمة المرور: ")
+    init_db()
+    with SessionLocal() as db:
+        if args.command == "create-user":
+            user = create_user(db, args.username, password, role=args.role)
+            print(f"تم إنشاء المستخدم {user.username} ({user.role.value})")
+        else:
+            user = set_password(db, args.username, password)
+            print(f"تم تغيير كلمة مرور {user.username}")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from passlib.context import CryptContext
+from passlib.hash import bcrypt as bcrypt_hash
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 
@@ -11,19 +12,22 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
+def get_password_hash(password, rounds: int = None):
+    # rounds: كلفة bcrypt (log2 عدد الدورات)؛ الـ hash يحمل كلفته فالتحقق لا يحتاجها
+    if rounds:
+        return bcrypt_hash.using(rounds=rounds).hash(password)
     return pwd_context.hash(password)
 
-def create_access_token(data: dict, expires_delta: timedelta = None):
+def create_access_token(data: dict, expires_delta: timedelta = None, secret_key: str = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, secret_key or SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def decode_access_token(token: str):
+def decode_access_token(token: str, secret_key: str = None):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, secret_key or SECRET_KEY, algorithms=[ALGORITHM])
         return payload
     except JWTError:
         return None
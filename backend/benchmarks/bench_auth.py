@@ -0,0 +1,69 @@
+# كلفة التحقق من كل طلب: قراءة المستخدم + bcrypt (كلمة المرور مع كل طلب) مقابل رمز الجلسة
+# (فك توقيع JWT أول مرة، ثم الرمز الموثق من الذاكرة) ثم الزمن الكامل لطلب /api/session عبر ASGI
+# التشغيل من مجلد backend:  python -m benchmarks.bench_auth [--repeat 2000] [--bcrypt-repeat 10]
+
+import argparse, os, tempfile, time
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from database.db_utils import init_db, SessionLocal, engine
+from auth.user_manager import create_user, login_candidate
+from auth.password_pool import password_pool
+from auth.session import sessions, load_user_state
+import app as A
+
+USERNAME, PASSWORD = "bench_admin", "bench-password"
+
+def timed(fn, repeat):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+def password_per_request():
+    with SessionLocal() as db:
+        user = login_candidate(db, USERNAME)
+    assert password_pool.verify_sync(PASSWORD, user.password_hash)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--bcrypt-repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    init_db()
+    with SessionLocal() as db:
+        user = create_user(db, USERNAME, PASSWORD, role="admin")
+        issued = sessions.issue(user.id, user.username, user.role, user.is_active, user.password_hash)
+    token = issued["access_token"]
+
+    def token_first_use():
+        sessions._tokens.clear()
+        sessions.check(sessions.decode(token), sessions.cached_state(user.id))
+
+    def token_cached():
+        sessions.check(sessions.decode(token), sessions.cached_state(user.id))
+
+    def token_state_reload():
+        # مرة كل user_cache_seconds لكل مستخدم
+        with SessionLocal() as db:
+            sessions.check(sessions.decode(token), load_user_state(db, user.id))
+
+    client = TestClient(A.app, headers={"Authorization": f"Bearer {token}"})
+    queries = [0]
+    event.listen(engine, "before_cursor_execute", lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+    print(f"{'check':<34}{'us/request':>12}{'db queries':>12}")
+    for name, fn, repeat in (
+        ("password (db + bcrypt)", password_per_request, args.bcrypt_repeat),
+        ("token: first use (jwt decode)", token_first_use, args.repeat),
+        ("token: cached", token_cached, args.repeat),
+        ("token: user state reload (db)", token_state_reload, args.repeat),
+        ("http /api/session", lambda: client.get("/api/session").raise_for_status(), args.repeat // 4),
+    ):
+        queries[0] = 0
+        us = timed(fn, repeat)
+        print(f"{name:<34}{us:>12.1f}{queries[0] / (repeat + 1):>12.2f}")
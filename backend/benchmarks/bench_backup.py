@@ -0,0 +1,100 @@
+# النسخ الاحتياطي الحي والاستعادة على قاعدة بحجم عدة GB: سرعة النسخة الكاملة، النسخة التزايدية بعد إضافات/تعديلات قليلة،
+# زمن الكتابة أثناء النسخ (كاتب متزامن)، وزمن الاستعادة مع integrity_check و quick_check
+# التشغيل من مجلد backend:  python -m benchmarks.bench_backup [--size-mb 2048]
+
+import argparse, os, random, shutil, sqlite3, tempfile, threading, time
+
+from database.backup_restore import DEFAULT_BACKUP_CONFIG, create_backup, restore_backup
+
+ROW_BYTES = 1024
+BATCH = 20000
+WORDS = "عقد إيجار وحدة سكنية مستأجر مالك فاتورة دفعة شهرية مبنى موقع ملاحظات".split()
+
+def populate(path, size_mb):
+    rng = random.Random(7)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE rows (id INTEGER PRIMARY KEY, payload TEXT NOT NULL)")
+    rows = size_mb * 1024 * 1024 // ROW_BYTES
+    for lo in range(0, rows, BATCH):
+        conn.executemany("INSERT INTO rows (payload) VALUES (?)", [
+            (" ".join(rng.choice(WORDS) for _ in range(60)) + rng.randbytes(200).hex(),)
+            for _ in range(min(BATCH, rows - lo))
+        ])
+        conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return rows
+
+class Writer(threading.Thread):
+    # كاتب متزامن يحدّث الصفوف الحديثة أثناء النسخ؛ أكبر زمن commit يوضح إن كان النسخ يوقف الكتابة
+    def __init__(self, path, rows):
+        super().__init__(daemon=True)
+        self.path, self.rows = path, rows
+        self.stop = threading.Event()
+        self.latencies = []
+
+    def run(self):
+        conn = sqlite3.connect(self.path, timeout=60)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        rng = random.Random(1)
+        while not self.stop.is_set():
+            t0 = time.perf_counter()
+            conn.execute("UPDATE rows SET payload = ? WHERE id = ?", (rng.randbytes(400).hex(), rng.randint(self.rows - self.rows // 20, self.rows)))
+            conn.commit()
+            self.latencies.append(time.perf_counter() - t0)
+            time.sleep(0.005)
+        conn.close()
+
+def mb(n):
+    return n / 1024 / 1024
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--updates", type=int, default=1000, help="صفوف تُعدل (وتُضاف) قبل كل نسخة تزايدية")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    source = os.path.join(work, "bench.db")
+    config = dict(DEFAULT_BACKUP_CONFIG, directory=os.path.join(work, "backups"))
+    try:
+        t0 = time.perf_counter()
+        rows = populate(source, args.size_mb)
+        size = os.path.getsize(source)
+        print(f"database   {mb(size):10.0f} MB  ({rows} rows, {time.perf_counter() - t0:.0f} s to build)")
+
+        writer = Writer(source, rows)
+        writer.start()
+        full = create_backup(source, config)
+        writer.stop.set()
+        writer.join()
+        print(f"full       {full['seconds']:10.1f} s   {mb(full['size']) / full['seconds']:7.0f} MB/s  "
+              f"stored {mb(full['stored_bytes']):.0f} MB (x{full['size'] / max(full['stored_bytes'], 1):.1f})")
+        lat = sorted(writer.latencies)
+        print(f"writer     {len(lat):10d} commits during backup, p50 {lat[len(lat) // 2] * 1000:.1f} ms, "
+              f"max {lat[-1] * 1000:.1f} ms")
+
+        # نمط التطبيق: إضافة صفوف جديدة (فواتير، دفعات، سجل التدقيق) وتعديل الحديث منها، ثم الأسوأ: تعديلات عشوائية
+        rng = random.Random(3)
+        for label, ids in (("increment", lambda: rng.randint(rows - rows // 20, rows)),
+                           ("random", lambda: rng.randint(1, rows))):
+            conn = sqlite3.connect(source)
+            for _ in range(args.updates):
+                conn.execute("UPDATE rows SET payload = ? WHERE id = ?", (rng.randbytes(400).hex(), ids()))
+            if label == "increment":
+                conn.executemany("INSERT INTO rows (payload) VALUES (?)",
+                                 [(rng.randbytes(400).hex(),) for _ in range(args.updates)])
+            conn.commit()
+            conn.close()
+            inc = create_backup(source, config)
+            print(f"{label:<10} {inc['seconds']:10.1f} s   {inc['new_chunks']} of {len(inc['chunks'])} chunks new, "
+                  f"stored {mb(inc['stored_bytes']):.1f} MB")
+
+        target = os.path.join(work, "restored.db")
+        for check in ("integrity", "quick"):
+            result = restore_backup(inc["id"], target, config, check=check, safety_backup=False)
+            print(f"restore    {result['seconds']:10.1f} s   {mb(result['size']) / result['seconds']:7.0f} MB/s  ({check}_check)")
+            os.remove(target)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
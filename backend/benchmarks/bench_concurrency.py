@@ -0,0 +1,87 @@
+# زمن الاستجابة (p50/p99) والإنتاجية تحت 200 عميل متزامن: مزيج قراءة/كتابة على التطبيق نفسه (ASGI داخل العملية)
+# التشغيل من مجلد backend:  python -m benchmarks.bench_concurrency [--clients 200] [--requests 20] [--writes 0.2] [--no-lanes]
+
+import argparse, asyncio, os, random, tempfile, time
+
+# قاعدة مؤقتة قبل استيراد التطبيق (db_utils يقرأ DATABASE_URL عند الاستيراد)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+import httpx
+from database.db_utils import init_db, SessionLocal, db_config
+from database.models import Owner, Unit, UnitStatus
+from auth.user_manager import create_user
+from auth.session import sessions
+from app import app
+
+OWNERS = 500
+UNITS = 2000
+
+def seed():
+    init_db()
+    with SessionLocal() as db:
+        db.add_all(Owner(name=f"Owner {i}", registration_number=f"1{i:09d}", nationality="SA") for i in range(OWNERS))
+        db.flush()
+        db.add_all(Unit(unit_number=f"U-{i}", unit_type="flat", rooms=3, area=120, location="الرياض",
+                        status=UnitStatus.available, owner_id=1 + i % OWNERS) for i in range(UNITS))
+        db.commit()
+        # كل العملاء بجلسة واحدة (الرمز مباشرة بدون bcrypt الدخول)
+        user = create_user(db, "bench_admin", "bench-password", role="admin")
+        token = sessions.issue(user.id, user.username, user.role, user.is_active, user.password_hash)
+    return {"Authorization": f"Bearer {token['access_token']}"}
+
+async def client(http, n, writes, rng, results, counter):
+    for _ in range(n):
+        if rng.random() < writes:
+            kind = "write"
+            if rng.random() < 0.5:
+                i = next(counter)
+                req = http.post("/owners/", json=dict(name=f"Bench owner {i}", registration_number=f"9{i:09d}", nationality="SA"))
+            else:
+                unit_id = rng.randint(1, UNITS)
+                req = http.put(f"/units/{unit_id}", json=dict(
+                    unit_number=f"U-{unit_id - 1}", unit_type="flat", rooms=rng.randint(1, 6), area=120,
+                    location="الرياض", status="available", owner_id=1 + (unit_id - 1) % OWNERS))
+        else:
+            kind = "read"
+            path = rng.choice((f"/owners/{rng.randint(1, OWNERS)}", f"/units/{rng.randint(1, UNITS)}",
+                               "/owners/?per_page=20", "/units/?per_page=20"))
+            req = http.get(path)
+        t0 = time.perf_counter()
+        try:
+            status = (await req).status_code
+        except httpx.TimeoutException:
+            status = 599
+        results.append((kind, time.perf_counter() - t0, status))
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0.0
+
+async def main(args):
+    db_config["async"]["lanes"] = not args.no_lanes
+    headers = seed()
+    counter = iter(range(10 ** 9))
+    results = []
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120, headers=headers) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            client(http, args.requests, args.writes, random.Random(i), results, counter)
+            for i in range(args.clients)
+        ))
+        elapsed = time.perf_counter() - started
+
+    errors = sum(1 for _, _, status in results if status >= 500)
+    print(f"{args.clients} clients x {args.requests} requests, {args.writes:.0%} writes: "
+          f"{len(results) / elapsed:.0f} req/s, {errors} errors")
+    for kind in ("read", "write", None):
+        lat = [t for k, t, _ in results if kind in (None, k)]
+        print(f"  {kind or 'all':<6} p50 {percentile(lat, 0.5):8.1f} ms   p99 {percentile(lat, 0.99):8.1f} ms   ({len(lat)})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--writes", type=float, default=0.2)
+    parser.add_argument("--no-lanes", action="store_true", help="كل طلب يدخل الـ threadpool مباشرة (بدون طابور asyncio)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,60 @@
+# زمن الطلب الواحد: requests.get لكل طلب (اتصال جديد) مقابل العميل المشترك frontend/api_client.py (keep-alive)
+# التشغيل من مجلد backend:  python -m benchmarks.bench_http_client [--url http://localhost:8000/units/]
+# بدون --url يُشغّل خادم محلي صغير يرجع JSON بحجم قائمة وحدات.
+
+import json, os, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from frontend.api_client import ApiClient
+
+RUNS = 300
+PAYLOAD = json.dumps([{"id": i, "unit_number": f"U-{i}", "location": "الرياض", "status": "available"} for i in range(50)]).encode()
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # يسمح بإبقاء الاتصال مفتوحاً
+    disable_nagle_algorithm = True  # الرأس والجسم في كتابتين؛ بدون هذا ينتظر كل طلب delayed-ACK (~40ms)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, *args):
+        pass
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/units/"
+
+def timed(label, fn):
+    fn()
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        fn()
+    per_request = (time.perf_counter() - start) * 1000 / RUNS
+    print(f"{label:34} {per_request:7.3f} ms/طلب")
+    return per_request
+
+def main():
+    url = sys.argv[sys.argv.index("--url") + 1] if "--url" in sys.argv else None
+    server = None
+    if url is None:
+        server, url = start_server()
+    client = ApiClient()
+
+    before = timed("requests.get (اتصال جديد لكل طلب)", lambda: requests.get(url).json())
+    after = timed("ApiClient (جلسة مشتركة)", lambda: client.get(url).json())
+    print(f"التحسن: {before / after:.1f}x")
+
+    client.close()
+    if server:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# الاستيراد الجماعي (database/import_utils.py) لملفات CSV كبيرة: ملاك، مستأجرون، وحدات (المالك برقم الهوية)
+# وعقود (الوحدة والمستأجر بالمفتاح الطبيعي) مع جداول فواتيرها، مقابل الإضافة سطراً سطراً عبر add_* (المسار القديم)
+# التشغيل من مجلد backend:  python -m benchmarks.bench_import [--rows 100000] [--chunk-rows 2000] [--legacy-rows 500]
+
+import argparse, csv, os, tempfile, time
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from datetime import date, timedelta
+from sqlalchemy import select, func
+from database.db_utils import init_db, SessionLocal
+from database.models import Invoice, UnitStatus, ContractStatus
+from database.import_utils import import_file
+from database.owners_utils import add_owner
+from database.tenants_utils import add_tenant
+from database.units_utils import add_unit
+from database.contracts_utils import add_contract
+
+def write_csv(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return path
+
+def files(directory, n):
+    return [
+        ("owners", write_csv(os.path.join(directory, "owners.csv"),
+            ["name", "registration_number", "nationality", "iban", "agent_name"],
+            ([f"مالك رقم {i}", f"1{i:09d}", "SA", f"SA{i:022d}", ""] for i in range(n)))),
+        ("tenants", write_csv(os.path.join(directory, "tenants.csv"),
+            ["name", "national_id", "phone", "nationality", "email"],
+            ([f"مستأجر رقم {i}", f"2{i:09d}", f"05{i % 10 ** 8:08d}", "SA", f"t{i}@example.com"] for i in range(n)))),
+        ("units", write_csv(os.path.join(directory, "units.csv"),
+            ["unit_number", "unit_type", "rooms", "area", "location", "status", "owner_registration_number"],
+            ([f"U-{i}", "شقة", 3, 120.5, "الرياض", "rented", f"1{i:09d}"] for i in range(n)))),
+        ("contracts", write_csv(os.path.join(directory, "contracts.csv"),
+            ["contract_number", "unit_number", "tenant_national_id", "start_date", "end_date", "rent_amount", "status", "payment_type"],
+            # بدايات على 12 شهراً و50 قيمة إيجار: شروط متكررة كما في محفظة حقيقية
+            ([f"C-{i}", f"U-{i}", f"2{i:09d}", date(2026, 1 + i % 12, 1), date(2027, 1 + i % 12, 1) - timedelta(days=1),
+              12000 + i % 50 * 100, "active", "ربع سنوي"] for i in range(n)))),
+    ]
+
+def legacy(n):
+    # نفس البيانات عبر دوال الإضافة الحالية: استعلام تحقق + commit لكل سطر
+    start, end = date(2026, 1, 1), date(2026, 12, 31)
+    timings = {}
+    with SessionLocal() as db:
+        t0 = time.perf_counter()
+        owners = [add_owner(db, f"مالك {i}", f"3{i:09d}", "SA").id for i in range(n)]
+        timings["owners"] = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        tenants = [add_tenant(db, f"مستأجر {i}", f"4{i:09d}", f"05{i:08d}", "SA").id for i in range(n)]
+        timings["tenants"] = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        units = [add_unit(db, f"L-{i}", "شقة", 3, 120.5, "الرياض", UnitStatus.rented, owners[i]).id for i in range(n)]
+        timings["units"] = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for i in range(n):
+            add_contract(db, f"LC-{i}", units[i], tenants[i], start, end, 12, 12000, ContractStatus.active,
+                         payment_type="ربع سنوي")
+        timings["contracts"] = time.perf_counter() - t0
+    return timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--chunk-rows", type=int, default=2000)
+    parser.add_argument("--legacy-rows", type=int, default=500)
+    args = parser.parse_args()
+
+    init_db()
+    directory = tempfile.mkdtemp()
+    print(f"{args.rows} rows per entity, chunk_rows={args.chunk_rows}")
+    print(f"{'entity':<12}{'bulk s':>9}{'rows/s':>10}{'invoices':>10}{'legacy rows/s':>15}{'speedup':>9}")
+    reports = {}
+    for entity, path in files(directory, args.rows):
+        with SessionLocal() as db:
+            reports[entity] = import_file(db, entity, path, chunk_rows=args.chunk_rows)
+        assert reports[entity]["inserted"] == args.rows, reports[entity]["errors"][:5]
+    timings = legacy(args.legacy_rows)
+    for entity, report in reports.items():
+        bulk_rate = report["rows"] / report["seconds"]
+        legacy_rate = args.legacy_rows / timings[entity]
+        print(f"{entity:<12}{report['seconds']:>9.2f}{bulk_rate:>10.0f}{report['invoices']:>10}"
+              f"{legacy_rate:>15.0f}{bulk_rate / legacy_rate:>8.0f}x")
+    with SessionLocal() as db:
+        print("invoices in db:", db.scalar(select(func.count(Invoice.id))))
@@ -0,0 +1,57 @@
+# مقارنة توليد فواتير العقد: الطريقة القديمة (add_invoice لكل قسط) مقابل التوليد الجماعي
+# التشغيل من مجلد backend:  python -m benchmarks.bench_invoice_schedule
+
+import os, tempfile, time
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database.models import Base, Owner, Unit, Tenant, Contract, ContractStatus, UnitStatus, InvoiceStatus
+from database.invoices_utils import add_invoice
+from contracts.contract_manager import build_invoice_schedule, generate_invoices_for_contract
+
+RUNS = 5
+YEARS = 10
+
+def make_session(path):
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)()
+
+def make_contract(db, n):
+    contract = Contract(
+        contract_number=f"BENCH-{n}", unit_id=1, tenant_id=1,
+        start_date=date(2020, 1, 1), end_date=date(2020 + YEARS, 1, 1) , duration_months=YEARS * 12,
+        rent_amount=120000, payment_type="شهري", status=ContractStatus.active
+    )
+    db.add(contract)
+    db.commit()
+    return contract
+
+def legacy_generate(db, contract):
+    for issue_date, amount in build_invoice_schedule(contract):
+        add_invoice(db=db, contract_id=contract.id, date_issued=issue_date, amount=amount,
+                    status=InvoiceStatus.unpaid, created_by_contract=True)
+
+def run(label, fn):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    db = make_session(path)
+    db.add(Owner(name="Bench", registration_number="1000000000", nationality="SA"))
+    db.add(Unit(unit_number="B-1", unit_type="flat", rooms=1, area=1, location="x", status=UnitStatus.rented, owner_id=1))
+    db.add(Tenant(name="Bench", national_id="2000000000", nationality="SA", phone="0500000000"))
+    db.commit()
+    timings = []
+    for n in range(RUNS):
+        contract = make_contract(db, n)
+        t0 = time.perf_counter()
+        fn(db, contract)
+        timings.append(time.perf_counter() - t0)
+    db.close()
+    best = min(timings) * 1000
+    print(f"{label:<10} best {best:8.1f} ms  avg {sum(timings) / len(timings) * 1000:8.1f} ms  ({YEARS * 12} invoices)")
+    return best
+
+if __name__ == "__main__":
+    legacy = run("legacy", legacy_generate)
+    bulk = run("bulk", generate_invoices_for_contract)
+    print(f"speedup x{legacy / bulk:.1f}")
@@ -0,0 +1,99 @@
+# مسار JSON السريع لكل endpoint: كائنات ORM ثم *_to_schema ثم تحقق response_model وترميز (المسار القديم)
+# مقابل صفوف SQL (profile="rows") مباشرة إلى dict وترميز orjson بدون تحقق، ثم الزمن الكامل للطلب عبر ASGI
+# التشغيل من مجلد backend:  python -m benchmarks.bench_json [--rows 5000] [--repeat 50]
+
+import argparse, os, tempfile, time
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from datetime import date, timedelta
+from typing import List
+from pydantic import TypeAdapter
+from fastapi.testclient import TestClient
+from database.db_utils import init_db, SessionLocal
+from database.models import Owner, Unit, Tenant, Contract, Attachment, AttachmentType, UnitStatus, ContractStatus
+from database.owners_utils import list_owners
+from database.units_utils import list_units
+from database.tenants_utils import list_tenants
+from database.contracts_utils import list_contracts
+from database.dashboard_utils import get_dashboard_summary
+from utils.json_response import dumps, orjson
+from auth.user_manager import create_user
+from auth.session import sessions
+import app as A
+
+def seed(n):
+    init_db()
+    with SessionLocal() as db:
+        db.add_all(Owner(name=f"مالك رقم {i}", registration_number=f"1{i:09d}", nationality="SA", iban=f"SA{i:020d}",
+                         notes="ملاحظات المالك") for i in range(n))
+        db.add_all(Tenant(name=f"مستأجر رقم {i}", national_id=f"2{i:09d}", phone=f"05{i:08d}", nationality="SA",
+                          email=f"t{i}@example.com", address="الرياض، حي النخيل") for i in range(n))
+        db.flush()
+        db.add_all(Unit(unit_number=f"U-{i}", unit_type="شقة", rooms=3, area=120.5, location="الرياض", building_name="برج 1",
+                        floor_number=i % 20, status=UnitStatus.rented, owner_id=1 + i % n) for i in range(n))
+        db.flush()
+        start = date(2026, 1, 1)
+        db.add_all(Contract(contract_number=f"C-{i}", unit_id=1 + i, tenant_id=1 + i, start_date=start,
+                            end_date=start + timedelta(days=364), duration_months=12, rent_amount=30000.0,
+                            status=ContractStatus.active, payment_type="شهري") for i in range(n))
+        for column in ("owner_id", "unit_id", "tenant_id", "contract_id"):
+            db.add_all(Attachment(filepath=f"docs/{column}/{i}.pdf", filetype="pdf", attachment_type=AttachmentType.general,
+                                  **{column: 1 + i}) for i in range(0, n, 2))
+        db.commit()
+        user = create_user(db, "bench_admin", "bench-password", role="admin")
+        token = sessions.issue(user.id, user.username, user.role, user.is_active, user.password_hash)
+    return {"Authorization": f"Bearer {token['access_token']}"}
+
+def timed(fn, repeat):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        body = fn()
+    return (time.perf_counter() - t0) / repeat * 1000, len(body)
+
+def schema_path(list_fn, to_schema, model, per_page):
+    adapter = TypeAdapter(List[model])
+    def run():
+        with SessionLocal() as db:
+            items = [to_schema(row, db) for row in list_fn(db, per_page=per_page)["data"]]
+            return adapter.dump_json(adapter.validate_python(items))
+    return run
+
+def rows_path(list_fn, entity, per_page, extended=False):
+    def run():
+        with SessionLocal() as db:
+            return dumps(A.page_rows(db, list_fn(db, per_page=per_page, profile="rows")["data"], entity, extended))
+    return run
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    headers = seed(args.rows)
+    print(f"encoder: {'orjson ' + orjson.__version__ if orjson else 'json (orjson غير مثبت)'}")
+
+    endpoints = [
+        ("/owners/", 200, list_owners, lambda o, db: A.owner_to_schema(o), A.OwnerOut, "owner", False),
+        ("/units/", 100, list_units, A.unit_to_schema, A.UnitOut, "unit", False),
+        ("/tenants/", 100, list_tenants, lambda t, db: A.tenant_to_schema(t), A.TenantOut, "tenant", True),
+        ("/contracts/", 100, list_contracts, A.contract_to_schema, A.ContractOut, "contract", False),
+    ]
+    print(f"{'endpoint':<14}{'per_page':>9}{'schema ms':>11}{'rows ms':>9}{'speedup':>9}{'http ms':>9}{'bytes':>9}")
+    # بدون with: لا يُشغَّل startup (المهام الدورية والنسخ الاحتياطي)، القاعدة جاهزة من seed
+    client = TestClient(A.app, headers=headers)
+    for path, per_page, list_fn, to_schema, model, entity, extended in endpoints:
+        before, _ = timed(schema_path(list_fn, to_schema, model, per_page), args.repeat)
+        after, size = timed(rows_path(list_fn, entity, per_page, extended), args.repeat)
+        http, _ = timed(lambda: client.get(path, params={"per_page": per_page}).content, args.repeat)
+        print(f"{path:<14}{per_page:>9}{before:>11.2f}{after:>9.2f}{before / after:>8.1f}x{http:>9.2f}{size:>9}")
+
+    # لوحة التحكم: نفس القاموس، الفرق في التحقق والترميز فقط
+    with SessionLocal() as db:
+        summary = get_dashboard_summary(db)
+    adapter = TypeAdapter(dict)
+    before, _ = timed(lambda: adapter.dump_json(adapter.validate_python(summary)), args.repeat * 20)
+    after, size = timed(lambda: dumps(summary), args.repeat * 20)
+    http, _ = timed(lambda: client.get("/dashboard/").content, args.repeat)
+    print(f"{'/dashboard/':<14}{'-':>9}{before:>11.3f}{after:>9.3f}{before / after:>8.1f}x{http:>9.2f}{size:>9}")
@@ -0,0 +1,113 @@
+# زمن /units/ و /invoices/ أثناء موجة تسجيلات دخول: bcrypt في threads السيرفر (السلوك السابق)
+# مقابل مجمع العمليات المحدود (auth/password_pool.py)، ثم زمن bcrypt لكل كلفة (bcrypt_rounds)
+# التشغيل من مجلد backend:  python -m benchmarks.bench_password_pool [--seconds 10] [--readers 4] [--logins 16] [--rounds 10 11 12 13]
+
+import argparse, asyncio, os, tempfile, time
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0.0
+
+def seed():
+    from datetime import date, timedelta
+    from database.db_utils import init_db, SessionLocal
+    from database.models import Owner, Unit, Tenant, Contract, Invoice, UnitStatus, ContractStatus, InvoiceStatus
+    from auth.user_manager import create_user
+    from auth.session import sessions
+    init_db()
+    with SessionLocal() as db:
+        db.add_all(Owner(name=f"Owner {i}", registration_number=f"1{i:09d}", nationality="SA") for i in range(200))
+        db.add_all(Tenant(name=f"Tenant {i}", national_id=f"2{i:09d}", phone=f"05{i:08d}", nationality="SA") for i in range(200))
+        db.flush()
+        db.add_all(Unit(unit_number=f"U-{i}", unit_type="flat", rooms=3, area=120, location="الرياض",
+                        status=UnitStatus.rented, owner_id=1 + i) for i in range(200))
+        db.flush()
+        start = date(2026, 1, 1)
+        db.add_all(Contract(contract_number=f"C-{i}", unit_id=1 + i, tenant_id=1 + i, start_date=start,
+                            end_date=start + timedelta(days=364), duration_months=12, rent_amount=12000,
+                            status=ContractStatus.active) for i in range(200))
+        db.flush()
+        db.add_all(Invoice(contract_id=1 + i % 200, date_issued=start + timedelta(days=30 * (i // 200)), amount=1000,
+                           status=InvoiceStatus.unpaid) for i in range(2400))
+        db.commit()
+        reader = create_user(db, "bench_reader", "reader-password", role="staff")
+        token = sessions.issue(reader.id, reader.username, reader.role, reader.is_active, reader.password_hash)
+        create_user(db, "bench_login", "login-password", role="staff")
+    return {"Authorization": f"Bearer {token['access_token']}"}
+
+async def reader(http, stop, latencies):
+    paths = ("/units/?per_page=20", "/invoices/?per_page=20")
+    i = 0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        (await http.get(paths[i % 2])).raise_for_status()
+        latencies.append(time.perf_counter() - t0)
+        i += 1
+
+async def login_client(http, stop, counts):
+    while not stop.is_set():
+        r = await http.post("/api/login", json={"username": "bench_login", "password": "login-password"})
+        counts[r.status_code] = counts.get(r.status_code, 0) + 1
+        if r.status_code == 503:
+            await asyncio.sleep(float(r.headers.get("Retry-After", 1)))
+
+async def scenario(app, headers, args, logins):
+    import httpx
+    stop = asyncio.Event()
+    latencies, counts = [], {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers, timeout=120) as http:
+        tasks = [asyncio.create_task(reader(http, stop, latencies)) for _ in range(args.readers)]
+        tasks += [asyncio.create_task(login_client(http, stop, counts)) for _ in range(logins)]
+        await asyncio.sleep(args.seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+    return latencies, counts
+
+def main(args):
+    # الاستيراد هنا: عمليات spawn تستورد هذه الوحدة كـ __mp_main__ ولا تحتاج التطبيق
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    from auth.password_pool import password_pool, PasswordPool
+    import app as A
+    headers = seed()
+
+    modes = [
+        ("idle (no logins)", None, 0),
+        # السلوك السابق: كل تسجيل دخول في thread من threadpool السيرفر (40) بدون حد ولا أولوية أقل
+        ("logins in server threads", dict(processes=False, workers=40, nice=0), args.logins),
+        ("logins in process pool", dict(processes=True, workers=password_pool.workers, nice=password_pool.nice), args.logins),
+    ]
+    print(f"{args.readers} readers on /units/ + /invoices/, {args.logins} login clients, {args.seconds}s each, "
+          f"bcrypt_rounds={password_pool.rounds}, cpus={os.cpu_count()}")
+    print(f"{'mode':<28}{'reads/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'logins/s':>10}{'503':>6}")
+    for name, settings, logins in modes:
+        if settings:
+            password_pool.shutdown()
+            for key, value in settings.items():
+                setattr(password_pool, key, value)
+            password_pool.start()
+            time.sleep(1)  # إقلاع العمليات خارج فترة القياس
+            password_pool.reset_stats()
+        latencies, counts = asyncio.run(scenario(A.app, headers, args, logins))
+        print(f"{name:<28}{len(latencies) / args.seconds:>9.0f}{percentile(latencies, 0.5):>9.1f}"
+              f"{percentile(latencies, 0.99):>9.1f}{counts.get(200, 0) / args.seconds:>10.1f}{counts.get(503, 0):>6}")
+    print("process pool:", password_pool.stats())
+    password_pool.shutdown()
+
+    print(f"\n{'bcrypt_rounds':<14}{'hash ms':>9}{'verify ms':>11}")
+    for rounds in args.rounds:
+        pool = PasswordPool(dict(workers=1, processes=False, max_pending=1, bcrypt_rounds=rounds, nice=0))
+        t0 = time.perf_counter()
+        hashed = pool.hash_sync("password")
+        t1 = time.perf_counter()
+        pool.verify_sync("password", hashed)
+        t2 = time.perf_counter()
+        print(f"{rounds:<14}{(t1 - t0) * 1000:>9.0f}{(t2 - t1) * 1000:>11.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--logins", type=int, default=16)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    main(parser.parse_args())
@@ -0,0 +1,99 @@
+# تقرير أعمار الديون على بيانات صناعية (مليون فاتورة افتراضياً): حلقة بايثون على كائنات ORM مقابل محرك التقارير المتجه، ثم الكاش
+# التشغيل من مجلد backend:  python -m benchmarks.bench_reports [--rows 1000000]
+
+import argparse, os, tempfile, time
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from database.models import Base, Owner, Unit, Tenant, Contract, Invoice, Payment, ContractStatus, UnitStatus, InvoiceStatus
+from reports.reports import aging, run_report, AGING_BUCKETS, AGING_EDGES
+
+INVOICES_PER_CONTRACT = 120
+AS_OF = date(2026, 1, 1)
+BATCH = 50000
+
+def make_session(path):
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)()
+
+def populate(db, rows):
+    rng = np.random.default_rng(7)
+    contracts = max(1, rows // INVOICES_PER_CONTRACT)
+    db.add(Owner(name="Bench", registration_number="1000000000", nationality="SA"))
+    db.add(Unit(unit_number="B-1", unit_type="flat", rooms=1, area=1, location="x", status=UnitStatus.rented, owner_id=1))
+    db.add(Tenant(name="Bench", national_id="2000000000", nationality="SA", phone="0500000000"))
+    db.commit()
+    db.execute(insert(Contract), [
+        dict(contract_number=f"BENCH-{n}", unit_id=1, tenant_id=1, start_date=date(2016, 1, 1), end_date=date(2026, 1, 1),
+             duration_months=120, rent_amount=120000, payment_type="شهري", status=ContractStatus.active)
+        for n in range(contracts)
+    ])
+    start = AS_OF - timedelta(days=3650)
+    offsets = rng.integers(0, 3650, rows)
+    amounts = rng.integers(500, 5000, rows).astype(float)
+    paid = rng.random(rows)  # ~60% مدفوعة بالكامل، ~15% جزئياً، الباقي بدون دفع
+    for lo in range(0, rows, BATCH):
+        hi = min(lo + BATCH, rows)
+        db.execute(insert(Invoice), [
+            dict(id=i + 1, contract_id=i % contracts + 1, date_issued=start + timedelta(days=int(offsets[i])),
+                 amount=amounts[i], status=InvoiceStatus.paid if paid[i] < 0.6 else InvoiceStatus.unpaid)
+            for i in range(lo, hi)
+        ])
+        db.execute(insert(Payment), [
+            dict(contract_id=i % contracts + 1, invoice_id=i + 1, due_date=start + timedelta(days=int(offsets[i])),
+                 amount_due=amounts[i], amount_paid=amounts[i] if paid[i] < 0.6 else amounts[i] / 2,
+                 paid_on=start + timedelta(days=int(offsets[i]) + 5))
+            for i in range(lo, hi) if paid[i] < 0.75
+        ])
+    db.commit()
+
+def orm_aging(db, as_of):
+    # الطريقة المباشرة: كل فاتورة ودفعة ككائن ORM وحساب الفئات بحلقة بايثون
+    paid = {}
+    for p in db.query(Payment).yield_per(BATCH):
+        if p.invoice_id is not None:
+            paid[p.invoice_id] = paid.get(p.invoice_id, 0.0) + (p.amount_paid or 0.0)
+    counts = [0] * len(AGING_BUCKETS)
+    amounts = [0.0] * len(AGING_BUCKETS)
+    for inv in db.query(Invoice).yield_per(BATCH):
+        if inv.date_issued > as_of:
+            continue
+        collected = inv.amount if inv.status == InvoiceStatus.paid else min(paid.get(inv.id, 0.0), inv.amount)
+        outstanding = inv.amount - collected
+        if outstanding <= 0.005:
+            continue
+        age = (as_of - inv.date_issued).days
+        bucket = sum(age >= edge for edge in AGING_EDGES)
+        counts[bucket] += 1
+        amounts[bucket] += outstanding
+    return counts, amounts
+
+def timed(label, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<12} {elapsed * 1000:10.1f} ms")
+    return result, elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    db = make_session(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    t0 = time.perf_counter()
+    populate(db, args.rows)
+    print(f"populated {args.rows} invoices in {time.perf_counter() - t0:.1f} s")
+
+    (counts, amounts), orm_time = timed("orm loop", lambda: orm_aging(db, AS_OF))
+    db.expunge_all()
+    report, vec_time = timed("vectorized", lambda: aging(db, AS_OF))
+    run_report(db, "aging", as_of=AS_OF)
+    _, hit_time = timed("cached", lambda: run_report(db, "aging", as_of=AS_OF))
+
+    assert [b["invoices"] for b in report["buckets"]] == counts
+    assert all(abs(b["amount"] - a) < 1 for b, a in zip(report["buckets"], amounts))
+    print(f"speedup x{orm_time / vec_time:.1f} (vectorized), x{orm_time / max(hit_time, 1e-9):.0f} (cached)")
@@ -0,0 +1,50 @@
+# مقارنة البحث بالاسم: ilike('%term%') مقابل فهرس FTS5 على 100 ألف مالك
+# التشغيل من مجلد backend:  python -m benchmarks.bench_search
+
+import os, random, tempfile, time
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from database.models import Base, Owner
+from database.migrations import run_migrations
+from database.search_utils import search, text_filter
+
+ROWS = 100_000
+RUNS = 20
+FIRST = ["أحمد", "محمد", "إبراهيم", "فاطمة", "خالد", "سارة", "عبدالله", "نورة", "يوسف", "مريم"]
+LAST = ["العتيبي", "القحطاني", "الشهري", "الزهراني", "الغامدي", "الدوسري", "المطيري", "الحربي"]
+
+def make_session():
+    path = os.path.join(tempfile.mkdtemp(), "search.db")
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    Base.metadata.create_all(engine)
+    random.seed(1)
+    with engine.begin() as conn:
+        conn.execute(insert(Owner), [
+            {"name": f"{random.choice(FIRST)} {random.choice(LAST)} {i}", "registration_number": f"{1000000000 + i}",
+             "nationality": "SA", "is_deleted": False}
+            for i in range(ROWS)
+        ])
+    # الترحيل ينشئ جدول البحث ويبنيه من البيانات الموجودة
+    start = time.perf_counter()
+    run_migrations(engine)
+    print(f"بناء الفهرس: {(time.perf_counter() - start) * 1000:.0f} ms")
+    return sessionmaker(bind=engine, autoflush=False, future=True)()
+
+def timed(label, fn):
+    fn()
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        count = fn()
+    print(f"{label:28} {(time.perf_counter() - start) * 1000 / RUNS:8.2f} ms  ({count} نتيجة)")
+
+def main():
+    db = make_session()
+    term = "القحط"
+    timed("ilike count", lambda: db.query(Owner).filter(Owner.is_deleted == False, Owner.name.ilike(f"%{term}%")).count())
+    timed("fts text_filter count", lambda: db.query(Owner).filter(Owner.is_deleted == False, text_filter(db, "owners", Owner.name, term)).count())
+    timed("ilike first page", lambda: len(db.query(Owner).filter(Owner.name.ilike(f"%{term}%")).order_by(Owner.id.desc()).limit(20).all()))
+    timed("/search top 20", lambda: len(search(db, "احمد القحط", ["owners"], 20)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# فحص خطط التنفيذ (EXPLAIN QUERY PLAN) لاستعلامات list_* و check_*
+# يلتقط الجمل التي تنفذها الدوال فعلياً ويتأكد أن كل جدول يُقرأ عبر فهرس وليس بمسح كامل.
+# التشغيل من مجلد backend:  python -m benchmarks.explain_query_plans
+# يرجع رمز خروج 1 إذا وُجد استعلام بدون فهرس. نفس الحالات تُفحص في pytest (backend/tests/test_query_plans.py).
+
+import os, re, sys, tempfile
+from datetime import date
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database.models import Base, Owner, Unit, Tenant, Contract, Invoice, Payment, UnitStatus, ContractStatus, InvoiceStatus
+from database.migrations import run_migrations
+from database.owners_utils import list_owners
+from database.units_utils import list_units
+from database.tenants_utils import list_tenants
+from database.contracts_utils import list_contracts, check_contract_conflicts
+from database.invoices_utils import list_invoices, check_invoice_conflict
+from database.payments_utils import list_payments, check_payment_conflict
+from database.attachments_utils import list_attachments
+from database.auditlog_utils import list_audit_logs
+
+# مسح كامل بدون فهرس: "SCAN owners" (وليس "SCAN owners USING INDEX ...")
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+def make_session():
+    path = os.path.join(tempfile.mkdtemp(), "plans.db")
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    db = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)()
+    db.add(Owner(name="Plan", registration_number="1000000000", nationality="SA"))
+    db.add(Unit(unit_number="P-1", unit_type="flat", rooms=1, area=1, location="x", status=UnitStatus.rented, owner_id=1))
+    db.add(Tenant(name="Plan", national_id="1000000000", nationality="SA", phone="0500000000"))
+    db.add(Contract(contract_number="P-1", unit_id=1, tenant_id=1, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31),
+                    duration_months=12, rent_amount=1000, status=ContractStatus.active))
+    db.add(Invoice(contract_id=1, date_issued=date(2024, 1, 1), amount=1000, status=InvoiceStatus.unpaid))
+    db.add(Payment(contract_id=1, invoice_id=1, due_date=date(2024, 1, 1), amount_due=1000))
+    db.commit()
+    return engine, db
+
+# (الاسم، الدالة) — الفلاتر النصية (ilike '%x%') لا يمكن فهرستها فهي غير مشمولة
+CASES = [
+    ("list_owners", lambda db: list_owners(db)),
+    ("list_owners keyset", lambda db: list_owners(db, keyset=True)),
+    ("list_units", lambda db: list_units(db)),
+    ("list_units owner", lambda db: list_units(db, filter_owner_id=1)),
+    ("list_tenants", lambda db: list_tenants(db)),
+    ("list_contracts", lambda db: list_contracts(db)),
+    ("list_contracts unit", lambda db: list_contracts(db, filter_unit_id=1)),
+    ("list_contracts tenant", lambda db: list_contracts(db, filter_tenant_id=1)),
+    ("list_invoices", lambda db: list_invoices(db)),
+    ("list_invoices contract", lambda db: list_invoices(db, filter_contract_id=1)),
+    ("list_invoices status", lambda db: list_invoices(db, filter_status=InvoiceStatus.unpaid)),
+    ("list_payments", lambda db: list_payments(db)),
+    ("list_payments contract", lambda db: list_payments(db, filter_contract_id=1)),
+    ("list_payments invoice", lambda db: list_payments(db, filter_invoice_id=1)),
+    ("list_attachments", lambda db: list_attachments(db)),
+    ("list_attachments owner", lambda db: list_attachments(db, owner_id=1)),
+    ("list_attachments contract", lambda db: list_attachments(db, contract_id=1)),
+    ("list_audit_logs", lambda db: list_audit_logs(db)),
+    ("check_contract_conflicts", lambda db: check_contract_conflicts(db, 2, date(2030, 1, 1), date(2030, 12, 31))),
+    ("check_invoice_conflict", lambda db: check_invoice_conflict(db, 1, date(2030, 1, 1))),
+    ("check_payment_conflict", lambda db: check_payment_conflict(db, 1, date(2030, 1, 1))),
+]
+
+def capture(engine, db, fn):
+    statements = []
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        fn(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+    return statements
+
+def full_scans(conn, statement, parameters):
+    plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    scans = []
+    for row in plan:
+        m = FULL_SCAN.match(row[-1])
+        if m:
+            scans.append(m.group(1))
+    return scans
+
+def main():
+    engine, db = make_session()
+    failures = 0
+    with engine.connect() as conn:
+        for name, fn in CASES:
+            for statement, parameters in capture(engine, db, fn):
+                scans = full_scans(conn, statement, parameters)
+                status = "OK  " if not scans else "SCAN"
+                if scans:
+                    failures += 1
+                first_line = " ".join(statement.split())[:90]
+                print(f"{status} {name:28} {', '.join(scans) or '-':12} {first_line}")
+    db.close()
+    print(f"\n{failures} استعلام بمسح كامل" if failures else "\nكل الاستعلامات تستخدم فهارس")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,12 @@
 from sqlalchemy.orm import Session
-from database.models import Contract, InvoiceStatus
-from database.invoices_utils import add_invoice
+from sqlalchemy import insert
+from database.models import Contract, Invoice, InvoiceStatus
+from database.invoices_utils import ValidationError
+from database.dashboard_utils import apply_dashboard_change, contract_contributions, invoice_contributions
 from dateutil.relativedelta import relativedelta
+from utils.audit_log import log_audit
+from utils.change_tracking import mark_rows_changed
+from types import SimpleNamespace
 
 def add_contract(
     db: Session,
@@ -32,12 +37,16 @@ def add_contract(
         notes=notes,
     )
     db.add(contract)
-    db.commit()
-    db.refresh(contract)
+    apply_dashboard_change(db, [], contract_contributions(contract))
+    db.flush()
     generate_invoices_for_contract(db, contract)
+    db.refresh(contract)
     return contract
 
-def generate_invoices_for_contract(db: Session, contract: Contract):
+def build_invoice_schedule(contract: Contract):
+    """
+    يحسب جدول الفواتير (تاريخ الإصدار، المبلغ) للعقد في الذاكرة دون أي استعلام.
+    """
     start = contract.start_date
     end = contract.end_date
 
@@ -61,21 +70,82 @@ def generate_invoices_for_contract(db: Session, contract: Contract):
     if total_months > contract.duration_months:
         total_months = contract.duration_months
 
+    schedule = []
     issue_date = start
     months_remaining = total_months
 
     while months_remaining > 0:
         step = min(months_step, months_remaining)
-        amount = rent_monthly * step
+        schedule.append((issue_date, rent_monthly * step))
+        issue_date = issue_date + relativedelta(months=step)
+        months_remaining -= step
+    return schedule
 
-        add_invoice(
-            db=db,
-            contract_id=contract.id,
+def invoice_rows(contract_id, schedule):
+    return [
+        dict(
+            contract_id=contract_id,
             date_issued=issue_date,
             amount=amount,
             status=InvoiceStatus.unpaid,
+            sent_to_email=False,
             created_by_contract=True
         )
+        for issue_date, amount in schedule
+    ]
 
-        issue_date = issue_date + relativedelta(months=step)
-        months_remaining -= step
+def generate_invoices_for_contract(db: Session, contract: Contract, commit=True):
+    """
+    يولد كل فواتير العقد دفعة واحدة: استعلام واحد لفحص التعارض، إدراج جماعي،
+    سجل تدقيق واحد، وكل ذلك في معاملة واحدة.
+    """
+    schedule = build_invoice_schedule(contract)
+
+    # فحص التعارض لكل التواريخ باستعلام واحد
+    dates = [d for d, _ in schedule]
+    if dates and db.query(Invoice.date_issued).filter(
+        Invoice.contract_id == contract.id,
+        Invoice.date_issued.in_(dates)
+    ).first():
+        raise ValidationError("هناك فاتورة لنفس العقد بنفس تاريخ الإصدار")
+
+    rows = invoice_rows(contract.id, schedule)
+    if rows:
+        db.execute(insert(Invoice), rows)
+
+        contributions = []
+        for row in rows:
+            contributions.extend(invoice_contributions(Invoice(**row)))
+        apply_dashboard_change(db, [], contributions)
+
+        log_audit(db, user="system", action="add", table_name="invoices", row_id=contract.id,
+                  details=f"Generate {len(rows)} invoices for contract {contract.id}")
+    if commit:
+        db.commit()
+    return rows
+
+def generate_invoice_schedules(db: Session, contracts):
+    """
+    فواتير عدة عقود جديدة دفعة واحدة (الاستيراد الجماعي): إدراج واحد لكل الأقساط وتحديث واحد للملخص.
+    contracts: [(contract_id, عقد أو كائن بنفس الحقول)]. بدون فحص تعارض: العقود أُنشئت للتو في نفس المعاملة.
+    لا ينفذ commit؛ يرجع عدد الفواتير.
+    """
+    rows = []
+    schedules = {}  # الجدول يعتمد على شروط العقد فقط: العقود المتشابهة (نفس البداية والمدة) تُحسب مرة
+    for contract_id, contract in contracts:
+        terms = (contract.start_date, contract.end_date, contract.duration_months, contract.rent_amount,
+                 str(contract.payment_type))
+        if terms not in schedules:
+            schedules[terms] = build_invoice_schedule(contract)
+        rows.extend(invoice_rows(contract_id, schedules[terms]))
+    if rows:
+        # Core على اتصال الجلسة: عشرات آلاف الأقساط بدون طبقة ORM bulk
+        table = Invoice.__table__
+        ids = db.connection().scalars(insert(table).returning(table.c.id), rows).all()
+        contributions = []
+        for row in rows:
+            contributions.extend(invoice_contributions(SimpleNamespace(**row)))
+        apply_dashboard_change(db, [], contributions)
+        # insert الجماعي لا يمر بـ after_flush: الفواتير تُسجل يدوياً للمزامنة
+        mark_rows_changed(db, "invoices", ids)
+    return len(rows)
@@ -0,0 +1,142 @@
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+from .db_utils import DATABASE_URL, db_config, SessionLocal, apply_sqlite_pragmas
+import asyncio
+import functools
+import importlib.util
+import inspect
+import logging
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# ========== طبقة قاعدة البيانات غير المتزامنة (async) ==========
+# المسارات async لا تحجز thread لكل طلب معلق: الطلب ينتظر دوره في "مسار" (lane) داخل حلقة asyncio،
+# ولا يدخل قاعدة البيانات إلا إذا كان له اتصال متاح. المسارات المتزامنة القديمة كانت تحجز thread من الـ threadpool
+# (40) ثم تنتظر اتصالاً من الـ pool (15)، والجلسة لا تُغلق إلا في thread آخر بعد إرسال الاستجابة،
+# فتحت ضغط 200 عميل تمتلئ الـ threads بطلبات تنتظر اتصالات لا تتحرر (timeout بعد 30 ثانية).
+#
+# دوال *_utils تبقى كما هي (Session متزامنة) وتُنفذ عبر run_db:
+#   - مع مشغل async مثبت (aiosqlite / asyncpg + greenlet): AsyncSession.run_sync على حلقة الأحداث نفسها
+#   - بدونه: في الـ threadpool بجلسة تُفتح وتُغلق في نفس الـ thread
+# SQLite يقبل كاتباً واحداً: مسار الكتابة بطول 1 يمنع انتظار busy_timeout و "database is locked".
+
+ASYNC_DRIVERS = {
+    # بادئة الرابط المتزامن: (المشغل async، الحزمة المطلوبة)
+    "sqlite": ("sqlite+aiosqlite", "aiosqlite"),
+    "postgresql": ("postgresql+asyncpg", "asyncpg"),
+}
+
+def async_config():
+    return db_config["async"]
+
+def _backend(url):
+    return url.split(":", 1)[0].split("+", 1)[0]
+
+@functools.lru_cache(maxsize=None)
+def async_url(url=DATABASE_URL):
+    """رابط المشغل async المقابل، أو None إذا لم يكن مثبتاً"""
+    driver, package = ASYNC_DRIVERS.get(_backend(url), (None, None))
+    if driver is None or not all(importlib.util.find_spec(name) for name in (package, "greenlet")):
+        return None
+    return driver + url[url.index(":"):]
+
+def async_available():
+    return async_config()["driver"] == "auto" and async_url() is not None
+
+_async_engine = None
+_async_session = None
+
+def get_async_engine():
+    # يُنشأ عند أول استخدام فقط (المشغل اختياري)
+    global _async_engine, _async_session
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        pool = db_config["pool"]
+        _async_engine = create_async_engine(
+            async_url(), echo=db_config["echo"], pool_size=pool["size"], max_overflow=pool["max_overflow"],
+            pool_timeout=pool["timeout"], pool_pre_ping=pool["pre_ping"], pool_recycle=pool["recycle"],
+        )
+        # نفس إعدادات PRAGMA لكل اتصال جديد
+        event.listen(_async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+        _async_session = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=True)
+        logger.info("قاعدة البيانات async: %s", _async_engine.dialect.driver)
+    return _async_engine
+
+def AsyncSessionLocal():
+    get_async_engine()
+    return _async_session()
+
+async def get_async_db():
+    # Dependency للمسارات التي تستخدم AsyncSession مباشرة
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_async_engine():
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+
+# ---------- المسارات (lanes) ----------
+def lane_sizes(url=DATABASE_URL, config=None):
+    """(قراءة، كتابة): 0 في الإعدادات = حسب حجم الـ pool ونوع القاعدة"""
+    config = config or db_config
+    lanes = config["async"]
+    pool = config["pool"]
+    capacity = pool["size"] + pool["max_overflow"] if pool["class"] == "queue" else pool["size"]
+    writes = lanes["write_concurrency"] or (1 if _backend(url) == "sqlite" else max(1, capacity // 3))
+    reads = lanes["read_concurrency"] or max(1, capacity - writes)
+    return reads, writes
+
+# Semaphore مرتبط بحلقة asyncio: مجموعة لكل حلقة (السيرفر حلقة واحدة، الاختبارات قد تنشئ عدة حلقات)
+_lanes = weakref.WeakKeyDictionary()
+
+def _lane(write):
+    loop = asyncio.get_running_loop()
+    if loop not in _lanes:
+        reads, writes = lane_sizes()
+        _lanes[loop] = (asyncio.Semaphore(reads), asyncio.Semaphore(writes))
+    return _lanes[loop][1 if write else 0]
+
+def _call_in_session(fn, args, kwargs):
+    with SessionLocal() as db:
+        return fn(db, *args, **kwargs)
+
+async def run_db(fn, *args, write=False, **kwargs):
+    """
+    ينفذ fn(db, *args, **kwargs) بجلسة جديدة داخل مسار القراءة أو الكتابة.
+    النتيجة يجب أن تكون جاهزة للإرسال (schema/dict) لأن الجلسة تُغلق بعدها.
+    """
+    if not async_config()["lanes"]:
+        return await _run(fn, args, kwargs)
+    async with _lane(write):
+        return await _run(fn, args, kwargs)
+
+async def _run(fn, args, kwargs):
+    if async_available():
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(lambda session: fn(session, *args, **kwargs))
+    return await run_in_threadpool(_call_in_session, fn, args, kwargs)
+
+def async_endpoint(fn=None, *, write=False):
+    """
+    يحول مسار FastAPI متزامناً يستقبل db: Session = Depends(get_db) إلى مسار async:
+    المعامل db يُحذف من التوقيع ويُمرر من run_db، وباقي المعاملات يحللها FastAPI كما هي.
+
+        @app.get("/owners/{owner_id}")
+        @async_endpoint
+        def api_get_owner(owner_id: int, db: Session = Depends(get_db)): ...
+    """
+    if fn is None:
+        return functools.partial(async_endpoint, write=write)
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    async def endpoint(**kwargs):
+        return await run_db(lambda db: fn(db=db, **kwargs), write=write)
+
+    endpoint.__signature__ = signature.replace(
+        parameters=[p for name, p in signature.parameters.items() if name != "db"]
+    )
+    return endpoint
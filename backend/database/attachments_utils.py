@@ -1,13 +1,26 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from database.models import Attachment, AttachmentType, Owner, Unit, Tenant, Contract, Invoice, AuditLog
+from database.pagination import keyset_page
+from database.export_utils import export_select, export_to_string
 from datetime import datetime
-import csv, io
+from utils.audit_log import log_audit
 
 # استثناءات مخصصة
 class AttachmentNotFound(Exception): pass
+class AttachmentTargetNotFound(Exception): pass
 class ValidationError(Exception): pass
 
+# الكيانات التي تقبل مرفقات: الاسم في المسار -> (النموذج، عمود الربط في Attachment)
+ATTACHMENT_ENTITIES = {
+    "owner": (Owner, "owner_id"),
+    "unit": (Unit, "unit_id"),
+    "tenant": (Tenant, "tenant_id"),
+    "contract": (Contract, "contract_id"),
+    "invoice": (Invoice, "invoice_id"),
+}
+
 # إضافة مرفق مخصص لأي كيان (مالك، وحدة، مستأجر، ...)
 def add_attachment(
     db: Session,
@@ -20,7 +33,10 @@ def add_attachment(
     contract_id=None,
     invoice_id=None,
     notes=None,
-    filename=None
+    filename=None,
+    sha256=None,
+    size=None,
+    content_type=None
 ):
     if not filepath or not filetype or not attachment_type:
         raise ValidationError("جميع الحقول الأساسية للمرفق مطلوبة")
@@ -35,15 +51,61 @@ def add_attachment(
         contract_id=contract_id,
         invoice_id=invoice_id,
         notes=notes,
-        filename=filename
+        filename=filename,
+        sha256=sha256,
+        size=size,
+        content_type=content_type
     )
 
     db.add(attachment)
+    log_audit(db, user="system", action="add", table_name="attachments", row_id=attachment, details=f"Add {attachment_type.value} file")
     db.commit()
     db.refresh(attachment)
-    log_audit(db, user="system", action="add", table_name="attachments", row_id=attachment.id, details=f"Add {attachment_type.value} file")
     return attachment
 
+# مرفق لملف مرفوع إلى المخزن (utils/file_manager.py)؛ entity_id = 0 يعني مرفقاً مؤقتاً يُربط عند حفظ الكيان
+def add_stored_attachment(db: Session, entity, entity_id, stored, relative_path, filetype, filename=None,
+                          attachment_type: AttachmentType = AttachmentType.general, notes=None):
+    model, column = ATTACHMENT_ENTITIES[entity]
+    if entity_id:
+        target = db.get(model, entity_id)
+        if target is None or getattr(target, "is_deleted", False):
+            raise AttachmentTargetNotFound(f"{entity} {entity_id} غير موجود")
+    return add_attachment(
+        db, filepath=relative_path, filetype=filetype, attachment_type=attachment_type,
+        notes=notes, filename=filename, sha256=stored.sha256, size=stored.size,
+        content_type=stored.content_type, **{column: entity_id or None},
+    )
+
+# كل مرفقات كيان واحد (الأحدث أولاً)
+def list_entity_attachments(db: Session, entity, entity_id):
+    _, column = ATTACHMENT_ENTITIES[entity]
+    return (
+        db.query(Attachment)
+        .filter(getattr(Attachment, column) == entity_id)
+        .order_by(Attachment.uploaded_at.desc(), Attachment.id.desc())
+        .all()
+    )
+
+# مرفقات صفحة كاملة من كيان واحد باستعلام واحد (مسار JSON السريع): {معرف الكيان: [dict]}
+# extended: حقول محتوى الملف أيضاً (filename / size / content_type) كما في TenantAttachmentInfo
+def attachment_rows(db: Session, entity, entity_ids, extended=False):
+    _, column = ATTACHMENT_ENTITIES[entity]
+    key = getattr(Attachment, column)
+    columns = [key, Attachment.id, Attachment.filepath, Attachment.filetype, Attachment.attachment_type, Attachment.notes]
+    if extended:
+        columns += [Attachment.filename, Attachment.size, Attachment.content_type]
+    by_entity = {}
+    if not entity_ids:
+        return by_entity
+    result = db.execute(select(*columns).where(key.in_(entity_ids)).order_by(Attachment.id))
+    fields = tuple(result.keys())[1:]
+    for entity_id, *values in result:
+        data = dict(zip(fields, values))
+        data["attachment_type"] = data["attachment_type"].value
+        by_entity.setdefault(entity_id, []).append(data)
+    return by_entity
+
 # تعديل مرفق
 def update_attachment(db: Session, attachment_id, **kwargs):
     attachment = db.query(Attachment).get(attachment_id)
@@ -52,9 +114,9 @@ def update_attachment(db: Session, attachment_id, **kwargs):
     for k, v in kwargs.items():
         if hasattr(attachment, k):
             setattr(attachment, k, v)
+    log_audit(db, user="system", action="update", table_name="attachments", row_id=attachment.id, details="Update attachment")
     db.commit()
     db.refresh(attachment)
-    log_audit(db, user="system", action="update", table_name="attachments", row_id=attachment.id, details="Update attachment")
     return attachment
 
 # حذف مرفق
@@ -63,8 +125,8 @@ def delete_attachment(db: Session, attachment_id):
     if not attachment:
         raise AttachmentNotFound("المرفق غير موجود")
     db.delete(attachment)
-    db.commit()
     log_audit(db, user="system", action="delete", table_name="attachments", row_id=attachment_id, details="Delete attachment")
+    db.commit()
     return True
 
 # جلب مرفق واحد
@@ -84,7 +146,9 @@ def list_attachments(
     unit_id=None,
     tenant_id=None,
     contract_id=None,
-    invoice_id=None
+    invoice_id=None,
+    cursor=None,
+    keyset=False
 ):
     query = db.query(Attachment)
     if filter_type:
@@ -99,6 +163,9 @@ def list_attachments(
         query = query.filter(Attachment.contract_id == contract_id)
     if invoice_id:
         query = query.filter(Attachment.invoice_id == invoice_id)
+    # وضع المؤشر (Keyset): بدون COUNT وبدون OFFSET، يُفعّل عند طلبه فقط
+    if keyset or cursor:
+        return keyset_page(query, Attachment.uploaded_at, Attachment.id, per_page, cursor)
     total = query.count()
     attachments = query.order_by(Attachment.uploaded_at.desc()).offset((page-1)*per_page).limit(per_page).all()
     return {
@@ -109,31 +176,15 @@ def list_attachments(
     }
 
 # تصدير المرفقات إلى CSV (مفيدة للأرشفة أو الإشراف)
-def export_attachments_to_csv(db: Session, filter_type: AttachmentType = None):
-    query = db.query(Attachment)
-    if filter_type:
-        query = query.filter(Attachment.attachment_type == filter_type)
-    attachments = query.all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['id', 'filepath', 'filetype', 'attachment_type', 'owner_id', 'unit_id', 'tenant_id', 'contract_id', 'invoice_id', 'notes', 'uploaded_at'])
-    for a in attachments:
-        writer.writerow([
-            a.id, a.filepath, a.filetype, a.attachment_type.value,
-            a.owner_id or '', a.unit_id or '', a.tenant_id or '', a.contract_id or '', a.invoice_id or '',
-            a.notes or '', a.uploaded_at or ''
-        ])
-    return output.getvalue()
+def export_attachments_query(filter_type: AttachmentType = None):
+    criteria = [Attachment.attachment_type == filter_type] if filter_type else []
+    return export_select([
+        ("id", Attachment.id), ("filepath", Attachment.filepath), ("filetype", Attachment.filetype),
+        ("attachment_type", Attachment.attachment_type), ("owner_id", Attachment.owner_id), ("unit_id", Attachment.unit_id),
+        ("tenant_id", Attachment.tenant_id), ("contract_id", Attachment.contract_id), ("invoice_id", Attachment.invoice_id),
+        ("notes", Attachment.notes), ("uploaded_at", Attachment.uploaded_at),
+        ("sha256", Attachment.sha256), ("size", Attachment.size), ("content_type", Attachment.content_type),
+    ], *criteria, order_by=Attachment.id)
 
-# سجل تدقيق (يمكنك تعديل التعريف لو لديك ملف logger موحّد)
-def log_audit(db: Session, user: str, action: str, table_name: str, row_id: int, details: str = ""):
-    log = AuditLog(
-        user=user,
-        action=action,
-        table_name=table_name,
-        row_id=row_id,
-        details=details,
-        timestamp=datetime.utcnow()
-    )
-    db.add(log)
-    db.commit()
+def export_attachments_to_csv(db: Session, filter_type: AttachmentType = None):
+    return export_to_string(db, *export_attachments_query(filter_type))
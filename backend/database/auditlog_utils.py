@@ -1,8 +1,9 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from database.models import AuditLog
+from database.pagination import keyset_page
+from database.export_utils import export_select, export_to_string
 from datetime import datetime
-import csv, io
 
 # استثناءات مخصصة
 class AuditLogNotFound(Exception): pass
@@ -39,7 +40,7 @@ def delete_audit_log(db: Session, log_id):
     return True
 
 # قائمة سجلات التدقيق مع Pagination وفلترة حسب المستخدم، الجدول أو الإجراء
-def list_audit_logs(db: Session, page=1, per_page=50, filter_user=None, filter_table=None, filter_action=None):
+def list_audit_logs(db: Session, page=1, per_page=50, filter_user=None, filter_table=None, filter_action=None, cursor=None, keyset=False):
     query = db.query(AuditLog)
     if filter_user:
         query = query.filter(AuditLog.user.ilike(f"%{filter_user}%"))
@@ -47,6 +48,9 @@ def list_audit_logs(db: Session, page=1, per_page=50, filter_user=None, filter_t
         query = query.filter(AuditLog.table_name.ilike(f"%{filter_table}%"))
     if filter_action:
         query = query.filter(AuditLog.action.ilike(f"%{filter_action}%"))
+    # وضع المؤشر (Keyset): بدون COUNT وبدون OFFSET، يُفعّل عند طلبه فقط
+    if keyset or cursor:
+        return keyset_page(query, AuditLog.timestamp, AuditLog.id, per_page, cursor)
     total = query.count()
     logs = query.order_by(AuditLog.timestamp.desc()).offset((page-1)*per_page).limit(per_page).all()
     return {
@@ -57,18 +61,18 @@ def list_audit_logs(db: Session, page=1, per_page=50, filter_user=None, filter_t
     }
 
 # تصدير السجلات إلى CSV
-def export_auditlogs_to_csv(db: Session, filter_user=None, filter_table=None, filter_action=None):
-    query = db.query(AuditLog)
+def export_auditlogs_query(filter_user=None, filter_table=None, filter_action=None):
+    criteria = []
     if filter_user:
-        query = query.filter(AuditLog.user.ilike(f"%{filter_user}%"))
+        criteria.append(AuditLog.user.ilike(f"%{filter_user}%"))
     if filter_table:
-        query = query.filter(AuditLog.table_name.ilike(f"%{filter_table}%"))
+        criteria.append(AuditLog.table_name.ilike(f"%{filter_table}%"))
     if filter_action:
-        query = query.filter(AuditLog.action.ilike(f"%{filter_action}%"))
-    logs = query.order_by(AuditLog.timestamp.desc()).all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['id', 'user', 'action', 'table_name', 'row_id', 'details', 'timestamp'])
-    for log in logs:
-        writer.writerow([log.id, log.user, log.action, log.table_name, log.row_id, log.details or '', log.timestamp])
-    return output.getvalue()
+        criteria.append(AuditLog.action.ilike(f"%{filter_action}%"))
+    return export_select([
+        ("id", AuditLog.id), ("user", AuditLog.user), ("action", AuditLog.action), ("table_name", AuditLog.table_name),
+        ("row_id", AuditLog.row_id), ("details", AuditLog.details), ("timestamp", AuditLog.timestamp),
+    ], *criteria, order_by=AuditLog.timestamp.desc())
+
+def export_auditlogs_to_csv(db: Session, filter_user=None, filter_table=None, filter_action=None):
+    return export_to_string(db, *export_auditlogs_query(filter_user, filter_table, filter_action))
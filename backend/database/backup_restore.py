@@ -0,0 +1,425 @@
+from sqlalchemy.engine import make_url
+from utils.config import get_section
+from datetime import datetime, timedelta
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# استثناءات مخصصة
+class BackupError(Exception): pass
+class BackupNotFound(Exception): pass
+class RestoreError(Exception): pass
+
+# ========== النسخ الاحتياطي الحي والاستعادة (SQLite) ==========
+# 1) لقطة متسقة بواجهة النسخ الحي في SQLite (backup API) في خطوة واحدة: معاملة قراءة واحدة،
+#    ومع WAL لا تنتظر الكتابة ولا توقفها. الصفحات تُنسخ بنفس ترتيبها في الملف (بخلاف VACUUM INTO الذي يعيد ترتيبها)،
+#    لذلك الصفحات التي لم تتغير تبقى متطابقة بين نسخة وأخرى.
+# 2) اللقطة تُقسم لقطع بحجم عدد ثابت من الصفحات، كل قطعة تُخزن مضغوطة باسم بصمتها (sha256) مرة واحدة فقط:
+#    النسخة التالية تكتب القطع المتغيرة فقط (نسخ تزايدي على مستوى الصفحات).
+# 3) كل نسخة ملف manifest (JSON) بقائمة البصمات وبصمة الملف كاملاً. الاستعادة تتحقق من كل قطعة ومن الملف كاملاً
+#    ثم PRAGMA integrity_check قبل استبدال القاعدة.
+# 4) سياسة احتفاظ دوارة (آخر N + يومي/أسبوعي/شهري)، والقطع التي لم تعد أي نسخة تشير لها تُحذف.
+#
+# التشغيل اليدوي من مجلد backend:
+#   python -m database.backup_restore backup | list | verify [ID] | prune | restore [ID] [--target PATH]
+# الاستعادة على القاعدة الفعلية تتم والسيرفر متوقف.
+
+DEFAULT_BACKUP_CONFIG = {
+    "enabled": True,             # نسخة دورية عبر المجدول (notifications/scheduler.py)
+    "directory": "backups",
+    "interval_seconds": 86400,
+    "chunk_pages": 16,           # حجم القطعة بالصفحات (16 × 4KB = 64KB): أصغر = نسخة تزايدية أصغر وملفات أكثر
+    "compression_level": 1,      # zlib 1-9؛ صفحات القاعدة تنضغط جيداً بالمستوى 1 وهو أسرع بمرتين ونصف من 6
+    "keep_last": 7,
+    "keep_daily": 14,
+    "keep_weekly": 8,
+    "keep_monthly": 12,
+    "lock_timeout": 21600,       # ثوانٍ قبل اعتبار قفل مجلد النسخ متروكاً (عملية توقفت فجأة)
+}
+
+MANIFEST_VERSION = 1
+ID_FORMAT = "%Y%m%d-%H%M%S"
+
+def backup_config():
+    return get_section("backup", DEFAULT_BACKUP_CONFIG)
+
+def sqlite_path(url=None):
+    """مسار ملف القاعدة من رابط SQLAlchemy (الافتراضي: رابط التطبيق)"""
+    if url is None:
+        from database.db_utils import DATABASE_URL as url
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        raise BackupError("النسخ الاحتياطي يدعم قاعدة SQLite في ملف فقط (لـ PostgreSQL استخدم pg_dump)")
+    return Path(url.database)
+
+# ---------- مخزن النسخ ----------
+class BackupStore:
+    def __init__(self, directory):
+        self.root = Path(directory)
+        self.chunks = self.root / "chunks"
+        self.manifests = self.root / "manifests"
+        self.tmp = self.root / "tmp"
+
+    def ensure(self):
+        for path in (self.chunks, self.manifests, self.tmp):
+            path.mkdir(parents=True, exist_ok=True)
+
+    def chunk_path(self, digest):
+        return self.chunks / digest[:2] / digest
+
+    def put_chunk(self, digest, data, level):
+        """يكتب القطعة إذا لم تكن موجودة؛ يرجع الحجم المخزن (0 إذا كانت موجودة)"""
+        path = self.chunk_path(digest)
+        if path.exists():
+            return 0
+        path.parent.mkdir(exist_ok=True)
+        packed = zlib.compress(data, level)
+        _write_atomic(path, packed)
+        return len(packed)
+
+    def get_chunk(self, digest):
+        path = self.chunk_path(digest)
+        try:
+            data = zlib.decompress(path.read_bytes())
+        except FileNotFoundError:
+            raise RestoreError(f"القطعة {digest} مفقودة")
+        except zlib.error:
+            raise RestoreError(f"القطعة {digest} تالفة")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise RestoreError(f"بصمة القطعة {digest} غير مطابقة")
+        return data
+
+    def manifest_ids(self):
+        if not self.manifests.exists():
+            return []
+        return sorted(p.stem for p in self.manifests.glob("*.json"))
+
+    def load_manifest(self, backup_id):
+        try:
+            return json.loads((self.manifests / f"{backup_id}.json").read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise BackupNotFound(f"النسخة {backup_id} غير موجودة")
+
+    def save_manifest(self, manifest):
+        _write_atomic(self.manifests / f"{manifest['id']}.json",
+                      json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+
+    def new_id(self, now):
+        base = now.strftime(ID_FORMAT)
+        backup_id, n = base, 1
+        while (self.manifests / f"{backup_id}.json").exists():
+            n += 1
+            backup_id = f"{base}-{n}"
+        return backup_id
+
+def _write_atomic(path, data):
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class _StoreLock:
+    # قفل بين العمليات (CLI والمجدول) بملف يُنشأ حصرياً: الحذف (prune) لا يتزامن مع نسخة تعيد استخدام قطع موجودة.
+    # ملف (وليس fcntl) حتى يعمل على Windows أيضاً
+    _local = threading.Lock()
+
+    def __init__(self, store, timeout):
+        self.path = store.root / "lock"
+        self.timeout = timeout
+
+    def __enter__(self):
+        self._local.acquire()
+        try:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if time.time() - self.path.stat().st_mtime < self.timeout:
+                    raise BackupError("عملية نسخ احتياطي أخرى قيد التشغيل")
+                logger.warning("إزالة قفل نسخ احتياطي متروك %s", self.path)
+                os.replace(self.path, self.path.with_name("lock.stale"))
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+        except BaseException:
+            self._local.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self.path.unlink()
+        finally:
+            self._local.release()
+
+def _store(config):
+    store = BackupStore(config["directory"])
+    store.ensure()
+    return store
+
+# ---------- النسخ ----------
+def _snapshot(source: Path, target: Path):
+    # pages=-1: خطوة واحدة داخل معاملة قراءة واحدة = لقطة متسقة لا تتأثر بالكتابة الجارية
+    # (النسخ على خطوات يُعاد من البداية كلما كتب اتصال آخر على القاعدة)
+    if not source.exists():
+        raise BackupError(f"القاعدة {source} غير موجودة")
+    src = sqlite3.connect(source, timeout=30)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+        page_size = dst.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+    return page_size
+
+def create_backup(source=None, config=None, label=None, now=None):
+    """
+    نسخة احتياطية حية للقاعدة (لا توقف الكتابة). تُخزن القطع الجديدة فقط ثم تُطبق سياسة الاحتفاظ.
+    يرجع الـ manifest مع إحصاءات النسخة.
+    """
+    config = config or backup_config()
+    source = Path(source) if source is not None else sqlite_path()
+    now = now or datetime.utcnow()
+    store = _store(config)
+    started = time.perf_counter()
+    with _StoreLock(store, config["lock_timeout"]):
+        snapshot = store.tmp / f"snapshot-{os.getpid()}.db"
+        try:
+            page_size = _snapshot(source, snapshot)
+            chunk_size = page_size * config["chunk_pages"]
+            digest, chunks = hashlib.sha256(), []
+            size = new_chunks = stored = 0
+            with open(snapshot, "rb") as f:
+                while True:
+                    data = f.read(chunk_size)
+                    if not data:
+                        break
+                    digest.update(data)
+                    h = hashlib.sha256(data).hexdigest()
+                    written = store.put_chunk(h, data, config["compression_level"])
+                    if written:
+                        new_chunks += 1
+                        stored += written
+                    chunks.append(h)
+                    size += len(data)
+        finally:
+            snapshot.unlink(missing_ok=True)
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "id": store.new_id(now),
+            "label": label,
+            "created_at": now.isoformat(),
+            "source": str(source),
+            "page_size": page_size,
+            "chunk_size": chunk_size,
+            "size": size,
+            "sha256": digest.hexdigest(),
+            "chunks": chunks,
+            "new_chunks": new_chunks,
+            "stored_bytes": stored,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        store.save_manifest(manifest)
+        pruned = _prune(store, config, now)
+    logger.info("نسخة احتياطية %s: %d بايت، %d قطعة جديدة (%d بايت مضغوط)",
+                manifest["id"], size, new_chunks, stored)
+    return {**manifest, "pruned": pruned["removed"]}
+
+# ---------- الاحتفاظ ----------
+_PERIODS = (
+    ("keep_daily", lambda d: d.date()),
+    ("keep_weekly", lambda d: d.isocalendar()[:2]),
+    ("keep_monthly", lambda d: (d.year, d.month)),
+)
+
+def retained_ids(manifests, config):
+    """آخر keep_last نسخة + أحدث نسخة في كل يوم/أسبوع/شهر ضمن العدد المحدد لكل فترة"""
+    newest = sorted(manifests, key=lambda m: m["created_at"], reverse=True)
+    keep = {m["id"] for m in newest[:config["keep_last"]]}
+    for option, period in _PERIODS:
+        seen = set()
+        for m in newest:
+            key = period(datetime.fromisoformat(m["created_at"]))
+            if key in seen:
+                continue
+            if len(seen) >= config[option]:
+                break
+            seen.add(key)
+            keep.add(m["id"])
+    return keep
+
+def _prune(store, config, now):
+    manifests = [store.load_manifest(i) for i in store.manifest_ids()]
+    keep = retained_ids(manifests, config)
+    removed = []
+    for m in manifests:
+        if m["id"] not in keep:
+            (store.manifests / f"{m['id']}.json").unlink()
+            removed.append(m["id"])
+    referenced = {h for m in manifests if m["id"] in keep for h in m["chunks"]}
+    chunks_removed = freed = 0
+    for path in store.chunks.glob("*/*"):
+        if path.name not in referenced:
+            freed += path.stat().st_size
+            path.unlink()
+            chunks_removed += 1
+    # بقايا عمليات توقفت فجأة
+    for path in store.tmp.glob("*"):
+        if path.stat().st_mtime < (now - timedelta(seconds=config["lock_timeout"])).timestamp():
+            path.unlink()
+    return {"removed": removed, "chunks_removed": chunks_removed, "bytes_freed": freed}
+
+def prune_backups(config=None, now=None):
+    config = config or backup_config()
+    store = _store(config)
+    with _StoreLock(store, config["lock_timeout"]):
+        return _prune(store, config, now or datetime.utcnow())
+
+# ---------- القائمة والتحقق والاستعادة ----------
+_SUMMARY_FIELDS = ("id", "label", "created_at", "size", "sha256", "new_chunks", "stored_bytes", "seconds")
+
+def _summary(manifest):
+    summary = {k: manifest.get(k) for k in _SUMMARY_FIELDS}
+    summary["chunks"] = len(manifest["chunks"])
+    return summary
+
+def list_backups(config=None):
+    """النسخ الأحدث أولاً"""
+    store = BackupStore((config or backup_config())["directory"])
+    return [_summary(store.load_manifest(i)) for i in reversed(store.manifest_ids())]
+
+def _resolve(store, backup_id):
+    if backup_id is None:
+        ids = store.manifest_ids()
+        if not ids:
+            raise BackupNotFound("لا توجد نسخ احتياطية")
+        backup_id = ids[-1]
+    return store.load_manifest(backup_id)
+
+def _check_database(path, check="integrity"):
+    pragma = "quick_check" if check == "quick" else "integrity_check"
+    conn = sqlite3.connect(path)
+    try:
+        rows = [r[0] for r in conn.execute(f"PRAGMA {pragma}")]
+    except sqlite3.DatabaseError as e:
+        raise RestoreError(f"الملف المستعاد ليس قاعدة صالحة: {e}")
+    finally:
+        conn.close()
+    if rows != ["ok"]:
+        raise RestoreError("فشل فحص سلامة القاعدة: " + "; ".join(rows[:5]))
+
+def _assemble(store, manifest, target: Path, check):
+    # إعادة بناء الملف مع التحقق من بصمة كل قطعة ثم بصمة الملف كاملاً ثم فحص SQLite
+    digest = hashlib.sha256()
+    with open(target, "wb") as out:
+        for h in manifest["chunks"]:
+            data = store.get_chunk(h)
+            digest.update(data)
+            out.write(data)
+        out.flush()
+        os.fsync(out.fileno())
+    if digest.hexdigest() != manifest["sha256"]:
+        raise RestoreError(f"بصمة النسخة {manifest['id']} غير مطابقة")
+    _check_database(target, check)
+
+def verify_backup(backup_id=None, config=None, check="integrity"):
+    """التحقق الكامل من نسخة (القطع + البصمة + integrity_check) دون لمس القاعدة"""
+    config = config or backup_config()
+    store = _store(config)
+    manifest = _resolve(store, backup_id)
+    tmp = store.tmp / f"verify-{os.getpid()}.db"
+    started = time.perf_counter()
+    try:
+        with _StoreLock(store, config["lock_timeout"]):
+            _assemble(store, manifest, tmp, check)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return {"id": manifest["id"], "ok": True, "seconds": round(time.perf_counter() - started, 3)}
+
+def restore_backup(backup_id=None, target=None, config=None, check="integrity", safety_backup=True):
+    """
+    استعادة نسخة (الافتراضي: الأحدث) إلى target (الافتراضي: قاعدة التطبيق) والسيرفر متوقف.
+    الملف يُبنى ويُفحص بجانب الهدف ثم يستبدله بـ os.replace، فالقاعدة الحالية لا تُلمس إذا فشل التحقق.
+    safety_backup: نسخة من القاعدة الحالية قبل استبدالها.
+    """
+    config = config or backup_config()
+    store = _store(config)
+    manifest = _resolve(store, backup_id)
+    target = Path(target) if target is not None else sqlite_path()
+    started = time.perf_counter()
+    tmp = target.with_name(target.name + ".restore")
+    try:
+        with _StoreLock(store, config["lock_timeout"]):
+            _assemble(store, manifest, tmp, check)
+        safety = None
+        if safety_backup and target.exists():
+            try:
+                safety = create_backup(target, config, label=f"pre-restore {manifest['id']}")["id"]
+            except (sqlite3.DatabaseError, BackupError) as e:
+                logger.warning("تعذر نسخ القاعدة الحالية قبل الاستعادة: %s", e)
+        # WAL/SHM القديمة تخص الملف السابق ولا يجب أن تُطبق على الملف المستعاد
+        for suffix in ("-wal", "-shm", "-journal"):
+            Path(str(target) + suffix).unlink(missing_ok=True)
+        os.replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+    logger.info("تمت استعادة النسخة %s إلى %s", manifest["id"], target)
+    return {"id": manifest["id"], "target": str(target), "size": manifest["size"],
+            "safety_backup": safety, "seconds": round(time.perf_counter() - started, 3)}
+
+# ---------- مهمة المجدول ----------
+def scheduled_backup(db=None):
+    result = create_backup()
+    return {"id": result["id"], "size": result["size"], "new_chunks": result["new_chunks"],
+            "stored_bytes": result["stored_bytes"], "pruned": len(result["pruned"])}
+
+def backups_enabled():
+    if not backup_config()["enabled"]:
+        return False
+    try:
+        sqlite_path()
+    except BackupError:
+        return False
+    return True
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m database.backup_restore")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backup").add_argument("--label")
+    sub.add_parser("list")
+    sub.add_parser("prune")
+    p = sub.add_parser("verify")
+    p.add_argument("id", nargs="?")
+    p.add_argument("--quick", action="store_true", help="PRAGMA quick_check بدل integrity_check")
+    p = sub.add_parser("restore")
+    p.add_argument("id", nargs="?")
+    p.add_argument("--target")
+    p.add_argument("--quick", action="store_true")
+    args = parser.parse_args()
+
+    check = "quick" if getattr(args, "quick", False) else "integrity"
+    if args.command == "backup":
+        result = create_backup(label=args.label)
+        print(f"{result['id']}: {result['size']} بايت، {result['new_chunks']} قطعة جديدة "
+              f"({result['stored_bytes']} بايت مضغوط) في {result['seconds']} ث")
+    elif args.command == "list":
+        for b in list_backups():
+            print(f"{b['id']}  {b['created_at']}  {b['size']:>12}  {b['label'] or ''}")
+    elif args.command == "prune":
+        print(prune_backups())
+    elif args.command == "verify":
+        print(verify_backup(args.id, check=check))
+    elif args.command == "restore":
+        print(restore_backup(args.id, args.target, check=check))
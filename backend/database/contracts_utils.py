@@ -1,12 +1,35 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload, raiseload
 from sqlalchemy.exc import SQLAlchemyError
-from database.models import Contract, Unit, Tenant, Attachment, AttachmentType, AuditLog, ContractStatus
+from database.models import Contract, Unit, Tenant, Attachment, AttachmentType, AuditLog, ContractStatus, Invoice, Payment
+from database.search_utils import text_filter
+from database.pagination import keyset_page, RowProfile, apply_profile
+from database.export_utils import export_select, export_to_string
+from database.dashboard_utils import (
+    apply_dashboard_change, contract_contributions, invoice_contributions, payment_contributions
+)
 from datetime import datetime
-import csv, io
+from utils.audit_log import log_audit
 
 # 🔴 استيراد دالة توليد الفواتير
 from contracts.contract_manager import generate_invoices_for_contract
 
+# ملفات التحميل المسبق للقوائم: "list" يحمل الوحدة والمستأجر والمرفقات ويمنع أي lazy load إضافي
+CONTRACT_LOAD_PROFILES = {
+    "plain": [],
+    "list": [
+        joinedload(Contract.unit), joinedload(Contract.tenant),
+        selectinload(Contract.attachments), raiseload("*")
+    ],
+    # مسار JSON السريع: أعمدة ContractOut مع رقم الوحدة واسم المستأجر (LEFT JOIN)
+    "rows": RowProfile(
+        Contract.id, Contract.contract_number, Contract.unit_id, Unit.unit_number, Contract.tenant_id,
+        Tenant.name.label("tenant_name"), Contract.start_date, Contract.end_date, Contract.duration_months,
+        Contract.rent_amount, Contract.status, Contract.rental_platform, Contract.payment_type, Contract.notes,
+        Contract.created_at, Contract.updated_at,
+        joins=[(Unit, Contract.unit_id == Unit.id), (Tenant, Contract.tenant_id == Tenant.id)],
+    ),
+}
+
 # استثناءات مخصصة
 class ContractNotFound(Exception): pass
 class ContractExists(Exception): pass
@@ -63,14 +86,16 @@ def add_contract(db: Session, contract_number, unit_id, tenant_id, start_date, e
     )
 
     db.add(new_contract)
-    db.commit()
-    db.refresh(new_contract)
-    
-    # ---------- السطر الجديد: توليد الفواتير فورًا ----------
-    generate_invoices_for_contract(db, new_contract)
+    apply_dashboard_change(db, [], contract_contributions(new_contract))
+    db.flush()
+
+    # ---------- توليد الفواتير فورًا في نفس المعاملة (commit واحد للعقد وفواتيره) ----------
+    generate_invoices_for_contract(db, new_contract, commit=False)
     # ------------------------------------------------------
 
     log_audit(db, user="system", action="add", table_name="contracts", row_id=new_contract.id, details=f"Add: {contract_number}")
+    db.commit()
+    db.refresh(new_contract)
     return new_contract
 
 # باقي الدوال كما هي بالملف القديم (بدون تغيير)
@@ -91,20 +116,29 @@ def update_contract(db: Session, contract_id, **kwargs):
     # تحقق من الوحدة والمستأجر (في حال التغيير)
     if "unit_id" in kwargs or "tenant_id" in kwargs:
         validate_unit_and_tenant(db, unit_id, kwargs.get("tenant_id", contract.tenant_id))
+    before = contract_contributions(contract)
     for k, v in kwargs.items():
         setattr(contract, k, v)
+    apply_dashboard_change(db, before, contract_contributions(contract))
+    log_audit(db, user="system", action="update", table_name="contracts", row_id=contract.id, details=f"Update: {contract.contract_number}")
     db.commit()
     db.refresh(contract)
-    log_audit(db, user="system", action="update", table_name="contracts", row_id=contract.id, details=f"Update: {contract.contract_number}")
     return contract
 
 def delete_contract(db: Session, contract_id):
     contract = db.query(Contract).get(contract_id)
     if not contract or contract.is_deleted:
         raise ContractNotFound("العقد غير موجود أو محذوف")
+    # الفواتير والدفعات تحذف تلقائياً (CASCADE) لذلك نطرح مساهمتها من الملخص أيضاً
+    before = contract_contributions(contract)
+    for inv in db.query(Invoice).filter(Invoice.contract_id == contract_id):
+        before.extend(invoice_contributions(inv))
+    for p in db.query(Payment).filter(Payment.contract_id == contract_id):
+        before.extend(payment_contributions(p))
     db.delete(contract)  # <-- حذف فعلي
+    apply_dashboard_change(db, before, [])
+    log_audit(db, user="system", action="delete", table_name="contracts", row_id=contract_id, details=f"Delete: {contract.contract_number}")
     db.commit()
-    log_audit(db, user="system", action="delete", table_name="contracts", row_id=contract.id, details=f"Delete: {contract.contract_number}")
     return True
 
 
@@ -117,18 +151,21 @@ def get_contract(db: Session, contract_id, attachment_type=None):
         attachments = [a for a in contract.attachments if a.attachment_type == attachment_type]
     return contract, attachments
 
-def list_contracts(db: Session, page=1, per_page=20, filter_contract_number=None, filter_unit_id=None, filter_tenant_id=None, filter_status=None):
+def list_contracts(db: Session, page=1, per_page=20, filter_contract_number=None, filter_unit_id=None, filter_tenant_id=None, filter_status=None, profile="list", cursor=None, keyset=False):
     query = db.query(Contract).filter_by(is_deleted=False)
     if filter_contract_number:
-        query = query.filter(Contract.contract_number.ilike(f"%{filter_contract_number}%"))
+        query = query.filter(text_filter(db, "contracts", Contract.contract_number, filter_contract_number))
     if filter_unit_id:
         query = query.filter(Contract.unit_id == filter_unit_id)
     if filter_tenant_id:
         query = query.filter(Contract.tenant_id == filter_tenant_id)
     if filter_status:
         query = query.filter(Contract.status == filter_status)
+    # وضع المؤشر (Keyset): بدون COUNT وبدون OFFSET، يُفعّل عند طلبه فقط
+    if keyset or cursor:
+        return keyset_page(apply_profile(query, CONTRACT_LOAD_PROFILES[profile]), Contract.id, Contract.id, per_page, cursor)
     total = query.count()
-    contracts = query.order_by(Contract.id.desc()).offset((page-1)*per_page).limit(per_page).all()
+    contracts = apply_profile(query, CONTRACT_LOAD_PROFILES[profile]).order_by(Contract.id.desc()).offset((page-1)*per_page).limit(per_page).all()
     return {
         "total": total,
         "page": page,
@@ -148,9 +185,9 @@ def attach_contract_file(db: Session, contract_id, filepath, filetype, attachmen
         notes=notes
     )
     db.add(attachment)
+    log_audit(db, user="system", action="attach", table_name="attachments", row_id=attachment, details=f"Attach {attachment_type.value} to contract {contract.contract_number}")
     db.commit()
     db.refresh(attachment)
-    log_audit(db, user="system", action="attach", table_name="attachments", row_id=attachment.id, details=f"Attach {attachment_type.value} to contract {contract.contract_number}")
     return attachment
 
 def detach_contract_file(db: Session, attachment_id):
@@ -158,39 +195,17 @@ def detach_contract_file(db: Session, attachment_id):
     if not att or not att.contract_id:
         raise ContractNotFound("المرفق غير موجود أو غير مرتبط بعقد")
     db.delete(att)
-    db.commit()
     log_audit(db, user="system", action="detach", table_name="attachments", row_id=attachment_id, details="Detach from contract")
+    db.commit()
     return True
 
+def export_contracts_query():
+    return export_select([
+        ("id", Contract.id), ("contract_number", Contract.contract_number), ("unit_id", Contract.unit_id),
+        ("tenant_id", Contract.tenant_id), ("start_date", Contract.start_date), ("end_date", Contract.end_date),
+        ("duration_months", Contract.duration_months), ("rent_amount", Contract.rent_amount), ("status", Contract.status),
+        ("rental_platform", Contract.rental_platform), ("payment_type", Contract.payment_type),
+    ], Contract.is_deleted == False, order_by=Contract.id)
+
 def export_contracts_to_csv(db: Session):
-    contracts = db.query(Contract).filter_by(is_deleted=False).all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['id', 'contract_number', 'unit_id', 'tenant_id', 'start_date', 'end_date', 'duration_months', 'rent_amount', 'status', 'rental_platform', 'payment_type'])
-    for c in contracts:
-        writer.writerow([
-            c.id,
-            c.contract_number,
-            c.unit_id,
-            c.tenant_id,
-            c.start_date,
-            c.end_date,
-            c.duration_months,
-            c.rent_amount,
-            c.status.value,
-            c.rental_platform or '',
-            c.payment_type or ''
-        ])
-    return output.getvalue()
-
-def log_audit(db: Session, user: str, action: str, table_name: str, row_id: int, details: str = ""):
-    log = AuditLog(
-        user=user,
-        action=action,
-        table_name=table_name,
-        row_id=row_id,
-        details=details,
-        timestamp=datetime.utcnow()
-    )
-    db.add(log)
-    db.commit()
+    return export_to_string(db, *export_contracts_query())
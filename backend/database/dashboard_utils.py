@@ -0,0 +1,197 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from database.models import (
+    DashboardCounter, DashboardBucket, Unit, Contract, Invoice, Payment,
+    UnitStatus, ContractStatus, InvoiceStatus
+)
+from database.db_utils import dialect_insert
+from datetime import date, datetime, timedelta
+
+# عدد الأيام التي يعتبر خلالها العقد "قارب على الانتهاء"
+EXPIRY_WINDOW_DAYS = 30
+
+# ========== مساهمة كل صف في جداول الملخص ==========
+# كل دالة ترجع قائمة من (metric, bucket_date, count, amount)
+# bucket_date = None يعني عداد عام (dashboard_counters)، غير ذلك يعني خانة يومية (dashboard_buckets)
+
+def _enum_value(value):
+    return value.value if hasattr(value, "value") else str(value)
+
+def unit_contributions(unit):
+    if unit is None or unit.is_deleted:
+        return []
+    status = _enum_value(unit.status)
+    return [
+        ("units_total", None, 1, 0.0),
+        (f"units_{status}", None, 1, 0.0),
+    ]
+
+def contract_contributions(contract):
+    if contract is None or contract.is_deleted:
+        return []
+    status = _enum_value(contract.status)
+    rent = contract.rent_amount or 0.0
+    rows = [
+        ("contracts_total", None, 1, rent),
+        (f"contracts_{status}", None, 1, rent),
+    ]
+    if status != ContractStatus.expired.value:
+        rows.append(("rent_roll", None, 1, rent))
+        if contract.end_date:
+            rows.append(("contracts_end", contract.end_date, 1, rent))
+    return rows
+
+def invoice_contributions(invoice):
+    if invoice is None:
+        return []
+    status = _enum_value(invoice.status)
+    amount = invoice.amount or 0.0
+    rows = [
+        ("invoices_total", None, 1, amount),
+        (f"invoices_{status}", None, 1, amount),
+    ]
+    if status != InvoiceStatus.paid.value and invoice.date_issued:
+        rows.append(("invoices_open", invoice.date_issued, 1, amount))
+    return rows
+
+def payment_contributions(payment):
+    if payment is None:
+        return []
+    return [("payments_total", None, 1, payment.amount_paid or 0.0)]
+
+# ========== تطبيق الفرق على جداول الملخص ==========
+def apply_dashboard_change(db: Session, before, after):
+    """
+    يطبّق الفرق (after - before) على جداول الملخص داخل نفس المعاملة.
+    لا ينفذ commit؛ الدالة المستدعية هي من تنفذه مع التعديل الأصلي.
+    """
+    deltas = {}
+    for sign, rows in ((-1, before or []), (1, after or [])):
+        for metric, bucket_date, count, amount in rows:
+            d = deltas.setdefault((metric, bucket_date), [0, 0.0])
+            d[0] += sign * count
+            d[1] += sign * amount
+
+    counters, buckets, emptied = [], [], []
+    for (metric, bucket_date), (count, amount) in deltas.items():
+        if count == 0 and amount == 0:
+            continue
+        if bucket_date is None:
+            counters.append({"metric": metric, "count": count, "amount": amount})
+        else:
+            buckets.append({"metric": metric, "bucket_date": bucket_date, "count": count, "amount": amount})
+            if count < 0:
+                emptied.append((metric, bucket_date))
+
+    # upsert جماعي (executemany) بدلاً من جملة لكل مفتاح
+    if counters:
+        stmt = dialect_insert(db, DashboardCounter)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["metric"],
+            set_={"count": DashboardCounter.count + stmt.excluded.count,
+                  "amount": DashboardCounter.amount + stmt.excluded.amount}
+        )
+        db.execute(stmt, counters)
+    if buckets:
+        stmt = dialect_insert(db, DashboardBucket)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["metric", "bucket_date"],
+            set_={"count": DashboardBucket.count + stmt.excluded.count,
+                  "amount": DashboardBucket.amount + stmt.excluded.amount}
+        )
+        db.execute(stmt, buckets)
+    # حذف الخانات التي أصبحت فارغة ليبقى الجدول صغيراً
+    for metric, bucket_date in emptied:
+        db.query(DashboardBucket).filter(
+            DashboardBucket.metric == metric,
+            DashboardBucket.bucket_date == bucket_date,
+            DashboardBucket.count <= 0
+        ).delete(synchronize_session=False)
+
+# ========== إعادة بناء الملخص من الصفر ==========
+def rebuild_dashboard_summary(db: Session):
+    db.query(DashboardCounter).delete(synchronize_session=False)
+    db.query(DashboardBucket).delete(synchronize_session=False)
+    rows = []
+    for unit in db.query(Unit).filter_by(is_deleted=False).yield_per(1000):
+        rows.extend(unit_contributions(unit))
+    for contract in db.query(Contract).filter_by(is_deleted=False).yield_per(1000):
+        rows.extend(contract_contributions(contract))
+    for invoice in db.query(Invoice).yield_per(1000):
+        rows.extend(invoice_contributions(invoice))
+    for payment in db.query(Payment).yield_per(1000):
+        rows.extend(payment_contributions(payment))
+    apply_dashboard_change(db, [], rows)
+    db.commit()
+
+def ensure_dashboard_summary(db: Session):
+    # يعيد البناء فقط إذا كانت جداول الملخص فارغة (قاعدة قديمة أو جديدة)
+    if db.query(DashboardCounter).first() is None:
+        rebuild_dashboard_summary(db)
+
+# ========== قراءة لوحة التحكم ==========
+def get_dashboard_summary(db: Session, today: date = None):
+    today = today or date.today()
+    counters = {c.metric: c for c in db.query(DashboardCounter).all()}
+
+    def count(metric):
+        return counters[metric].count if metric in counters else 0
+
+    def amount(metric):
+        return round(counters[metric].amount, 2) if metric in counters else 0.0
+
+    overdue_count, overdue_amount = db.query(
+        func.coalesce(func.sum(DashboardBucket.count), 0),
+        func.coalesce(func.sum(DashboardBucket.amount), 0.0)
+    ).filter(
+        DashboardBucket.metric == "invoices_open",
+        DashboardBucket.bucket_date < today
+    ).one()
+
+    expiring_count = db.query(func.coalesce(func.sum(DashboardBucket.count), 0)).filter(
+        DashboardBucket.metric == "contracts_end",
+        DashboardBucket.bucket_date >= today,
+        DashboardBucket.bucket_date <= today + timedelta(days=EXPIRY_WINDOW_DAYS)
+    ).scalar()
+
+    units_total = count("units_total")
+    units_rented = count(f"units_{UnitStatus.rented.value}")
+    return {
+        "units": {
+            "total": units_total,
+            "available": count(f"units_{UnitStatus.available.value}"),
+            "rented": units_rented,
+            "under_maintenance": count(f"units_{UnitStatus.under_maintenance.value}"),
+            "occupancy_rate": round(units_rented / units_total * 100, 2) if units_total else 0.0,
+        },
+        "contracts": {
+            "total": count("contracts_total"),
+            "active": count(f"contracts_{ContractStatus.active.value}"),
+            "warning": count(f"contracts_{ContractStatus.warning.value}"),
+            "expired": count(f"contracts_{ContractStatus.expired.value}"),
+            "expiring_soon": expiring_count,
+            "expiry_window_days": EXPIRY_WINDOW_DAYS,
+        },
+        "rent_roll": {
+            "contracts": count("rent_roll"),
+            "annual_amount": amount("rent_roll"),
+        },
+        "invoices": {
+            "total": count("invoices_total"),
+            "paid": count(f"invoices_{InvoiceStatus.paid.value}"),
+            "unpaid": count(f"invoices_{InvoiceStatus.unpaid.value}"),
+            "late": count(f"invoices_{InvoiceStatus.late.value}"),
+            "paid_amount": amount(f"invoices_{InvoiceStatus.paid.value}"),
+            "unpaid_amount": amount(f"invoices_{InvoiceStatus.unpaid.value}"),
+            "late_amount": amount(f"invoices_{InvoiceStatus.late.value}"),
+        },
+        "overdue": {
+            "count": overdue_count,
+            "amount": round(overdue_amount, 2),
+        },
+        "payments": {
+            "count": count("payments_total"),
+            "collected_amount": amount("payments_total"),
+        },
+        "generated_at": datetime.utcnow().isoformat(),
+    }
@@ -0,0 +1,200 @@
+from sqlalchemy import select, Boolean, Integer, Numeric, Float, Date, DateTime, String, Enum
+from decimal import Decimal
+from datetime import date, datetime
+import csv, io, json, zlib
+
+# ========== محرك التصدير المتدفق (Streaming Export) ==========
+# الصفوف تُقرأ على دفعات (yield_per) كصفوف Core وليس كائنات ORM،
+# وتُحوّل مباشرة إلى أجزاء (chunks) صغيرة تُرسل للعميل بدون تجميع الملف كاملاً في الذاكرة.
+
+# استثناءات مخصصة
+class ExportFormatError(Exception): pass
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+def export_select(columns, *criteria, order_by=None):
+    """
+    يبني جملة select لأعمدة التصدير ويرجع (stmt, header).
+    columns: قائمة (اسم العمود في الملف، عمود الجدول أو تعبير SQL)
+    """
+    stmt = select(*[col.label(name) for name, col in columns])
+    if criteria:
+        stmt = stmt.where(*criteria)
+    if order_by is not None:
+        stmt = stmt.order_by(order_by)
+    return stmt, [name for name, _ in columns]
+
+def iter_rows(stmt, bind=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    يولّد صفوف Core على دفعات باتصال خاص به (cursor من جهة السيرفر حيث يدعمه المحرك).
+    الاتصال يُغلق عند انتهاء التوليد أو إيقافه، وليس مرتبطاً بجلسة الطلب.
+    """
+    if bind is None:
+        from database.db_utils import engine as bind
+    with bind.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+        for partition in result.partitions():
+            yield from partition
+
+def _plain(value):
+    if value is None:
+        return ""
+    if hasattr(value, "value"):
+        return value.value
+    return value
+
+def _json_value(value):
+    if hasattr(value, "value"):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+# ========== صيغ الإخراج ==========
+def csv_chunks(header, rows, chunk_rows=EXPORT_BATCH_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    pending = 0
+    for row in rows:
+        writer.writerow([_plain(v) for v in row])
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode("utf-8")
+
+def ndjson_chunks(header, rows, chunk_rows=EXPORT_BATCH_SIZE):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({k: _json_value(v) for k, v in zip(header, row)}, ensure_ascii=False))
+        if len(lines) >= chunk_rows:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+class _ChunkSink(io.RawIOBase):
+    # ملف وهمي يجمع ما يكتبه ParquetWriter لنرسله جزءاً جزءاً
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+# نوع عمود SQLAlchemy -> اسم نوع Arrow (الترتيب مهم: Enum قبل String و Float قبل Numeric)
+_ARROW_TYPES = [
+    (Boolean, "bool_"), (Integer, "int64"), (Float, "float64"), (Numeric, "float64"),
+    (DateTime, "timestamp"), (Date, "date32"), (Enum, "string"), (String, "string"),
+]
+
+def _arrow_type(pa, sa_type):
+    for sa_class, name in _ARROW_TYPES:
+        if isinstance(sa_type, sa_class):
+            return pa.timestamp("us") if name == "timestamp" else getattr(pa, name)()
+    return None  # تعبير بدون نوع معروف: يُستنتج من البيانات
+
+def _parquet_value(value):
+    if hasattr(value, "value"):
+        return value.value
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def parquet_chunks(header, rows, chunk_rows=EXPORT_BATCH_SIZE, types=None):
+    """
+    types: أنواع SQLAlchemy للأعمدة (stmt.selected_columns) ليُبنى مخطط Arrow قبل أول دفعة؛
+    بدونها، أو لعمود بلا نوع معروف، يُستنتج النوع من الدفعة الأولى والعمود الفارغ فيها يصبح string.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportFormatError("تصدير Parquet يتطلب تثبيت مكتبة pyarrow")
+
+    declared = [_arrow_type(pa, t) for t in types] if types else [None] * len(header)
+    sink = _ChunkSink()
+    writer = None
+    batch = []
+
+    def flush_batch():
+        nonlocal writer
+        columns = list(zip(*batch)) if batch else [[] for _ in header]
+        columns = [[_parquet_value(v) for v in values] for values in columns]
+        if writer is None:
+            # مخطط ثابت من أول دفعة: عمود nullable كله None هنا لا يصبح null فيفشل في دفعة لاحقة
+            fields = []
+            for name, arrow_type, values in zip(header, declared, columns):
+                if arrow_type is None:
+                    arrow_type = pa.array(values).type
+                    if pa.types.is_null(arrow_type):
+                        arrow_type = pa.string()
+                fields.append(pa.field(name, arrow_type))
+            writer = pq.ParquetWriter(sink, pa.schema(fields))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, writer.schema)],
+            schema=writer.schema,
+        ))
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk_rows:
+            flush_batch()
+            batch = []
+            yield sink.drain()
+    if batch or writer is None:
+        flush_batch()
+    writer.close()
+    yield sink.drain()
+
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = ترويسة gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+_FORMATTERS = {"csv": csv_chunks, "ndjson": ndjson_chunks, "parquet": parquet_chunks}
+
+def stream_export(stmt, header, fmt="csv", compress=False, bind=None):
+    """يرجع مولّد bytes للتصدير بالصيغة المطلوبة مع ضغط gzip اختياري"""
+    if fmt not in _FORMATTERS:
+        raise ExportFormatError(f"صيغة تصدير غير مدعومة: {fmt}")
+    if fmt == "parquet":
+        # التأكد من توفر pyarrow قبل بدء الإرسال حتى يرجع الخطأ كاستجابة عادية
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportFormatError("تصدير Parquet يتطلب تثبيت مكتبة pyarrow")
+        chunks = parquet_chunks(header, iter_rows(stmt, bind=bind), types=[c.type for c in stmt.selected_columns])
+    else:
+        chunks = _FORMATTERS[fmt](header, iter_rows(stmt, bind=bind))
+    return gzip_chunks(chunks) if compress else chunks
+
+def export_to_string(db, stmt, header):
+    # للتوافق مع الاستدعاءات القديمة التي تتوقع نص CSV كاملاً (ضمن جلسة الطلب)
+    rows = db.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    return b"".join(csv_chunks(header, rows)).decode("utf-8")
@@ -0,0 +1,481 @@
+from sqlalchemy import insert, select, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database.models import Owner, Unit, Tenant, Contract, UnitStatus, ContractStatus
+from database.owners_utils import validate_registration_number
+from database.tenants_utils import validate_national_id, validate_phone, validate_email
+from database.units_utils import validate_unit_number
+from database.dashboard_utils import apply_dashboard_change, unit_contributions, contract_contributions
+from database.search_utils import index_rows
+from database.pagination import invalidate_count_cache
+from contracts.contract_manager import generate_invoice_schedules
+from utils.audit_log import log_audit
+from utils.change_tracking import mark_rows_changed
+from utils.config import get_section
+from datetime import date, datetime
+from types import SimpleNamespace
+import csv
+import os
+import time
+
+# ========== محرك الاستيراد الجماعي (Bulk Import) ==========
+# عكس التصدير المتدفق: الملف (CSV أو XLSX) يُقرأ على دفعات (chunk_rows) بدون تحميله كاملاً، وكل دفعة:
+#   1) تحويل وتحقق من كل سطر في الذاكرة (نفس دوال التحقق في *_utils) بدون أي استعلام
+#   2) استعلام واحد للمفاتيح الفريدة الموجودة مسبقاً، واستعلام واحد لكل مرجع (المالك، الوحدة، المستأجر)
+#   3) insert جماعي (executemany) في معاملة واحدة مع الملخص، فهرس البحث، سجل التغييرات، التدقيق،
+#      وجداول فواتير العقود المستوردة — بدل طلب HTTP و commit لكل سطر
+# الأسطر المرفوضة لا توقف الاستيراد: تُجمع في تقرير برقم السطر والسبب.
+# أسماء الأعمدة هي نفس أعمدة التصدير (id يُتجاهل)، والمراجع بالمعرف أو بالمفتاح الطبيعي:
+#   units: owner_id أو owner_registration_number
+#   contracts: unit_id أو unit_number، tenant_id أو tenant_national_id
+
+# استثناءات مخصصة
+class ImportFormatError(Exception): pass
+class RowError(Exception): pass
+
+DEFAULT_IMPORT_CONFIG = {
+    "chunk_rows": 2000,      # أسطر كل معاملة
+    "max_errors": 1000,      # أخطاء الأسطر المحفوظة في التقرير (العدد الكلي يُحسب دائماً)
+    "max_upload_mb": 200,
+}
+
+IMPORT_FORMATS = ("csv", "xlsx")
+
+def import_config():
+    return get_section("import", DEFAULT_IMPORT_CONFIG)
+
+def import_format(filename=None, fmt=None):
+    fmt = (fmt or os.path.splitext(filename or "")[1].lstrip(".") or "csv").lower()
+    if fmt not in IMPORT_FORMATS:
+        raise ImportFormatError(f"صيغة استيراد غير مدعومة: {fmt} (المدعوم: csv, xlsx)")
+    return fmt
+
+# ========== قراءة الملف ==========
+def _header(names):
+    header = [str(name or "").strip().lower().replace(" ", "_") for name in names]
+    if not any(header):
+        raise ImportFormatError("السطر الأول يجب أن يحتوي أسماء الأعمدة")
+    return header
+
+def csv_records(path):
+    # (رقم السطر، {العمود: القيمة}); utf-8-sig يتجاهل BOM الذي يضيفه Excel
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = _header(next(reader, None) or [])
+        for line, values in enumerate(reader, start=2):
+            if any(values):
+                yield line, dict(zip(header, values))
+
+def xlsx_records(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError("استيراد XLSX يتطلب تثبيت مكتبة openpyxl")
+    # read_only: الأوراق تُقرأ صفاً صفاً من الملف المضغوط بدون تحميلها في الذاكرة
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _header(next(rows, None) or [])
+        for line, values in enumerate(rows, start=2):
+            if any(v not in (None, "") for v in values):
+                yield line, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+_READERS = {"csv": csv_records, "xlsx": xlsx_records}
+
+def read_chunks(path, fmt="csv", chunk_rows=None):
+    """مولّد دفعات [(رقم السطر، dict)] من الملف"""
+    chunk_rows = chunk_rows or import_config()["chunk_rows"]
+    chunk = []
+    for record in _READERS[fmt](path):
+        chunk.append(record)
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# ========== تحويل القيم ==========
+def _text(record, name, required=False, max_length=None):
+    value = record.get(name)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # Excel يخزن الأرقام الطويلة كـ float
+    value = "" if value is None else str(value).strip()
+    if not value:
+        if required:
+            raise RowError(f"{name}: مطلوب")
+        return None
+    if max_length and len(value) > max_length:
+        raise RowError(f"{name}: أطول من {max_length} حرفاً")
+    return value
+
+def _number(record, name, cast=float, required=False):
+    value = record.get(name)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise RowError(f"{name}: مطلوب")
+        return None
+    try:
+        number = float(str(value).replace(",", "").strip())
+    except ValueError:
+        raise RowError(f"{name}: رقم غير صالح ({value})")
+    if cast is int:
+        if not number.is_integer():
+            raise RowError(f"{name}: يجب أن يكون عدداً صحيحاً ({value})")
+        return int(number)
+    return number
+
+def _date(record, name, required=False):
+    value = record.get(name)
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = _text(record, name, required)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        raise RowError(f"{name}: تاريخ غير صالح ({value})، الصيغة YYYY-MM-DD")
+
+def _enum(record, name, enum_type, default):
+    value = _text(record, name)
+    if value is None:
+        return default
+    for member in enum_type:
+        if value in (member.value, member.name):
+            return member
+    raise RowError(f"{name}: قيمة غير معروفة ({value})")
+
+def _check(validator, *args):
+    # دوال التحقق في *_utils ترفع ValidationError خاصاً بكل وحدة
+    try:
+        validator(*args)
+    except Exception as exc:
+        raise RowError(str(exc))
+
+# ========== تحويل كل كيان (بدون قاعدة بيانات) ==========
+def _prepare_owner(record):
+    registration_number = _text(record, "registration_number", required=True)
+    _check(validate_registration_number, registration_number)
+    return {
+        "name": _text(record, "name", required=True, max_length=128),
+        "registration_number": registration_number,
+        "nationality": _text(record, "nationality", required=True, max_length=32),
+        "iban": _text(record, "iban", max_length=34),
+        "agent_name": _text(record, "agent_name", max_length=128),
+        "notes": _text(record, "notes"),
+    }
+
+def _prepare_tenant(record):
+    national_id = _text(record, "national_id", required=True)
+    phone = _text(record, "phone", required=True)
+    email = _text(record, "email", max_length=128)
+    _check(validate_national_id, national_id)
+    _check(validate_phone, phone)
+    _check(validate_email, email)
+    return {
+        "name": _text(record, "name", required=True, max_length=128),
+        "national_id": national_id,
+        "phone": phone,
+        "nationality": _text(record, "nationality", required=True, max_length=32),
+        "email": email,
+        "address": _text(record, "address", max_length=256),
+        "work": _text(record, "work", max_length=128),
+        "notes": _text(record, "notes"),
+    }
+
+def _prepare_unit(record):
+    unit_number = _text(record, "unit_number", required=True)
+    _check(validate_unit_number, unit_number)
+    return {
+        "unit_number": unit_number,
+        "unit_type": _text(record, "unit_type", required=True, max_length=32),
+        "rooms": _number(record, "rooms", int, required=True),
+        "area": _number(record, "area", required=True),
+        "location": _text(record, "location", required=True, max_length=256),
+        "status": _enum(record, "status", UnitStatus, UnitStatus.available),
+        "building_name": _text(record, "building_name", max_length=128),
+        "floor_number": _number(record, "floor_number", int),
+        "notes": _text(record, "notes"),
+        "owner_id": _number(record, "owner_id", int),
+        "owner_registration_number": _text(record, "owner_registration_number"),
+    }
+
+def _prepare_contract(record):
+    start_date = _date(record, "start_date", required=True)
+    end_date = _date(record, "end_date", required=True)
+    if end_date < start_date:
+        raise RowError("end_date: قبل start_date")
+    duration_months = _number(record, "duration_months", int)
+    if duration_months is None:
+        # نفس حساب الأشهر في build_invoice_schedule
+        duration_months = (end_date.year - start_date.year) * 12 + (end_date.month - start_date.month)
+        duration_months += 1 if end_date.day >= start_date.day else 0
+    rent_amount = _number(record, "rent_amount", required=True)
+    if rent_amount < 0:
+        raise RowError("rent_amount: قيمة سالبة")
+    return {
+        "contract_number": _text(record, "contract_number", required=True, max_length=64),
+        "start_date": start_date,
+        "end_date": end_date,
+        "duration_months": duration_months,
+        "rent_amount": rent_amount,
+        "status": _enum(record, "status", ContractStatus, ContractStatus.active),
+        "rental_platform": _text(record, "rental_platform", max_length=32),
+        "payment_type": _text(record, "payment_type", max_length=32),
+        "notes": _text(record, "notes"),
+        "unit_id": _number(record, "unit_id", int),
+        "unit_number": _text(record, "unit_number"),
+        "tenant_id": _number(record, "tenant_id", int),
+        "tenant_national_id": _text(record, "tenant_national_id"),
+    }
+
+class ImportSpec:
+    """
+    model: الجدول الهدف، key: العمود الفريد، prepare: dict القيم من سطر الملف أو RowError
+    references: (عمود المعرف، النموذج المرجعي، عمود المفتاح الطبيعي، اسم عمود المفتاح في الملف، اسم الكيان للرسائل)
+    """
+
+    def __init__(self, model, key, prepare, references=(), contributions=None, invoices=False):
+        self.model = model
+        self.key = key
+        self.prepare = prepare
+        self.references = references
+        self.contributions = contributions
+        self.invoices = invoices
+
+IMPORT_ENTITIES = {
+    "owners": ImportSpec(Owner, "registration_number", _prepare_owner),
+    "tenants": ImportSpec(Tenant, "national_id", _prepare_tenant),
+    "units": ImportSpec(
+        Unit, "unit_number", _prepare_unit,
+        references=[("owner_id", Owner, "registration_number", "owner_registration_number", "المالك")],
+        contributions=unit_contributions,
+    ),
+    "contracts": ImportSpec(
+        Contract, "contract_number", _prepare_contract,
+        references=[
+            ("unit_id", Unit, "unit_number", "unit_number", "الوحدة"),
+            ("tenant_id", Tenant, "national_id", "tenant_national_id", "المستأجر"),
+        ],
+        contributions=contract_contributions, invoices=True,
+    ),
+}
+
+# ========== مهمة الاستيراد ==========
+class ImportJob:
+    """
+    prepare(chunk) بدون قاعدة بيانات ثم write(db, prepared) في معاملة واحدة لكل دفعة.
+    المسار في app.py ينفذ write داخل مسار الكتابة (run_db) فلا يحجز الكاتب إلا أثناء الدفعة نفسها.
+    """
+
+    def __init__(self, entity, source=None, dry_run=False, skip_existing=False, user="system", config=None):
+        self.entity = entity
+        self.spec = IMPORT_ENTITIES[entity]
+        self.source = source or ""
+        self.dry_run = dry_run
+        self.skip_existing = skip_existing
+        self.user = user
+        self.max_errors = (config or import_config())["max_errors"]
+        self.rows = self.inserted = self.skipped = self.failed = self.invoices = self.chunks = 0
+        self.errors = []
+        self._seen = set()         # المفاتيح المقبولة من الملف حتى الآن (التكرار داخل الملف)
+        self._periods = {}         # العقود: فترات كل وحدة المقبولة من الملف (التداخل بين الدفعات)
+        self._started = time.perf_counter()
+
+    def _error(self, line, message, key=None):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "key": key, "error": message})
+
+    def prepare(self, chunk):
+        prepared = []
+        for line, record in chunk:
+            self.rows += 1
+            try:
+                prepared.append((line, self.spec.prepare(record)))
+            except RowError as exc:
+                self._error(line, str(exc), record.get(self.spec.key))
+        return prepared
+
+    # ---------- الدفعة: تحقق مقابل القاعدة ثم إدراج ----------
+    def write(self, db: Session, prepared):
+        self.chunks += 1
+        counts = (self.failed, self.skipped, len(self.errors))
+        try:
+            return self._write(db, prepared)
+        except IntegrityError:
+            # سطر أُضيف من طلب آخر بين التحقق والإدراج: إعادة التحقق مرة واحدة بالمفاتيح الحالية
+            db.rollback()
+            self._restore(counts)
+            try:
+                return self._write(db, prepared)
+            except IntegrityError as exc:
+                db.rollback()
+                self._restore(counts)
+                for line, values in prepared:
+                    self._error(line, f"تعارض في قاعدة البيانات: {exc.orig}", values[self.spec.key])
+                return 0
+
+    def _restore(self, counts):
+        # أخطاء المحاولة الفاشلة لا تُحسب مرتين
+        self.failed, self.skipped, errors = counts
+        del self.errors[errors:]
+
+    def _write(self, db: Session, prepared):
+        spec, model = self.spec, self.spec.model
+        key_column = getattr(model, spec.key)
+        keys = [values[spec.key] for _, values in prepared]
+        # القيد الفريد على كل الصفوف (بما فيها المحذوفة منطقياً)
+        existing = set(db.scalars(select(key_column).where(key_column.in_(keys)))) if keys else set()
+        resolved = {column: self._resolve(db, column, ref_model, ref_key, ref_field, prepared)
+                    for column, ref_model, ref_key, ref_field, _ in spec.references}
+        periods = self._existing_periods(db, prepared, resolved) if spec.invoices else None
+
+        accepted, seen, lines = [], set(), []
+        for line, values in prepared:
+            key = values[spec.key]
+            if key in existing:
+                if self.skip_existing:
+                    self.skipped += 1
+                else:
+                    self._error(line, f"{spec.key}: مستخدم سابقاً", key)
+                continue
+            if key in self._seen or key in seen:
+                self._error(line, f"{spec.key}: مكرر في الملف", key)
+                continue
+            try:
+                row = self._row(values, resolved, periods)
+            except RowError as exc:
+                self._error(line, str(exc), key)
+                continue
+            seen.add(key)
+            accepted.append(row)
+            lines.append(line)
+        if not accepted:
+            return 0
+
+        # insert على الجدول (Core) عبر اتصال الجلسة: بدون طبقة ORM bulk، والمعرفات بترتيب الأسطر
+        table = model.__table__
+        ids = list(db.connection().scalars(insert(table).returning(table.c.id, sort_by_parameter_order=True), accepted))
+        objects = [SimpleNamespace(id=row_id, is_deleted=False, **row) for row_id, row in zip(ids, accepted)]
+        table = table.name
+        if spec.contributions:
+            contributions = []
+            for obj in objects:
+                contributions.extend(spec.contributions(obj))
+            apply_dashboard_change(db, [], contributions)
+        invoices = generate_invoice_schedules(db, [(obj.id, obj) for obj in objects]) if spec.invoices else 0
+        index_rows(db, table, objects)
+        # insert الجماعي لا يمر بـ after_flush: الصفوف تُسجل يدوياً للمزامنة وناقل الأحداث
+        mark_rows_changed(db, table, ids)
+        log_audit(db, user=self.user, action="import", table_name=table, row_id=ids[0],
+                  details=f"Import {len(ids)} rows (lines {lines[0]}-{lines[-1]}) {self.source}".strip())
+        if self.dry_run:
+            db.rollback()
+        else:
+            db.commit()
+            invalidate_count_cache(table)
+        self._seen.update(seen)
+        if periods is not None:
+            for row in accepted:
+                self._periods.setdefault(row["unit_id"], []).append((row["start_date"], row["end_date"]))
+        self.inserted += len(ids)
+        self.invoices += invoices
+        return len(ids)
+
+    def _resolve(self, db: Session, column, ref_model, ref_key, ref_field, prepared):
+        """{المعرف أو المفتاح الطبيعي: المعرف} للمراجع غير المحذوفة، باستعلام واحد للدفعة"""
+        ids = {values[column] for _, values in prepared if values.get(column)}
+        natural = {values[ref_field] for _, values in prepared if values.get(ref_field)}
+        if not ids and not natural:
+            return {}
+        key_column = getattr(ref_model, ref_key)
+        criteria = []
+        if ids:
+            criteria.append(ref_model.id.in_(ids))
+        if natural:
+            criteria.append(key_column.in_(natural))
+        result = {}
+        for row_id, key in db.execute(select(ref_model.id, key_column).where(or_(*criteria), ref_model.is_deleted == False)):
+            result[row_id] = row_id
+            result[key] = row_id
+        return result
+
+    def _existing_periods(self, db: Session, prepared, resolved):
+        # فترات العقود الحالية للوحدات المذكورة في الدفعة (check_contract_conflicts لكل الدفعة باستعلام واحد)
+        unit_ids = {unit_id for unit_id in resolved.get("unit_id", {}).values()}
+        periods = {unit_id: list(self._periods.get(unit_id, ())) for unit_id in unit_ids}
+        if unit_ids:
+            rows = db.execute(select(Contract.unit_id, Contract.start_date, Contract.end_date)
+                              .where(Contract.unit_id.in_(unit_ids), Contract.is_deleted == False))
+            for unit_id, start, end in rows:
+                periods[unit_id].append((start, end))
+        return periods
+
+    def _row(self, values, resolved, periods):
+        row = dict(values)
+        for column, _, _, ref_field, label in self.spec.references:
+            ref = row.pop(ref_field, None)
+            wanted = row.get(column) or ref
+            if wanted is None:
+                if column == "owner_id":
+                    continue  # الوحدة بدون مالك مسموحة في النموذج
+                raise RowError(f"{column}: مطلوب ({column} أو {ref_field})")
+            row_id = resolved[column].get(wanted)
+            if row_id is None:
+                raise RowError(f"{label} غير موجود ({wanted})")
+            row[column] = row_id
+        if periods is not None:
+            unit_periods = periods.setdefault(row["unit_id"], [])
+            if any(start <= row["end_date"] and row["start_date"] <= end for start, end in unit_periods):
+                raise RowError("هناك عقد آخر لهذه الوحدة ضمن نفس الفترة")
+            unit_periods.append((row["start_date"], row["end_date"]))
+        return row
+
+    def report(self):
+        return {
+            "entity": self.entity,
+            "source": self.source,
+            "dry_run": self.dry_run,
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "invoices": self.invoices,
+            "chunks": self.chunks,
+            "seconds": round(time.perf_counter() - self._started, 3),
+            "errors": sorted(self.errors, key=lambda e: e["line"]),
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+def import_file(db: Session, entity, path, fmt=None, dry_run=False, skip_existing=False, user="system", chunk_rows=None):
+    """استيراد ملف كامل في الجلسة المعطاة (commit لكل دفعة)؛ يرجع تقرير ImportJob"""
+    job = ImportJob(entity, source=os.path.basename(path), dry_run=dry_run, skip_existing=skip_existing, user=user)
+    for chunk in read_chunks(path, import_format(path, fmt), chunk_rows):
+        job.write(db, job.prepare(chunk))
+    return job.report()
+
+# ---------- سطر الأوامر ----------
+# من مجلد backend:  python -m database.import_utils owners owners.csv [--dry-run] [--skip-existing]
+if __name__ == "__main__":
+    import argparse, json
+    from database.db_utils import init_db, SessionLocal
+
+    parser = argparse.ArgumentParser(prog="python -m database.import_utils")
+    parser.add_argument("entity", choices=list(IMPORT_ENTITIES))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=IMPORT_FORMATS)
+    parser.add_argument("--dry-run", action="store_true", help="تحقق فقط بدون حفظ")
+    parser.add_argument("--skip-existing", action="store_true", help="تجاهل الأسطر الموجودة مسبقاً بدل اعتبارها أخطاء")
+    parser.add_argument("--chunk-rows", type=int)
+    args = parser.parse_args()
+
+    init_db()
+    with SessionLocal() as db:
+        report = import_file(db, args.entity, args.path, args.format, args.dry_run, args.skip_existing,
+                             chunk_rows=args.chunk_rows)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
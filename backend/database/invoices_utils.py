@@ -1,8 +1,17 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload, raiseload
 from sqlalchemy.exc import SQLAlchemyError
 from database.models import Invoice, Contract, Attachment, AttachmentType, AuditLog, InvoiceStatus
+from database.dashboard_utils import apply_dashboard_change, invoice_contributions
+from database.pagination import keyset_page
+from database.export_utils import export_select, export_to_string
 from datetime import datetime
-import csv, io
+from utils.audit_log import log_audit
+
+# ملفات التحميل المسبق للقوائم: "list" يحمل المرفقات دفعة واحدة ويمنع أي lazy load إضافي
+INVOICE_LOAD_PROFILES = {
+    "plain": [],
+    "list": [selectinload(Invoice.attachments), raiseload("*")],
+}
 
 # استثناءات مخصصة
 class InvoiceNotFound(Exception): pass
@@ -46,12 +55,13 @@ def add_invoice(
         created_by_contract=created_by_contract  # <-- وهنا نمررها
     )
     db.add(invoice)
-    db.commit()
-    db.refresh(invoice)
+    apply_dashboard_change(db, [], invoice_contributions(invoice))
     log_audit(
-        db, user="system", action="add", table_name="invoices", row_id=invoice.id,
+        db, user="system", action="add", table_name="invoices", row_id=invoice,
         details=f"Add invoice for contract {contract_id}"
     )
+    db.commit()
+    db.refresh(invoice)
     return invoice
 
 # تعديل فاتورة
@@ -64,14 +74,16 @@ def update_invoice(db: Session, invoice_id, **kwargs):
         date_issued = kwargs.get("date_issued", invoice.date_issued)
         validate_contract(db, contract_id)
         check_invoice_conflict(db, contract_id, date_issued, exclude_invoice_id=invoice_id)
+    before = invoice_contributions(invoice)
     for k, v in kwargs.items():
         setattr(invoice, k, v)
-    db.commit()
-    db.refresh(invoice)
+    apply_dashboard_change(db, before, invoice_contributions(invoice))
     log_audit(
         db, user="system", action="update",
         table_name="invoices", row_id=invoice.id, details="Update invoice"
     )
+    db.commit()
+    db.refresh(invoice)
     return invoice
 
 # حذف فاتورة
@@ -81,12 +93,13 @@ def delete_invoice(db: Session, invoice_id):
         raise InvoiceNotFound("الفاتورة غير موجودة")
     if getattr(invoice, "created_by_contract", False):  # تحقق من الخاصية
         raise ValidationError("لا يمكن حذف الفاتورة المرتبطة بعقد.")
+    apply_dashboard_change(db, invoice_contributions(invoice), [])
     db.delete(invoice)
-    db.commit()
     log_audit(
         db, user="system", action="delete",
         table_name="invoices", row_id=invoice_id, details="Delete invoice"
     )
+    db.commit()
     return True
 
 # جلب فاتورة مع مرفقاتها حسب النوع
@@ -100,15 +113,18 @@ def get_invoice(db: Session, invoice_id, attachment_type=None):
     return invoice, attachments
 
 # قائمة الفواتير مع Pagination وFiltering
-def list_invoices(db: Session, page=1, per_page=20, filter_contract_id=None, filter_status=None):
+def list_invoices(db: Session, page=1, per_page=20, filter_contract_id=None, filter_status=None, profile="list", cursor=None, keyset=False):
     query = db.query(Invoice)
     if filter_contract_id:
         query = query.filter(Invoice.contract_id == filter_contract_id)
     if filter_status:
         query = query.filter(Invoice.status == filter_status)
     query = query.filter(Invoice.contract_id != None)
+    # وضع المؤشر (Keyset): بدون COUNT وبدون OFFSET، يُفعّل عند طلبه فقط
+    if keyset or cursor:
+        return keyset_page(query.options(*INVOICE_LOAD_PROFILES[profile]), Invoice.date_issued, Invoice.id, per_page, cursor)
     total = query.count()
-    invoices = query.order_by(Invoice.date_issued.desc()).offset((page-1)*per_page).limit(per_page).all()
+    invoices = query.options(*INVOICE_LOAD_PROFILES[profile]).order_by(Invoice.date_issued.desc()).offset((page-1)*per_page).limit(per_page).all()
     return {
         "total": total,
         "page": page,
@@ -129,12 +145,12 @@ def attach_invoice_file(db: Session, invoice_id, filepath, filetype, attachment_
         notes=notes
     )
     db.add(attachment)
-    db.commit()
-    db.refresh(attachment)
     log_audit(
-        db, user="system", action="attach", table_name="attachments", row_id=attachment.id,
+        db, user="system", action="attach", table_name="attachments", row_id=attachment,
         details=f"Attach {attachment_type.value} to invoice {invoice.id}"
     )
+    db.commit()
+    db.refresh(attachment)
     return attachment
 
 def detach_invoice_file(db: Session, attachment_id):
@@ -142,41 +158,20 @@ def detach_invoice_file(db: Session, attachment_id):
     if not att or not att.invoice_id:
         raise InvoiceNotFound("المرفق غير موجود أو غير مرتبط بفاتورة")
     db.delete(att)
-    db.commit()
     log_audit(
         db, user="system", action="detach", table_name="attachments", row_id=attachment_id,
         details="Detach from invoice"
     )
+    db.commit()
     return True
 
 # تصدير الفواتير إلى CSV
-def export_invoices_to_csv(db: Session):
-    invoices = db.query(Invoice).all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['id', 'contract_id', 'date_issued', 'amount', 'status', 'sent_to_email', 'notes', 'created_by_contract'])
-    for inv in invoices:
-        writer.writerow([
-            inv.id,
-            inv.contract_id,
-            inv.date_issued,
-            inv.amount,
-            inv.status.value,
-            inv.sent_to_email if inv.sent_to_email else '',
-            inv.notes or '',
-            getattr(inv, "created_by_contract", False)
-        ])
-    return output.getvalue()
+def export_invoices_query():
+    return export_select([
+        ("id", Invoice.id), ("contract_id", Invoice.contract_id), ("date_issued", Invoice.date_issued),
+        ("amount", Invoice.amount), ("status", Invoice.status), ("sent_to_email", Invoice.sent_to_email),
+        ("notes", Invoice.notes), ("created_by_contract", Invoice.created_by_contract),
+    ], order_by=Invoice.id)
 
-# سجل تدقيق
-def log_audit(db: Session, user: str, action: str, table_name: str, row_id: int, details: str = ""):
-    log = AuditLog(
-        user=user,
-        action=action,
-        table_name=table_name,
-        row_id=row_id,
-        details=details,
-        timestamp=datetime.utcnow()
-    )
-    db.add(log)
-    db.commit()
+def export_invoices_to_csv(db: Session):
+    return export_to_string(db, *export_invoices_query())
@@ -0,0 +1,130 @@
+from sqlalchemy import insert, select, inspect, text, MetaData, Table, Column, Index, Boolean, Integer, String
+from database.models import SchemaMigration
+from database.search_utils import create_search_index
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ========== ترحيلات مخطط القاعدة (Schema Migrations) ==========
+# create_all ينشئ الجداول الناقصة فقط ولا يضيف فهارس أو أعمدة لجداول موجودة،
+# لذلك كل تغيير على قاعدة قائمة يُضاف هنا كخطوة مرقمة تُنفذ مرة واحدة وتُسجل في schema_migrations.
+# الخطوة دالة تستقبل اتصالاً (Connection) داخل معاملة وتنفذ عليه التغيير.
+# كل خطوة تحمل تعريف ما تنشئه كما كان عند كتابتها، ولا تقرأ models.py الحالي: نتيجة الخطوة نفسها
+# مهما تأخر تطبيقها (فهرس على عمود تضيفه خطوة لاحقة كان سيُنفذ قبل إضافة العمود).
+
+# ---------- تعريفات ثابتة للفهارس والأعمدة ----------
+ACTIVE = "active"       # WHERE is_deleted = false (الحذف منطقي)
+NOT_NULL = "not_null"   # WHERE <العمود الأول> IS NOT NULL
+
+def _index(name, table, *columns, where=None):
+    # جدول مؤقت بأسماء الأعمدة فقط يكفي لتوليد CREATE INDEX بلهجة القاعدة
+    cols = [Column(c) for c in columns]
+    is_deleted = Column("is_deleted", Boolean)
+    Table(table, MetaData(), *cols, is_deleted)
+    if where == ACTIVE:
+        condition = is_deleted == False
+    elif where == NOT_NULL:
+        condition = cols[0].isnot(None)
+    else:
+        return Index(name, *cols)
+    return Index(name, *cols, sqlite_where=condition, postgresql_where=condition)
+
+def create_indexes(*indexes):
+    def step(conn):
+        for index in indexes:
+            index.create(conn, checkfirst=True)
+    return step
+
+def add_columns(table, *columns):
+    # أعمدة اختيارية (NULL) على جدول قائم؛ القاعدة الجديدة تنشئها create_all فتُتجاوز
+    def step(conn):
+        existing = {c["name"] for c in inspect(conn).get_columns(table)}
+        for name, column_type in columns:
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column_type.compile(dialect=conn.dialect)}"))
+    return step
+
+def steps(*functions):
+    def step(conn):
+        for function in functions:
+            function(conn)
+    return step
+
+QUERY_INDEXES = [
+    _index("ix_owners_active", "owners", "id", where=ACTIVE),
+    _index("ix_units_active", "units", "id", where=ACTIVE),
+    _index("ix_units_owner", "units", "owner_id", where=ACTIVE),
+    _index("ix_tenants_active", "tenants", "id", where=ACTIVE),
+    _index("ix_contracts_active", "contracts", "id", where=ACTIVE),
+    _index("ix_contracts_unit_period", "contracts", "unit_id", "start_date", "end_date", where=ACTIVE),
+    _index("ix_contracts_tenant", "contracts", "tenant_id", where=ACTIVE),
+    _index("ix_payments_contract_due", "payments", "contract_id", "due_date"),
+    _index("ix_payments_invoice", "payments", "invoice_id"),
+    _index("ix_payments_due", "payments", "due_date", "id"),
+    _index("ix_invoices_contract_date", "invoices", "contract_id", "date_issued"),
+    _index("ix_invoices_date", "invoices", "date_issued", "id"),
+    _index("ix_invoices_status_date", "invoices", "status", "date_issued"),
+    _index("ix_attachments_owner", "attachments", "owner_id", where=NOT_NULL),
+    _index("ix_attachments_unit", "attachments", "unit_id", where=NOT_NULL),
+    _index("ix_attachments_tenant", "attachments", "tenant_id", where=NOT_NULL),
+    _index("ix_attachments_contract", "attachments", "contract_id", where=NOT_NULL),
+    _index("ix_attachments_invoice", "attachments", "invoice_id", where=NOT_NULL),
+    _index("ix_attachments_uploaded", "attachments", "uploaded_at", "id"),
+    _index("ix_auditlog_timestamp", "auditlog", "timestamp", "id"),
+    _index("ix_auditlog_table_row", "auditlog", "table_name", "row_id"),
+    _index("ix_auditlog_user", "auditlog", "user"),
+]
+
+# بالترتيب: (الإصدار، الوصف، الدالة)
+MIGRATIONS = [
+    ("0001_query_indexes", "فهارس مركبة وجزئية حسب أشكال الاستعلامات", create_indexes(*QUERY_INDEXES)),
+    ("0002_search_index", "فهرس البحث النصي FTS5 للملاك والمستأجرين والوحدات والعقود", create_search_index),
+    ("0003_status_rule_indexes", "فهرس حالة/انتهاء العقود لقواعد المجدول", create_indexes(
+        _index("ix_contracts_status_end", "contracts", "status", "end_date", where=ACTIVE),
+    )),
+    ("0004_attachment_content", "بصمة وحجم ونوع محتوى المرفقات", steps(
+        add_columns("attachments", ("sha256", String(64)), ("size", Integer()), ("content_type", String(128))),
+        create_indexes(_index("ix_attachments_sha256", "attachments", "sha256", where=NOT_NULL)),
+    )),
+]
+
+def applied_versions(conn):
+    SchemaMigration.__table__.create(conn, checkfirst=True)
+    return set(conn.execute(select(SchemaMigration.version)).scalars())
+
+def pending_migrations(bind=None):
+    if bind is None:
+        from database.db_utils import engine as bind
+    with bind.begin() as conn:
+        done = applied_versions(conn)
+    return [(version, description) for version, description, _ in MIGRATIONS if version not in done]
+
+def run_migrations(bind=None):
+    """ينفذ الترحيلات غير المطبقة بالترتيب، كل ترحيل في معاملة مستقلة. يرجع قائمة الإصدارات المنفذة"""
+    if bind is None:
+        from database.db_utils import engine as bind
+    with bind.begin() as conn:
+        done = applied_versions(conn)
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version in done:
+            continue
+        with bind.begin() as conn:
+            step(conn)
+            conn.execute(insert(SchemaMigration).values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        logger.info("تم تطبيق الترحيل %s", version)
+        applied.append(version)
+    return applied
+
+# التشغيل اليدوي من مجلد backend:  python -m database.migrations [--status]
+if __name__ == "__main__":
+    import sys
+    if "--status" in sys.argv:
+        pending = pending_migrations()
+        print("لا توجد ترحيلات معلقة" if not pending else "\n".join(f"{v}: {d}" for v, d in pending))
+    else:
+        applied = run_migrations()
+        print("تم تطبيق: " + ", ".join(applied) if applied else "القاعدة محدثة")
@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Text, Enum
+    Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Text, Enum, Index
 )
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
@@ -34,6 +34,15 @@ class AttachmentType(enum.Enum):
     general = "general"
 
 
+# ========== فهارس ==========
+# فهرس جزئي على الصفوف غير المحذوفة فقط (الحذف منطقي عبر is_deleted)
+def active_index(name, *columns, is_deleted):
+    return Index(name, *columns, sqlite_where=is_deleted == False, postgresql_where=is_deleted == False)
+
+# فهرس جزئي على مفتاح أجنبي أغلب قيمه NULL (مثل مرفقات الكيانات المختلفة)
+def not_null_index(name, column):
+    return Index(name, column, sqlite_where=column.isnot(None), postgresql_where=column.isnot(None))
+
 # ========== ORM MODELS ==========
 
 class Owner(Base):
@@ -52,6 +61,10 @@ class Owner(Base):
     units = relationship('Unit', back_populates='owner')
     attachments = relationship('Attachment', back_populates='owner')
 
+    __table_args__ = (
+        active_index('ix_owners_active', id, is_deleted=is_deleted),
+    )
+
 class Unit(Base):
     __tablename__ = 'units'
     id = Column(Integer, primary_key=True)
@@ -73,6 +86,11 @@ class Unit(Base):
     attachments = relationship('Attachment', back_populates='unit')
     contracts = relationship('Contract', back_populates='unit')
 
+    __table_args__ = (
+        active_index('ix_units_active', id, is_deleted=is_deleted),
+        active_index('ix_units_owner', owner_id, is_deleted=is_deleted),
+    )
+
 class Tenant(Base):
     __tablename__ = 'tenants'
     id = Column(Integer, primary_key=True)
@@ -91,6 +109,10 @@ class Tenant(Base):
     attachments = relationship('Attachment', back_populates='tenant')
     contracts = relationship('Contract', back_populates='tenant')
 
+    __table_args__ = (
+        active_index('ix_tenants_active', id, is_deleted=is_deleted),
+    )
+
 class Contract(Base):
     __tablename__ = 'contracts'
     id = Column(Integer, primary_key=True)
@@ -115,6 +137,15 @@ class Contract(Base):
     payments = relationship('Payment', back_populates='contract')
     invoices = relationship('Invoice', back_populates='contract',cascade="all, delete",passive_deletes=True)
 
+    __table_args__ = (
+        active_index('ix_contracts_active', id, is_deleted=is_deleted),
+        # check_contract_conflicts: نفس الوحدة + تداخل الفترة
+        active_index('ix_contracts_unit_period', unit_id, start_date, end_date, is_deleted=is_deleted),
+        active_index('ix_contracts_tenant', tenant_id, is_deleted=is_deleted),
+        # قواعد انتقال الحالة في notifications/scheduler.py (الحالة + تاريخ الانتهاء)
+        active_index('ix_contracts_status_end', status, end_date, is_deleted=is_deleted),
+    )
+
 class Payment(Base):
     __tablename__ = 'payments'
     id = Column(Integer, primary_key=True)
@@ -132,6 +163,14 @@ class Payment(Base):
     contract = relationship('Contract', back_populates='payments')
     invoice = relationship('Invoice', back_populates='payments')
 
+    __table_args__ = (
+        # check_payment_conflict + دفعات العقد
+        Index('ix_payments_contract_due', contract_id, due_date),
+        Index('ix_payments_invoice', invoice_id),
+        # ترتيب القائمة (due_date, id)
+        Index('ix_payments_due', due_date, id),
+    )
+
 class Invoice(Base):
     __tablename__ = 'invoices'
     id = Column(Integer, primary_key=True)
@@ -147,6 +186,14 @@ class Invoice(Base):
     contract = relationship('Contract', back_populates='invoices')
     payments = relationship('Payment', back_populates='invoice')
     attachments = relationship('Attachment', back_populates='invoice')
+
+    __table_args__ = (
+        # check_invoice_conflict + فواتير العقد
+        Index('ix_invoices_contract_date', contract_id, date_issued),
+        # ترتيب القائمة (date_issued, id) مع/بدون فلتر الحالة
+        Index('ix_invoices_date', date_issued, id),
+        Index('ix_invoices_status_date', status, date_issued),
+    )
     
 
 class Attachment(Base):
@@ -164,6 +211,10 @@ class Attachment(Base):
     invoice_id = Column(Integer, ForeignKey('invoices.id', ondelete="CASCADE"), nullable=True)
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime, default=func.now())
+    # محتوى الملف في مخزن المرفقات (utils/file_manager.py)؛ فارغة للمرفقات القديمة التي تحمل مساراً فقط
+    sha256 = Column(String(64), nullable=True)
+    size = Column(Integer, nullable=True)
+    content_type = Column(String(128), nullable=True)
 
     owner = relationship('Owner', back_populates='attachments')
     unit = relationship('Unit', back_populates='attachments')
@@ -171,6 +222,17 @@ class Attachment(Base):
     contract = relationship('Contract', back_populates='attachments')
     invoice = relationship('Invoice', back_populates='attachments')
 
+    __table_args__ = (
+        not_null_index('ix_attachments_owner', owner_id),
+        not_null_index('ix_attachments_unit', unit_id),
+        not_null_index('ix_attachments_tenant', tenant_id),
+        not_null_index('ix_attachments_contract', contract_id),
+        not_null_index('ix_attachments_invoice', invoice_id),
+        Index('ix_attachments_uploaded', uploaded_at, id),
+        # المرفقات بنفس المحتوى + تنظيف الملفات غير المستخدمة
+        not_null_index('ix_attachments_sha256', sha256),
+    )
+
 class AuditLog(Base):
     __tablename__ = 'auditlog'
     id = Column(Integer, primary_key=True)
@@ -181,6 +243,12 @@ class AuditLog(Base):
     details = Column(Text, nullable=True)
     timestamp = Column(DateTime, default=func.now())
 
+    __table_args__ = (
+        Index('ix_auditlog_timestamp', timestamp, id),
+        Index('ix_auditlog_table_row', table_name, row_id),
+        Index('ix_auditlog_user', user),
+    )
+
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True)
@@ -192,6 +260,71 @@ class User(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
 
+class DashboardCounter(Base):
+    __tablename__ = 'dashboard_counters'
+    metric = Column(String(64), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    amount = Column(Float, nullable=False, default=0.0)
+
+class DashboardBucket(Base):
+    __tablename__ = 'dashboard_buckets'
+    metric = Column(String(64), primary_key=True)
+    bucket_date = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    amount = Column(Float, nullable=False, default=0.0)
+
+class SchemaMigration(Base):
+    __tablename__ = 'schema_migrations'
+    version = Column(String(64), primary_key=True)
+    description = Column(String(256), nullable=True)
+    applied_at = Column(DateTime, default=func.now())
+
+class TableVersion(Base):
+    # عداد تغييرات لكل جدول يزيد مع كل commit يعدّل الجدول (utils/change_tracking.py)
+    __tablename__ = 'table_versions'
+    table_name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=func.now())
+
+class RowChange(Base):
+    # آخر إصدار عام (رمز التغيير) عدّل فيه كل صف؛ مصدر /sync/{entity}?since= (utils/change_tracking.py)
+    __tablename__ = 'row_changes'
+    table_name = Column(String(64), primary_key=True)
+    row_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    __table_args__ = (
+        Index("ix_row_changes_table_version", "table_name", "version"),
+    )
+
+class Notification(Base):
+    # إشعارات يولدها المجدول عند انتقال الحالات (notifications/notifier.py)
+    __tablename__ = 'notifications'
+    id = Column(Integer, primary_key=True)
+    rule = Column(String(64), nullable=False)
+    table_name = Column(String(64), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    message = Column(Text, nullable=False)
+    is_read = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index('ix_notifications_read', is_read, id),
+        Index('ix_notifications_table_row', table_name, row_id),
+    )
+
+class ScheduledJob(Base):
+    # حالة مهام المجدول محفوظة في القاعدة: موعد التشغيل التالي يبقى بعد إعادة التشغيل (notifications/scheduler.py)
+    __tablename__ = 'scheduled_jobs'
+    name = Column(String(64), primary_key=True)
+    interval_seconds = Column(Integer, nullable=False)
+    next_run_at = Column(DateTime, nullable=False)
+    last_run_at = Column(DateTime, nullable=True)
+    last_status = Column(String(16), nullable=True)   # ok | error
+    last_error = Column(Text, nullable=True)
+    last_result = Column(Text, nullable=True)         # JSON
+    run_count = Column(Integer, nullable=False, default=0)
+    locked_until = Column(DateTime, nullable=True)    # حجز التشغيل بين عدة workers
+
 # ========== Pydantic Schemas ==========
 
 from typing import List, Optional
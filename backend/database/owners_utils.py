@@ -1,8 +1,23 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload, raiseload
 from sqlalchemy.exc import SQLAlchemyError
 from database.models import Owner, Attachment, AttachmentType, AuditLog
+from database.search_utils import text_filter
+from database.pagination import keyset_page, cached_count, invalidate_count_cache, RowProfile, apply_profile
+from database.export_utils import export_select, export_to_string
 from datetime import datetime
-import csv, io, re
+from utils.audit_log import log_audit
+import re
+
+# ملفات التحميل المسبق للقوائم: "list" يحمل المرفقات دفعة واحدة ويمنع أي lazy load إضافي
+OWNER_LOAD_PROFILES = {
+    "plain": [],
+    "list": [selectinload(Owner.attachments), raiseload("*")],
+    # مسار JSON السريع: أعمدة القائمة فقط بترتيب OwnerOut (المرفقات باستعلام واحد لكل الصفحة)
+    "rows": RowProfile(
+        Owner.id, Owner.name, Owner.registration_number, Owner.nationality, Owner.iban,
+        Owner.agent_name, Owner.notes, Owner.created_at, Owner.updated_at,
+    ),
+}
 
 class OwnerNotFound(Exception): pass
 class OwnerExists(Exception): pass
@@ -35,7 +50,9 @@ def add_owner_with_attachments(
         notes=notes
     )
     db.add(new_owner)
+    log_audit(db, user="system", action="add", table_name="owners", row_id=new_owner, details=f"Add: {name}")
     db.commit()
+    invalidate_count_cache("owners")
     db.refresh(new_owner)
 
     # إضافة المرفقات إذا وجدت
@@ -62,7 +79,6 @@ def add_owner_with_attachments(
 
             )
 
-    log_audit(db, user="system", action="add", table_name="owners", row_id=new_owner.id, details=f"Add: {name}")
     return new_owner
 
 def add_owner(db: Session, name, registration_number, nationality, iban=None, agent_name=None, notes=None):
@@ -78,9 +94,10 @@ def add_owner(db: Session, name, registration_number, nationality, iban=None, ag
         notes=notes
     )
     db.add(new_owner)
+    log_audit(db, user="system", action="add", table_name="owners", row_id=new_owner, details=f"Add: {name}")
     db.commit()
+    invalidate_count_cache("owners")
     db.refresh(new_owner)
-    log_audit(db, user="system", action="add", table_name="owners", row_id=new_owner.id, details=f"Add: {name}")
     return new_owner
 
 def update_owner(db: Session, owner_id, **kwargs):
@@ -94,9 +111,9 @@ def update_owner(db: Session, owner_id, **kwargs):
             raise OwnerExists("رقم الهوية مستخدم سابقًا")
     for k, v in kwargs.items():
         setattr(owner, k, v)
+    log_audit(db, user="system", action="update", table_name="owners", row_id=owner.id, details=f"Update: {owner.name}")
     db.commit()
     db.refresh(owner)
-    log_audit(db, user="system", action="update", table_name="owners", row_id=owner.id, details=f"Update: {owner.name}")
     return owner
 
 def delete_owner(db: Session, owner_id):
@@ -104,8 +121,9 @@ def delete_owner(db: Session, owner_id):
     if not owner or owner.is_deleted:
         raise OwnerNotFound("المالك غير موجود أو محذوف")
     owner.is_deleted = True
-    db.commit()
     log_audit(db, user="system", action="delete", table_name="owners", row_id=owner.id, details=f"Delete: {owner.name}")
+    db.commit()
+    invalidate_count_cache("owners")
     return True
 
 def get_owner(db: Session, owner_id, attachment_type=None):
@@ -119,16 +137,23 @@ def get_owner(db: Session, owner_id, attachment_type=None):
         attachments = list(owner.attachments)
     return owner, attachments
 
-def list_owners(db: Session, page=1, per_page=20, filter_name=None, filter_registration_number=None, filter_nationality=None):
+def _filtered_owners_query(db: Session, filter_name=None, filter_registration_number=None, filter_nationality=None):
     query = db.query(Owner).filter_by(is_deleted=False)
     if filter_name:
-        query = query.filter(Owner.name.ilike(f"%{filter_name}%"))
+        query = query.filter(text_filter(db, "owners", Owner.name, filter_name))
     if filter_registration_number:
         query = query.filter(Owner.registration_number == filter_registration_number)
     if filter_nationality:
         query = query.filter(Owner.nationality.ilike(f"%{filter_nationality}%"))
+    return query
+
+def list_owners(db: Session, page=1, per_page=20, filter_name=None, filter_registration_number=None, filter_nationality=None, profile="list", cursor=None, keyset=False):
+    query = _filtered_owners_query(db, filter_name, filter_registration_number, filter_nationality)
+    # وضع المؤشر (Keyset): بدون COUNT وبدون OFFSET، يُفعّل عند طلبه فقط
+    if keyset or cursor:
+        return keyset_page(apply_profile(query, OWNER_LOAD_PROFILES[profile]), Owner.id, Owner.id, per_page, cursor)
     total = query.count()
-    owners = query.order_by(Owner.id.desc()).offset((page-1)*per_page).limit(per_page).all()
+    owners = apply_profile(query, OWNER_LOAD_PROFILES[profile]).order_by(Owner.id.desc()).offset((page-1)*per_page).limit(per_page).all()
     return {
         "total": total,
         "page": page,
@@ -136,48 +161,46 @@ def list_owners(db: Session, page=1, per_page=20, filter_name=None, filter_regis
         "data": owners
     }
 
+# عدد المالكين لشريط الصفحات (تقريبي ومخزن مؤقتاً، منفصل عن جلب الصفحة)
+def count_owners(db: Session, filter_name=None, filter_registration_number=None, filter_nationality=None):
+    query = _filtered_owners_query(db, filter_name, filter_registration_number, filter_nationality)
+    key = ("owners", filter_name or "", filter_registration_number or "", filter_nationality or "")
+    return cached_count(key, query)
+
 def attach_owner_file(db: Session, owner_id, filepath, filetype, attachment_type: AttachmentType, notes=None):
     owner = db.query(Owner).get(owner_id)
     if not owner or owner.is_deleted:
         raise OwnerNotFound("المالك غير موجود")
-    from database.attachments_utils import add_attachment
-    attachment = add_attachment(
-        db=db,
+    attachment = Attachment(
+        owner_id=owner_id,
         filepath=filepath,
         filetype=filetype,
         attachment_type=attachment_type,
-        owner_id=owner_id,
         notes=notes
     )
-    log_audit(db, user="system", action="attach", table_name="attachments", row_id=attachment.id, details=f"Attach {attachment_type} to owner {owner.name}")
+    db.add(attachment)
+    # سجل التدقيق في نفس المعاملة مع المرفق (commit واحد)
+    log_audit(db, user="system", action="attach", table_name="attachments", row_id=attachment, details=f"Attach {attachment_type.value} to owner {owner.name}")
+    db.commit()
+    db.refresh(attachment)
     return attachment
 
 def detach_owner_file(db: Session, attachment_id):
     from database.attachments_utils import delete_attachment
-    delete_attachment(db, attachment_id)
+    # يكتب هذا السجل مع commit دالة delete_attachment في نفس المعاملة
     log_audit(db, user="system", action="detach", table_name="attachments", row_id=attachment_id, details="Detach from owner")
+    delete_attachment(db, attachment_id)
     return True
 
+def export_owners_query():
+    return export_select([
+        ("id", Owner.id), ("name", Owner.name), ("registration_number", Owner.registration_number),
+        ("nationality", Owner.nationality), ("iban", Owner.iban), ("agent_name", Owner.agent_name),
+    ], Owner.is_deleted == False, order_by=Owner.id)
+
 def export_owners_to_csv(db: Session):
-    owners = db.query(Owner).filter_by(is_deleted=False).all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['id', 'name', 'registration_number', 'nationality', 'iban', 'agent_name'])
-    for o in owners:
-        writer.writerow([o.id, o.name, o.registration_number, o.nationality, o.iban or '', o.agent_name or ''])
-    return output.getvalue()
-
-def log_audit(db: Session, user: str, action: str, table_name: str, row_id: int, details: str = ""):
-    log = AuditLog(
-        user=user,
-        action=action,
-        table_name=table_name,
-        row_id=row_id,
-        details=details,
-        timestamp=datetime.utcnow()
-    )
-    db.add(log)
-    db.commit()
+    return export_to_string(db, *export_owners_query())
+
 
 # إضافة دالة تحويل كائن ORM مالك إلى سكيمة Pydantic مع المرفقات (مطلوب لـ app.py)
 from database.models import OwnerOut, AttachmentOut
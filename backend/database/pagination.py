@@ -0,0 +1,134 @@
+from sqlalchemy import or_, and_
+from datetime import date, datetime
+import base64, json, threading, time
+
+# استثناءات مخصصة
+class InvalidCursor(Exception): pass
+
+# ========== ترميز المؤشر (Cursor) ==========
+# المؤشر نص مُعتم (base64) يحمل قيمة مفتاح الترتيب ومعرف الصف واتجاه التصفح
+
+def _to_json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def _from_json_value(column, value):
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+def encode_cursor(sort_value, row_id, direction):
+    payload = json.dumps({"k": _to_json_value(sort_value), "i": row_id, "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, sort_col):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload["d"]
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return _from_json_value(sort_col, payload["k"]), int(payload["i"]), direction
+    except Exception:
+        raise InvalidCursor("مؤشر الصفحات غير صالح")
+
+# ========== ملفات التحميل (Load Profiles) ==========
+class RowProfile:
+    """
+    ملف تحميل بالأعمدة فقط: الاستعلام يرجع Row (tuple بأسماء الحقول) بدل كائنات ORM،
+    لمسار JSON السريع في القوائم الكبيرة. joins = [(الجدول، شرط الربط)] للأعمدة من جداول أخرى (LEFT JOIN).
+    """
+    def __init__(self, *columns, joins=()):
+        self.columns = columns
+        self.joins = joins
+
+    def apply(self, query):
+        query = query.with_entities(*self.columns)
+        for target, onclause in self.joins:
+            query = query.outerjoin(target, onclause)
+        return query
+
+def apply_profile(query, profile):
+    # profile: قائمة خيارات تحميل (selectinload ...) أو RowProfile
+    if isinstance(profile, RowProfile):
+        return profile.apply(query)
+    return query.options(*profile)
+
+# ========== تصفح بالمفاتيح (Keyset Pagination) ==========
+def keyset_page(query, sort_col, id_col, per_page, cursor=None):
+    """
+    يرجع صفحة مرتبة تنازلياً حسب (sort_col, id_col) بدون COUNT وبدون OFFSET.
+    الصفحة التالية/السابقة تُطلب بتمرير next_cursor/prev_cursor.
+    """
+    same_key = sort_col is id_col
+    direction = "next"
+    if cursor:
+        sort_value, row_id, direction = decode_cursor(cursor, sort_col)
+        if direction == "next":
+            cond = id_col < row_id if same_key else or_(sort_col < sort_value, and_(sort_col == sort_value, id_col < row_id))
+        else:
+            cond = id_col > row_id if same_key else or_(sort_col > sort_value, and_(sort_col == sort_value, id_col > row_id))
+        query = query.filter(cond)
+
+    if direction == "next":
+        order = [id_col.desc()] if same_key else [sort_col.desc(), id_col.desc()]
+    else:
+        order = [id_col.asc()] if same_key else [sort_col.asc(), id_col.asc()]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == "prev":
+        rows.reverse()
+
+    sort_attr, id_attr = sort_col.key, id_col.key
+    def cursor_for(row, d):
+        return encode_cursor(getattr(row, sort_attr), getattr(row, id_attr), d)
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if direction == "next":
+            next_cursor = cursor_for(rows[-1], "next") if has_more else None
+            prev_cursor = cursor_for(rows[0], "prev") if cursor else None
+        else:
+            next_cursor = cursor_for(rows[-1], "next")
+            prev_cursor = cursor_for(rows[0], "prev") if has_more else None
+    return {
+        "per_page": per_page,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+        "data": rows
+    }
+
+# ========== عدّ تقريبي مع كاش ==========
+# العدد يُحسب مرة كل COUNT_CACHE_TTL ثانية لكل مجموعة فلاتر، وقد يتأخر قليلاً عن الواقع
+COUNT_CACHE_TTL = 30
+_count_cache = {}
+_count_lock = threading.Lock()
+
+def cached_count(key, query, ttl=COUNT_CACHE_TTL):
+    now = time.monotonic()
+    with _count_lock:
+        hit = _count_cache.get(key)
+        if hit and now - hit[1] < ttl:
+            return {"total": hit[0], "approximate": True, "age_seconds": round(now - hit[1], 1)}
+    total = query.count()
+    with _count_lock:
+        _count_cache[key] = (total, now)
+    return {"total": total, "approximate": False, "age_seconds": 0.0}
+
+def invalidate_count_cache(prefix=None):
+    with _count_lock:
+        if prefix is None:
+            _count_cache.clear()
+        else:
+            for key in [k for k in _count_cache if k[0] == prefix]:
+                del _count_cache[key]
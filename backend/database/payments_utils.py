@@ -1,8 +1,12 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from sqlalchemy.exc import SQLAlchemyError
 from database.models import Payment, Contract, Invoice, AuditLog, InvoiceStatus
+from database.dashboard_utils import apply_dashboard_change, invoice_contributions, payment_contributions
+from database.pagination import keyset_page
+from database.export_utils import export_select, export_to_string
 from datetime import datetime
-import csv, io
+from utils.audit_log import log_audit
 
 # استثناءات مخصصة
 class PaymentNotFound(Exception): pass
@@ -47,19 +51,22 @@ def add_payment(db: Session, contract_id, invoice_id, due_date, amount_due, amou
         notes=notes
     )
     db.add(payment)
-    db.commit()
-    db.refresh(payment)
+    apply_dashboard_change(db, [], payment_contributions(payment))
+    db.flush()
 
-    # تحديث حالة الفاتورة تلقائياً
+    # تحديث حالة الفاتورة تلقائياً (في نفس المعاملة)
+    before = invoice_contributions(invoice)
     total_paid = sum(p.amount_paid or 0 for p in invoice.payments)
     if total_paid >= invoice.amount:
         invoice.status = InvoiceStatus.paid
     else:
         invoice.status = InvoiceStatus.unpaid
-    db.commit()
+    apply_dashboard_change(db, before, invoice_contributions(invoice))
 
     log_audit(db, user="system", action="add", table_name="payments", row_id=payment.id,
               details=f"Add: contract_id={contract_id}, invoice_id={invoice_id}, due={due_date}")
+    db.commit()
+    db.refresh(payment)
     return payment
 
 # تعديل دفعة
@@ -74,22 +81,26 @@ def update_payment(db: Session, payment_id, **kwargs):
         validate_contract(db, contract_id)
         check_payment_conflict(db, contract_id, due_date, exclude_payment_id=payment_id)
 
+    before = payment_contributions(payment)
     for k, v in kwargs.items():
         setattr(payment, k, v)
-    db.commit()
-    db.refresh(payment)
+    apply_dashboard_change(db, before, payment_contributions(payment))
+    db.flush()
     # تحديث حالة الفاتورة المرتبطة (لو كان هناك تغيير)
     if payment.invoice_id:
         invoice = db.query(Invoice).get(payment.invoice_id)
         if invoice:
+            before = invoice_contributions(invoice)
             total_paid = sum(p.amount_paid or 0 for p in invoice.payments)
             if total_paid >= invoice.amount:
                 invoice.status = InvoiceStatus.paid
             else:
                 invoice.status = InvoiceStatus.unpaid
-            db.commit()
+            apply_dashboard_change(db, before, invoice_contributions(invoice))
 
     log_audit(db, user="system", action="update", table_name="payments", row_id=payment.id, details="Update payment")
+    db.commit()
+    db.refresh(payment)
     return payment
 
 # حذف دفعة
@@ -98,20 +109,23 @@ def delete_payment(db: Session, payment_id):
     if not payment:
         raise PaymentNotFound("الدفعة غير موجودة")
     invoice_id = payment.invoice_id
+    apply_dashboard_change(db, payment_contributions(payment), [])
     db.delete(payment)
-    db.commit()
+    db.flush()
     # تحديث حالة الفاتورة (بعد الحذف)
     if invoice_id:
         invoice = db.query(Invoice).get(invoice_id)
         if invoice:
+            before = invoice_contributions(invoice)
             total_paid = sum(p.amount_paid or 0 for p in invoice.payments)
             if total_paid >= invoice.amount:
                 invoice.status = InvoiceStatus.paid
             else:
                 invoice.status = InvoiceStatus.unpaid
-            db.commit()
+            apply_dashboard_change(db, before, invoice_contributions(invoice))
 
     log_audit(db, user="system", action="delete", table_name="payments", row_id=payment_id, details="Delete payment")
+    db.commit()
     return True
 
 # جلب دفعة واحدة
@@ -122,7 +136,7 @@ def get_payment(db: Session, payment_id):
     return payment
 
 # قائمة الدفعات مع Pagination وFiltering
-def list_payments(db: Session, page=1, per_page=20, filter_contract_id=None, filter_invoice_id=None, filter_is_late=None):
+def list_payments(db: Session, page=1, per_page=20, filter_contract_id=None, filter_invoice_id=None, filter_is_late=None, cursor=None, keyset=False):
     query = db.query(Payment)
     if filter_contract_id:
         query = query.filter(Payment.contract_id == filter_contract_id)
@@ -131,6 +145,9 @@ def list_payments(db: Session, page=1, per_page=20, filter_contract_id=None, fil
     if filter_is_late is not None:
         query = query.filter(Payment.is_late == filter_is_late)
 
+    # وضع المؤشر (Keyset): بدون COUNT وبدون OFFSET، يُفعّل عند طلبه فقط
+    if keyset or cursor:
+        return keyset_page(query, Payment.due_date, Payment.id, per_page, cursor)
     total = query.count()
     payments = query.order_by(Payment.due_date.desc()).offset((page-1)*per_page).limit(per_page).all()
     return {
@@ -141,34 +158,13 @@ def list_payments(db: Session, page=1, per_page=20, filter_contract_id=None, fil
     }
 
 # تصدير الدفعات إلى CSV
+def export_payments_query():
+    return export_select([
+        ("id", Payment.id), ("contract_id", Payment.contract_id), ("invoice_id", Payment.invoice_id),
+        ("due_date", Payment.due_date), ("amount_due", Payment.amount_due),
+        ("amount_paid", func.coalesce(Payment.amount_paid, 0)), ("paid_on", Payment.paid_on),
+        ("is_late", Payment.is_late), ("notes", Payment.notes),
+    ], order_by=Payment.id)
+
 def export_payments_to_csv(db: Session):
-    payments = db.query(Payment).all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['id', 'contract_id', 'invoice_id', 'due_date', 'amount_due', 'amount_paid', 'paid_on', 'is_late', 'notes'])
-    for p in payments:
-        writer.writerow([
-            p.id,
-            p.contract_id,
-            p.invoice_id,
-            p.due_date,
-            p.amount_due,
-            p.amount_paid or 0,
-            p.paid_on or '',
-            p.is_late if p.is_late else '',
-            p.notes or ''
-        ])
-    return output.getvalue()
-
-# سجل تدقيق
-def log_audit(db: Session, user: str, action: str, table_name: str, row_id: int, details: str = ""):
-    log = AuditLog(
-        user=user,
-        action=action,
-        table_name=table_name,
-        row_id=row_id,
-        details=details,
-        timestamp=datetime.utcnow()
-    )
-    db.add(log)
-    db.commit()
+    return export_to_string(db, *export_payments_query())
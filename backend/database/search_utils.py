@@ -0,0 +1,187 @@
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session
+from database.models import Owner, Tenant, Unit, Contract
+import re
+import weakref
+
+# ========== البحث النصي الكامل (FTS5) ==========
+# جدول افتراضي واحد search_index لكل الكيانات القابلة للبحث، النص فيه مُطبّع (normalize_arabic)
+# ويُحدّث داخل نفس المعاملة عبر أحداث الجلسة (after_flush). متاح على SQLite فقط؛
+# على القواعد الأخرى يرجع البحث إلى ilike.
+
+SEARCH_TABLE = "search_index"
+SEARCH_LIMIT = 20
+
+# ========== تطبيع النص العربي ==========
+_DIACRITICS = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")  # التشكيل والتطويل
+_ARABIC_MAP = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ة": "ه",
+    "ى": "ي",
+})
+
+def normalize_arabic(value):
+    """يوحد أشكال الألف والتاء المربوطة والألف المقصورة ويحذف التشكيل، ويحول اللاتيني لأحرف صغيرة"""
+    if not value:
+        return ""
+    return _DIACRITICS.sub("", str(value)).translate(_ARABIC_MAP).lower()
+
+# ========== مستندات البحث لكل كيان ==========
+# entity -> (النموذج، عمود العنوان، دالة ترجع (العنوان، باقي الحقول))
+def _owner_document(o):
+    return o.name, [o.registration_number, o.nationality, o.agent_name]
+
+def _tenant_document(t):
+    return t.name, [t.national_id, t.phone, t.email, t.nationality]
+
+def _unit_document(u):
+    return u.unit_number, [u.unit_type, u.location, u.building_name]
+
+def _contract_document(c):
+    return c.contract_number, [c.rental_platform, c.payment_type]
+
+SEARCH_ENTITIES = {
+    "owners": (Owner, Owner.name, _owner_document),
+    "tenants": (Tenant, Tenant.name, _tenant_document),
+    "units": (Unit, Unit.unit_number, _unit_document),
+    "contracts": (Contract, Contract.contract_number, _contract_document),
+}
+_ENTITY_BY_MODEL = {model: entity for entity, (model, _, _) in SEARCH_ENTITIES.items()}
+
+def _document_row(entity, obj):
+    title, fields = SEARCH_ENTITIES[entity][2](obj)
+    return {
+        "entity": entity,
+        "row_id": obj.id,
+        "title": normalize_arabic(title),
+        "body": normalize_arabic(" ".join(str(f) for f in fields if f)),
+        "label": title or "",
+    }
+
+# ========== إنشاء الجدول وإعادة البناء ==========
+_enabled = weakref.WeakKeyDictionary()
+
+def search_available(bind):
+    # الجدول موجود؟ (يُحفظ لكل محرك لتجنب الاستعلام في كل flush)
+    engine = getattr(bind, "engine", bind)
+    if engine not in _enabled:
+        if engine.dialect.name != "sqlite":
+            _enabled[engine] = False
+        elif bind is engine:
+            with engine.connect() as conn:
+                _enabled[engine] = engine.dialect.has_table(conn, SEARCH_TABLE)
+        else:
+            _enabled[engine] = engine.dialect.has_table(bind, SEARCH_TABLE)
+    return _enabled[engine]
+
+def create_search_index(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        "entity UNINDEXED, row_id UNINDEXED, label UNINDEXED, title, body, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+    _enabled.pop(conn.engine, None)
+    rebuild_search_index(conn)
+
+def rebuild_search_index(conn):
+    """يعيد بناء الفهرس كاملاً من الجداول (بعد استيراد جماعي بدون ORM مثلاً)"""
+    conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    for entity, (model, _, _) in SEARCH_ENTITIES.items():
+        result = conn.execute(select(model.__table__).where(model.__table__.c.is_deleted == False))
+        rows = [_document_row(entity, row) for row in result]
+        if rows:
+            conn.execute(_insert_sql(), rows)
+
+def _insert_sql():
+    return text(f"INSERT INTO {SEARCH_TABLE} (entity, row_id, label, title, body) VALUES (:entity, :row_id, :label, :title, :body)")
+
+def _delete_sql():
+    return text(f"DELETE FROM {SEARCH_TABLE} WHERE entity = :entity AND row_id = :row_id")
+
+def index_rows(db: Session, entity, rows):
+    """
+    يضيف مستندات صفوف أُدرجت بدون ORM (insert جماعي لا يمر بـ after_flush).
+    rows: كائنات أو SimpleNamespace بحقول الكيان و id.
+    """
+    conn = db.connection()
+    if rows and search_available(conn):
+        conn.execute(_insert_sql(), [_document_row(entity, row) for row in rows])
+
+# ========== المزامنة مع التعديلات ==========
+@event.listens_for(Session, "after_flush")
+def _sync_search_index(session, flush_context):
+    changed = [o for o in list(session.new) + list(session.dirty) if type(o) in _ENTITY_BY_MODEL]
+    deleted = [o for o in session.deleted if type(o) in _ENTITY_BY_MODEL]
+    if not changed and not deleted:
+        return
+    conn = session.connection()
+    if not search_available(conn):
+        return
+    removals, additions = [], []
+    for obj in changed + deleted:
+        entity = _ENTITY_BY_MODEL[type(obj)]
+        removals.append({"entity": entity, "row_id": obj.id})
+        if obj not in deleted and not obj.is_deleted:
+            additions.append(_document_row(entity, obj))
+    conn.execute(_delete_sql(), removals)
+    if additions:
+        conn.execute(_insert_sql(), additions)
+
+# ========== البحث ==========
+def match_expression(term, column=None):
+    """
+    يحول نص المستخدم إلى تعبير MATCH: كل كلمة كبادئة (prefix) والكلمات مربوطة بـ AND.
+    يرجع None إذا لم يبق شيء بعد التطبيع.
+    """
+    tokens = re.findall(r"\w+", normalize_arabic(term))
+    if not tokens:
+        return None
+    expression = " AND ".join(f'"{token}"*' for token in tokens)
+    return f"{column} : ({expression})" if column else expression
+
+def search_ids_subquery(entity, term, column=None):
+    # row_id المطابقة ككائن select لاستخدامه داخل IN (...)
+    return text(
+        f"SELECT row_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match AND entity = :entity"
+    ).bindparams(match=match_expression(term, column), entity=entity).columns(row_id=None)
+
+def text_filter(db: Session, entity, column, term, search_column="title"):
+    """
+    شرط فلترة نصي: عبر فهرس FTS إذا كان متاحاً، وإلا ilike('%term%') كما كان.
+    column عمود ilike البديل (مثل Owner.name).
+    """
+    model = SEARCH_ENTITIES[entity][0]
+    if search_available(db.get_bind()) and match_expression(term):
+        return model.id.in_(search_ids_subquery(entity, term, search_column))
+    return column.ilike(f"%{term}%")
+
+def search(db: Session, term, entities=None, limit=SEARCH_LIMIT):
+    """بحث موحد مرتب حسب الصلة (bm25). يرجع [{entity, id, label, rank}]"""
+    entities = [e for e in (entities or SEARCH_ENTITIES) if e in SEARCH_ENTITIES]
+    match = match_expression(term)
+    if not match or not entities:
+        return []
+
+    if not search_available(db.get_bind()):
+        return _fallback_search(db, term, entities, limit)
+
+    placeholders = ", ".join(f":e{i}" for i in range(len(entities)))
+    params = {f"e{i}": e for i, e in enumerate(entities)}
+    params.update(match=match, limit=limit)
+    rows = db.execute(text(
+        f"SELECT entity, row_id, label, bm25({SEARCH_TABLE}, 0.0, 0.0, 0.0, 10.0, 1.0) AS score FROM {SEARCH_TABLE} "
+        f"WHERE {SEARCH_TABLE} MATCH :match AND entity IN ({placeholders}) "
+        "ORDER BY score LIMIT :limit"
+    ), params)
+    return [{"entity": r.entity, "id": r.row_id, "label": r.label, "rank": round(-r.score, 6)} for r in rows]
+
+def _fallback_search(db: Session, term, entities, limit):
+    # القواعد بدون FTS5: ilike على حقل العنوان لكل كيان (بدون ترتيب حسب الصلة)
+    results = []
+    for entity in entities:
+        model, title_column, document = SEARCH_ENTITIES[entity]
+        query = db.query(model).filter(model.is_deleted == False, title_column.ilike(f"%{term}%")).limit(limit)
+        results.extend({"entity": entity, "id": obj.id, "label": document(obj)[0], "rank": 0.0} for obj in query)
+    return results[:limit]
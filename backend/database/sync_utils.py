@@ -0,0 +1,65 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database.models import Owner, Unit, Tenant, RowChange
+from database.owners_utils import OWNER_LOAD_PROFILES
+from database.units_utils import UNIT_LOAD_PROFILES
+from database.tenants_utils import TENANT_LOAD_PROFILES
+from utils.change_tracking import current_token
+
+# استثناءات مخصصة
+class InvalidSyncToken(Exception): pass
+class UnknownSyncEntity(Exception): pass
+
+# ========== المزامنة التزايدية (Delta Sync) ==========
+# العميل يحفظ رمز التغيير (token) من آخر مزامنة ويطلب ما تغير بعده فقط:
+# الصفوف المعدلة أو المضافة كاملة، ومعرفات الصفوف المحذوفة (منطقياً أو فعلياً).
+# الرمز هو العداد العام في table_versions، وكل صف معدل يُسجل في row_changes بالرمز الذي عدّله.
+
+SYNC_LIMIT = 1000  # أكثر من هذا: الأسرع إعادة تحميل القائمة كاملة (reset)
+
+# model، ملف التحميل، والعلاقات المعروضة: (عمود المفتاح الأجنبي، الجدول) -- تغير اسم المالك يغير تمثيل الوحدة
+SYNC_ENTITIES = {
+    "owners": (Owner, OWNER_LOAD_PROFILES["list"], ()),
+    "units": (Unit, UNIT_LOAD_PROFILES["list"], ((Unit.owner_id, "owners"),)),
+    "tenants": (Tenant, TENANT_LOAD_PROFILES["list"], ()),
+}
+
+def parse_token(value):
+    try:
+        token = int(value)
+    except (TypeError, ValueError):
+        raise InvalidSyncToken("رمز المزامنة غير صالح")
+    if token < 0:
+        raise InvalidSyncToken("رمز المزامنة غير صالح")
+    return token
+
+def _changed_ids(table, since):
+    return select(RowChange.row_id).where(RowChange.table_name == table, RowChange.version > since)
+
+def changes_since(db: Session, entity, since, limit=SYNC_LIMIT):
+    """
+    التغييرات على entity بعد الرمز since:
+    {"token", "changed": [ORM], "deleted": [ids], "reset": bool}
+    reset=True يعني أن على العميل إعادة التحميل الكامل (رمز من قاعدة أخرى/مستعادة، أو تغييرات كثيرة).
+    """
+    if entity not in SYNC_ENTITIES:
+        raise UnknownSyncEntity(f"لا توجد مزامنة للكيان {entity}")
+    model, load_options, relations = SYNC_ENTITIES[entity]
+    # الرمز يُقرأ أولاً: ما يُعدّل أثناء الاستعلام يرجع مرة أخرى في المزامنة التالية (تكرار آمن، لا فقدان)
+    token = current_token(db)
+    if since > token:
+        return {"token": token, "changed": [], "deleted": [], "reset": True}
+
+    ids = set(db.execute(_changed_ids(model.__tablename__, since).limit(limit + 1)).scalars())
+    for fk_column, table in relations:
+        ids.update(db.execute(
+            select(model.id).where(fk_column.in_(_changed_ids(table, since))).limit(limit + 1)
+        ).scalars())
+    if len(ids) > limit:
+        return {"token": token, "changed": [], "deleted": [], "reset": True}
+
+    rows = db.query(model).options(*load_options).filter(model.id.in_(ids)).order_by(model.id.desc()).all() if ids else []
+    changed = [r for r in rows if not r.is_deleted]
+    # الصفوف المحذوفة منطقياً أو التي لم تعد موجودة
+    deleted = sorted(ids - {r.id for r in changed})
+    return {"token": token, "changed": changed, "deleted": deleted, "reset": False}
@@ -1,8 +1,23 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload, raiseload
 from sqlalchemy.exc import SQLAlchemyError
 from database.models import Tenant, Attachment, AttachmentType, AuditLog
+from database.search_utils import text_filter
+from database.pagination import keyset_page, RowProfile, apply_profile
+from database.export_utils import export_select, export_to_string
 from datetime import datetime
-import csv, io, re
+from utils.audit_log import log_audit
+import re
+
+# ملفات التحميل المسبق للقوائم: "list" يحمل المرفقات دفعة واحدة ويمنع أي lazy load إضافي
+TENANT_LOAD_PROFILES = {
+    "plain": [],
+    "list": [selectinload(Tenant.attachments), raiseload("*")],
+    # مسار JSON السريع: أعمدة TenantOut فقط
+    "rows": RowProfile(
+        Tenant.id, Tenant.name, Tenant.national_id, Tenant.phone, Tenant.nationality, Tenant.email,
+        Tenant.address, Tenant.work, Tenant.notes, Tenant.created_at, Tenant.updated_at,
+    ),
+}
 
 # استثناءات مخصصة
 class TenantNotFound(Exception): pass
@@ -54,8 +69,7 @@ def add_tenant(
         notes=notes
     )
     db.add(new_tenant)
-    db.commit()
-    db.refresh(new_tenant)
+    db.flush()
 
     # تعديل المرفقات المؤقتة لربطها بالـ tenant الجديد
     if attachments:
@@ -63,9 +77,10 @@ def add_tenant(
             att = db.query(Attachment).get(att_id)
             if att and att.tenant_id in (None, 0):
                 att.tenant_id = new_tenant.id
-        db.commit()
 
     log_audit(db, user="system", action="add", table_name="tenants", row_id=new_tenant.id, details=f"Add: {name}")
+    db.commit()
+    db.refresh(new_tenant)
     return new_tenant
 
 # تعديل مستأجر
@@ -117,8 +132,8 @@ def delete_tenant(db: Session, tenant_id):
     if not tenant or tenant.is_deleted:
         raise TenantNotFound("المستأجر غير موجود أو محذوف")
     tenant.is_deleted = True
-    db.commit()
     log_audit(db, user="system", action="delete", table_name="tenants", row_id=tenant.id, details=f"Delete: {tenant.name}")
+    db.commit()
     return True
 
 # جلب مستأجر ومرفقاته حسب النوع
@@ -132,16 +147,19 @@ def get_tenant(db: Session, tenant_id, attachment_type=None):
     return tenant, attachments
 
 # قائمة المستأجرين مع Pagination وFiltering
-def list_tenants(db: Session, page=1, per_page=20, filter_name=None, filter_national_id=None, filter_phone=None):
+def list_tenants(db: Session, page=1, per_page=20, filter_name=None, filter_national_id=None, filter_phone=None, profile="list", cursor=None, keyset=False):
     query = db.query(Tenant).filter_by(is_deleted=False)
     if filter_name:
-        query = query.filter(Tenant.name.ilike(f"%{filter_name}%"))
+        query = query.filter(text_filter(db, "tenants", Tenant.name, filter_name))
     if filter_national_id:
         query = query.filter(Tenant.national_id == filter_national_id)
     if filter_phone:
         query = query.filter(Tenant.phone == filter_phone)
+    # وضع المؤشر (Keyset): بدون COUNT وبدون OFFSET، يُفعّل عند طلبه فقط
+    if keyset or cursor:
+        return keyset_page(apply_profile(query, TENANT_LOAD_PROFILES[profile]), Tenant.id, Tenant.id, per_page, cursor)
     total = query.count()
-    tenants = query.order_by(Tenant.id.desc()).offset((page-1)*per_page).limit(per_page).all()
+    tenants = apply_profile(query, TENANT_LOAD_PROFILES[profile]).order_by(Tenant.id.desc()).offset((page-1)*per_page).limit(per_page).all()
     return {
         "total": total,
         "page": page,
@@ -162,9 +180,9 @@ def attach_tenant_file(db: Session, tenant_id, filepath, filetype, attachment_ty
         notes=notes
     )
     db.add(attachment)
+    log_audit(db, user="system", action="attach", table_name="attachments", row_id=attachment, details=f"Attach {attachment_type.value} to tenant {tenant.name}")
     db.commit()
     db.refresh(attachment)
-    log_audit(db, user="system", action="attach", table_name="attachments", row_id=attachment.id, details=f"Attach {attachment_type.value} to tenant {tenant.name}")
     return attachment
 
 def detach_tenant_file(db: Session, attachment_id):
@@ -172,29 +190,16 @@ def detach_tenant_file(db: Session, attachment_id):
     if not att or not att.tenant_id:
         raise TenantNotFound("المرفق غير موجود أو غير مرتبط بمستأجر")
     db.delete(att)
-    db.commit()
     log_audit(db, user="system", action="detach", table_name="attachments", row_id=attachment_id, details="Detach from tenant")
+    db.commit()
     return True
 
 # تصدير المستأجرين إلى CSV
+def export_tenants_query():
+    return export_select([
+        ("id", Tenant.id), ("name", Tenant.name), ("national_id", Tenant.national_id), ("phone", Tenant.phone),
+        ("nationality", Tenant.nationality), ("email", Tenant.email), ("address", Tenant.address), ("work", Tenant.work),
+    ], Tenant.is_deleted == False, order_by=Tenant.id)
+
 def export_tenants_to_csv(db: Session):
-    tenants = db.query(Tenant).filter_by(is_deleted=False).all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['id', 'name', 'national_id', 'phone', 'nationality', 'email', 'address', 'work'])
-    for t in tenants:
-        writer.writerow([t.id, t.name, t.national_id, t.phone, t.nationality, t.email or '', t.address or '', t.work or ''])
-    return output.getvalue()
-
-# سجل تدقيق
-def log_audit(db: Session, user: str, action: str, table_name: str, row_id: int, details: str = ""):
-    log = AuditLog(
-        user=user,
-        action=action,
-        table_name=table_name,
-        row_id=row_id,
-        details=details,
-        timestamp=datetime.utcnow()
-    )
-    db.add(log)
-    db.commit()
+    return export_to_string(db, *export_tenants_query())
@@ -1,14 +1,32 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload, raiseload
 from sqlalchemy.exc import SQLAlchemyError
 from database.models import Unit, Owner, Attachment, AttachmentType, AuditLog, UnitStatus
+from database.dashboard_utils import apply_dashboard_change, unit_contributions
+from database.search_utils import text_filter
+from database.pagination import keyset_page, RowProfile, apply_profile
+from database.export_utils import export_select, export_to_string
 from datetime import datetime
-import csv, io, re
+from utils.audit_log import log_audit
+import re
 
 # استثناءات مخصصة
 class UnitNotFound(Exception): pass
 class UnitExists(Exception): pass
 class ValidationError(Exception): pass
 
+# ملفات التحميل المسبق للقوائم: "list" يحمل كل ما يحتاجه unit_to_schema ويمنع أي lazy load إضافي
+UNIT_LOAD_PROFILES = {
+    "plain": [],
+    "list": [joinedload(Unit.owner), selectinload(Unit.attachments), raiseload("*")],
+    # مسار JSON السريع: أعمدة UnitOut مع اسم المالك (LEFT JOIN) بدون كائنات ORM
+    "rows": RowProfile(
+        Unit.id, Unit.unit_number, Unit.unit_type, Unit.rooms, Unit.area, Unit.location, Unit.status,
+        Unit.owner_id, Owner.name.label("owner_name"), Unit.building_name, Unit.floor_number, Unit.notes,
+        Unit.created_at, Unit.updated_at,
+        joins=[(Owner, Unit.owner_id == Owner.id)],
+    ),
+}
+
 # تحقق من صحة رقم الوحدة (مثال)
 def validate_unit_number(unit_number: str):
     if not unit_number or not unit_number.strip():
@@ -37,9 +55,10 @@ def add_unit(db: Session, unit_number, unit_type, rooms, area, location, status,
         owner_id=owner_id
     )
     db.add(new_unit)
+    apply_dashboard_change(db, [], unit_contributions(new_unit))
+    log_audit(db, user="system", action="add", table_name="units", row_id=new_unit, details=f"Add: {unit_number}")
     db.commit()
     db.refresh(new_unit)
-    log_audit(db, user="system", action="add", table_name="units", row_id=new_unit.id, details=f"Add: {unit_number}")
     return new_unit
 
 # تعديل وحدة سكنية
@@ -55,11 +74,13 @@ def update_unit(db: Session, unit_id, **kwargs):
     if "owner_id" in kwargs:
         if not db.query(Owner).filter_by(id=kwargs["owner_id"], is_deleted=False).first():
             raise ValidationError("المالك غير موجود")
+    before = unit_contributions(unit)
     for k, v in kwargs.items():
         setattr(unit, k, v)
+    apply_dashboard_change(db, before, unit_contributions(unit))
+    log_audit(db, user="system", action="update", table_name="units", row_id=unit.id, details=f"Update: {unit.unit_number}")
     db.commit()
     db.refresh(unit)
-    log_audit(db, user="system", action="update", table_name="units", row_id=unit.id, details=f"Update: {unit.unit_number}")
     return unit
 
 # حذف منطقي
@@ -67,9 +88,11 @@ def delete_unit(db: Session, unit_id):
     unit = db.query(Unit).get(unit_id)
     if not unit or unit.is_deleted:
         raise UnitNotFound("الوحدة غير موجودة أو محذوفة")
+    before = unit_contributions(unit)
     unit.is_deleted = True
-    db.commit()
+    apply_dashboard_change(db, before, [])
     log_audit(db, user="system", action="delete", table_name="units", row_id=unit.id, details=f"Delete: {unit.unit_number}")
+    db.commit()
     return True
 
 # جلب وحدة واحدة (مع إمكانية جلب المرفقات)
@@ -83,16 +106,19 @@ def get_unit(db: Session, unit_id, attachment_type=None):
     return unit, attachments
 
 # قائمة الوحدات مع Pagination وFiltering
-def list_units(db: Session, page=1, per_page=20, filter_unit_number=None, filter_owner_id=None, filter_status=None):
+def list_units(db: Session, page=1, per_page=20, filter_unit_number=None, filter_owner_id=None, filter_status=None, profile="list", cursor=None, keyset=False):
     query = db.query(Unit).filter_by(is_deleted=False)
     if filter_unit_number:
-        query = query.filter(Unit.unit_number.ilike(f"%{filter_unit_number}%"))
+        query = query.filter(text_filter(db, "units", Unit.unit_number, filter_unit_number))
     if filter_owner_id:
         query = query.filter(Unit.owner_id == filter_owner_id)
     if filter_status:
         query = query.filter(Unit.status == filter_status)
+    # وضع المؤشر (Keyset): بدون COUNT وبدون OFFSET، يُفعّل عند طلبه فقط
+    if keyset or cursor:
+        return keyset_page(apply_profile(query, UNIT_LOAD_PROFILES[profile]), Unit.id, Unit.id, per_page, cursor)
     total = query.count()
-    units = query.order_by(Unit.id.desc()).offset((page-1)*per_page).limit(per_page).all()
+    units = apply_profile(query, UNIT_LOAD_PROFILES[profile]).order_by(Unit.id.desc()).offset((page-1)*per_page).limit(per_page).all()
     return {
         "total": total,
         "page": page,
@@ -113,9 +139,9 @@ def attach_unit_file(db: Session, unit_id, filepath, filetype, attachment_type:
         notes=notes
     )
     db.add(attachment)
+    log_audit(db, user="system", action="attach", table_name="attachments", row_id=attachment, details=f"Attach {attachment_type.value} to unit {unit.unit_number}")
     db.commit()
     db.refresh(attachment)
-    log_audit(db, user="system", action="attach", table_name="attachments", row_id=attachment.id, details=f"Attach {attachment_type.value} to unit {unit.unit_number}")
     return attachment
 
 def detach_unit_file(db: Session, attachment_id):
@@ -123,29 +149,16 @@ def detach_unit_file(db: Session, attachment_id):
     if not att or not att.unit_id:
         raise UnitNotFound("المرفق غير موجود أو غير مرتبط بوحدة")
     db.delete(att)
-    db.commit()
     log_audit(db, user="system", action="detach", table_name="attachments", row_id=attachment_id, details="Detach from unit")
+    db.commit()
     return True
 
 # تصدير الوحدات إلى CSV
-def export_units_to_csv(db: Session):
-    units = db.query(Unit).filter_by(is_deleted=False).all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['id', 'unit_number', 'unit_type', 'rooms', 'area', 'location', 'status', 'owner_id'])
-    for u in units:
-        writer.writerow([u.id, u.unit_number, u.unit_type, u.rooms, u.area, u.location, u.status.value, u.owner_id])
-    return output.getvalue()
+def export_units_query():
+    return export_select([
+        ("id", Unit.id), ("unit_number", Unit.unit_number), ("unit_type", Unit.unit_type), ("rooms", Unit.rooms),
+        ("area", Unit.area), ("location", Unit.location), ("status", Unit.status), ("owner_id", Unit.owner_id),
+    ], Unit.is_deleted == False, order_by=Unit.id)
 
-# Hook التدقيق
-def log_audit(db: Session, user: str, action: str, table_name: str, row_id: int, details: str = ""):
-    log = AuditLog(
-        user=user,
-        action=action,
-        table_name=table_name,
-        row_id=row_id,
-        details=details,
-        timestamp=datetime.utcnow()
-    )
-    db.add(log)
-    db.commit()
+def export_units_to_csv(db: Session):
+    return export_to_string(db, *export_units_query())
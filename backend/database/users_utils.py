@@ -1,8 +1,9 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from database.models import User, UserRole, AuditLog
+from database.export_utils import export_select, export_to_string
 from datetime import datetime
-import csv, io
+from utils.audit_log import log_audit
 import re
 
 # استثناءات مخصصة
@@ -33,9 +34,9 @@ def add_user(db: Session, username, password_hash, role, is_active=True, last_lo
         last_login=last_login
     )
     db.add(new_user)
+    log_audit(db, user=username, action="add", table_name="users", row_id=new_user, details="Create user")
     db.commit()
     db.refresh(new_user)
-    log_audit(db, user=username, action="add", table_name="users", row_id=new_user.id, details="Create user")
     return new_user
 
 # تعديل مستخدم
@@ -53,9 +54,9 @@ def update_user(db: Session, user_id, **kwargs):
         kwargs["role"] = UserRole[kwargs["role"]]
     for k, v in kwargs.items():
         setattr(user, k, v)
+    log_audit(db, user=user.username, action="update", table_name="users", row_id=user.id, details="Update user")
     db.commit()
     db.refresh(user)
-    log_audit(db, user=user.username, action="update", table_name="users", row_id=user.id, details="Update user")
     return user
 
 # حذف مستخدم
@@ -64,8 +65,8 @@ def delete_user(db: Session, user_id):
     if not user:
         raise UserNotFound("المستخدم غير موجود")
     db.delete(user)
-    db.commit()
     log_audit(db, user=user.username, action="delete", table_name="users", row_id=user_id, details="Delete user")
+    db.commit()
     return True
 
 # جلب مستخدم
@@ -94,30 +95,11 @@ def list_users(db: Session, page=1, per_page=20, filter_username=None, filter_ro
     }
 
 # تصدير المستخدمين إلى CSV
-def export_users_to_csv(db: Session):
-    users = db.query(User).all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['id', 'username', 'role', 'is_active', 'last_login'])
-    for u in users:
-        writer.writerow([
-            u.id,
-            u.username,
-            u.role.value if u.role else '',
-            u.is_active,
-            u.last_login or ''
-        ])
-    return output.getvalue()
+def export_users_query():
+    return export_select([
+        ("id", User.id), ("username", User.username), ("role", User.role),
+        ("is_active", User.is_active), ("last_login", User.last_login),
+    ], order_by=User.id)
 
-# سجل تدقيق
-def log_audit(db: Session, user: str, action: str, table_name: str, row_id: int, details: str = ""):
-    log = AuditLog(
-        user=user,
-        action=action,
-        table_name=table_name,
-        row_id=row_id,
-        details=details,
-        timestamp=datetime.utcnow()
-    )
-    db.add(log)
-    db.commit()
+def export_users_to_csv(db: Session):
+    return export_to_string(db, *export_users_query())
@@ -0,0 +1,47 @@
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from database.models import Notification
+from database.pagination import keyset_page
+
+# استثناءات مخصصة
+class NotificationNotFound(Exception): pass
+
+# ========== سجلات الإشعارات ==========
+# المجدول يضيف الإشعارات دفعة واحدة (executemany) داخل نفس معاملة تغيير الحالة، فلا يوجد
+# انتقال بدون إشعار أو إشعار بدون انتقال. الواجهة تعرضها عبر /notifications/ وتعلّمها كمقروءة.
+
+def notify_many(db: Session, rule, table_name, rows, message):
+    """
+    rows: صفوف RETURNING من جملة الانتقال، message(row) تبني نص الإشعار.
+    لا ينفذ commit؛ يرجع عدد الإشعارات.
+    """
+    values = [
+        {"rule": rule, "table_name": table_name, "row_id": row.id, "message": message(row), "is_read": False}
+        for row in rows
+    ]
+    if values:
+        db.execute(insert(Notification), values)
+    return len(values)
+
+def list_notifications(db: Session, per_page=50, unread_only=False, filter_rule=None, cursor=None):
+    # الأحدث أولاً بالمؤشر (Keyset)
+    query = db.query(Notification)
+    if unread_only:
+        query = query.filter(Notification.is_read == False)
+    if filter_rule:
+        query = query.filter(Notification.rule == filter_rule)
+    return keyset_page(query, Notification.id, Notification.id, per_page, cursor)
+
+def count_unread(db: Session):
+    return db.query(Notification).filter(Notification.is_read == False).count()
+
+def mark_read(db: Session, ids=None):
+    """تعليم الإشعارات كمقروءة بجملة واحدة (كل غير المقروء إذا لم تُحدد ids)؛ يرجع عدد الصفوف"""
+    stmt = update(Notification).where(Notification.is_read == False).values(is_read=True)
+    if ids is not None:
+        stmt = stmt.where(Notification.id.in_(ids))
+    count = db.execute(stmt.execution_options(synchronize_session=False)).rowcount
+    if ids is not None and len(ids) == 1 and count == 0 and db.get(Notification, ids[0]) is None:
+        raise NotificationNotFound("الإشعار غير موجود")
+    db.commit()
+    return count
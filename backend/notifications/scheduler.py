@@ -0,0 +1,284 @@
+from sqlalchemy import update, select, and_, or_
+from sqlalchemy.orm import Session
+from database.models import Contract, Invoice, ScheduledJob, ContractStatus, InvoiceStatus
+from database.db_utils import dialect_insert
+from database.dashboard_utils import (
+    apply_dashboard_change, contract_contributions, invoice_contributions, EXPIRY_WINDOW_DAYS
+)
+from notifications.notifier import notify_many
+from utils.change_tracking import mark_rows_changed
+from utils.config import get_section
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# ========== قواعد انتقال الحالة (Set-based) ==========
+# كل قاعدة جملة UPDATE واحدة على المحفظة كلها (WHERE بالحالة والتاريخ) بدل تعديل العقود/الفواتير صفاً صفاً.
+# RETURNING يرجع الصفوف المنتقلة فقط، ومنها في نفس المعاملة: فرق لوحة التحكم، الإشعارات، وتتبع التغييرات (/sync و /events).
+# القواعد تعتمد على التاريخ فقط، لذلك تشغيلها مرة واحدة بعد توقف طويل يلحق بكل ما فات.
+
+DEFAULT_SCHEDULER_CONFIG = {
+    "enabled": True,
+    "poll_seconds": 30,          # فحص المهام المستحقة
+    "lease_seconds": 600,        # مدة حجز المهمة أثناء التشغيل (تحمي من التشغيل المزدوج بين workers)
+    "retry_seconds": 300,        # إعادة المحاولة بعد فشل
+    "status_rules_interval": 3600,
+    "invoice_late_after_days": 0,  # الفاتورة غير المدفوعة تصبح متأخرة بعد تاريخ إصدارها بهذا العدد من الأيام
+}
+
+def scheduler_config():
+    return get_section("scheduler", DEFAULT_SCHEDULER_CONFIG)
+
+class StatusRule:
+    def __init__(self, name, model, from_status, to_status, condition, columns, contributions, message):
+        self.name = name
+        self.model = model
+        self.from_status = from_status
+        self.to_status = to_status
+        self.condition = condition          # condition(today, config) -> تعبير WHERE
+        self.columns = columns              # أعمدة RETURNING اللازمة للوحة التحكم والإشعار
+        self.contributions = contributions
+        self.message = message
+
+    def apply(self, db: Session, today, config):
+        model = self.model
+        stmt = (
+            update(model)
+            .where(model.status == self.from_status, self.condition(today, config))
+            .values(status=self.to_status)
+            .returning(model.id, *self.columns)
+            .execution_options(synchronize_session=False)
+        )
+        rows = db.execute(stmt).all()
+        if not rows:
+            return 0
+        # الصفوف قبل/بعد بنفس الحقول التي تعتمد عليها جداول الملخص
+        before, after = [], []
+        for row in rows:
+            values = row._asdict()
+            before.extend(self.contributions(SimpleNamespace(**values, status=self.from_status, is_deleted=False)))
+            after.extend(self.contributions(SimpleNamespace(**values, status=self.to_status, is_deleted=False)))
+        apply_dashboard_change(db, before, after)
+        mark_rows_changed(db, model.__tablename__, [row.id for row in rows])
+        notify_many(db, self.name, model.__tablename__, rows, self.message)
+        return len(rows)
+
+def _contract_expiring(today, config):
+    return and_(Contract.is_deleted == False, Contract.end_date >= today,
+                Contract.end_date <= today + timedelta(days=EXPIRY_WINDOW_DAYS))
+
+def _contract_ended(today, config):
+    return and_(Contract.is_deleted == False, Contract.end_date < today)
+
+def _invoice_overdue(today, config):
+    return Invoice.date_issued < today - timedelta(days=config["invoice_late_after_days"])
+
+_CONTRACT_COLUMNS = (Contract.contract_number, Contract.rent_amount, Contract.end_date)
+_INVOICE_COLUMNS = (Invoice.contract_id, Invoice.amount, Invoice.date_issued)
+
+# بالترتيب: الانتهاء قبل التحذير حتى لا يمر عقد منتهٍ بحالة warning أولاً
+STATUS_RULES = [
+    StatusRule("contract_expired", Contract, ContractStatus.active, ContractStatus.expired,
+               _contract_ended, _CONTRACT_COLUMNS, contract_contributions,
+               lambda r: f"انتهى العقد {r.contract_number} بتاريخ {r.end_date}"),
+    StatusRule("contract_expired", Contract, ContractStatus.warning, ContractStatus.expired,
+               _contract_ended, _CONTRACT_COLUMNS, contract_contributions,
+               lambda r: f"انتهى العقد {r.contract_number} بتاريخ {r.end_date}"),
+    StatusRule("contract_warning", Contract, ContractStatus.active, ContractStatus.warning,
+               _contract_expiring, _CONTRACT_COLUMNS, contract_contributions,
+               lambda r: f"العقد {r.contract_number} ينتهي بتاريخ {r.end_date}"),
+    StatusRule("invoice_late", Invoice, InvoiceStatus.unpaid, InvoiceStatus.late,
+               _invoice_overdue, _INVOICE_COLUMNS, invoice_contributions,
+               lambda r: f"الفاتورة رقم {r.id} بمبلغ {r.amount:.2f} متأخرة منذ {r.date_issued}"),
+]
+
+def run_status_rules(db: Session, today: date = None, config=None):
+    """تطبيق كل القواعد في معاملة واحدة؛ يرجع عدد الصفوف المنتقلة لكل قاعدة"""
+    today = today or date.today()
+    config = config or scheduler_config()
+    result = {}
+    for rule in STATUS_RULES:
+        result[rule.name] = result.get(rule.name, 0) + rule.apply(db, today, config)
+    db.commit()
+    return result
+
+# ========== المجدول (مهام دورية بحالة محفوظة) ==========
+# موعد التشغيل التالي وآخر نتيجة في scheduled_jobs: بعد إعادة تشغيل السيرفر تُشغّل المهمة المتأخرة فوراً
+# مرة واحدة (catch-up) ثم يعود الجدول لمواعيده. حجز المهمة بجملة UPDATE مشروطة يمنع تشغيلها مرتين من عدة workers.
+
+class Job:
+    def __init__(self, name, func, interval_seconds):
+        self.name = name
+        self.func = func                    # func(db) -> dict نتيجة قابلة لـ JSON
+        self.interval_seconds = interval_seconds
+
+class Scheduler:
+    def __init__(self, session_factory=None, config=None):
+        if session_factory is None:
+            from database.db_utils import SessionLocal as session_factory
+        self._session_factory = session_factory
+        self._config = config or scheduler_config()
+        self._jobs = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_job(self, name, func, interval_seconds):
+        self._jobs[name] = Job(name, func, interval_seconds)
+
+    def has_job(self, name):
+        return name in self._jobs
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+            except Exception:
+                logger.exception("خطأ في دورة المجدول")
+            self._stop.wait(self._config["poll_seconds"])
+
+    def _register(self, db: Session, now):
+        # المهام الجديدة تُشغّل فوراً؛ تغيير الفترة في الإعدادات يُحدّث فقط دون لمس الموعد
+        # (on_conflict_do_nothing: عدة workers قد يسجلون نفس المهمة معاً)
+        stmt = dialect_insert(db, ScheduledJob).on_conflict_do_nothing(index_elements=[ScheduledJob.name])
+        db.execute(stmt, [
+            {"name": job.name, "interval_seconds": job.interval_seconds, "next_run_at": now, "run_count": 0}
+            for job in self._jobs.values()
+        ])
+        for job in self._jobs.values():
+            db.execute(
+                update(ScheduledJob)
+                .where(ScheduledJob.name == job.name, ScheduledJob.interval_seconds != job.interval_seconds)
+                .values(interval_seconds=job.interval_seconds)
+            )
+        db.commit()
+
+    def _claim(self, db: Session, name, now, force=False):
+        cond = [ScheduledJob.name == name,
+                or_(ScheduledJob.locked_until == None, ScheduledJob.locked_until < now)]
+        if not force:
+            cond.append(ScheduledJob.next_run_at <= now)
+        claimed = db.execute(
+            update(ScheduledJob).where(*cond)
+            .values(locked_until=now + timedelta(seconds=self._config["lease_seconds"]))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        return claimed == 1
+
+    def _next_run(self, scheduled, interval, now):
+        # على نفس شبكة المواعيد (بدون انزياح)، وأول موعد بعد الآن؛ المواعيد الفائتة تُدمج في تشغيل واحد
+        if scheduled > now:
+            return scheduled, 0
+        missed = int((now - scheduled).total_seconds() // interval) + 1
+        return scheduled + timedelta(seconds=interval * missed), missed - 1
+
+    def run_pending(self, now=None):
+        """تشغيل كل مهمة مستحقة (وما فات منها) مرة واحدة؛ يرجع أسماء المهام المنفذة"""
+        now = now or datetime.utcnow()
+        with self._session_factory() as db:
+            self._register(db, now)
+            due = db.execute(
+                select(ScheduledJob.name).where(ScheduledJob.name.in_(self._jobs), ScheduledJob.next_run_at <= now)
+            ).scalars().all()
+        ran = []
+        for name in due:
+            if self._run(name, now):
+                ran.append(name)
+        return ran
+
+    def run_job(self, name, now=None):
+        """تشغيل مهمة فوراً خارج موعدها (إذا لم تكن قيد التشغيل)؛ يرجع حالة المهمة"""
+        now = now or datetime.utcnow()
+        with self._session_factory() as db:
+            self._register(db, now)
+        self._run(name, now, force=True)
+        with self._session_factory() as db:
+            return job_state(db.get(ScheduledJob, name))
+
+    def _run(self, name, now, force=False):
+        job = self._jobs[name]
+        with self._session_factory() as db:
+            if not self._claim(db, name, now, force):
+                return False
+            try:
+                result = job.func(db) or {}
+                status, error = "ok", None
+            except Exception as e:
+                db.rollback()
+                logger.exception("فشل تشغيل المهمة %s", name)
+                result, status, error = {}, "error", str(e)
+
+            state = db.get(ScheduledJob, name)
+            finished = datetime.utcnow()
+            if status == "ok":
+                state.next_run_at, missed = self._next_run(state.next_run_at, job.interval_seconds, finished)
+                result = {**result, "missed_runs": missed} if missed else result
+            else:
+                state.next_run_at = finished + timedelta(seconds=min(self._config["retry_seconds"], job.interval_seconds))
+            state.last_run_at = finished
+            state.last_status = status
+            state.last_error = error
+            state.last_result = json.dumps(result, ensure_ascii=False)
+            state.run_count = (state.run_count or 0) + 1
+            state.locked_until = None
+            db.commit()
+        return True
+
+def job_state(job: ScheduledJob):
+    if job is None:
+        return None
+    return {
+        "name": job.name,
+        "interval_seconds": job.interval_seconds,
+        "next_run_at": job.next_run_at.isoformat() if job.next_run_at else None,
+        "last_run_at": job.last_run_at.isoformat() if job.last_run_at else None,
+        "last_status": job.last_status,
+        "last_error": job.last_error,
+        "last_result": json.loads(job.last_result) if job.last_result else None,
+        "run_count": job.run_count,
+        "running": bool(job.locked_until and job.locked_until > datetime.utcnow()),
+    }
+
+def list_jobs(db: Session):
+    return [job_state(j) for j in db.query(ScheduledJob).order_by(ScheduledJob.name)]
+
+# ========== المجدول الافتراضي للتطبيق ==========
+_scheduler = None
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        config = scheduler_config()
+        _scheduler = Scheduler(config=config)
+        _scheduler.add_job("status_rules", lambda db: run_status_rules(db, config=config), config["status_rules_interval"])
+        from database.backup_restore import backups_enabled, scheduled_backup, backup_config
+        if backups_enabled():
+            _scheduler.add_job("backup", scheduled_backup, backup_config()["interval_seconds"])
+        from utils.file_manager import collect_garbage, storage_config
+        _scheduler.add_job("attachments_gc", collect_garbage, storage_config()["gc_interval"])
+    return _scheduler
+
+def start_scheduler():
+    if scheduler_config()["enabled"]:
+        get_scheduler().start()
+
+def stop_scheduler():
+    if _scheduler is not None:
+        _scheduler.stop()
@@ -0,0 +1,279 @@
+from sqlalchemy import select, String, type_coerce
+from sqlalchemy.orm import Session
+from database.models import Contract, Invoice, Payment, Unit, Owner
+from utils.change_tracking import version_tag
+from collections import OrderedDict
+from datetime import date, datetime
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # التقارير تتطلب numpy؛ بقية التطبيق يعمل بدونها
+    np = None
+
+# استثناءات مخصصة
+class ReportError(Exception): pass
+class UnknownReport(Exception): pass
+
+# ========== محرك التقارير (أعمدة NumPy) ==========
+# كل تقرير يجلب الأعمدة التي يحتاجها فقط بجملة Core select (بدون كائنات ORM)، ويحولها لمصفوفات NumPy،
+# ثم يحسب بعمليات متجهة (أقنعة، bincount، digitize) بدل حلقات بايثون على الصفوف.
+# التواريخ والحالات تُقرأ كنص خام (type_coerce) وتُحول دفعة واحدة إلى datetime64 بدل تحويل كل قيمة في بايثون.
+# النتائج تُحفظ في كاش حسب (التقرير، المعاملات، إصدار الجداول) فلا يُعاد الحساب إلا بعد تغير البيانات.
+
+AGING_BUCKETS = ("0-30", "31-60", "61-90", "90+")
+AGING_EDGES = (31, 61, 91)  # بداية كل فئة بعد الأولى (بالأيام)
+GROUP_BY = ("building", "owner")
+UNSPECIFIED = "غير محدد"
+
+REPORT_CACHE_SIZE = 64
+
+def _require_numpy():
+    if np is None:
+        raise ReportError("التقارير تتطلب تثبيت مكتبة numpy")
+
+# ---------- تحميل الأعمدة ----------
+def _raw(column):
+    # نص خام بدون معالجة SQLAlchemy لكل قيمة (التاريخ/Enum)؛ على PostgreSQL يرجع التاريخ كـ date وهذا مقبول أيضاً
+    return type_coerce(column, String).label(column.key)
+
+def _load(db: Session, stmt):
+    """{اسم العمود: tuple القيم} من جملة Core"""
+    # على اتصال الجلسة مباشرة: بدون طبقة نتائج ORM (أسرع بوضوح عند مئات آلاف الصفوف)
+    result = db.connection().execute(stmt)
+    keys = list(result.keys())
+    rows = result.all()
+    if not rows:
+        return {k: () for k in keys}
+    return dict(zip(keys, zip(*rows)))
+
+def _floats(values):
+    # None -> 0
+    return np.nan_to_num(np.array(values, dtype=float))
+
+def _ints(values, missing=-1):
+    arr = np.array(values, dtype=float)
+    return np.where(np.isnan(arr), missing, arr).astype(np.int64)
+
+def _days(values):
+    # None -> NaT
+    return np.array(values, dtype="datetime64[D]")
+
+def _labels(values):
+    return np.array([UNSPECIFIED if v in (None, "") else str(v) for v in values], dtype=object)
+
+def _grouped(keys, **values):
+    """مجاميع لكل مفتاح عبر np.unique + bincount؛ القيمة None في values تعني العدد"""
+    if len(keys) == 0:
+        return []
+    labels, inverse = np.unique(keys, return_inverse=True)
+    sums = {name: np.bincount(inverse, weights=v, minlength=len(labels)) for name, v in values.items()}
+    return [
+        {"key": str(label), **{name: _number(sums[name][i]) for name in sums}}
+        for i, label in enumerate(labels)
+    ]
+
+def _number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 2)
+
+def _paid_by_invoice(db: Session, invoice_ids):
+    """المدفوع لكل فاتورة (مصفوفة بمحاذاة invoice_ids) بـ bincount على invoice_id"""
+    if len(invoice_ids) == 0:
+        return np.zeros(0)
+    cols = _load(db, select(Payment.invoice_id, Payment.amount_paid).where(Payment.invoice_id.isnot(None)))
+    if not cols["invoice_id"]:
+        return np.zeros(len(invoice_ids))
+    pay_ids = _ints(cols["invoice_id"])
+    size = int(max(pay_ids.max(), invoice_ids.max())) + 1
+    paid = np.bincount(pay_ids, weights=_floats(cols["amount_paid"]), minlength=size)
+    return paid[invoice_ids]
+
+def _invoices(db: Session):
+    cols = _load(db, select(Invoice.id, Invoice.amount, _raw(Invoice.date_issued), _raw(Invoice.status)))
+    ids = _ints(cols["id"])
+    amount = _floats(cols["amount"])
+    issued = _days(cols["date_issued"])
+    status = np.array(cols["status"], dtype=object)
+    paid = _paid_by_invoice(db, ids)
+    # فاتورة بحالة paid بدون دفعات مسجلة تُعد محصلة بالكامل
+    collected = np.where(status == "paid", amount, np.minimum(paid, amount))
+    return ids, amount, issued, status, collected
+
+def _as_day(value):
+    return np.datetime64(value, "D")
+
+# ---------- التقارير ----------
+def rent_roll(db: Session, as_of: date, group_by=None):
+    """العقود السارية في تاريخ as_of: العدد، قيمة العقود، والإيجار الشهري (قيمة العقد / مدته بالأشهر)"""
+    cols = _load(db, select(
+        Contract.rent_amount, Contract.duration_months, _raw(Contract.start_date), _raw(Contract.end_date),
+        _raw(Contract.status), Unit.building_name, Owner.name.label("owner_name"),
+    ).outerjoin(Unit, Contract.unit_id == Unit.id).outerjoin(Owner, Unit.owner_id == Owner.id)
+     .where(Contract.is_deleted == False))
+    day = _as_day(as_of)
+    rent = _floats(cols["rent_amount"])
+    months = np.maximum(_floats(cols["duration_months"]), 1)
+    status = np.array(cols["status"], dtype=object)
+    mask = (_days(cols["start_date"]) <= day) & (_days(cols["end_date"]) >= day) & (status != "expired")
+    monthly = rent / months
+
+    result = {
+        "as_of": str(as_of),
+        "contracts": int(mask.sum()),
+        "contract_value": _number(rent[mask].sum()),
+        "monthly_rent": _number(monthly[mask].sum()),
+        "annualized_rent": _number(monthly[mask].sum() * 12),
+    }
+    if group_by:
+        keys = _labels(cols["building_name"] if group_by == "building" else cols["owner_name"])[mask]
+        result["groups"] = _grouped(keys, contracts=None, monthly_rent=monthly[mask])
+    return result
+
+def collection(db: Session, start: date, end: date):
+    """نسبة التحصيل للفواتير الصادرة بين start و end (المحصل / المفوتر)"""
+    ids, amount, issued, status, collected = _invoices(db)
+    mask = (issued >= _as_day(start)) & (issued <= _as_day(end))
+    billed = amount[mask].sum()
+    result = {
+        "start": str(start),
+        "end": str(end),
+        "invoices": int(mask.sum()),
+        "billed": _number(billed),
+        "collected": _number(collected[mask].sum()),
+        "outstanding": _number(billed - collected[mask].sum()),
+        "collection_rate": round(float(collected[mask].sum() / billed * 100), 2) if billed else 0.0,
+    }
+    for value in ("paid", "unpaid", "late"):
+        result[f"{value}_count"] = int((mask & (status == value)).sum())
+    return result
+
+def aging(db: Session, as_of: date):
+    """أعمار المبالغ المستحقة غير المحصلة في تاريخ as_of حسب الفئات 0-30/31-60/61-90/90+ يوماً"""
+    ids, amount, issued, status, collected = _invoices(db)
+    day = _as_day(as_of)
+    outstanding = amount - collected
+    mask = (issued <= day) & (outstanding > 0.005)
+    age = (day - issued[mask]).astype(np.int64)
+    bucket = np.digitize(age, AGING_EDGES)
+    counts = np.bincount(bucket, minlength=len(AGING_BUCKETS))
+    amounts = np.bincount(bucket, weights=outstanding[mask], minlength=len(AGING_BUCKETS))
+    return {
+        "as_of": str(as_of),
+        "total_outstanding": _number(outstanding[mask].sum()),
+        "invoices": int(mask.sum()),
+        "buckets": [
+            {"bucket": name, "invoices": int(counts[i]), "amount": _number(amounts[i])}
+            for i, name in enumerate(AGING_BUCKETS)
+        ],
+    }
+
+def occupancy(db: Session, group_by="building"):
+    """نسبة الإشغال (المؤجرة / الكل) لكل مبنى أو مالك"""
+    cols = _load(db, select(_raw(Unit.status), Unit.building_name, Owner.name.label("owner_name"))
+                 .outerjoin(Owner, Unit.owner_id == Owner.id).where(Unit.is_deleted == False))
+    status = np.array(cols["status"], dtype=object)
+    keys = _labels(cols["building_name"] if group_by == "building" else cols["owner_name"])
+    rented = (status == "rented").astype(float)
+    groups = _grouped(keys, units=None, rented=rented,
+                      available=(status == "available").astype(float),
+                      under_maintenance=(status == "under_maintenance").astype(float))
+    for g in groups:
+        g["occupancy_rate"] = round(g["rented"] / g["units"] * 100, 2) if g["units"] else 0.0
+    total = len(status)
+    return {
+        "group_by": group_by,
+        "units": total,
+        "rented": int(rented.sum()),
+        "occupancy_rate": round(float(rented.sum()) / total * 100, 2) if total else 0.0,
+        "groups": groups,
+    }
+
+def revenue(db: Session, start: date, end: date):
+    """سلسلة شهرية: المفوتر (حسب تاريخ الفاتورة) والمحصل (حسب تاريخ الدفع)"""
+    months = np.arange(np.datetime64(start, "M"), np.datetime64(end, "M") + 1)
+    if len(months) == 0:
+        raise ReportError("تاريخ البداية بعد تاريخ النهاية")
+
+    def monthly(dates, weights):
+        month = dates.astype("datetime64[M]")
+        mask = ~np.isnat(dates) & (month >= months[0]) & (month <= months[-1])
+        index = (month[mask] - months[0]).astype(np.int64)
+        return np.bincount(index, weights=weights[mask], minlength=len(months))
+
+    inv = _load(db, select(Invoice.amount, _raw(Invoice.date_issued)))
+    pay = _load(db, select(Payment.amount_paid, _raw(Payment.paid_on)))
+    billed = monthly(_days(inv["date_issued"]), _floats(inv["amount"]))
+    collected = monthly(_days(pay["paid_on"]), _floats(pay["amount_paid"]))
+    return {
+        "start": str(start),
+        "end": str(end),
+        "series": [
+            {"month": str(m), "billed": _number(billed[i]), "collected": _number(collected[i])}
+            for i, m in enumerate(months)
+        ],
+        "billed": _number(billed.sum()),
+        "collected": _number(collected.sum()),
+    }
+
+# ========== السجل والكاش ==========
+# الاسم: (الدالة، الجداول التي يعتمد عليها، المعاملات المسموحة)
+REPORTS = {
+    "rent_roll": (rent_roll, ("contracts", "units", "owners"), ("as_of", "group_by")),
+    "collection": (collection, ("invoices", "payments"), ("start", "end")),
+    "aging": (aging, ("invoices", "payments"), ("as_of",)),
+    "occupancy": (occupancy, ("units", "owners"), ("group_by",)),
+    "revenue": (revenue, ("invoices", "payments"), ("start", "end")),
+}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _resolve_params(name, params):
+    allowed = REPORTS[name][2]
+    unknown = set(k for k, v in params.items() if v is not None) - set(allowed)
+    if unknown:
+        raise ReportError(f"معاملات غير مدعومة للتقرير {name}: {', '.join(sorted(unknown))}")
+    params = {k: params.get(k) for k in allowed}
+    today = date.today()
+    if "as_of" in params and params["as_of"] is None:
+        params["as_of"] = today
+    if "end" in params and params["end"] is None:
+        params["end"] = today
+    if "start" in params and params["start"] is None:
+        params["start"] = date(params["end"].year, 1, 1)
+    if "start" in params and params["start"] > params["end"]:
+        raise ReportError("تاريخ البداية بعد تاريخ النهاية")
+    if params.get("group_by") not in (None, *GROUP_BY):
+        raise ReportError(f"group_by يجب أن يكون أحد: {', '.join(GROUP_BY)}")
+    if name == "occupancy" and params["group_by"] is None:
+        params["group_by"] = "building"
+    return params
+
+def run_report(db: Session, name, **params):
+    """
+    تشغيل تقرير بالاسم مع كاش حسب (الاسم، المعاملات بعد تعبئة الافتراضي، إصدار الجداول).
+    المعاملات الافتراضية تعتمد على تاريخ اليوم، لذلك تدخل في المفتاح بقيمتها الفعلية.
+    """
+    if name not in REPORTS:
+        raise UnknownReport(f"التقرير {name} غير موجود")
+    _require_numpy()
+    func, tables, _ = REPORTS[name]
+    params = _resolve_params(name, params)
+    etag, _ = version_tag(db, tables)
+    key = (name, tuple(sorted(params.items())), etag)
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit
+    result = {"report": name, **func(db, **params), "generated_at": datetime.utcnow().isoformat()}
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > REPORT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+def clear_report_cache():
+    with _cache_lock:
+        _cache.clear()
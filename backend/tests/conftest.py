@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# الاختبارات تستورد الوحدات كما تعمل من مجلد backend (database، utils، ...)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# قاعدة مؤقتة للمحرك العام في database/db_utils بدل property_management.db
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tests.db')}")
+# مفتاح توقيع ثابت: استيراد auth.session لا ينشئ ملف مفتاح في مجلد المستخدم
+os.environ.setdefault("PROPERTY_SECRET_KEY", "tests-secret-key")
+
+# ========== PostgreSQL للاختبارات ==========
+# TEST_POSTGRES_URL: خادم جاهز (مثلاً خدمة CI: docker run -e POSTGRES_PASSWORD=postgres -p 5432:5432 postgres:16)
+# بدونه يُشغّل خادم مؤقت عبر testing.postgresql إذا كان initdb/postgres في PATH (وليس كمستخدم root)
+# المتطلبات: psycopg2-binary و testing.postgresql
+# TEST_REQUIRE_POSTGRES=1 (في CI): عدم توفر PostgreSQL فشل وليس تخطياً
+
+REQUIRE_POSTGRES = os.environ.get("TEST_REQUIRE_POSTGRES", "").lower() in ("1", "true", "yes")
+
+def _postgres_unavailable(reason):
+    if REQUIRE_POSTGRES:
+        pytest.fail(f"TEST_REQUIRE_POSTGRES مفعّل لكن PostgreSQL غير متاح: {reason}", pytrace=False)
+    pytest.skip(f"PostgreSQL غير متاح: {reason}")
+
+@pytest.fixture(scope="session")
+def postgres_url():
+    try:
+        import psycopg2  # noqa: F401
+    except ImportError:
+        _postgres_unavailable("psycopg2 غير مثبت")
+    if os.environ.get("TEST_POSTGRES_URL"):
+        yield os.environ["TEST_POSTGRES_URL"]
+        return
+    try:
+        import testing.postgresql
+    except ImportError:
+        _postgres_unavailable("لا TEST_POSTGRES_URL ولا testing.postgresql")
+    try:
+        # UTF8 صراحة: بدون locale ينشئ initdb قاعدة SQL_ASCII لا تقبل النص العربي
+        server = testing.postgresql.Postgresql(initdb_args="-U postgres -A trust -E UTF8 --locale=C")
+    except RuntimeError as exc:
+        _postgres_unavailable(str(exc).strip().splitlines()[0])
+    try:
+        yield server.url().replace("postgresql://", "postgresql+psycopg2://", 1)
+    finally:
+        server.stop()
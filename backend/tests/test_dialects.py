@@ -0,0 +1,116 @@
+import os
+import tempfile
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database.models import Base, DashboardCounter, TableVersion, UnitStatus, ContractStatus
+from database.db_utils import _engine_kwargs, db_config, dialect_insert, apply_sqlite_pragmas
+from database.migrations import run_migrations, pending_migrations
+from database.owners_utils import add_owner, update_owner, delete_owner, list_owners
+from database.tenants_utils import add_tenant, delete_tenant, list_tenants
+from database.units_utils import add_unit, update_unit, delete_unit, list_units
+from database.contracts_utils import add_contract, update_contract, delete_contract, list_contracts
+from database.invoices_utils import list_invoices
+from database.dashboard_utils import get_dashboard_summary, rebuild_dashboard_summary
+
+# نفس مسار *_utils على SQLite وعلى PostgreSQL (dialect_insert، ilike، الترحيلات)
+# خادم PostgreSQL من الـ fixture postgres_url في conftest.py (TEST_POSTGRES_URL أو خادم مؤقت)
+TODAY = date(2026, 6, 1)
+
+def _sqlite_url():
+    return f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'dialect.db')}"
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def dialect_db(request):
+    if request.param == "postgresql":
+        url = request.getfixturevalue("postgres_url")
+    else:
+        url = _sqlite_url()
+    engine = create_engine(url, **_engine_kwargs(url, db_config))
+    if request.param == "sqlite":
+        # نفس إعدادات المحرك العام (foreign_keys مطلوبة لحذف الفواتير مع العقد)
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+    # قاعدة الاختبار تُبنى من الصفر في كل مرة
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    db = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)()
+    yield db
+    db.close()
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+def test_migrations_applied(dialect_db):
+    assert pending_migrations(dialect_db.get_bind()) == []
+
+def test_crud_path(dialect_db):
+    db = dialect_db
+    owner = add_owner(db, "مالك", "1000000001", "SA")
+    other = add_owner(db, "مالك آخر", "1000000002", "SA")
+    tenant = add_tenant(db, "مستأجر", "2000000001", "0500000001", "SA")
+    unit = add_unit(db, "U-1", "شقة", 3, 120.5, "الرياض", UnitStatus.available, owner.id)
+    contract = add_contract(db, "C-1", unit.id, tenant.id, date(2026, 1, 1), date(2026, 12, 31), 12, 12000,
+                            ContractStatus.active, payment_type="ربع سنوي")
+
+    update_owner(db, owner.id, name="مالك معدل")
+    update_unit(db, unit.id, status=UnitStatus.rented, owner_id=other.id)
+    update_contract(db, contract.id, rent_amount=15000)
+
+    # text_filter: FTS على SQLite و ilike على PostgreSQL، غير حساس لحالة الأحرف على القاعدتين
+    assert [o.name for o in list_owners(db, filter_name="معدل")["data"]] == ["مالك معدل"]
+    assert [u.unit_number for u in list_units(db, filter_unit_number="u-")["data"]] == ["U-1"]
+    assert list_units(db, filter_owner_id=other.id)["total"] == 1
+    assert list_tenants(db)["total"] == 1
+    assert list_contracts(db, filter_contract_number="c-1")["data"][0].rent_amount == 15000
+    assert list_invoices(db, filter_contract_id=contract.id)["total"] > 0
+    # عدادات إصدار الجداول (upsert عبر dialect_insert في change_tracking)
+    assert db.get(TableVersion, "contracts").version >= 2
+
+    delete_contract(db, contract.id)
+    delete_unit(db, unit.id)
+    delete_tenant(db, tenant.id)
+    delete_owner(db, owner.id)
+    assert list_contracts(db)["total"] == 0
+    assert list_invoices(db)["total"] == 0
+    assert list_owners(db)["total"] == 1
+
+def test_dashboard_upserts_match_rebuild(dialect_db):
+    db = dialect_db
+    owner = add_owner(db, "مالك", "1000000001", "SA")
+    tenants = [add_tenant(db, f"مستأجر {i}", f"200000000{i}", f"050000000{i}", "SA") for i in range(3)]
+    units = [add_unit(db, f"U-{i}", "شقة", 2, 90, "جدة", UnitStatus.available, owner.id) for i in range(3)]
+    contracts = [
+        add_contract(db, f"C-{i}", units[i].id, tenants[i].id, date(2026, 1, 1), date(2026, 6, 15 + i), 6,
+                     6000 + 1000 * i, ContractStatus.active, payment_type="شهري")
+        for i in range(3)
+    ]
+    update_unit(db, units[0].id, status=UnitStatus.rented)
+    update_contract(db, contracts[1].id, status=ContractStatus.expired)
+    delete_contract(db, contracts[2].id)
+    delete_unit(db, units[2].id)
+
+    # الملخص المحدث تدريجياً (upsert) يطابق إعادة البناء من الجداول الأصلية
+    incremental = get_dashboard_summary(db, today=TODAY)
+    rebuild_dashboard_summary(db)
+    rebuilt = get_dashboard_summary(db, today=TODAY)
+    for summary in (incremental, rebuilt):
+        summary.pop("generated_at")
+    assert rebuilt == incremental
+    assert incremental["units"]["total"] == 2
+
+def test_upsert_accumulates(dialect_db):
+    db = dialect_db
+    for amount in (10.0, 5.5):
+        stmt = dialect_insert(db, DashboardCounter)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["metric"],
+            set_={"count": DashboardCounter.count + stmt.excluded.count,
+                  "amount": DashboardCounter.amount + stmt.excluded.amount}
+        )
+        db.execute(stmt, [{"metric": "test_metric", "count": 1, "amount": amount}])
+    db.commit()
+    counter = db.get(DashboardCounter, "test_metric")
+    assert (counter.count, counter.amount) == (2, 15.5)
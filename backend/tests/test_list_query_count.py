@@ -0,0 +1,96 @@
+import os
+import tempfile
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database.models import (
+    Base, Owner, Unit, Tenant, Contract, Invoice, Attachment,
+    UnitStatus, ContractStatus, InvoiceStatus, AttachmentType,
+)
+from database.migrations import run_migrations
+from database.owners_utils import list_owners
+from database.units_utils import list_units
+from database.tenants_utils import list_tenants
+from database.contracts_utils import list_contracts
+from database.invoices_utils import list_invoices
+from app import owner_to_schema, unit_to_schema, tenant_to_schema, contract_to_schema, invoice_to_schema
+
+# صفحات list_* مع التحويل إلى schema: COUNT + الصفحة (مع joinedload) + المرفقات (selectinload)
+# ثلاثة SELECT مهما كان حجم الصفحة، وأي تحميل كسول يرفع خطأ (raiseload)
+ROWS = 60
+SELECTS_PER_PAGE = 3
+
+CASES = [
+    ("owners", list_owners, lambda row, db: owner_to_schema(row)),
+    ("units", list_units, unit_to_schema),
+    ("tenants", list_tenants, lambda row, db: tenant_to_schema(row)),
+    ("contracts", list_contracts, contract_to_schema),
+    ("invoices", list_invoices, lambda row, db: invoice_to_schema(row)),
+]
+
+def _attachment(**fk):
+    return Attachment(filepath="/tmp/x.pdf", filetype="pdf", attachment_type=AttachmentType.general, **fk)
+
+@pytest.fixture(scope="module")
+def list_db():
+    path = os.path.join(tempfile.mkdtemp(), "lists.db")
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    with Session() as db:
+        for i in range(1, ROWS + 1):
+            db.add(Owner(id=i, name=f"مالك {i}", registration_number=f"1{i:09d}", nationality="SA"))
+            db.add(Tenant(id=i, name=f"مستأجر {i}", national_id=f"2{i:09d}", nationality="SA", phone=f"05{i:08d}"))
+        db.flush()
+        for i in range(1, ROWS + 1):
+            db.add(Unit(id=i, unit_number=f"U-{i}", unit_type="شقة", rooms=2, area=100, location="الرياض",
+                        status=UnitStatus.rented, owner_id=i))
+        db.flush()
+        for i in range(1, ROWS + 1):
+            db.add(Contract(id=i, contract_number=f"C-{i}", unit_id=i, tenant_id=i, start_date=date(2026, 1, 1),
+                            end_date=date(2026, 12, 31), duration_months=12, rent_amount=12000,
+                            status=ContractStatus.active))
+        db.flush()
+        for i in range(1, ROWS + 1):
+            db.add(Invoice(id=i, contract_id=i, date_issued=date(2026, 1, 1), amount=1000, status=InvoiceStatus.unpaid))
+        db.flush()
+        for i in range(1, ROWS + 1):
+            # مرفقان لكل صف حتى يكون لـ selectinload ما يحمله
+            for _ in range(2):
+                db.add_all([_attachment(owner_id=i), _attachment(unit_id=i), _attachment(tenant_id=i),
+                            _attachment(contract_id=i), _attachment(invoice_id=i)])
+        db.commit()
+    yield engine, Session
+    engine.dispose()
+
+def count_selects(engine, fn):
+    statements = []
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+    return statements
+
+@pytest.mark.parametrize("per_page", [5, 50])
+@pytest.mark.parametrize("entity, list_fn, to_schema", CASES, ids=[entity for entity, _, _ in CASES])
+def test_list_page_query_count(list_db, entity, list_fn, to_schema, per_page):
+    engine, Session = list_db
+    # جلسة جديدة لكل حالة: لا شيء في identity map يخفي استعلاماً
+    with Session() as db:
+        result = {}
+        def run():
+            result.update(list_fn(db, per_page=per_page))
+            result["schemas"] = [to_schema(row, db) for row in result["data"]]
+        statements = count_selects(engine, run)
+    assert len(result["schemas"]) == per_page
+    assert result["total"] == ROWS
+    assert all(len(schema.attachments) == 2 for schema in result["schemas"])
+    assert len(statements) == SELECTS_PER_PAGE, "\n".join(" ".join(s.split()) for s in statements)
@@ -0,0 +1,47 @@
+import os
+import shutil
+
+from sqlalchemy import create_engine, inspect, text
+
+from database.models import Base
+from database.migrations import MIGRATIONS, run_migrations, pending_migrations
+
+# property_management.db المرفقة بالمستودع بمخطط الإصدار الأول (بدون فهارس الاستعلامات ولا أعمدة المرفقات)
+BASELINE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "property_management.db")
+
+def _upgrade(path):
+    # نفس خطوات init_db: الجداول الناقصة ثم الترحيلات
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    return engine
+
+def _index_sql(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"))
+        return {name: " ".join(sql.split()) for name, sql in rows}
+
+def test_baseline_database_upgrades(tmp_path):
+    path = tmp_path / "baseline.db"
+    shutil.copy(BASELINE_DB, path)
+    engine = _upgrade(path)
+    try:
+        assert pending_migrations(engine) == []
+        columns = {c["name"] for c in inspect(engine).get_columns("attachments")}
+        assert {"sha256", "size", "content_type"} <= columns
+        # القاعدة المرقاة تطابق قاعدة جديدة من models.py فهرساً فهرساً
+        fresh = _upgrade(tmp_path / "fresh.db")
+        assert _index_sql(engine) == _index_sql(fresh)
+        fresh.dispose()
+    finally:
+        engine.dispose()
+
+def test_migrations_are_idempotent_on_fresh_database(tmp_path):
+    engine = _upgrade(tmp_path / "fresh.db")
+    try:
+        with engine.connect() as conn:
+            applied = conn.execute(text("SELECT version FROM schema_migrations ORDER BY version")).scalars().all()
+        assert applied == [version for version, _, _ in MIGRATIONS]
+        assert run_migrations(engine) == []
+    finally:
+        engine.dispose()
@@ -0,0 +1,21 @@
+import pytest
+
+from benchmarks.explain_query_plans import CASES, make_session, capture, full_scans
+
+# كل استعلام list_* و check_* يقرأ جداوله عبر فهرس (EXPLAIN QUERY PLAN بدون "SCAN <table>")
+
+@pytest.fixture(scope="module")
+def plan_db():
+    engine, db = make_session()
+    yield engine, db
+    db.close()
+    engine.dispose()
+
+@pytest.mark.parametrize("name, fn", CASES, ids=[name for name, _ in CASES])
+def test_query_uses_indexes(plan_db, name, fn):
+    engine, db = plan_db
+    statements = capture(engine, db, fn)
+    assert statements, f"{name} لم ينفذ أي SELECT"
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            assert full_scans(conn, statement, parameters) == [], " ".join(statement.split())
@@ -0,0 +1,44 @@
+import os
+import stat
+
+import pytest
+
+import auth_utils
+from auth.session import DEFAULT_AUTH_CONFIG, SecretKeyError, SessionManager, load_secret_key
+
+def _config(tmp_path, **overrides):
+    config = dict(DEFAULT_AUTH_CONFIG, secret_key_file=str(tmp_path / "keys" / "secret_key"))
+    config.update(overrides)
+    return config
+
+@pytest.fixture(autouse=True)
+def no_env_key(monkeypatch):
+    monkeypatch.delenv("PROPERTY_SECRET_KEY", raising=False)
+
+def test_generated_key_is_private_and_reused(tmp_path):
+    config = _config(tmp_path)
+    key = load_secret_key(config)
+    assert key != auth_utils.SECRET_KEY and len(key) >= 32
+    path = config["secret_key_file"]
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    # إعادة التشغيل (أو worker آخر) يستخدم نفس المفتاح: الرموز الصادرة تبقى صالحة
+    assert load_secret_key(config) == key
+    token = SessionManager(config).issue(1, "admin", "admin", True, "hash")["access_token"]
+    assert SessionManager(config).decode(token)["sub"] == "1"
+
+def test_public_default_key_is_refused_when_required(tmp_path):
+    with pytest.raises(SecretKeyError):
+        load_secret_key(_config(tmp_path, secret_key=auth_utils.SECRET_KEY))
+
+def test_forged_token_with_public_key_is_rejected(tmp_path):
+    manager = SessionManager(_config(tmp_path))
+    forged = auth_utils.create_access_token({"sub": "1", "name": "admin", "role": "admin", "sid": "x", "pwd": "x"},
+                                            secret_key=auth_utils.SECRET_KEY)
+    with pytest.raises(Exception):
+        manager.decode(forged)
+
+def test_unwritable_key_file_refuses_to_start(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    with pytest.raises(SecretKeyError):
+        load_secret_key(_config(tmp_path, secret_key_file=str(blocker / "secret_key")))
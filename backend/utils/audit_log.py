@@ -0,0 +1,130 @@
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+from database.models import AuditLog
+from datetime import datetime
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# مفاتيح تخزين السجلات المعلقة والكاتب المؤقت داخل session.info
+PENDING_KEY = "pending_audit"
+WRITER_KEY = "audit_writer"
+
+# ========== تسجيل التدقيق ضمن نفس المعاملة (Unit of Work) ==========
+def log_audit(db: Session, user: str, action: str, table_name: str, row_id, details: str = ""):
+    """
+    يسجل عملية تدقيق معلقة على الجلسة بدون commit.
+    تكتب السجلات فعلياً عند db.commit() التالي في نفس المعاملة مع التعديل الأصلي.
+    row_id يمكن أن يكون رقماً أو كائن ORM جديد (يُقرأ id بعد الـ flush).
+    """
+    db.info.setdefault(PENDING_KEY, []).append({
+        "user": user,
+        "action": action,
+        "table_name": table_name,
+        "row_id": row_id,
+        "details": details,
+        "timestamp": datetime.utcnow(),
+    })
+
+def use_audit_writer(db: Session, writer):
+    # توجيه سجلات هذه الجلسة إلى كاتب مؤقت غير متزامن (للاستيراد الكبير)
+    if writer is None:
+        db.info.pop(WRITER_KEY, None)
+    else:
+        db.info[WRITER_KEY] = writer
+
+def _resolve_row_id(row_id):
+    if row_id is None or isinstance(row_id, int):
+        return row_id
+    return getattr(row_id, "id", None)
+
+@event.listens_for(Session, "before_commit")
+def _write_pending_audit(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if not pending:
+        return
+    # flush لمعرفة المعرفات الجديدة قبل كتابة السجلات
+    session.flush()
+    rows = []
+    for entry in pending:
+        entry["row_id"] = _resolve_row_id(entry["row_id"])
+        rows.append(entry)
+    writer = session.info.get(WRITER_KEY)
+    if writer is not None:
+        writer.write_many(rows)
+    else:
+        session.execute(insert(AuditLog), rows)
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending_audit(session, transaction):
+    # المعاملة انتهت بدون commit (rollback أو close): السجلات المعلقة لم تعد صالحة
+    if transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+
+# ========== كاتب مؤقت غير متزامن للأحمال الكبيرة ==========
+_STOP = object()
+
+class BufferedAuditWriter:
+    """
+    يجمع سجلات التدقيق في طابور ويكتبها على دفعات من مسار (thread) منفصل باتصال مستقل.
+    مناسب للاستيراد الكبير؛ السجلات لا تشارك معاملة التعديل الأصلي.
+    """
+
+    def __init__(self, bind=None, batch_size=500):
+        if bind is None:
+            from database.db_utils import engine as bind
+        self._bind = bind
+        self._batch_size = batch_size
+        self._queue = queue.Queue()
+        self.written = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, row: dict):
+        self._queue.put(row)
+
+    def write_many(self, rows):
+        for row in rows:
+            self._queue.put(row)
+
+    def flush(self):
+        # ينتظر حتى تكتب كل السجلات الموجودة في الطابور
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [r for r in batch if r is not _STOP]
+            stop = len(rows) != len(batch)
+            if rows:
+                self._write_batch(rows)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_batch(self, rows):
+        try:
+            with self._bind.begin() as conn:
+                conn.execute(insert(AuditLog), rows)
+            self.written += len(rows)
+        except Exception:
+            self.errors += 1
+            logger.exception("فشل كتابة %d سجل تدقيق", len(rows))
@@ -0,0 +1,155 @@
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from database.models import TableVersion, RowChange
+from utils.event_bus import EVENT_KEY, change_event
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import hashlib
+
+# ========== عدادات إصدار الجداول (Table Versions) ==========
+# كل commit يعدّل جدولاً يزيد عداده في table_versions داخل نفس المعاملة، فيبقى العداد صحيحاً
+# مهما كان عدد العمليات (workers) التي تكتب على القاعدة. العدادات تُستخدم لـ ETag/Last-Modified.
+# ومع كل commit يزيد العداد العام (GLOBAL_VERSION) ويُسجل كرمز تغيير لكل صف معدل في row_changes
+# (مصدر المزامنة التزايدية). تحديث صف العداد العام يقفله حتى نهاية المعاملة، فالرموز تتبع ترتيب الـ commit.
+
+# مفاتيح الجداول والصفوف المعدلة داخل session.info حتى الـ commit
+CHANGED_KEY = "changed_tables"
+CHANGED_ROWS_KEY = "changed_rows"
+
+GLOBAL_VERSION = "*"
+
+# جداول لا تُتتبع: العدادات نفسها، وسجل التدقيق الذي يُكتب في before_commit بعد جمع التغييرات
+UNTRACKED_TABLES = {"table_versions", "row_changes", "schema_migrations", "scheduled_jobs", "auditlog"}
+
+# المرفق جزء من تمثيل صاحبه: تعديله يُسجل تغييراً على الصف الأب أيضاً
+ATTACHMENT_PARENTS = (
+    ("owner_id", "owners"), ("unit_id", "units"), ("tenant_id", "tenants"),
+    ("contract_id", "contracts"), ("invoice_id", "invoices"),
+)
+
+def mark_changed(session: Session, *tables):
+    # للتعديلات التي لا تمر عبر الـ ORM أو session.execute (مثل text() الخام)
+    session.info.setdefault(CHANGED_KEY, set()).update(t for t in tables if t not in UNTRACKED_TABLES)
+
+def mark_rows_changed(session: Session, table, row_ids):
+    # التعديلات الجماعية (update/insert عبر session.execute) لا تعرف صفوفها: تُسجل يدوياً للمزامنة
+    if table in UNTRACKED_TABLES:
+        return
+    session.info.setdefault(CHANGED_ROWS_KEY, set()).update((table, row_id) for row_id in row_ids)
+    mark_changed(session, table)
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table is None or table in UNTRACKED_TABLES:
+            continue
+        row_id = getattr(obj, "id", None)
+        if isinstance(row_id, int):
+            mark_rows_changed(session, table, [row_id])
+        else:
+            mark_changed(session, table)
+        if table == "attachments":
+            for column, parent in ATTACHMENT_PARENTS:
+                parent_id = getattr(obj, column, None)
+                if parent_id:
+                    mark_rows_changed(session, parent, [parent_id])
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_statement_tables(orm_execute_state):
+    # insert/update/delete الجماعية عبر session.execute لا تمر بالـ flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            mark_changed(orm_execute_state.session, table.name)
+
+@event.listens_for(Session, "before_commit")
+def _bump_table_versions(session):
+    # flush أولاً حتى تُجمع كل الجداول المعدلة في هذه المعاملة
+    session.flush()
+    tables = session.info.pop(CHANGED_KEY, None)
+    rows = session.info.pop(CHANGED_ROWS_KEY, None)
+    if not tables:
+        return
+    from database.db_utils import dialect_insert
+    now = datetime.utcnow()
+    stmt = dialect_insert(session, TableVersion)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TableVersion.table_name],
+        set_={"version": TableVersion.version + 1, "updated_at": now},
+    )
+    # بترتيب ثابت لتجنب الـ deadlock بين معاملتين على PostgreSQL ("*" أولاً)
+    names = [GLOBAL_VERSION] + sorted(tables)
+    session.execute(stmt, [{"table_name": t, "version": 1, "updated_at": now} for t in names])
+
+    token = session.execute(
+        select(TableVersion.version).where(TableVersion.table_name == GLOBAL_VERSION)
+    ).scalar_one()
+    # يُنشر على ناقل الأحداث بعد نجاح الـ commit (utils/event_bus.py)
+    session.info[EVENT_KEY] = change_event(token, tables, rows or ())
+    if not rows:
+        return
+    stmt = dialect_insert(session, RowChange)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RowChange.table_name, RowChange.row_id],
+        set_={"version": token},
+    )
+    # على الاتصال مباشرة (Core): الاستيراد الجماعي يسجل آلاف الصفوف في commit واحد
+    session.connection().execute(stmt, [{"table_name": t, "row_id": r, "version": token} for t, r in sorted(rows)])
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_changed_tables(session, transaction):
+    # rollback أو close بدون commit
+    if transaction.parent is None:
+        session.info.pop(CHANGED_KEY, None)
+        session.info.pop(CHANGED_ROWS_KEY, None)
+        session.info.pop(EVENT_KEY, None)
+
+def current_token(db: Session):
+    """رمز التغيير الحالي (العداد العام)؛ 0 لقاعدة لم تُعدّل بعد"""
+    return db.execute(
+        select(TableVersion.version).where(TableVersion.table_name == GLOBAL_VERSION)
+    ).scalar() or 0
+
+# ========== ETag و Last-Modified ==========
+def table_versions(db: Session, tables):
+    rows = db.execute(
+        select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at)
+        .where(TableVersion.table_name.in_(tables))
+    )
+    return {r.table_name: (r.version, r.updated_at) for r in rows}
+
+def version_tag(db: Session, tables):
+    """
+    (ETag ضعيف، Last-Modified) لتمثيل يعتمد على الجداول المعطاة.
+    يُقرأ قبل بيانات الاستجابة: لو تغيرت البيانات بينهما يكون الـ ETag أقدم فقط (والعميل يعيد الجلب لاحقاً)، لا العكس.
+    """
+    versions = table_versions(db, tables)
+    parts, last_modified = [], None
+    for table in sorted(tables):
+        version, updated_at = versions.get(table, (0, None))
+        parts.append(f"{table}:{version}:{updated_at.isoformat() if updated_at else ''}")
+        if updated_at and (last_modified is None or updated_at > last_modified):
+            last_modified = updated_at
+    digest = hashlib.sha1("|".join(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"', last_modified
+
+def http_date(value: datetime):
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def is_not_modified(headers, etag, last_modified):
+    """If-None-Match له الأولوية (مقارنة ضعيفة)، ثم If-Modified-Since"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
@@ -0,0 +1,48 @@
+from pathlib import Path
+import copy
+import logging
+import os
+
+try:
+    import yaml
+except ImportError:  # PyYAML غير مثبت: نعمل بالقيم الافتراضية فقط
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+# مسار ملف الإعدادات (config/config.yaml في جذر المشروع) ويمكن تغييره بمتغير البيئة
+CONFIG_PATH = Path(os.environ.get("PROPERTY_APP_CONFIG", Path(__file__).resolve().parents[2] / "config" / "config.yaml"))
+
+# ========== تحميل الإعدادات ==========
+_config = None
+
+def _merge(defaults: dict, overrides: dict):
+    # دمج الإعدادات المحملة فوق القيم الافتراضية (بشكل متداخل)
+    merged = copy.deepcopy(defaults)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def load_config(path=None, reload=False):
+    """يقرأ ملف الإعدادات مرة واحدة ويرجع dict (فارغ إذا لم يوجد الملف)"""
+    global _config
+    if _config is not None and not reload and path is None:
+        return _config
+    path = Path(path or CONFIG_PATH)
+    data = {}
+    if path.exists():
+        if yaml is None:
+            logger.warning("PyYAML غير مثبت، تم تجاهل ملف الإعدادات %s", path)
+        else:
+            with open(path, encoding="utf-8") as f:
+                data = yaml.safe_load(f) or {}
+    if path == CONFIG_PATH:
+        _config = data
+    return data
+
+def get_section(name: str, defaults: dict = None):
+    # قسم من الإعدادات مدموج فوق القيم الافتراضية للوحدة التي تطلبه
+    return _merge(defaults or {}, load_config().get(name) or {})
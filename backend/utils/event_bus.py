@@ -0,0 +1,108 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import asyncio
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# ========== ناقل أحداث التغيير (Change Event Bus) ==========
+# change_tracking يجهز حدثاً لكل commit يعدّل بيانات (نفس خطافات الجلسة مثل سجل التدقيق)،
+# ويُنشر هنا بعد نجاح الـ commit فقط. المشتركون (اتصالات /events بـ SSE) يستقبلونه في حلقة asyncio الخاصة بهم،
+# والواجهة تعيد جلب ما تغير فقط بدل التحديث الدوري.
+# الناقل داخل العملية (process): مع عدة workers يصل الحدث لمشتركي نفس الـ worker فقط،
+# لكن رمز التغيير في كل حدث يجعل العميل يلحق بالباقي عند أي حدث تالٍ أو عند إعادة الاتصال (/sync).
+
+# الحدث المعلق داخل session.info حتى after_commit
+EVENT_KEY = "pending_change_event"
+
+MAX_ROW_IDS = 200  # أكثر من هذا في جدول واحد: الحدث يحمل اسم الجدول فقط والعميل يزامن
+
+class Subscription:
+    def __init__(self, loop, max_queue):
+        self.loop = loop
+        self.queue = asyncio.Queue(max_queue)
+        self.overflowed = False
+
+    def _put(self, item):
+        # في حلقة المشترك؛ مشترك بطيء لا يوقف النشر: يُفرغ طابوره ويستلم حدث reset واحد
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "reset", "token": item.get("token")})
+
+    async def get(self):
+        item = await self.queue.get()
+        if item.get("type") == "reset":
+            self.overflowed = False
+        return item
+
+class EventBus:
+    def __init__(self, max_queue=100):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._max_queue = max_queue
+
+    def subscribe(self):
+        # يُستدعى من داخل حلقة asyncio للمشترك
+        sub = Subscription(asyncio.get_running_loop(), self._max_queue)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, item):
+        # آمن من أي مسار: المسارات المتزامنة (threadpool) تنشر والمشتركون في حلقة الأحداث
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub._put, item)
+            except RuntimeError:
+                # الحلقة أُغلقت (إيقاف السيرفر)
+                self.unsubscribe(sub)
+
+bus = EventBus()
+
+def change_event(token, tables, rows):
+    """{"type": "change", "token", "tables": [...], "rows": {table: [ids]}}"""
+    by_table = {}
+    for table, row_id in rows:
+        by_table.setdefault(table, []).append(row_id)
+    return {
+        "type": "change",
+        "token": token,
+        "tables": sorted(tables),
+        "rows": {t: sorted(ids) for t, ids in by_table.items() if len(ids) <= MAX_ROW_IDS},
+    }
+
+def format_sse(item):
+    # id = رمز التغيير حتى يرسله EventSource في Last-Event-ID عند إعادة الاتصال
+    data = json.dumps(item, ensure_ascii=False, separators=(",", ":"))
+    lines = [f"event: {item['type']}", f"data: {data}"]
+    if item.get("token") is not None:
+        lines.insert(0, f"id: {item['token']}")
+    return "\n".join(lines) + "\n\n"
+
+@event.listens_for(Session, "after_commit")
+def _publish_change_event(session):
+    item = session.info.pop(EVENT_KEY, None)
+    if item is not None:
+        try:
+            bus.publish(item)
+        except Exception:
+            # النشر لا يفشل commit تم بالفعل
+            logger.exception("تعذر نشر حدث التغيير")
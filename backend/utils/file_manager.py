@@ -0,0 +1,211 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database.models import Attachment
+from utils.config import get_section
+from pathlib import Path
+import hashlib
+import logging
+import mimetypes
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+# استثناءات مخصصة
+class FileTooLarge(Exception): pass
+class FileTypeNotAllowed(Exception): pass
+class StoredFileMissing(Exception): pass
+
+# ========== مخزن المرفقات حسب المحتوى (Content-Addressable) ==========
+# الملف المرفوع يُكتب قطعةً قطعة لملف مؤقت مع حساب sha256 أثناء الكتابة (بدون تحميله كاملاً في الذاكرة)،
+# ثم يُنقل (os.replace) إلى مسار بصمته: ab/cd/abcd...  — نفس المحتوى (صورة هوية أو عقد مرفوع مرتين) يُخزن مرة واحدة
+# وعدة صفوف Attachment تشير له. التنزيل FileResponse مباشرة من المسار (sendfile/pathsend، مع Range).
+# الملفات لا تُحذف مع الصف؛ مهمة دورية تحذف ما لم يعد أي مرفق يشير له (بعد مهلة تحمي الرفع الجاري).
+
+DEFAULT_STORAGE_CONFIG = {
+    "directory": "attachments",
+    "max_upload_mb": 25,
+    # بادئات أنواع المحتوى المسموحة (حسب توقيع الملف وليس ما يرسله العميل)
+    "allowed_types": [
+        "image/", "application/pdf", "text/plain",
+        "application/msword", "application/vnd.ms-excel", "application/vnd.openxmlformats-officedocument.",
+    ],
+    "gc_interval": 86400,
+    "gc_grace_seconds": 3600,
+}
+
+HEAD_BYTES = 512  # عينة بداية الملف لتحديد نوعه
+
+# أنواع مضغوطة أصلاً: لا يعيد GZipMiddleware ضغطها عند التنزيل
+PRECOMPRESSED_TYPES = (
+    "application/pdf", "application/zip",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "image/heic", "image/tiff",
+)
+
+def storage_config():
+    return get_section("attachments", DEFAULT_STORAGE_CONFIG)
+
+# ---------- نوع المحتوى ----------
+# (التوقيع في بداية الملف، النوع)
+_SIGNATURES = (
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"BM", "image/bmp"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/x-ole-storage"),  # doc/xls القديمة
+    (b"MZ", "application/x-msdownload"),
+    (b"\x7fELF", "application/x-executable"),
+)
+
+def _is_text(head):
+    if b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+        return True
+    except UnicodeDecodeError as e:
+        return e.start >= len(head) - 3  # حرف مقطوع في نهاية العينة
+
+def detect_content_type(head: bytes, filename=None):
+    """نوع المحتوى من توقيع بداية الملف؛ الامتداد يحدد النوع داخل الحاويات (docx/xlsx داخل zip)"""
+    guessed = mimetypes.guess_type(filename or "")[0]
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1"):
+        return "image/heic"
+    for magic, content_type in _SIGNATURES:
+        if head.startswith(magic):
+            if content_type == "application/zip" and guessed and guessed.startswith("application/vnd.openxmlformats"):
+                return guessed
+            if content_type == "application/x-ole-storage" and guessed in ("application/msword", "application/vnd.ms-excel"):
+                return guessed
+            return content_type
+    if head and _is_text(head):
+        return "text/plain"
+    return "application/octet-stream"
+
+def check_content_type(content_type, config=None):
+    allowed = (config or storage_config())["allowed_types"]
+    if not any(content_type.startswith(prefix) for prefix in allowed):
+        raise FileTypeNotAllowed(f"نوع الملف غير مسموح: {content_type}")
+
+def file_extension(content_type, filename=None):
+    # للحقل filetype (قصير): من الاسم إن وُجد وإلا من النوع
+    suffix = Path(filename).suffix.lstrip(".").lower() if filename else ""
+    if not suffix:
+        suffix = (mimetypes.guess_extension(content_type) or "").lstrip(".")
+    return (suffix or "bin")[:32]
+
+# ---------- المخزن ----------
+class StoredFile:
+    def __init__(self, sha256, size, content_type, deduplicated):
+        self.sha256 = sha256
+        self.size = size
+        self.content_type = content_type
+        self.deduplicated = deduplicated
+
+class IncomingFile:
+    """ملف قيد الرفع: write(chunk) لكل جزء ثم commit() أو discard()"""
+
+    def __init__(self, store, max_bytes):
+        self._store = store
+        self._max_bytes = max_bytes
+        store.tmp.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=store.tmp, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self.path = Path(path)
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self._max_bytes:
+            raise FileTooLarge(f"حجم الملف أكبر من الحد المسموح ({self._max_bytes // (1024 * 1024)}MB)")
+        if len(self.head) < HEAD_BYTES:
+            self.head += chunk[:HEAD_BYTES - len(self.head)]
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self, content_type):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        digest = self._hash.hexdigest()
+        final = self._store.path_for(digest)
+        if final.exists():
+            # نسخة مكررة: الملف المؤقت يُحذف، وتحديث وقت الملف الموجود يحميه من التنظيف قبل ربطه بالصف الجديد
+            self.path.unlink()
+            os.utime(final)
+            return StoredFile(digest, self.size, content_type, deduplicated=True)
+        final.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.path, final)
+        return StoredFile(digest, self.size, content_type, deduplicated=False)
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+        self.path.unlink(missing_ok=True)
+
+class ContentStore:
+    def __init__(self, directory):
+        self.root = Path(directory)
+        self.tmp = self.root / "tmp"
+
+    def path_for(self, sha256):
+        # تقسيم بأول 4 أحرف من البصمة (256 × 256 مجلد) حتى لا يكبر أي مجلد
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    def relative_path(self, sha256):
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+    def incoming(self, max_bytes):
+        return IncomingFile(self, max_bytes)
+
+    def open_path(self, sha256):
+        path = self.path_for(sha256)
+        if not path.is_file():
+            raise StoredFileMissing("ملف المرفق غير موجود في المخزن")
+        return path
+
+def get_store(config=None):
+    return ContentStore((config or storage_config())["directory"])
+
+def attachment_path(attachment: Attachment, store=None):
+    """مسار محتوى المرفق على السيرفر؛ المرفقات القديمة (مسار من العميل فقط) ليس لها محتوى مخزن"""
+    if not attachment.sha256:
+        raise StoredFileMissing("المرفق لا يحتوي ملفاً مخزناً على السيرفر")
+    return (store or get_store()).open_path(attachment.sha256)
+
+def collect_garbage(db: Session, store=None, grace_seconds=None):
+    """حذف الملفات التي لا يشير لها أي مرفق (والملفات المؤقتة المتروكة) الأقدم من المهلة"""
+    config = storage_config()
+    store = store or get_store(config)
+    grace = config["gc_grace_seconds"] if grace_seconds is None else grace_seconds
+    if not store.root.exists():
+        return {"removed": 0, "bytes_freed": 0}
+    referenced = set(db.execute(
+        select(Attachment.sha256).where(Attachment.sha256.isnot(None)).distinct()
+    ).scalars())
+    cutoff = time.time() - grace
+    removed = freed = 0
+    for path in store.root.glob("??/??/*"):
+        stat = path.stat()
+        if path.name not in referenced and stat.st_mtime < cutoff:
+            path.unlink()
+            removed += 1
+            freed += stat.st_size
+    for path in store.tmp.glob("*.part"):
+        if path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+    if removed:
+        logger.info("تنظيف المرفقات: حذف %d ملف (%d بايت)", removed, freed)
+    return {"removed": removed, "bytes_freed": freed}
@@ -0,0 +1,45 @@
+from fastapi.responses import JSONResponse
+from datetime import date, datetime
+from decimal import Decimal
+import enum
+import json
+
+try:
+    import orjson
+except ImportError:  # اختياري: بدونه يُستخدم json القياسي بنفس المخرجات
+    orjson = None
+
+# ========== مسار JSON السريع للاستجابات الموثوقة ==========
+# مع response_model يتحقق FastAPI من كل عنصر في الاستجابة مرة أخرى (بعد بنائه في *_to_schema) ثم يرمزه.
+# القوائم الكبيرة ولوحة التحكم تُبنى من صفوف SQL مباشرة (dict بأنواع JSON جاهزة)، فترجع TrustedJSONResponse:
+# FastAPI يرسل أي Response كما هو بدون تحقق، والترميز بـ orjson إن كان مثبتاً.
+# response_model يبقى على المسار لتوثيق OpenAPI فقط.
+
+def _default(value):
+    # الأنواع التي لا يرمزها json مباشرة (orjson يرمز التاريخ و enum بنفسه)
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class TrustedJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def trusted_json(content, response=None):
+    """
+    استجابة JSON بدون تحقق response_model. response: كائن Response المحقون في المسار؛
+    ترويساته (ETag من conditional_get، مؤشرات الصفحات) تُنقل لأن FastAPI لا يدمجها مع Response مُرجع.
+    """
+    result = TrustedJSONResponse(content)
+    if response is not None:
+        result.headers.raw.extend(response.headers.raw)
+    return result
@@ -0,0 +1,181 @@
+from collections import OrderedDict
+from pathlib import Path
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import yaml
+except ImportError:  # بدون PyYAML نستخدم القيم الافتراضية
+    yaml = None
+
+# ========== عميل HTTP مشترك لكل الـ API Handlers ==========
+# جلسة واحدة (requests.Session) باتصالات مُعاد استخدامها (keep-alive) بدل فتح اتصال TCP جديد لكل طلب،
+# مع مهلة افتراضية، وقبول الضغط، وإعادة المحاولة مع تراجع تدريجي (backoff) للأخطاء المؤقتة.
+
+DEFAULT_CLIENT_CONFIG = {
+    "api_base_url": "http://localhost:8000",
+    "connect_timeout": 3.05,
+    "read_timeout": 30,
+    "retries": 3,
+    "backoff_factor": 0.3,     # 0.3, 0.6, 1.2 ثانية بين المحاولات
+    "pool_maxsize": 10,
+    "http_cache_size": 256,    # عدد استجابات GET المحفوظة للتحقق بـ ETag (0 لتعطيله)
+    "live_updates": True,      # الاشتراك في أحداث التغيير من /events (frontend/event_stream.py)
+}
+
+# الطلبات التي يمكن إعادتها بأمان (POST قد ينشئ سجلاً مكرراً)
+RETRY_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+RETRY_STATUSES = (502, 503, 504)
+
+CONFIG_PATH = Path(os.environ.get("PROPERTY_APP_CONFIG", Path(__file__).resolve().parents[1] / "config" / "config.yaml"))
+
+def _accept_encoding():
+    # urllib3 يفك br فقط إذا كانت مكتبة brotli مثبتة
+    try:
+        import brotli  # noqa: F401
+        return "gzip, deflate, br"
+    except ImportError:
+        return "gzip, deflate"
+
+def load_client_config(path=CONFIG_PATH):
+    config = dict(DEFAULT_CLIENT_CONFIG)
+    if yaml is not None and Path(path).exists():
+        with open(path, encoding="utf-8") as f:
+            config.update((yaml.safe_load(f) or {}).get("frontend") or {})
+    if os.environ.get("PROPERTY_API_URL"):
+        config["api_base_url"] = os.environ["PROPERTY_API_URL"]
+    return config
+
+class ApiClient:
+    def __init__(self, base_url=None, connect_timeout=None, read_timeout=None,
+                 retries=None, backoff_factor=None, pool_maxsize=None):
+        config = load_client_config()
+        self.base_url = (base_url or config["api_base_url"]).rstrip("/")
+        self.timeout = (connect_timeout or config["connect_timeout"], read_timeout or config["read_timeout"])
+
+        retry = Retry(
+            total=config["retries"] if retries is None else retries,
+            backoff_factor=config["backoff_factor"] if backoff_factor is None else backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=RETRY_METHODS,
+            raise_on_status=False,
+        )
+        size = pool_maxsize or config["pool_maxsize"]
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=size, pool_maxsize=size)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept-Encoding": _accept_encoding()})
+
+        # آخر استجابة GET لكل رابط مع ETag/Last-Modified: الطلب التالي مشروط، و304 يعيد المحفوظة بدون جسم
+        self._cache = OrderedDict()
+        self._cache_size = config["http_cache_size"]
+        self._cache_lock = threading.Lock()  # الطلبات تُرسل من مسارات متعددة (RequestDispatcher)
+        # تُستدعى (من مسار الطلب) عند أول 401 لطلب يحمل رمز الجلسة: انتهت الصلاحية أو أُلغيت الجلسة
+        self._unauthorized_callbacks = []
+
+    def url(self, path):
+        # يقبل مساراً نسبياً ("/units/") أو رابطاً كاملاً كما هو
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        if method.upper() == "GET" and self._cache_size and not kwargs.get("stream"):
+            response = self._conditional_get(self.url(path), **kwargs)
+        else:
+            response = self.session.request(method, self.url(path), **kwargs)
+        if response.status_code == 401:
+            self._session_expired(response)
+        return response
+
+    def on_unauthorized(self, callback):
+        self._unauthorized_callbacks.append(callback)
+
+    def _session_expired(self, response):
+        # فقط إذا أُرسل الطلب برمز الجلسة الحالي؛ الطلبات المتزامنة الأخرى تجد الرمز محذوفاً فلا تكرر التنبيه
+        sent = response.request.headers.get("Authorization")
+        if sent is None or self.session.headers.get("Authorization") != sent:
+            return
+        if self.session.headers.pop("Authorization", None) is None:
+            return
+        self.clear_cache()
+        for callback in self._unauthorized_callbacks:
+            callback()
+
+    def _conditional_get(self, url, **kwargs):
+        key = requests.Request("GET", url, params=kwargs.get("params")).prepare().url
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached is not None:
+            if cached.headers.get("ETag"):
+                headers["If-None-Match"] = cached.headers["ETag"]
+            if cached.headers.get("Last-Modified"):
+                headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+        response = self.session.request("GET", url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            with self._cache_lock:
+                self._cache.move_to_end(key)
+            return cached
+        if response.ok and ("ETag" in response.headers or "Last-Modified" in response.headers):
+            response.content  # قراءة الجسم كاملاً قبل الحفظ
+            with self._cache_lock:
+                self._cache[key] = response
+                self._cache.move_to_end(key)
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return response
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def set_token(self, token):
+        """رمز الجلسة من /api/login: يُرسل مع كل طلب بعده (بما فيها /events)"""
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        self.clear_cache()  # الاستجابات المحفوظة تخص الجلسة السابقة
+
+    def clear_token(self):
+        self.session.headers.pop("Authorization", None)
+        self.clear_cache()
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def upload(self, path, file_path, **params):
+        """رفع ملف كجسم الطلب مباشرة (يُقرأ من القرص أثناء الإرسال)؛ السيرفر يحسب البصمة ويحدد النوع"""
+        with open(file_path, "rb") as f:
+            return self.post(path, data=f, params={"filename": os.path.basename(file_path), **params},
+                             headers={"Content-Type": "application/octet-stream"})
+
+    def send(self, method, path, **kwargs):
+        """(نجاح الطلب، جسم JSON) — جسم غير JSON يرجع {}؛ يُستدعى عادة من مسار العامل"""
+        resp = self.request(method, path, **kwargs)
+        try:
+            data = resp.json()
+        except ValueError:
+            data = {}
+        return resp.ok, data
+
+    def close(self):
+        self.session.close()
+
+# عميل واحد مشترك للتطبيق كله
+api = ApiClient()
@@ -1,13 +1,18 @@
 from PySide6.QtCore import QObject, Slot, Signal, Property
-import requests
+from frontend.api_client import api
+from frontend.request_dispatcher import RequestDispatcher
 
 class AuditApiHandler(QObject):
     auditLogChanged = Signal()
+    auditLoaded = Signal('QVariant')
     errorOccurred = Signal(str)
+    loadingChanged = Signal()
 
     def __init__(self):
         super().__init__()
         self._auditlog = []
+        self._dispatcher = RequestDispatcher(self)
+        self._dispatcher.loadingChanged.connect(self.loadingChanged)
 
     def _to_py_dict(self, jsvalue):
         if hasattr(jsvalue, "toVariant"):
@@ -20,30 +25,32 @@ class AuditApiHandler(QObject):
             return jsvalue
         return jsvalue
 
-    @Slot(result="QVariant")
+    @Slot()
     def get_all_auditlog(self):
-        try:
-            resp = requests.get("http://localhost:8000/auditlog/")
-            data = resp.json()
-            self._auditlog = data if isinstance(data, list) else data.get("data", [])
-            self.auditLogChanged.emit()
-            return self._auditlog
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return []
-
-    @Slot(int, result="QVariant")
+        self._dispatcher.submit(self._fetch_auditlog, self._on_auditlog_loaded, self.errorOccurred.emit, key="auditlog")
+
+    def _fetch_auditlog(self):
+        data = api.get("/auditlog/").json()
+        return data if isinstance(data, list) else data.get("data", [])
+
+    def _on_auditlog_loaded(self, auditlog):
+        self._auditlog = auditlog
+        self.auditLogChanged.emit()
+
+    @Slot(int)
     def get_audit_by_id(self, audit_id):
-        try:
-            resp = requests.get(f"http://localhost:8000/auditlog/{audit_id}")
-            return resp.json()
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {}
+        self._dispatcher.submit(
+            lambda: api.get(f"/auditlog/{audit_id}").json(),
+            self.auditLoaded.emit, self.errorOccurred.emit, key=("audit", audit_id),
+        )
 
     # غالباً السجل يُقرأ فقط، إن أردت إضافة/حذف فعّلها بنفس النمط
 
     def auditlog(self):
         return self._auditlog
 
+    def isLoading(self):
+        return self._dispatcher.isLoading()
+
     auditLogList = Property('QVariant', auditlog, notify=auditLogChanged)
+    isLoadingProp = Property(bool, isLoading, notify=loadingChanged)
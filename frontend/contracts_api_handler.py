@@ -1,13 +1,19 @@
 from PySide6.QtCore import QObject, Slot, Signal, Property
-import requests
+from frontend.api_client import api
+from frontend.request_dispatcher import RequestDispatcher
 
 class ContractsApiHandler(QObject):
     contractsChanged = Signal()
+    contractLoaded = Signal('QVariant')
     errorOccurred = Signal(str)
+    loadingChanged = Signal()
 
     def __init__(self):
         super().__init__()
         self._contracts = []
+        self._loaded = False
+        self._dispatcher = RequestDispatcher(self)
+        self._dispatcher.loadingChanged.connect(self.loadingChanged)
 
     def _to_py_dict(self, jsvalue):
         if hasattr(jsvalue, "toVariant"):
@@ -20,75 +26,62 @@ class ContractsApiHandler(QObject):
             return jsvalue
         return jsvalue
 
-    @Slot(result="QVariant")
+    @Slot()
     def get_all_contracts(self):
-        try:
-            resp = requests.get("http://localhost:8000/contracts/")
-            data = resp.json()
-            self._contracts = data if isinstance(data, list) else data.get("data", [])
-            self.contractsChanged.emit()
-            return self._contracts
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return []
-
-    @Slot(int, result="QVariant")
+        self._dispatcher.submit(self._fetch_contracts, self._on_contracts_loaded, self.errorOccurred.emit, key="contracts")
+
+    def _fetch_contracts(self):
+        data = api.get("/contracts/").json()
+        return data if isinstance(data, list) else data.get("data", [])
+
+    def _on_contracts_loaded(self, contracts):
+        self._contracts = contracts
+        self._loaded = True
+        self.contractsChanged.emit()
+
+    @Slot()
+    def on_remote_change(self):
+        # حدث تغيير من السيرفر (EventStream): إعادة الجلب (طلب مشروط بـ ETag) إذا كانت القائمة معروضة
+        if self._loaded:
+            self.get_all_contracts()
+
+    @Slot(int)
     def get_contract_by_id(self, contract_id):
-        try:
-            resp = requests.get(f"http://localhost:8000/contracts/{contract_id}")
-            return resp.json()
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {}
-
-    @Slot("QVariant", result="QVariant")
+        self._dispatcher.submit(
+            lambda: api.get(f"/contracts/{contract_id}").json(),
+            self.contractLoaded.emit, self.errorOccurred.emit, key=("contract", contract_id),
+        )
+
+    def _mutate(self, method, path, payload=None):
+        # إضافة/تعديل/حذف ثم إعادة تحميل القائمة (بدون مفتاح: لا يُلغى)
+        self._dispatcher.submit(
+            lambda: api.send(method, path, json=payload),
+            self._on_mutated, self.errorOccurred.emit,
+        )
+
+    def _on_mutated(self, result):
+        ok, data = result
+        self.get_all_contracts()
+        if not ok:
+            self.errorOccurred.emit(str(data))
+
+    @Slot("QVariant")
     def add_contract(self, contract_data):
-        try:
-            contract_data = self._to_py_dict(contract_data)
-            resp = requests.post("http://localhost:8000/contracts/", json=contract_data)
-            data = resp.json()
-            self.get_all_contracts()
-            if resp.ok:
-                return {"success": True, "contract_id": data.get("id")}
-            else:
-                self.errorOccurred.emit(str(data))
-                return {"success": False, "error": data.get("detail")}
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {'success': False, 'error': str(e)}
-
-    @Slot(int, "QVariant", result="QVariant")
+        self._mutate("POST", "/contracts/", self._to_py_dict(contract_data))
+
+    @Slot(int, "QVariant")
     def update_contract(self, contract_id, contract_data):
-        try:
-            contract_data = self._to_py_dict(contract_data)
-            resp = requests.put(f"http://localhost:8000/contracts/{contract_id}", json=contract_data)
-            data = resp.json()
-            self.get_all_contracts()
-            if resp.ok:
-                return {"success": True}
-            else:
-                self.errorOccurred.emit(str(data))
-                return {"success": False, "error": data.get("detail")}
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {'success': False, 'error': str(e)}
-
-    @Slot(int, result="QVariant")
+        self._mutate("PUT", f"/contracts/{contract_id}", self._to_py_dict(contract_data))
+
+    @Slot(int)
     def delete_contract(self, contract_id):
-        try:
-            resp = requests.delete(f"http://localhost:8000/contracts/{contract_id}")
-            self.get_all_contracts()
-            if resp.ok:
-                return {"success": True}
-            else:
-                data = resp.json()
-                self.errorOccurred.emit(str(data))
-                return {"success": False, "error": data.get("detail")}
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {'success': False, 'error': str(e)}
+        self._mutate("DELETE", f"/contracts/{contract_id}")
 
     def contracts(self):
         return self._contracts
 
+    def isLoading(self):
+        return self._dispatcher.isLoading()
+
     contractsList = Property('QVariant', contracts, notify=contractsChanged)
+    isLoadingProp = Property(bool, isLoading, notify=loadingChanged)
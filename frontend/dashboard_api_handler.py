@@ -1,27 +1,40 @@
 from PySide6.QtCore import QObject, Slot, Signal, Property
-import requests
+from frontend.api_client import api
+from frontend.request_dispatcher import RequestDispatcher
 
 class DashboardApiHandler(QObject):
     dashboardChanged = Signal()
     errorOccurred = Signal(str)
+    loadingChanged = Signal()
 
     def __init__(self):
         super().__init__()
         self._dashboard = {}
+        self._dispatcher = RequestDispatcher(self)
+        self._dispatcher.loadingChanged.connect(self.loadingChanged)
 
-    @Slot(result="QVariant")
+    @Slot()
     def get_dashboard(self):
-        try:
-            resp = requests.get("http://localhost:8000/dashboard/")
-            data = resp.json()
-            self._dashboard = data if isinstance(data, dict) else {}
-            self.dashboardChanged.emit()
-            return self._dashboard
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {}
+        # النتيجة عبر dashboardChanged ثم الخاصية dashboardData
+        self._dispatcher.submit(
+            lambda: api.get("/dashboard/").json(),
+            self._on_dashboard_loaded, self.errorOccurred.emit, key="dashboard",
+        )
+
+    def _on_dashboard_loaded(self, data):
+        self._dashboard = data if isinstance(data, dict) else {}
+        self.dashboardChanged.emit()
+
+    @Slot()
+    def on_remote_change(self):
+        if self._dashboard:
+            self.get_dashboard()
 
     def dashboard(self):
         return self._dashboard
 
+    def isLoading(self):
+        return self._dispatcher.isLoading()
+
     dashboardData = Property("QVariant", dashboard, notify=dashboardChanged)
+    isLoadingProp = Property(bool, isLoading, notify=loadingChanged)
@@ -0,0 +1,36 @@
+from frontend.api_client import api
+
+# ========== المزامنة التزايدية (Delta Sync) ==========
+# بدل إعادة تحميل القائمة كاملة في كل refresh: يُحفظ رمز التغيير من آخر تحميل، ويُطلب من
+# /sync/{entity}?since=<token> ما تغير أو حُذف بعده فقط، ثم يُدمج في نموذج القائمة (ApiListModel.merge).
+# fetch_token و fetch_changes تُنفذان في مسار العامل (RequestDispatcher)، و accept في مسار الواجهة.
+
+class DeltaSync:
+    def __init__(self, entity):
+        self.entity = entity
+        self.token = None  # None: لم يتم تحميل كامل بعد، فلا يمكن المزامنة التزايدية
+
+    def fetch_token(self):
+        """الرمز الحالي؛ يُطلب قبل التحميل الكامل حتى لا يضيع تغيير يحدث بينهما (None إذا فشل)"""
+        try:
+            response = api.get(f"/sync/{self.entity}")
+            response.raise_for_status()
+            return response.json().get("token")
+        except Exception:
+            return None
+
+    def fetch_changes(self, token):
+        """{"token", "changed", "deleted", "reset"} منذ الرمز المعطى"""
+        response = api.get(f"/sync/{self.entity}", params={"since": token})
+        response.raise_for_status()
+        return response.json()
+
+    def accept(self, token):
+        # الرد الأقدم (مزامنة وصلت بعد تحميل كامل أحدث) لا يرجع الرمز للخلف
+        if token is not None and (self.token is None or token >= self.token):
+            self.token = token
+            return True
+        return False
+
+    def invalidate(self):
+        self.token = None
@@ -0,0 +1,140 @@
+from PySide6.QtCore import QObject, QTimer, Signal, Slot, Property
+from frontend.api_client import api, load_client_config
+import json
+import threading
+
+# ========== مشترك أحداث التغيير (SSE من /events) ==========
+# اتصال واحد طويل في مسار خاص (ليس ضمن QThreadPool الطلبات) يستقبل حدثاً بعد كل commit على السيرفر،
+# ويوجهه للـ Handlers التي تعرض الجداول المتغيرة، فتزامن ما تغير فقط بدل التحديث الدوري.
+# الأحداث المتقاربة تُجمع (COALESCE_MS) فيصل كل Handler استدعاء واحد للدفعة.
+
+EVENTS_READ_TIMEOUT = 45  # أكبر من نبضة keep-alive في السيرفر (15 ثانية)
+RECONNECT_DELAYS = (1, 2, 5, 10, 30)
+COALESCE_MS = 150
+
+class EventStream(QObject):
+    eventReceived = Signal('QVariant')
+    connectedChanged = Signal()
+    _received = Signal(object)
+    _connection = Signal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._routes = []          # (الجداول، الدالة)
+        self._pending = set()      # جداول الدفعة الحالية
+        self._last_token = None
+        self._connected = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._response = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(COALESCE_MS)
+        self._timer.timeout.connect(self._flush)
+        # الإشارات من مسار القراءة تصل لمسار الواجهة (Queued)
+        self._received.connect(self._on_event)
+        self._connection.connect(self._set_connected)
+
+    def is_connected(self):
+        return self._connected
+
+    connected = Property(bool, is_connected, notify=connectedChanged)
+
+    def route(self, tables, callback):
+        """callback() يُستدعى في مسار الواجهة عند تغير أي من الجداول (أو بعد إعادة الاتصال)"""
+        self._routes.append((frozenset(tables), callback))
+
+    @Slot()
+    def start(self):
+        if not load_client_config().get("live_updates", True):
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="event-stream", daemon=True)
+        self._thread.start()
+
+    @Slot()
+    def stop(self):
+        self._stop.set()
+        response = self._response
+        if response is not None:
+            response.close()  # يفك القراءة المعلقة
+        if self._thread is not None:
+            self._thread.join(2)
+            self._thread = None
+
+    # ---------- مسار القراءة ----------
+    def _run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                response = api.get("/events", stream=True,
+                                   timeout=(api.timeout[0], EVENTS_READ_TIMEOUT),
+                                   headers={"Accept": "text/event-stream"})
+                if response.status_code == 401:
+                    # الرمز لم يعد صالحاً: إعادة المحاولة به لا فائدة منها، الاشتراك يبدأ من جديد بعد الدخول
+                    response.close()
+                    break
+                response.raise_for_status()
+                self._response = response
+                self._connection.emit(True)
+                attempt = 0
+                self._read(response)
+            except Exception:
+                pass
+            finally:
+                if self._response is not None:
+                    self._response.close()
+                    self._response = None
+                self._connection.emit(False)
+            if self._stop.wait(RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)]):
+                break
+            attempt += 1
+
+    def _read(self, response):
+        # chunk_size=None: كل جزء (chunk) يُسلم فور وصوله بدل انتظار امتلاء 512 بايت
+        response.encoding = "utf-8"  # SSE دائماً UTF-8 (الترويسة بدون charset)
+        data = []
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if self._stop.is_set():
+                return
+            if line is None:
+                continue
+            if line.startswith("data:"):
+                data.append(line[5:].strip())
+            elif line == "" and data:
+                try:
+                    self._received.emit(json.loads("\n".join(data)))
+                except ValueError:
+                    pass
+                data = []
+
+    # ---------- مسار الواجهة ----------
+    @Slot(bool)
+    def _set_connected(self, connected):
+        if connected != self._connected:
+            self._connected = connected
+            self.connectedChanged.emit()
+
+    @Slot(object)
+    def _on_event(self, item):
+        kind, token = item.get("type"), item.get("token")
+        if kind == "change":
+            self._pending.update(item.get("tables", ()))
+        elif kind in ("hello", "reset"):
+            # بعد (إعادة) الاتصال أو تأخر الاستقبال: قد تكون فاتت أحداث، كل الـ Handlers تزامن
+            if kind == "reset" or (self._last_token is not None and token != self._last_token):
+                for tables, _ in self._routes:
+                    self._pending.update(tables)
+        if token is not None:
+            self._last_token = token
+        self.eventReceived.emit(item)
+        if self._pending and not self._timer.isActive():
+            self._timer.start()
+
+    def _flush(self):
+        tables, self._pending = self._pending, set()
+        for route_tables, callback in self._routes:
+            if route_tables & tables:
+                callback()
@@ -1,13 +1,19 @@
 from PySide6.QtCore import QObject, Slot, Signal, Property
-import requests
+from frontend.api_client import api
+from frontend.request_dispatcher import RequestDispatcher
 
 class InvoicesApiHandler(QObject):
     invoicesChanged = Signal()
+    invoiceLoaded = Signal('QVariant')
     errorOccurred = Signal(str)
+    loadingChanged = Signal()
 
     def __init__(self):
         super().__init__()
         self._invoices = []
+        self._loaded = False
+        self._dispatcher = RequestDispatcher(self)
+        self._dispatcher.loadingChanged.connect(self.loadingChanged)
 
     def _to_py_dict(self, jsvalue):
         if hasattr(jsvalue, "toVariant"):
@@ -20,88 +26,66 @@ class InvoicesApiHandler(QObject):
             return jsvalue
         return jsvalue
 
-    @Slot(result="QVariant")
+    @Slot()
     def get_all_invoices(self):
-        try:
-            resp = requests.get("http://localhost:8000/invoices/")
-            data = resp.json()
-            self._invoices = data if isinstance(data, list) else data.get("data", [])
-            self.invoicesChanged.emit()
-            return self._invoices
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return []
-
-    @Slot(int, result="QVariant")
+        self._dispatcher.submit(self._fetch_invoices, self._on_invoices_loaded, self.errorOccurred.emit, key="invoices")
+
+    def _fetch_invoices(self):
+        data = api.get("/invoices/").json()
+        return data if isinstance(data, list) else data.get("data", [])
+
+    def _on_invoices_loaded(self, invoices):
+        self._invoices = invoices
+        self._loaded = True
+        self.invoicesChanged.emit()
+
+    @Slot()
+    def on_remote_change(self):
+        # حدث تغيير من السيرفر (EventStream): إعادة الجلب (طلب مشروط بـ ETag) إذا كانت القائمة معروضة
+        if self._loaded:
+            self.get_all_invoices()
+
+    @Slot(int)
     def get_invoice_by_id(self, invoice_id):
-        try:
-            resp = requests.get(f"http://localhost:8000/invoices/{invoice_id}")
-            return resp.json()
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {}
-
-    @Slot("QVariant", result="QVariant")
+        self._dispatcher.submit(
+            lambda: api.get(f"/invoices/{invoice_id}").json(),
+            self.invoiceLoaded.emit, self.errorOccurred.emit, key=("invoice", invoice_id),
+        )
+
+    def _mutate(self, method, path, payload=None):
+        # إضافة/تعديل/حذف ثم إعادة تحميل القائمة (بدون مفتاح: لا يُلغى)
+        self._dispatcher.submit(
+            lambda: api.send(method, path, json=payload),
+            self._on_mutated, self.errorOccurred.emit,
+        )
+
+    def _on_mutated(self, result):
+        ok, data = result
+        self.get_all_invoices()
+        if not ok:
+            self.errorOccurred.emit(str(data))
+
+    @Slot("QVariant")
     def add_invoice(self, invoice_data):
-        try:
-            invoice_data = self._to_py_dict(invoice_data)
-            resp = requests.post("http://localhost:8000/invoices/", json=invoice_data)
-            data = resp.json()
-            self.get_all_invoices()
-            if resp.ok:
-                return {"success": True, "invoice_id": data.get("id")}
-            else:
-                self.errorOccurred.emit(str(data))
-                return {"success": False, "error": data.get("detail")}
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {'success': False, 'error': str(e)}
-
-    @Slot(int, "QVariant", result="QVariant")
+        self._mutate("POST", "/invoices/", self._to_py_dict(invoice_data))
+
+    @Slot(int, "QVariant")
     def update_invoice(self, invoice_id, invoice_data):
-        try:
-            invoice_data = self._to_py_dict(invoice_data)
-            resp = requests.put(f"http://localhost:8000/invoices/{invoice_id}", json=invoice_data)
-            data = resp.json()
-            self.get_all_invoices()
-            if resp.ok:
-                return {"success": True}
-            else:
-                self.errorOccurred.emit(str(data))
-                return {"success": False, "error": data.get("detail")}
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {'success': False, 'error': str(e)}
-
-    @Slot(int, result="QVariant")
+        self._mutate("PUT", f"/invoices/{invoice_id}", self._to_py_dict(invoice_data))
+
+    @Slot(int)
     def delete_invoice(self, invoice_id):
-        try:
-            resp = requests.delete(f"http://localhost:8000/invoices/{invoice_id}")
-            self.get_all_invoices()
-            if resp.ok:
-                return {"success": True}
-            else:
-                data = resp.json()
-                self.errorOccurred.emit(str(data))
-                return {"success": False, "error": data.get("detail")}
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {'success': False, 'error': str(e)}
+        self._mutate("DELETE", f"/invoices/{invoice_id}")
 
     def invoices(self):
         return self._invoices
 
+    def isLoading(self):
+        return self._dispatcher.isLoading()
+
     invoicesList = Property('QVariant', invoices, notify=invoicesChanged)
+    isLoadingProp = Property(bool, isLoading, notify=loadingChanged)
 
     @Slot(int)
     def set_invoice_paid(self, invoice_id):
-        try:
-            resp = requests.post(f"http://localhost:8000/invoices/{invoice_id}/set_paid")
-            if resp.ok:
-                self.get_all_invoices()
-                self.invoicesChanged.emit()
-            else:
-                data = resp.json()
-                self.errorOccurred.emit(str(data))
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
+        self._mutate("POST", f"/invoices/{invoice_id}/set_paid")
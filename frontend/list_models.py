@@ -0,0 +1,237 @@
+from PySide6.QtCore import (QAbstractListModel, QSortFilterProxyModel, QModelIndex, QByteArray,
+                            Qt, Signal, Slot, Property)
+
+# ========== نماذج القوائم (QAbstractListModel) للـ QML ==========
+# بدل تمرير القائمة كاملة كـ QVariant في كل تغيير: النموذج يبلغ الـ ListView بالإضافة/الحذف/التعديل
+# لكل صف فيُعاد بناء الـ delegate المتأثر فقط، و fetchMore يحمّل الصفحة التالية (Keyset) عند التمرير.
+# كل صف dict كما يرجعه الـ API ويجب أن يحتوي "id".
+# الدور modelData يرجع الصف كاملاً حتى تبقى الـ delegates الحالية (modelData.name ...) تعمل كما هي.
+
+MODEL_DATA_ROLE = Qt.UserRole + 1
+
+class ApiListModel(QAbstractListModel):
+    countChanged = Signal()
+    hasMoreChanged = Signal()
+
+    def __init__(self, fields, fetch_more=None, parent=None):
+        """
+        fields: أسماء الحقول المتاحة كأدوار في QML (name, phone, ...).
+        fetch_more(cursor): تطلب الصفحة التالية، والـ Handler يستدعي append_page أو fetch_failed عند الرد.
+        """
+        super().__init__(parent)
+        self._rows = []
+        self._fields = list(fields)
+        self._field_roles = {MODEL_DATA_ROLE + 1 + i: name for i, name in enumerate(self._fields)}
+        self._fetch_more = fetch_more
+        self._next_cursor = None
+        self._fetching = False
+
+    # ---------- واجهة Qt ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def roleNames(self):
+        roles = {MODEL_DATA_ROLE: QByteArray(b"modelData")}
+        roles.update({role: QByteArray(name.encode()) for role, name in self._field_roles.items()})
+        return roles
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._rows):
+            return None
+        row = self._rows[index.row()]
+        if role == MODEL_DATA_ROLE:
+            return row
+        if role in self._field_roles:
+            return row.get(self._field_roles[role])
+        if role == Qt.DisplayRole and self._fields:
+            return str(row.get(self._fields[0], ""))
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return (not parent.isValid() and self._fetch_more is not None
+                and self._next_cursor is not None and not self._fetching)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._fetching = True
+        self._fetch_more(self._next_cursor)
+
+    # ---------- خصائص QML ----------
+    def row_count(self):
+        return len(self._rows)
+
+    def has_more(self):
+        return self._next_cursor is not None
+
+    count = Property(int, row_count, notify=countChanged)
+    hasMore = Property(bool, has_more, notify=hasMoreChanged)
+
+    @Slot(int, result="QVariant")
+    def get(self, row):
+        return self._rows[row] if 0 <= row < len(self._rows) else None
+
+    # ---------- التحديث من الـ Handler ----------
+    def rows(self):
+        return list(self._rows)
+
+    def row_at(self, row):
+        return self._rows[row]
+
+    def index_of(self, row_id, start=0):
+        for i in range(start, len(self._rows)):
+            if self._rows[i].get("id") == row_id:
+                return i
+        return None
+
+    def replace(self, rows, next_cursor=None):
+        """
+        استبدال المحتوى بأقل عدد من الإشعارات: حذف ما اختفى، نقل/إدراج الجديد، وdataChanged لما تغير فقط.
+        (إعادة تحميل نفس الصفحة لا تعيد إنشاء أي delegate لم يتغير)
+        """
+        old_count = len(self._rows)
+        new_ids = {r.get("id") for r in rows}
+        for i in range(len(self._rows) - 1, -1, -1):
+            if self._rows[i].get("id") not in new_ids:
+                self._remove_at(i)
+        for i, row in enumerate(rows):
+            j = self.index_of(row.get("id"), i)
+            if j is None:
+                self.beginInsertRows(QModelIndex(), i, i)
+                self._rows.insert(i, row)
+                self.endInsertRows()
+                continue
+            if j != i:
+                self.beginMoveRows(QModelIndex(), j, j, QModelIndex(), i)
+                self._rows.insert(i, self._rows.pop(j))
+                self.endMoveRows()
+            if self._rows[i] != row:
+                self._rows[i] = row
+                self._row_changed(i)
+        self._fetching = False
+        self._set_cursor(next_cursor)
+        if len(self._rows) != old_count:
+            self.countChanged.emit()
+
+    def append_page(self, rows, next_cursor=None):
+        # الصفحة التالية من fetchMore (يتجاهل الصفوف المكررة لو تغيرت البيانات بين الصفحات)
+        existing = {r.get("id") for r in self._rows}
+        rows = [r for r in rows if r.get("id") not in existing]
+        if rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+            self.countChanged.emit()
+        self._fetching = False
+        self._set_cursor(next_cursor)
+
+    def fetch_failed(self):
+        # يسمح بإعادة المحاولة عند التمرير التالي
+        self._fetching = False
+
+    def upsert(self, row):
+        i = self.index_of(row.get("id"))
+        if i is None:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first)
+            self._rows.append(row)
+            self.endInsertRows()
+            self.countChanged.emit()
+        elif self._rows[i] != row:
+            self._rows[i] = row
+            self._row_changed(i)
+
+    def merge(self, changed, deleted_ids=()):
+        """
+        دمج نتيجة مزامنة تزايدية (/sync): تحديث الصفوف الموجودة في مكانها وحذف المحذوفة،
+        والجديدة تُدرج بترتيب id تنازلي (ترتيب القوائم) إذا كانت ضمن المدى المحمل، وإلا تأتي مع fetchMore.
+        """
+        old_count = len(self._rows)
+        for row_id in deleted_ids:
+            i = self.index_of(row_id)
+            if i is not None:
+                self._remove_at(i)
+        for row in changed:
+            i = self.index_of(row.get("id"))
+            if i is not None:
+                if self._rows[i] != row:
+                    self._rows[i] = row
+                    self._row_changed(i)
+                continue
+            if self._next_cursor is not None and self._rows and row["id"] < self._rows[-1]["id"]:
+                continue
+            i = next((k for k, r in enumerate(self._rows) if r["id"] < row["id"]), len(self._rows))
+            self.beginInsertRows(QModelIndex(), i, i)
+            self._rows.insert(i, row)
+            self.endInsertRows()
+        if len(self._rows) != old_count:
+            self.countChanged.emit()
+
+    def update_fields(self, row_id, changes):
+        i = self.index_of(row_id)
+        if i is None:
+            return False
+        self._rows[i] = {**self._rows[i], **changes}
+        self._row_changed(i)
+        return True
+
+    def remove_id(self, row_id):
+        i = self.index_of(row_id)
+        if i is not None:
+            self._remove_at(i)
+            self.countChanged.emit()
+
+    def _remove_at(self, i):
+        self.beginRemoveRows(QModelIndex(), i, i)
+        del self._rows[i]
+        self.endRemoveRows()
+
+    def _row_changed(self, i):
+        index = self.index(i, 0)
+        self.dataChanged.emit(index, index, [])
+
+    def _set_cursor(self, next_cursor):
+        had_more = self._next_cursor is not None
+        self._next_cursor = next_cursor
+        if had_more != (next_cursor is not None):
+            self.hasMoreChanged.emit()
+
+class SearchFilterProxyModel(QSortFilterProxyModel):
+    """بحث محلي على الصفوف المحملة (يحتوي النص في أي من الحقول) مع الحفاظ على التحديث التدريجي و fetchMore"""
+    countChanged = Signal()
+
+    def __init__(self, source, fields, parent=None):
+        super().__init__(parent)
+        self._fields = list(fields)
+        self._search = ""
+        self.setSourceModel(source)
+        # عدد الصفوف بعد الفلترة لعدادات الواجهة
+        for signal in (self.rowsInserted, self.rowsRemoved, self.modelReset, self.layoutChanged):
+            signal.connect(self._emit_count)
+
+    def _emit_count(self, *args):
+        self.countChanged.emit()
+
+    def row_count(self):
+        return self.rowCount()
+
+    count = Property(int, row_count, notify=countChanged)
+
+    @Slot(str)
+    def setSearch(self, text):
+        text = (text or "").lower()
+        if text != self._search:
+            self._search = text
+            self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self._search:
+            return True
+        row = self.sourceModel().row_at(source_row)
+        return any(self._search in str(row.get(field) or "").lower() for field in self._fields)
+
+    @Slot(int, result="QVariant")
+    def get(self, row):
+        source_row = self.mapToSource(self.index(row, 0)).row()
+        return self.sourceModel().get(source_row)
@@ -1,60 +1,70 @@
-from PySide6.QtCore import QObject, Signal, Slot, QThread
-
-class LoginWorker(QThread):
-    loginCompleted = Signal(bool, dict)
-    
-    def __init__(self, username, password):
-        super().__init__()
-        self.username = username
-        self.password = password
-    
-    def run(self):
-        import requests
-        try:
-            response = requests.post(
-                "http://localhost:8000/api/login",
-                json={
-                    "username": self.username,
-                    "password": self.password
-                },
-                timeout=5
-            )
-            
-            data = response.json()
-            print("API response:", data)
-            
-            if response.ok and data.get("success") == True:
-                self.loginCompleted.emit(True, {"message": "تم تسجيل الدخول بنجاح"})
-            else:
-                self.loginCompleted.emit(False, {"message": data.get("message", "بيانات تسجيل الدخول غير صحيحة.")})
-        except Exception as e:
-            print("Login error:", e)
-            self.loginCompleted.emit(False, {"message": "فشل الاتصال بالخادم."})
+from PySide6.QtCore import QObject, Signal, Slot, Property
+
+from frontend.api_client import api
+from frontend.request_dispatcher import RequestDispatcher
 
 
 class LoginApiHandler(QObject):
     loginSuccess = Signal()
     loginFailed = Signal(str)
-    
+    loadingChanged = Signal()
+    # الرمز انتهى أو أُلغي (401): الواجهة تعود لصفحة الدخول
+    sessionExpired = Signal()
+    _unauthorized = Signal()
+
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.worker = None
-        
+        self._dispatcher = RequestDispatcher(self)
+        self._dispatcher.loadingChanged.connect(self.loadingChanged)
+        # api يستدعيها من مسار الطلب، والإشارة تنقلها لمسار الواجهة (Queued)
+        self._unauthorized.connect(self._on_unauthorized)
+        api.on_unauthorized(self._unauthorized.emit)
+
+    def isLoading(self):
+        return self._dispatcher.isLoading()
+
+    isLoadingProp = Property(bool, isLoading, notify=loadingChanged)
+
     @Slot(str, str)
     def login(self, username, password):
-        # إلغاء أي عملية سابقة
-        if self.worker and self.worker.isRunning():
-            self.worker.terminate()
-            self.worker.wait()
-        
-        # إنشاء عامل جديد في مسار منفصل
-        self.worker = LoginWorker(username, password)
-        self.worker.loginCompleted.connect(self.handleLoginResult)
-        
-        # تشغيل العملية في مسار منفصل
-        self.worker.start()
-    
-    def handleLoginResult(self, success, data):
+        # محاولة جديدة تلغي أي عملية سابقة (تُهمل نتيجتها) وتُنفذ في مسار منفصل
+        self._dispatcher.submit(
+            lambda: self._send_login(username, password),
+            self.handleLoginResult,
+            self._on_login_error,
+            key="login",
+        )
+
+    def _send_login(self, username, password):
+        response = api.post(
+            "/api/login",
+            json={
+                "username": username,
+                "password": password
+            },
+            timeout=5
+        )
+
+        data = response.json()
+        print("API response:", {"success": data.get("success"), "message": data.get("message")})
+
+        if response.ok and data.get("success") == True:
+            # كل الطلبات التالية تحمل رمز الجلسة بدل إعادة التحقق من كلمة المرور
+            api.set_token(data["access_token"])
+            return True, {"message": "تم تسجيل الدخول بنجاح", "user": data.get("user")}
+        return False, {"message": data.get("message", "بيانات تسجيل الدخول غير صحيحة.")}
+
+    def _on_login_error(self, message):
+        print("Login error:", message)
+        self.handleLoginResult((False, {"message": "فشل الاتصال بالخادم."}))
+
+    @Slot()
+    def _on_unauthorized(self):
+        print("Session expired, returning to login")
+        self.sessionExpired.emit()
+
+    def handleLoginResult(self, result):
+        success, data = result
         if success:
             # إرسال إشارة النجاح
             self.loginSuccess.emit()
@@ -162,6 +162,16 @@ ApplicationWindow {
         }
     }
 
+    // انتهاء الجلسة (401 من أي طلب): العودة لصفحة تسجيل الدخول
+    Connections {
+        target: loginApiHandler
+        function onSessionExpired() {
+            if (pageLoader.source.toString().indexOf("LoginPage.qml") === -1) {
+                goToLogin();
+            }
+        }
+    }
+
     // لودر للصفحات
     Loader {
         id: pageLoader
@@ -1,27 +1,40 @@
 from PySide6.QtCore import QObject, Signal, Slot, Property, QUrl
 
-import requests
+from frontend.api_client import api
+from frontend.request_dispatcher import RequestDispatcher
+from frontend.list_models import ApiListModel
+from frontend.delta_sync import DeltaSync
 
 import os
 
 import json
 
+OWNER_FIELDS = ("id", "name", "registration_number", "nationality", "iban", "agent_name", "notes",
+                "created_at", "updated_at", "attachments")
+
 class OwnersApiHandler(QObject):
 
     # الإشارات
-    dataLoaded = Signal(list) # إشارة جديدة لتحميل البيانات
+    # اكتمال تحميل صفحة (بدون الصفوف: الواجهة تقرأ ownersModel، والتعديلات تصله صفاً صفاً)
+    dataLoaded = Signal()
     ownerAdded = Signal()
     ownerUpdated = Signal()
     ownerDeleted = Signal(int) # تعديل لإرسال معرف المالك المحذوف
     errorOccurred = Signal(str)
     paginationChanged = Signal() # إشارة جديدة لتغيير معلومات الصفحات
+    loadingChanged = Signal()
 
     def __init__(self):
         super().__init__()
-        self._owners = []
+        # الصفحة الحالية في نموذج قائمة: تبديل الصفحة أو إعادة تحميلها يرسل فروقات الصفوف فقط.
+        # التصفح هنا بأزرار الصفحات (currentPage/totalPages) لذلك بدون fetchMore
+        self._model = ApiListModel(OWNER_FIELDS, parent=self)
         self._owners_loaded = False
-        self._isLoading = False
-        self._api_base_url = "http://localhost:8000"
+        # refresh بعد التحميل يجلب ما تغير فقط (/sync/owners) ويُدمج في الصفحة الحالية
+        self._sync = DeltaSync("owners")
+        # كل الطلبات تُنفذ خارج مسار الواجهة والنتائج ترجع عبر الإشارات
+        self._dispatcher = RequestDispatcher(self)
+        self._dispatcher.loadingChanged.connect(self.loadingChanged)
 
         # إضافة متغيرات جديدة لنظام الصفحات
         self._current_page = 1
@@ -31,13 +44,19 @@ class OwnersApiHandler(QObject):
         self._filter_name = ""
         self._filter_registration_number = ""
         self._filter_nationality = ""
+        # تصفح بالمؤشر (Keyset): مؤشر بداية كل صفحة تمت زيارتها، الصفحة 1 تبدأ بدون مؤشر
+        self._page_cursors = {1: None}
+        self._next_cursor = None
 
     # الخصائص الأساسية
     def owners(self):
-        return self._owners
+        return self._model.rows()
+
+    def owners_model(self):
+        return self._model
 
     def isLoading(self):
-        return self._isLoading
+        return self._dispatcher.isLoading()
 
     # خصائص جديدة لنظام الصفحات
     def current_page(self):
@@ -54,7 +73,8 @@ class OwnersApiHandler(QObject):
 
     # تعريف الخصائص
     ownersList = Property(list, owners, notify=dataLoaded)
-    isLoadingProp = Property(bool, isLoading, constant=True)
+    ownersModel = Property(QObject, owners_model, constant=True)
+    isLoadingProp = Property(bool, isLoading, notify=loadingChanged)
     currentPage = Property(int, current_page, notify=paginationChanged)
     perPage = Property(int, per_page, notify=paginationChanged)
     totalPages = Property(int, total_pages, notify=paginationChanged)
@@ -64,23 +84,50 @@ class OwnersApiHandler(QObject):
     def get_owners(self, force_reload=False):
         """تحميل الملاك من السيرفر (الطريقة القديمة)"""
         if self._owners_loaded and not force_reload:
-            self.dataLoaded.emit(self._owners)
+            self.dataLoaded.emit()
             return
 
-        self._isLoading = True
-        try:
-            # استخدام الطريقة الجديدة مع نظام الصفحات
-            self.get_filtered_owners("", "", "", self._current_page, self._per_page)
-        except Exception as e:
-            self.errorOccurred.emit(f"خطأ في جلب الملاك: {str(e)}")
-        finally:
-            self._isLoading = False
+        # استخدام الطريقة الجديدة مع نظام الصفحات
+        self.get_filtered_owners("", "", "", self._current_page, self._per_page)
 
     @Slot()
     def refresh(self):
-        """تحديث البيانات من السيرفر"""
-        self._owners_loaded = False
-        self.get_owners(force_reload=True)
+        """تحديث البيانات من السيرفر: التغييرات فقط منذ آخر مزامنة، أو تحميل كامل إذا لم يوجد رمز"""
+        token = self._sync.token
+        if token is None:
+            self._owners_loaded = False
+            self.get_owners(force_reload=True)
+            return
+        self._dispatcher.submit(
+            lambda: self._sync.fetch_changes(token), self._on_owners_synced,
+            lambda message: self.errorOccurred.emit(f"خطأ في تحديث الملاك: {message}"),
+            key="owners_sync",
+        )
+
+    @Slot()
+    def on_remote_change(self):
+        """ حدث تغيير من السيرفر (EventStream): مزامنة تزايدية إذا كانت القائمة محملة """
+        if self._sync.token is not None:
+            self.refresh()
+
+    def _on_owners_synced(self, data):
+        if data.get("reset"):
+            self._sync.invalidate()
+            self.refresh()
+            return
+        if not self._sync.accept(data.get("token")):
+            return
+        changed, deleted = data.get("changed", []), data.get("deleted", [])
+        if not changed and not deleted:
+            return
+        page_ids = {o["id"] for o in self._model.rows()}
+        filtered = self._filter_name or self._filter_registration_number or self._filter_nationality
+        # مالك جديد أو محذوف يزيح حدود الصفحات، والتعديل مع فلتر قد يخرج الصف منه: إعادة الصفحة الحالية
+        # (طلب مشروط بـ ETag). غير ذلك تُحدّث صفوف الصفحة في مكانها بدون أي طلب آخر
+        if filtered or deleted or any(o["id"] not in page_ids for o in changed):
+            self._reload_current_page()
+            return
+        self._model.merge(changed)
 
     @Slot(int)
     def set_per_page(self, per_page):
@@ -88,6 +135,7 @@ class OwnersApiHandler(QObject):
         if per_page != self._per_page:
             self._per_page = per_page
             self._current_page = 1  # إعادة الصفحة للبداية
+            self._page_cursors = {1: None}
             self.paginationChanged.emit()
             # استدعاء دالة تحميل البيانات مع القيمة الجديدة
             self.get_filtered_owners(self._filter_name, self._filter_registration_number, self._filter_nationality,
@@ -95,22 +143,30 @@ class OwnersApiHandler(QObject):
 
     @Slot(str, str, str, int, int)
     def get_filtered_owners(self, filter_name="", filter_registration_number="", filter_nationality="", page=1, per_page=None):
-        """تحميل الملاك من السيرفر مع دعم التصفية والصفحات"""
-        self._isLoading = True
-        self._current_page = page
-        
+        """تحميل الملاك من السيرفر مع دعم التصفية والصفحات (في الخلفية، الطلب الأحدث يلغي السابق)"""
         # استخدام قيمة per_page من المعاملات إذا توفرت، وإلا استخدام القيمة المخزنة
-        if per_page is not None:
+        if per_page is not None and per_page != self._per_page:
             self._per_page = per_page
-            
+            self._page_cursors = {1: None}
+
+        # تغيير الفلاتر يعيد التصفح من البداية لأن المؤشرات السابقة لم تعد صالحة
+        filters = (filter_name, filter_registration_number, filter_nationality)
+        if filters != (self._filter_name, self._filter_registration_number, self._filter_nationality):
+            self._page_cursors = {1: None}
+        if page not in self._page_cursors:
+            page = 1
+        self._current_page = page
+
         self._filter_name = filter_name
         self._filter_registration_number = filter_registration_number
         self._filter_nationality = filter_nationality
 
         params = {
-            "page": page,
-            "per_page": self._per_page
+            "per_page": self._per_page,
+            "keyset": "true"
         }
+        if self._page_cursors[page]:
+            params["cursor"] = self._page_cursors[page]
 
         if filter_name:
             params["filter_name"] = filter_name
@@ -121,38 +177,64 @@ class OwnersApiHandler(QObject):
         if filter_nationality:
             params["filter_nationality"] = filter_nationality
 
-        try:
-            response = requests.get(f"{self._api_base_url}/owners/", params=params)
-            data = response.json()
-
-            if isinstance(data, dict):
-                # معالجة الاستجابة الجديدة بتنسيق الصفحات
-                if "data" in data:
-                    self._owners = data.get("data", [])
-                    self._total_items = data.get("total", 0)
-                    self._current_page = data.get("page", 1)
-                    self._total_pages = data.get("total_pages", 1)
-                elif "owners" in data:
-                    self._owners = data["owners"]
-            elif isinstance(data, list):
-                self._owners = data
-                self._total_pages = 1
-                self._total_items = len(data)
-
-            self._owners_loaded = True
-            self.dataLoaded.emit(self._owners)
-            self.paginationChanged.emit()
-
-        except Exception as e:
-            self.errorOccurred.emit(f"خطأ في جلب الملاك: {str(e)}")
-        finally:
-            self._isLoading = False
+        self._dispatcher.cancel("owners_sync")
+        self._dispatcher.submit(
+            lambda: self._fetch_owners(params), self._on_owners_loaded,
+            lambda message: self.errorOccurred.emit(f"خطأ في جلب الملاك: {message}"),
+            key="owners",
+        )
+
+    def _fetch_owners(self, params):
+        # مسار العامل: رمز المزامنة، الصفحة، ثم العدد الإجمالي (None إذا فشل طلب العدد)
+        token = self._sync.fetch_token()
+        data = api.get("/owners/", params=params).json()
+        total = None
+        if isinstance(data, dict) and "data" in data:
+            count_params = {k: v for k, v in params.items() if k.startswith("filter_")}
+            try:
+                total = api.get("/owners/count", params=count_params).json().get("total", 0)
+            except Exception:
+                pass
+        return token, data, total
+
+    def _on_owners_loaded(self, result):
+        token, data, total = result
+        self._sync.invalidate()
+        self._sync.accept(token)
+        if isinstance(data, dict):
+            # معالجة الاستجابة الجديدة بتنسيق الصفحات
+            if "data" in data:
+                self._model.replace(data.get("data", []))
+                self._next_cursor = data.get("next_cursor")
+                self._set_total(total)
+            elif "owners" in data:
+                self._model.replace(data["owners"])
+        elif isinstance(data, list):
+            self._model.replace(data)
+            self._total_pages = 1
+            self._total_items = len(data)
+
+        self._owners_loaded = True
+        self.dataLoaded.emit()
+        self.paginationChanged.emit()
+
+    def _set_total(self, total):
+        """العدد الإجمالي (تقريبي ومخزن مؤقتاً في السيرفر) لشريط الصفحات"""
+        if total is not None:
+            self._total_items = total
+        else:
+            # العدد للعرض فقط؛ نعتمد على الصفحات التي تمت زيارتها إذا فشل الطلب
+            self._total_items = max(self._total_items, (self._current_page - 1) * self._per_page + self._model.rowCount())
+        self._total_pages = max(1, (self._total_items + self._per_page - 1) // self._per_page)
+        if self._next_cursor and self._total_pages <= self._current_page:
+            self._total_pages = self._current_page + 1
 
     @Slot()
     def next_page(self):
         """الانتقال للصفحة التالية"""
-        if self._current_page < self._total_pages:
+        if self._next_cursor:
             self._current_page += 1
+            self._page_cursors[self._current_page] = self._next_cursor
             self.paginationChanged.emit()
             self.get_filtered_owners(self._filter_name, self._filter_registration_number, self._filter_nationality,
                                    self._current_page, self._per_page)
@@ -166,158 +248,149 @@ class OwnersApiHandler(QObject):
             self.get_filtered_owners(self._filter_name, self._filter_registration_number, self._filter_nationality,
                                    self._current_page, self._per_page)
 
+    def _reload_current_page(self):
+        self._owners_loaded = False
+        self.get_filtered_owners(self._filter_name, self._filter_registration_number, self._filter_nationality,
+                                 self._current_page, self._per_page)
+
     @Slot(str, str, str, str, str, str, 'QVariant')
     def add_owner(self, name, registration_number, nationality, iban, agent_name, notes, attachments):
         """إضافة مالك جديد"""
-        self._isLoading = True
-        try:
-            attachments_list = self._to_pylist_of_dicts(attachments)
-            payload = {
-                "name": name,
-                "registration_number": registration_number,
-                "nationality": nationality,
-                "iban": iban,
-                "agent_name": agent_name,
-                "notes": notes,
-                "attachments": attachments_list,
-            }
-
-            response = requests.post(f"{self._api_base_url}/owners/", json=payload)
-            data = response.json()
-
-            if response.ok:
-                self.ownerAdded.emit()
-                # تحديث الكاش
-                if "owner" in data:
-                    self._owners.append(data["owner"])
-                else:
-                    self._owners_loaded = False
-                    self.get_filtered_owners(self._filter_name, self._filter_registration_number, self._filter_nationality,
-                                         self._current_page, self._per_page)
-            else:
-                self.errorOccurred.emit(data.get("message", "فشل إضافة مالك"))
-        except Exception as e:
-            self.errorOccurred.emit(f"فشل الإضافة: {str(e)}")
-        finally:
-            self._isLoading = False
+        payload = {
+            "name": name,
+            "registration_number": registration_number,
+            "nationality": nationality,
+            "iban": iban,
+            "agent_name": agent_name,
+            "notes": notes,
+            "attachments": self._to_pylist_of_dicts(attachments),
+        }
+        self._dispatcher.submit(
+            lambda: api.send("POST", "/owners/", json=payload),
+            self._on_owner_added,
+            lambda message: self.errorOccurred.emit(f"فشل الإضافة: {message}"),
+        )
+
+    def _on_owner_added(self, result):
+        ok, data = result
+        if not ok:
+            self.errorOccurred.emit(data.get("message", "فشل إضافة مالك"))
+            return
+        self.ownerAdded.emit()
+        # تحديث الكاش
+        if "owner" in data:
+            self._model.upsert(data["owner"])
+        else:
+            self._reload_current_page()
 
     @Slot(int, str, str, str, str, str, str, 'QVariant')
     def update_owner(self, owner_id, name, registration_number, nationality, iban, agent_name, notes, attachments):
         """تعديل بيانات مالك"""
-        self._isLoading = True
-        try:
-            attachments_list = self._to_pylist_of_dicts(attachments)
-            payload = {
-                "name": name,
-                "registration_number": registration_number,
-                "nationality": nationality,
-                "iban": iban,
-                "agent_name": agent_name,
-                "notes": notes,
-                "attachments": attachments_list,
-            }
-
-            response = requests.put(f"{self._api_base_url}/owners/{owner_id}", json=payload)
-            data = response.json()
-
-            if response.ok:
-                self.ownerUpdated.emit()
-                # تحديث العنصر في الكاش
-                for idx, o in enumerate(self._owners):
-                    if o["id"] == owner_id:
-                        self._owners[idx].update(payload)
-                        if "attachments" in data:
-                            self._owners[idx]["attachments"] = data["attachments"]
-                        break
-                else:
-                    # إذا لم يتم العثور على المالك في الكاش
-                    self._owners_loaded = False
-                    self.get_filtered_owners(self._filter_name, self._filter_registration_number, self._filter_nationality,
-                                         self._current_page, self._per_page)
-            else:
-                self.errorOccurred.emit(data.get("message", "فشل تعديل المالك"))
-        except Exception as e:
-            self.errorOccurred.emit(f"فشل التعديل: {str(e)}")
-        finally:
-            self._isLoading = False
+        payload = {
+            "name": name,
+            "registration_number": registration_number,
+            "nationality": nationality,
+            "iban": iban,
+            "agent_name": agent_name,
+            "notes": notes,
+            "attachments": self._to_pylist_of_dicts(attachments),
+        }
+        self._dispatcher.submit(
+            lambda: api.send("PUT", f"/owners/{owner_id}", json=payload),
+            lambda result: self._on_owner_updated(owner_id, payload, result),
+            lambda message: self.errorOccurred.emit(f"فشل التعديل: {message}"),
+        )
+
+    def _on_owner_updated(self, owner_id, payload, result):
+        ok, data = result
+        if not ok:
+            self.errorOccurred.emit(data.get("message", "فشل تعديل المالك"))
+            return
+        self.ownerUpdated.emit()
+        # تحديث العنصر في الكاش
+        changes = dict(payload)
+        if "attachments" in data:
+            changes["attachments"] = data["attachments"]
+        if not self._model.update_fields(owner_id, changes):
+            # إذا لم يتم العثور على المالك في الكاش
+            self._reload_current_page()
 
     @Slot(str)
     def delete_owner(self, owner_id):
         """حذف مالك"""
-        self._isLoading = True
         try:
             owner_id_int = int(owner_id)
-            response = requests.delete(f"{self._api_base_url}/owners/{owner_id}")
-            data = response.json()
-
-            if response.ok:
-                # حذف المالك من الكاش
-                self._owners = [o for o in self._owners if o["id"] != owner_id_int]
-                self.ownerDeleted.emit(owner_id_int)
-                # إذا كانت الصفحة الحالية فارغة وهناك صفحات سابقة، انتقل للصفحة السابقة
-                if len(self._owners) == 0 and self._current_page > 1:
-                    self.previous_page()
-                elif self._current_page > 1 or self._filter_name or self._filter_registration_number or self._filter_nationality:
-                    # تحديث البيانات والصفحات
-                    self.get_filtered_owners(self._filter_name, self._filter_registration_number, self._filter_nationality,
-                                         self._current_page, self._per_page)
-            else:
-                self.errorOccurred.emit(data.get("message", "فشل حذف المالك"))
-        except Exception as e:
-            self.errorOccurred.emit(f"فشل الحذف: {str(e)}")
-        finally:
-            self._isLoading = False
-
-    @Slot(str, str)
-    def download_file(self, url, target_path):
-        """تنزيل ملف مرفق"""
-        try:
-            # إزالة بروتوكول file:/// إذا كان موجودًا
-            if target_path.startswith("file:///"):
-                target_path = target_path[8:]
+        except ValueError:
+            self.errorOccurred.emit(f"فشل الحذف: معرف غير صالح {owner_id}")
+            return
+        self._dispatcher.submit(
+            lambda: api.send("DELETE", f"/owners/{owner_id_int}"),
+            lambda result: self._on_owner_deleted(owner_id_int, result),
+            lambda message: self.errorOccurred.emit(f"فشل الحذف: {message}"),
+        )
+
+    def _on_owner_deleted(self, owner_id, result):
+        ok, data = result
+        if not ok:
+            self.errorOccurred.emit(data.get("message", "فشل حذف المالك"))
+            return
+        # حذف المالك من الكاش
+        self._model.remove_id(owner_id)
+        self.ownerDeleted.emit(owner_id)
+        # إذا كانت الصفحة الحالية فارغة وهناك صفحات سابقة، انتقل للصفحة السابقة
+        if self._model.rowCount() == 0 and self._current_page > 1:
+            self.previous_page()
+        elif self._current_page > 1 or self._filter_name or self._filter_registration_number or self._filter_nationality:
+            # تحديث البيانات والصفحات
+            self.get_filtered_owners(self._filter_name, self._filter_registration_number, self._filter_nationality,
+                                     self._current_page, self._per_page)
+
+    @Slot(int, str)
+    def download_attachment(self, attachment_id, target_path):
+        """تنزيل مرفق من /attachments/download/{id} (في الخلفية، مع رمز الجلسة وعنوان api_base_url)"""
+        # إزالة بروتوكول file:/// إذا كان موجودًا
+        if target_path.startswith("file:///"):
+            target_path = target_path[8:]
 
+        def download():
             # التأكد من وجود المجلد
             os.makedirs(os.path.dirname(target_path), exist_ok=True)
-
-            # تنزيل الملف
-            response = requests.get(url, stream=True)
-            if response.ok:
-                with open(target_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=1024):
-                        if chunk:
-                            f.write(chunk)
-                self.errorOccurred.emit("تم تنزيل الملف بنجاح")
-            else:
-                self.errorOccurred.emit("فشل في تنزيل الملف")
-        except Exception as e:
-            self.errorOccurred.emit(f"خطأ في تنزيل الملف: {str(e)}")
+            response = api.get(f"/attachments/download/{attachment_id}", stream=True)
+            if not response.ok:
+                return False
+            with open(target_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=1024):
+                    if chunk:
+                        f.write(chunk)
+            return True
+
+        self._dispatcher.submit(
+            download,
+            lambda ok: self.errorOccurred.emit("تم تنزيل الملف بنجاح" if ok else "فشل في تنزيل الملف"),
+            lambda message: self.errorOccurred.emit(f"خطأ في تنزيل الملف: {message}"),
+        )
 
     @Slot(int)
     def get_owner_details(self, owner_id):
         """جلب تفاصيل مالك محدد"""
         # التحقق أولاً من وجود التفاصيل في الكاش
-        for o in self._owners:
+        for o in self._model.rows():
             if o["id"] == owner_id and "attachments" in o and o["attachments"]:
                 return o
 
-        # إذا لم تكن التفاصيل موجودة، اجلبها من السيرفر
-        try:
-            response = requests.get(f"{self._api_base_url}/owners/{owner_id}")
-            data = response.json()
-
-            # تحديث الكاش
-            for idx, o in enumerate(self._owners):
-                if o["id"] == owner_id:
-                    self._owners[idx] = data
-                    break
-            else:
-                self._owners.append(data)
-
-            self.dataLoaded.emit(self._owners)
-            return data
-        except Exception as e:
-            self.errorOccurred.emit(f"خطأ في جلب تفاصيل المالك: {str(e)}")
-            return None
+        # إذا لم تكن التفاصيل موجودة، اجلبها من السيرفر وتُحدّث صف النموذج عند وصولها
+        self._dispatcher.submit(
+            lambda: api.get(f"/owners/{owner_id}").json(),
+            lambda data: self._on_owner_details(owner_id, data),
+            lambda message: self.errorOccurred.emit(f"خطأ في جلب تفاصيل المالك: {message}"),
+            key=("owner", owner_id),
+        )
+        return None
+
+    def _on_owner_details(self, owner_id, data):
+        # تحديث الكاش
+        self._model.upsert(data)
+        self.dataLoaded.emit()
 
     def _to_pylist_of_dicts(self, attachments):
         """تحويل قائمة QML إلى قائمة بايثون"""
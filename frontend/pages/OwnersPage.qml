@@ -26,13 +26,11 @@ Page {
 
     // الخصائص العامة
     property bool isLoading: false
-    property int lastUpdateTime: 0
     property var currentAttachments: []
     property var currentIdentityAttachment: null
     property var selectedOwner: null
     property string searchText: ""
-    property var filteredOwners: []
-    property string lastDownloadUrl: ""
+    property int lastDownloadId: -1
     property string lastDownloadFilename: ""
 
     // خصائص pagination
@@ -46,12 +44,6 @@ Page {
         ownersApiHandler.refresh();
     }
 
-    // دالة التحديث المحلي
-    function updateLocalCache(newData) {
-        filteredOwners = newData || [];
-        lastUpdateTime = new Date().getTime();
-    }
-
     // دالة مسح المرفقات
     function clearAttachments() {
         currentAttachments = [];
@@ -79,24 +71,21 @@ Page {
             return;
         }
 
-        var fileUrl = attachment.url;
-        // إذا الرابط غير موجود، كوّنه من id
-        if ((!fileUrl || fileUrl === "") && attachment.id)
-            fileUrl = "http://localhost:8000/download/" + attachment.id;
-        if (!fileUrl) {
-            notificationPopup.showNotification("لا يوجد مسار للمرفق", "error");
+        // المرفقات المحفوظة على السيرفر فقط (لها id)؛ التنزيل عبر الـ Handler برمز الجلسة
+        if (!attachment.id) {
+            notificationPopup.showNotification("المرفق غير محفوظ على الخادم بعد", "error");
             return;
         }
 
-        root.lastDownloadUrl = fileUrl;
+        root.lastDownloadId = attachment.id;
         root.lastDownloadFilename = attachment.filename || "Attachment";
         saveFileDialog.currentFile = "file:///" + root.lastDownloadFilename;
         saveFileDialog.open();
     }
     
     // دالة تنزيل وحفظ الملف
-    function downloadAndSaveFile(url, filePath) {
-        if (!url || !filePath) {
+    function downloadAndSaveFile(attachmentId, filePath) {
+        if (attachmentId < 0 || !filePath) {
             notificationPopup.showNotification("بيانات غير كافية لتنزيل الملف", "error");
             return;
         }
@@ -106,7 +95,7 @@ Page {
             path = path.substring(8);
         }
         
-        ownersApiHandler.download_file(url, path);
+        ownersApiHandler.download_attachment(attachmentId, path);
     }
 
     // نافذة اختيار صورة الهوية
@@ -141,8 +130,8 @@ Page {
         fileMode: FileDialog.SaveFile
         nameFilters: ["كل الملفات (*.*)"]
         onAccepted: {
-            if (root.lastDownloadUrl && file)
-                root.downloadAndSaveFile(root.lastDownloadUrl, file);
+            if (root.lastDownloadId >= 0 && file)
+                root.downloadAndSaveFile(root.lastDownloadId, file);
         }
     }
     
@@ -744,7 +733,7 @@ Page {
         Label {
             text: root.apiReady ? 
                   ("إجمالي عدد الملاك: " + (typeof ownersApiHandler !== "undefined" ? ownersApiHandler.totalItems : 0) + 
-                  " (الصفحة الحالية: " + filteredOwners.length + " مالك)") :
+                  " (الصفحة الحالية: " + ownersApiHandler.ownersModel.count + " مالك)") :
                   "جاري تحميل البيانات..."
             font {
                 pixelSize: 14
@@ -888,7 +877,8 @@ Page {
                     right: parent.right
                     bottom: parent.bottom
                 }
-                model: root.filteredOwners
+                // نموذج الصفحة الحالية من الـ Handler (تحديث الصفوف المتأثرة فقط)
+                model: ownersApiHandler.ownersModel
                 boundsBehavior: Flickable.StopAtBounds
                 clip: true
                 // شريط تمرير مخصص
@@ -1248,9 +1238,10 @@ Page {
                     Label {
                         text: {
                             if (!root.apiReady || typeof ownersApiHandler === "undefined") return "0 من 0";
-                            if (filteredOwners.length === 0) return "0 من 0";
+                            const pageCount = ownersApiHandler.ownersModel.count;
+                            if (pageCount === 0) return "0 من 0";
                             const start = (ownersApiHandler.currentPage - 1) * ownersApiHandler.perPage + 1;
-                            const end = Math.min(start + filteredOwners.length - 1, ownersApiHandler.totalItems);
+                            const end = Math.min(start + pageCount - 1, ownersApiHandler.totalItems);
                             return start + "-" + end + " من " + ownersApiHandler.totalItems;
                         }
                         font.pixelSize: 14
@@ -4318,14 +4309,20 @@ Page {
     Connections {
         target: ownersApiHandler
 
-        function onDataLoaded(data) {
-            console.log("تم تحميل البيانات: " + data.length + " مالك");
-            root.filteredOwners = data;
-            root.updateLocalCache(data);
+        function onDataLoaded() {
+            console.log("تم تحميل البيانات: " + ownersApiHandler.ownersModel.count + " مالك");
             root.isLoading = false;
             loadingPopup.close();
         }
 
+        // المزامنة التزايدية تعدّل صفوف النموذج مباشرة بدون dataLoaded: انتهاء الطلبات ينهي التحميل
+        function onLoadingChanged() {
+            if (!ownersApiHandler.isLoadingProp) {
+                root.isLoading = false;
+                loadingPopup.close();
+            }
+        }
+
         function onOwnerAdded() {
             console.log("تم إضافة مالك جديد");
             notificationPopup.showNotification("تمت الإضافة بنجاح", "success");
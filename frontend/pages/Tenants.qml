@@ -9,11 +9,10 @@ Page {
     background: Rectangle { color: "#f5f6fa" }
 
     // الخصائص العامة
-    property var cachedTenants: []
     property bool isLoading: false
-    property int lastUpdateTime: 0
     property var selectedTenant: null
     property string searchText: ""
+    onSearchTextChanged: tenantsApiHandler.set_search(searchText)
     property var currentAttachments: []
     property var currentIdentityAttachment: null
 
@@ -24,12 +23,6 @@ Page {
         tenantsApiHandler.get_tenants();
     }
 
-    // دالة التحديث المحلي
-    function updateLocalCache(newData) {
-        cachedTenants = newData || [];
-        lastUpdateTime = new Date().getTime();
-    }
-
     // دالة فتح نافذة التفاصيل
     function showTenantDetails(tenant) {
         selectedTenant = tenant;
@@ -201,7 +194,7 @@ Page {
             }
             // معلومات عدد المستأجرين
             Label {
-                text: "عدد المستأجرين: " + cachedTenants.length
+                text: "عدد المستأجرين: " + tenantsApiHandler.tenantsModel.count
                 font {
                     pixelSize: 14
                     bold: true
@@ -257,13 +250,8 @@ Page {
             ListView {
                 id: tenantsList
                 anchors.fill: parent
-                model: root.cachedTenants.filter(function(item) {
-                    var search = root.searchText.toLowerCase();
-                    return !search ||
-                        item.name.toLowerCase().includes(search) ||
-                        item.national_id.toLowerCase().includes(search) ||
-                        item.phone.toLowerCase().includes(search);
-                })
+                // نموذج من الـ Handler: البحث فلتر على النموذج والتمرير يحمّل الصفحة التالية
+                model: tenantsApiHandler.tenantsModel
                 boundsBehavior: Flickable.StopAtBounds
                 spacing: 1
                 clip: true
@@ -1173,7 +1161,6 @@ Page {
     Connections {
         target: tenantsApiHandler
         function onTenantsChanged() {
-            root.cachedTenants = tenantsApiHandler.tenantsList || [];
             root.isLoading = false;
             errorLabel.text = "";
             successLabel.text = "تمت العملية بنجاح";
@@ -8,10 +8,9 @@ Page {
     background: Rectangle { color: "#f5f6fa" }
 
     // الخصائص العامة
-    property var cachedUnits: []
     property bool isLoading: false
-    property int lastUpdateTime: 0
     property var selectedUnit: null
+    // قائمة الملاك لقائمتي الاختيار فقط: تُجلب عند فتح نافذة الإضافة أو التعديل
     property var ownersList: []
     property var currentAttachments: []
     property var currentUnitAttachment: null
@@ -21,13 +20,6 @@ Page {
         if (root.isLoading) return;
         root.isLoading = true;
         unitsApiHandler.get_all_units();
-        ownersApiHandler.refresh(); // لجلب قائمة الملاك لربطها بالوحدات
-    }
-
-    // دالة التحديث المحلي
-    function updateLocalCache(newData) {
-        cachedUnits = newData || [];
-        lastUpdateTime = new Date().getTime();
     }
 
     // دالة فتح نافذة التفاصيل
@@ -214,7 +206,7 @@ Page {
 
             // معلومات عدد الوحدات
             Label {
-                text: "عدد الوحدات: " + cachedUnits.length
+                text: "عدد الوحدات: " + unitsApiHandler.unitsModel.count
                 font {
                     pixelSize: 14
                     bold: true
@@ -249,7 +241,8 @@ Page {
             ListView {
                 id: unitsList
                 anchors.fill: parent
-                model: root.cachedUnits
+                // نموذج من الـ Handler: تحديث الصفوف المتأثرة فقط والتمرير يحمّل الصفحة التالية
+                model: unitsApiHandler.unitsModel
                 boundsBehavior: Flickable.StopAtBounds
                 spacing: 1
                 clip: true
@@ -374,11 +367,8 @@ Page {
                                     color: "#333"
                                 }
                                 Label {
-                                    text: {
-                                        if (!modelData.owner_id) return "غير محدد";
-                                        var owner = ownersList.find(o => o.id === modelData.owner_id);
-                                        return owner ? owner.name : "غير معروف";
-                                    }
+                                    // اسم المالك يأتي مع صف الوحدة من الـ API
+                                    text: modelData.owner_id ? (modelData.owner_name || "غير معروف") : "غير محدد"
                                     font.pixelSize: 14
                                     color: "#555"
                                 }
@@ -468,6 +458,7 @@ Page {
         modal: true
         closePolicy: Popup.CloseOnEscape | Popup.CloseOnPressOutside
         padding: 20
+        onOpened: unitsApiHandler.get_all_owners_for_dropdown()
 
         property string unit_number: ""
         property string unit_type: "شقة"
@@ -783,6 +774,7 @@ Page {
         modal: true
         closePolicy: Popup.CloseOnEscape | Popup.CloseOnPressOutside
         padding: 20
+        onOpened: unitsApiHandler.get_all_owners_for_dropdown()
 
         property var unitData: null
 
@@ -1244,11 +1236,7 @@ Page {
                     color: "#333"
                 }
                 Label { 
-                    text: {
-                        if (!selectedUnit || !selectedUnit.owner_id) return "غير محدد";
-                        var owner = ownersList.find(o => o.id === selectedUnit.owner_id);
-                        return owner ? owner.name : "غير معروف";
-                    }
+                    text: selectedUnit && selectedUnit.owner_id ? (selectedUnit.owner_name || "غير معروف") : "غير محدد"
                     font.pixelSize: 14
                     color: "#555"
                 }
@@ -1509,7 +1497,6 @@ Page {
         target: unitsApiHandler
         
         function onUnitsChanged() {
-            root.cachedUnits = unitsApiHandler.unitsList || [];
             root.isLoading = false;
             errorLabel.text = "";
             successLabel.text = "تمت العملية بنجاح";
@@ -1519,13 +1506,13 @@ Page {
             errorLabel.text = msg;
             root.isLoading = false;
         }
-    }
 
-    Connections {
-        target: ownersApiHandler
-        
-        function onDataLoaded() {
-            root.ownersList = ownersApiHandler.ownersList || [];
+        function onOwnersForDropdownLoaded(result) {
+            if (result.success) {
+                root.ownersList = result.data;
+            } else {
+                errorLabel.text = "خطأ في جلب الملاك: " + result.error;
+            }
         }
     }
 
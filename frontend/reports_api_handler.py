@@ -0,0 +1,48 @@
+from PySide6.QtCore import QObject, Slot, Signal, Property
+from frontend.api_client import api
+from frontend.request_dispatcher import RequestDispatcher
+
+# الجداول التي تعتمد عليها التقارير (للتحديث الحي)
+REPORT_TABLES = ("contracts", "invoices", "payments", "units", "owners")
+
+class ReportsApiHandler(QObject):
+    reportsChanged = Signal()
+    errorOccurred = Signal(str)
+    loadingChanged = Signal()
+
+    def __init__(self):
+        super().__init__()
+        self._reports = {}     # الاسم: آخر نتيجة
+        self._params = {}      # الاسم: معاملات آخر طلب (لإعادة التحميل عند التغيير)
+        self._dispatcher = RequestDispatcher(self)
+        self._dispatcher.loadingChanged.connect(self.loadingChanged)
+
+    @Slot(str, "QVariant")
+    def load_report(self, name, params=None):
+        # params: as_of / start / end بصيغة YYYY-MM-DD و group_by (building/owner)؛ القيم الفارغة تُهمل
+        params = {k: v for k, v in (params or {}).items() if v not in (None, "")}
+        self._params[name] = params
+        self._dispatcher.submit(
+            lambda: api.get(f"/reports/{name}", params=params).json(),
+            lambda data: self._on_report_loaded(name, data), self.errorOccurred.emit, key=f"report_{name}",
+        )
+
+    def _on_report_loaded(self, name, data):
+        if isinstance(data, dict):
+            self._reports[name] = data
+            self.reportsChanged.emit()
+
+    @Slot()
+    def on_remote_change(self):
+        # السيرفر يعيد الحساب فقط إذا تغير إصدار الجداول؛ غير ذلك يرجع من الكاش
+        for name, params in list(self._params.items()):
+            self.load_report(name, params)
+
+    def reports(self):
+        return self._reports
+
+    def isLoading(self):
+        return self._dispatcher.isLoading()
+
+    reportsData = Property("QVariant", reports, notify=reportsChanged)
+    isLoadingProp = Property(bool, isLoading, notify=loadingChanged)
@@ -0,0 +1,118 @@
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal, Slot
+import itertools
+import threading
+
+from frontend.api_client import load_client_config
+
+# ========== تنفيذ طلبات الـ API خارج مسار الواجهة (GUI thread) ==========
+# كل Handler يملك RequestDispatcher: يرسل الدالة إلى QThreadPool مشترك، والنتيجة ترجع عبر إشارة
+# إلى مسار الواجهة (اتصال Queued تلقائياً) حيث تُستدعى دالة النجاح أو الخطأ.
+# الطلب الذي يحمل نفس المفتاح (key) يلغي الطلب السابق: إن لم يبدأ يُسحب من الطابور،
+# وإن بدأ تُهمل نتيجته (مثل الكتابة في مربع البحث).
+
+# حجم المسارات = حجم مجمع اتصالات العميل حتى لا تنتظر المسارات على اتصال
+_pool = QThreadPool()
+_pool.setMaxThreadCount(load_client_config()["pool_maxsize"])
+
+_request_ids = itertools.count(1)
+
+class _TaskSignals(QObject):
+    # تُنشأ في مسار الواجهة، فتصل الإشارات إليه حتى لو أُرسلت من مسار العامل
+    finished = Signal(int, object)
+    failed = Signal(int, str)
+
+class _RequestTask(QRunnable):
+    def __init__(self, request_id, fn, signals):
+        super().__init__()
+        self.setAutoDelete(False)  # المرجع محفوظ في RequestDispatcher حتى تصل النتيجة
+        self.request_id = request_id
+        self.fn = fn
+        self.signals = signals
+        self.cancelled = threading.Event()
+
+    def run(self):
+        if self.cancelled.is_set():
+            return
+        try:
+            result = self.fn()
+        except Exception as e:
+            if not self.cancelled.is_set():
+                self.signals.failed.emit(self.request_id, str(e))
+            return
+        if not self.cancelled.is_set():
+            self.signals.finished.emit(self.request_id, result)
+
+class RequestDispatcher(QObject):
+    loadingChanged = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._tasks = {}     # request_id -> (task, on_success, on_error)
+        self._by_key = {}    # key -> request_id للطلب الأحدث
+        self._signals = _TaskSignals(self)
+        self._signals.finished.connect(self._on_finished)
+        self._signals.failed.connect(self._on_failed)
+
+    def isLoading(self):
+        return bool(self._tasks)
+
+    def submit(self, fn, on_success=None, on_error=None, key=None):
+        """
+        تنفيذ fn() في مسار منفصل. on_success(result) و on_error(message) تُستدعى في مسار الواجهة.
+        key: طلب جديد بنفس المفتاح يلغي السابق (القوائم والبحث). الإضافة والتعديل والحذف بدون مفتاح.
+        """
+        if key is not None:
+            self.cancel(key)
+        was_loading = self.isLoading()
+        request_id = next(_request_ids)
+        task = _RequestTask(request_id, fn, self._signals)
+        self._tasks[request_id] = (task, on_success, on_error)
+        if key is not None:
+            self._by_key[key] = request_id
+        _pool.start(task)
+        if not was_loading:
+            self.loadingChanged.emit()
+        return request_id
+
+    def cancel(self, key):
+        request_id = self._by_key.pop(key, None)
+        if request_id is not None:
+            self._drop(request_id)
+
+    def cancel_all(self):
+        for request_id in list(self._tasks):
+            self._drop(request_id)
+        self._by_key.clear()
+
+    def _drop(self, request_id):
+        entry = self._tasks.pop(request_id, None)
+        if entry is None:
+            return
+        task = entry[0]
+        task.cancelled.set()
+        _pool.tryTake(task)  # لم يبدأ بعد: يُحذف من الطابور ولا يُرسل الطلب أصلاً
+        if not self._tasks:
+            self.loadingChanged.emit()
+
+    def _finish(self, request_id):
+        entry = self._tasks.pop(request_id, None)
+        if entry is None:
+            return None  # أُلغي بعد بدء التنفيذ
+        for key, rid in list(self._by_key.items()):
+            if rid == request_id:
+                del self._by_key[key]
+        if not self._tasks:
+            self.loadingChanged.emit()
+        return entry
+
+    @Slot(int, object)
+    def _on_finished(self, request_id, result):
+        entry = self._finish(request_id)
+        if entry and entry[1]:
+            entry[1](result)
+
+    @Slot(int, str)
+    def _on_failed(self, request_id, message):
+        entry = self._finish(request_id)
+        if entry and entry[2]:
+            entry[2](message)
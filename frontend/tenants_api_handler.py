@@ -1,8 +1,16 @@
 from PySide6.QtCore import QObject, Slot, Signal, Property
 from PySide6.QtWidgets import QFileDialog
-import requests
+from frontend.api_client import api
+from frontend.request_dispatcher import RequestDispatcher
+from frontend.list_models import ApiListModel, SearchFilterProxyModel
+from frontend.delta_sync import DeltaSync
 import os
 
+TENANTS_PAGE_SIZE = 50  # حجم صفحة fetchMore (الحد الأعلى في السيرفر 100)
+TENANT_FIELDS = ("id", "name", "national_id", "phone", "nationality", "email", "address", "work",
+                 "notes", "attachments")
+TENANT_SEARCH_FIELDS = ("name", "national_id", "phone")
+
 class TenantsApiHandler(QObject):
 
     tenantsChanged = Signal()
@@ -10,50 +18,127 @@ class TenantsApiHandler(QObject):
     tenantUpdated = Signal()
     tenantDeleted = Signal()
     errorOccurred = Signal(str)
+    loadingChanged = Signal()
+    tenantAttachmentsLoaded = Signal(int, 'QVariant')
+    attachmentUploaded = Signal(bool)
+    attachmentDeleted = Signal(bool)
+    attachmentDownloaded = Signal(str)
 
     def __init__(self):
         super().__init__()
-        self._tenants = []
+        # نموذج القائمة (fetchMore عند التمرير) وفوقه فلتر البحث المحلي الذي تعرضه صفحة المستأجرين
+        self._model = ApiListModel(TENANT_FIELDS, fetch_more=self._fetch_more_tenants, parent=self)
+        self._search_model = SearchFilterProxyModel(self._model, TENANT_SEARCH_FIELDS, parent=self)
         self._tenants_loaded = False
-        self._isLoading = False
+        # refresh بعد التحميل الأول يجلب ما تغير فقط (/sync/tenants)
+        self._sync = DeltaSync("tenants")
+        self._dispatcher = RequestDispatcher(self)
+        self._dispatcher.loadingChanged.connect(self.loadingChanged)
 
     def tenants(self):
-        return self._tenants
+        return self._model.rows()
+
+    def tenants_model(self):
+        return self._search_model
 
     def isLoading(self):
-        return self._isLoading
+        return self._dispatcher.isLoading()
 
     tenantsList = Property(list, tenants, notify=tenantsChanged)
-    isLoadingProp = Property(bool, isLoading, constant=True)
+    tenantsModel = Property(QObject, tenants_model, constant=True)
+    isLoadingProp = Property(bool, isLoading, notify=loadingChanged)
 
     @Slot()
     def get_tenants(self, force_reload=False):
         if self._tenants_loaded and not force_reload:
             self.tenantsChanged.emit()
             return
+        self._dispatcher.cancel("tenants_more")
+        self._dispatcher.cancel("tenants_sync")
+        self._dispatcher.submit(
+            self._load_tenants, self._on_tenants_loaded,
+            lambda message: self.errorOccurred.emit("فشل في جلب المستأجرين: " + message),
+            key="tenants",
+        )
 
-        self._isLoading = True
-        try:
-            response = requests.get("http://localhost:8000/tenants/")
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, dict) and "tenants" in data:
-                self._tenants = data["tenants"]
-            elif isinstance(data, list):
-                self._tenants = data
-            else:
-                self._tenants = data.get("data", [])
-            self._tenants_loaded = True
-            self.tenantsChanged.emit()
-        except Exception as e:
-            self.errorOccurred.emit("فشل في جلب المستأجرين: " + str(e))
-        finally:
-            self._isLoading = False
+    def _fetch_tenants(self, cursor=None):
+        # صفحة Keyset: الصفوف في الجسم ومؤشر الصفحة التالية في الترويسة X-Next-Cursor
+        params = {"per_page": TENANTS_PAGE_SIZE, "keyset": "true"}
+        if cursor:
+            params["cursor"] = cursor
+        response = api.get("/tenants/", params=params)
+        response.raise_for_status()
+        data = response.json()
+        if isinstance(data, dict) and "tenants" in data:
+            tenants = data["tenants"]
+        elif isinstance(data, list):
+            tenants = data
+        else:
+            tenants = data.get("data", [])
+        return tenants, response.headers.get("X-Next-Cursor")
+
+    def _load_tenants(self):
+        # الرمز قبل الصفحة الأولى: ما يتغير بينهما يرجع في المزامنة التالية
+        token = self._sync.fetch_token()
+        return token, self._fetch_tenants()
+
+    def _on_tenants_loaded(self, result):
+        token, (tenants, next_cursor) = result
+        self._model.replace(tenants, next_cursor)
+        self._sync.invalidate()
+        self._sync.accept(token)
+        self._tenants_loaded = True
+        self.tenantsChanged.emit()
+
+    def _fetch_more_tenants(self, cursor):
+        # يستدعيه النموذج عند وصول التمرير لنهاية القائمة
+        self._dispatcher.submit(
+            lambda: self._fetch_tenants(cursor), self._on_more_tenants, self._on_more_tenants_failed,
+            key="tenants_more",
+        )
+
+    def _on_more_tenants(self, result):
+        tenants, next_cursor = result
+        self._model.append_page(tenants, next_cursor)
+        self.tenantsChanged.emit()
+
+    def _on_more_tenants_failed(self, message):
+        self._model.fetch_failed()
+        self.errorOccurred.emit("فشل في جلب المستأجرين: " + message)
+
+    @Slot(str)
+    def set_search(self, text):
+        """ بحث بالاسم أو الهوية أو الجوال على الصفوف المحملة """
+        self._search_model.setSearch(text)
 
     @Slot()
     def refresh(self):
-        self._tenants_loaded = False
-        self.get_tenants(force_reload=True)
+        """ التغييرات فقط منذ آخر مزامنة، أو تحميل كامل إذا لم يوجد رمز """
+        token = self._sync.token
+        if token is None:
+            self._tenants_loaded = False
+            self.get_tenants(force_reload=True)
+            return
+        self._dispatcher.submit(
+            lambda: self._sync.fetch_changes(token), self._on_tenants_synced,
+            lambda message: self.errorOccurred.emit("فشل في تحديث المستأجرين: " + message),
+            key="tenants_sync",
+        )
+
+    @Slot()
+    def on_remote_change(self):
+        """ حدث تغيير من السيرفر (EventStream): مزامنة تزايدية إذا كانت القائمة محملة """
+        if self._sync.token is not None:
+            self.refresh()
+
+    def _on_tenants_synced(self, data):
+        if data.get("reset"):
+            self._sync.invalidate()
+            self.refresh()
+            return
+        if self._sync.accept(data.get("token")):
+            self._model.merge(data.get("changed", []), data.get("deleted", []))
+            self.tenantsChanged.emit()
 
     def _clean_data(self, data: dict):
         cleaned = {}
@@ -63,173 +148,164 @@ class TenantsApiHandler(QObject):
             cleaned[k] = v
         return cleaned
 
-    @Slot('QVariant', result="QVariant")
+    def _to_py_dict(self, tenant_data):
+        if hasattr(tenant_data, "toVariant"):
+            return tenant_data.toVariant()
+        elif hasattr(tenant_data, "toPython"):
+            return tenant_data.toPython()
+        elif not isinstance(tenant_data, dict):
+            return dict(tenant_data)
+        return tenant_data
+
+    def _upload_attachments(self, tenant_data, tenant_id):
+        # يُنفذ في مسار العامل: رفع الملفات المحلية واستبدالها بمعرفات المرفقات
+        attachments = tenant_data.get("attachments", [])
+        attachment_ids = []
+        for att in attachments:
+            if isinstance(att, dict) and att.get("id"):
+                attachment_ids.append(att["id"])
+                continue
+            file_path = att.get("url") or att.get("path") if isinstance(att, dict) else str(att)
+            if file_path and os.path.exists(file_path):
+                resp = api.upload(f"/attachments/tenant/{tenant_id}", file_path)
+                if resp.ok:
+                    res = resp.json()
+                    attachment_id = res.get("id") or res.get("attachment_id")
+                    if attachment_id:
+                        attachment_ids.append(attachment_id)
+
+        if attachment_ids:
+            tenant_data["attachments"] = attachment_ids
+        elif "attachments" in tenant_data:
+            tenant_data["attachments"] = []
+        return self._clean_data(tenant_data)
+
+    @Slot('QVariant')
     def add_tenant(self, tenant_data):
-        try:
-            if hasattr(tenant_data, "toVariant"):
-                tenant_data = tenant_data.toVariant()
-            elif hasattr(tenant_data, "toPython"):
-                tenant_data = tenant_data.toPython()
-            elif not isinstance(tenant_data, dict):
-                tenant_data = dict(tenant_data)
-
-            attachments = tenant_data.get("attachments", [])
-            attachment_ids = []
-            for att in attachments:
-                if isinstance(att, dict) and att.get("id"):
-                    attachment_ids.append(att["id"])
-                    continue
-                file_path = att.get("url") or att.get("path") if isinstance(att, dict) else str(att)
-                if file_path and os.path.exists(file_path):
-                    files = {'file': open(file_path, "rb")}
-                    resp = requests.post("http://localhost:8000/attachments/tenant/0", files=files)
-                    files['file'].close()
-                    if resp.ok:
-                        res = resp.json()
-                        attachment_id = res.get("id") or res.get("attachment_id")
-                        if attachment_id:
-                            attachment_ids.append(attachment_id)
-
-            if attachment_ids:
-                tenant_data["attachments"] = attachment_ids
-            elif "attachments" in tenant_data:
-                tenant_data["attachments"] = []
-
-            tenant_data = self._clean_data(tenant_data)
-
-            response = requests.post("http://localhost:8000/tenants/", json=tenant_data)
+        tenant_data = self._to_py_dict(tenant_data)
+
+        def send():
+            payload = self._upload_attachments(tenant_data, 0)
+            response = api.post("/tenants/", json=payload)
             response.raise_for_status()
-            data = response.json()
-            self.tenantAdded.emit()
-            self._tenants_loaded = False
-            self.get_tenants(force_reload=True)
-            return {"success": True, "tenant_id": data.get("id")}
-        except Exception as e:
-            self.errorOccurred.emit("فشل الإضافة: " + str(e))
-            return {"success": False, "error": str(e)}
+            return response.json()
+
+        self._dispatcher.submit(
+            send, lambda data: self._on_tenant_saved(self.tenantAdded),
+            lambda message: self.errorOccurred.emit("فشل الإضافة: " + message),
+        )
 
-    @Slot(int, 'QVariant', result="QVariant")
+    @Slot(int, 'QVariant')
     def update_tenant(self, tenant_id, tenant_data):
-        try:
-            if hasattr(tenant_data, "toVariant"):
-                tenant_data = tenant_data.toVariant()
-            elif hasattr(tenant_data, "toPython"):
-                tenant_data = tenant_data.toPython()
-            elif not isinstance(tenant_data, dict):
-                tenant_data = dict(tenant_data)
-
-            attachments = tenant_data.get("attachments", [])
-            attachment_ids = []
-            for att in attachments:
-                if isinstance(att, dict) and att.get("id"):
-                    attachment_ids.append(att["id"])
-                    continue
-                file_path = att.get("url") or att.get("path") if isinstance(att, dict) else str(att)
-                if file_path and os.path.exists(file_path):
-                    files = {'file': open(file_path, "rb")}
-                    resp = requests.post(f"http://localhost:8000/attachments/tenant/{tenant_id}", files=files)
-                    files['file'].close()
-                    if resp.ok:
-                        res = resp.json()
-                        attachment_id = res.get("id") or res.get("attachment_id")
-                        if attachment_id:
-                            attachment_ids.append(attachment_id)
-
-            if attachment_ids:
-                tenant_data["attachments"] = attachment_ids
-            elif "attachments" in tenant_data:
-                tenant_data["attachments"] = []
-
-            tenant_data = self._clean_data(tenant_data)
-
-            response = requests.put(f"http://localhost:8000/tenants/{tenant_id}", json=tenant_data)
+        tenant_data = self._to_py_dict(tenant_data)
+
+        def send():
+            payload = self._upload_attachments(tenant_data, tenant_id)
+            response = api.put(f"/tenants/{tenant_id}", json=payload)
             response.raise_for_status()
-            self.tenantUpdated.emit()
-            self._tenants_loaded = False
-            self.get_tenants(force_reload=True)
-            return {"success": True}
-        except Exception as e:
-            self.errorOccurred.emit("فشل التعديل: " + str(e))
-            return {"success": False, "error": str(e)}
+            return response.json()
+
+        self._dispatcher.submit(
+            send, lambda data: self._on_tenant_saved(self.tenantUpdated),
+            lambda message: self.errorOccurred.emit("فشل التعديل: " + message),
+        )
+
+    def _on_tenant_saved(self, signal):
+        signal.emit()
+        self.refresh()
 
     @Slot(int)
     def delete_tenant(self, tenant_id):
-        try:
-            response = requests.delete(f"http://localhost:8000/tenants/{tenant_id}")
-            response.raise_for_status()
-            self._tenants = [t for t in self._tenants if t["id"] != tenant_id]
-            self.tenantDeleted.emit()
-            self.tenantsChanged.emit()
-        except Exception as e:
-            self.errorOccurred.emit("فشل الحذف: " + str(e))
+        self._dispatcher.submit(
+            lambda: api.delete(f"/tenants/{tenant_id}").raise_for_status(),
+            lambda _: self._on_tenant_deleted(tenant_id),
+            lambda message: self.errorOccurred.emit("فشل الحذف: " + message),
+        )
 
-    @Slot(int, result="QVariant")
+    def _on_tenant_deleted(self, tenant_id):
+        self._model.remove_id(tenant_id)
+        self.tenantDeleted.emit()
+        self.tenantsChanged.emit()
+
+    @Slot(int)
     def getTenantAttachments(self, tenant_id):
-        try:
-            response = requests.get(f"http://localhost:8000/attachments/tenant/{tenant_id}")
+        def fetch():
+            response = api.get(f"/attachments/tenant/{tenant_id}")
             response.raise_for_status()
             return response.json()
-        except Exception as e:
-            self.errorOccurred.emit("فشل جلب المرفقات: " + str(e))
-            return []
+        self._dispatcher.submit(
+            fetch, lambda data: self.tenantAttachmentsLoaded.emit(tenant_id, data),
+            lambda message: self.errorOccurred.emit("فشل جلب المرفقات: " + message),
+            key=("attachments", tenant_id),
+        )
 
-    @Slot(int, 'QVariant', result=bool)
+    @Slot(int, 'QVariant')
     def uploadTenantAttachment(self, tenant_id, file_path):
-        try:
-            files = {'file': open(str(file_path), 'rb')}
-            response = requests.post(f"http://localhost:8000/attachments/tenant/{tenant_id}", files=files)
-            files['file'].close()
+        def upload():
+            response = api.upload(f"/attachments/tenant/{tenant_id}", str(file_path))
             return response.status_code == 200
-        except Exception as e:
-            self.errorOccurred.emit("فشل رفع المرفق: " + str(e))
-            return False
+        self._dispatcher.submit(
+            upload, self.attachmentUploaded.emit,
+            lambda message: self._on_attachment_error("فشل رفع المرفق: " + message, self.attachmentUploaded),
+        )
 
-    @Slot(int, result=bool)
+    @Slot(int)
     def deleteTenantAttachment(self, attachment_id):
-        try:
-            response = requests.delete(f"http://localhost:8000/attachments/{attachment_id}")
-            return response.status_code == 200
-        except Exception as e:
-            self.errorOccurred.emit("فشل حذف المرفق: " + str(e))
-            return False
+        self._dispatcher.submit(
+            lambda: api.delete(f"/attachments/{attachment_id}").status_code == 200,
+            self.attachmentDeleted.emit,
+            lambda message: self._on_attachment_error("فشل حذف المرفق: " + message, self.attachmentDeleted),
+        )
 
-    @Slot(int, result=str)
+    def _on_attachment_error(self, message, signal):
+        self.errorOccurred.emit(message)
+        signal.emit(False)
+
+    @Slot(int)
     def downloadTenantAttachment(self, attachment_id):
-        try:
-            response = requests.get(f"http://localhost:8000/attachments/download/{attachment_id}", stream=True)
+        # نافذة الحفظ في مسار الواجهة، والتنزيل في الخلفية
+        save_path = QFileDialog.getSaveFileName(
+            None, "Save File", "attachment"
+        )[0]
+        if not save_path:
+            return
+
+        def download():
+            response = api.get(f"/attachments/download/{attachment_id}", stream=True)
             response.raise_for_status()
-            save_path = QFileDialog.getSaveFileName(
-                None, "Save File", "attachment"
-            )[0]
-            if save_path:
-                with open(save_path, "wb") as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
+            with open(save_path, "wb") as f:
+                for chunk in response.iter_content(1024):
+                    f.write(chunk)
             return "done"
-        except Exception as e:
-            self.errorOccurred.emit("فشل تحميل المرفق: " + str(e))
-            return "error"
+
+        self._dispatcher.submit(
+            download, self.attachmentDownloaded.emit,
+            lambda message: self._on_download_error(message),
+        )
+
+    def _on_download_error(self, message):
+        self.errorOccurred.emit("فشل تحميل المرفق: " + message)
+        self.attachmentDownloaded.emit("error")
 
     @Slot(int, result="QVariant")
     def get_tenant_details(self, tenant_id):
-        try:
-            for t in self._tenants:
-                if t["id"] == tenant_id and "attachments" in t and t["attachments"]:
-                    return t
-            
-            response = requests.get(f"http://localhost:8000/tenants/{tenant_id}")
+        """ التفاصيل من الكاش إن وجدت، وإلا تُجلب في الخلفية ويُرسل tenantsChanged عند وصولها """
+        for t in self._model.rows():
+            if t["id"] == tenant_id and "attachments" in t and t["attachments"]:
+                return t
+
+        def fetch():
+            response = api.get(f"/tenants/{tenant_id}")
             response.raise_for_status()
-            data = response.json()
-            
-            for idx, t in enumerate(self._tenants):
-                if t["id"] == tenant_id:
-                    self._tenants[idx] = data
-                    break
-            else:
-                self._tenants.append(data)
-            
-            self.tenantsChanged.emit()
-            return data
-        except Exception as e:
-            self.errorOccurred.emit("خطأ في جلب تفاصيل المستأجر: " + str(e))
-            return None
\ No newline at end of file
+            return response.json()
+
+        self._dispatcher.submit(
+            fetch, lambda data: self._on_tenant_details(tenant_id, data),
+            lambda message: self.errorOccurred.emit("خطأ في جلب تفاصيل المستأجر: " + message),
+            key=("tenant", tenant_id),
+        )
+        return None
+
+    def _on_tenant_details(self, tenant_id, data):
+        self._model.upsert(data)
+        self.tenantsChanged.emit()
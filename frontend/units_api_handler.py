@@ -1,5 +1,13 @@
 from PySide6.QtCore import QObject, Slot, Signal, Property
-import requests
+from frontend.api_client import api
+from frontend.request_dispatcher import RequestDispatcher
+from frontend.list_models import ApiListModel
+from frontend.delta_sync import DeltaSync
+
+UNITS_PAGE_SIZE = 50  # حجم صفحة fetchMore (الحد الأعلى في السيرفر 100)
+OWNERS_DROPDOWN_PAGE_SIZE = 200  # الحد الأعلى لـ /owners/ في السيرفر
+UNIT_FIELDS = ("id", "unit_number", "unit_type", "rooms", "area", "location", "status",
+               "owner_id", "owner_name", "building_name", "floor_number", "notes", "attachments")
 
 class UnitsApiHandler(QObject):
     unitsChanged = Signal()
@@ -7,21 +15,32 @@ class UnitsApiHandler(QObject):
     unitUpdated  = Signal()
     unitDeleted  = Signal()
     errorOccurred = Signal(str)
+    loadingChanged = Signal()
+    ownersForDropdownLoaded = Signal('QVariant')
 
     def __init__(self):
         super().__init__()
-        self._units = []
+        # الوحدات في نموذج قائمة: التمرير يحمّل الصفحة التالية (fetchMore) والتعديلات تُحدّث الصف فقط
+        self._model = ApiListModel(UNIT_FIELDS, fetch_more=self._fetch_more_units, parent=self)
         self._units_loaded = False   # علم يدل إذا كانت البيانات محملة من السيرفر
-        self._isLoading = False
+        # refresh بعد التحميل الأول يجلب ما تغير فقط (/sync/units)
+        self._sync = DeltaSync("units")
+        # كل الطلبات تُنفذ خارج مسار الواجهة والنتائج ترجع عبر الإشارات
+        self._dispatcher = RequestDispatcher(self)
+        self._dispatcher.loadingChanged.connect(self.loadingChanged)
 
     def units(self):
-        return self._units
+        return self._model.rows()
+
+    def units_model(self):
+        return self._model
 
     def isLoading(self):
-        return self._isLoading
+        return self._dispatcher.isLoading()
 
     unitsList = Property('QVariant', units, notify=unitsChanged)
-    isLoadingProp = Property(bool, isLoading, constant=True)
+    unitsModel = Property(QObject, units_model, constant=True)
+    isLoadingProp = Property(bool, isLoading, notify=loadingChanged)
 
     # ---------- التخزين المؤقت الذكي وLazy Loading ----------
     @Slot()
@@ -30,49 +49,101 @@ class UnitsApiHandler(QObject):
         if self._units_loaded and not force_reload:
             self.unitsChanged.emit()
             return
-        self._isLoading = True
-        try:
-            resp = requests.get("http://localhost:8000/units/")
-            data = resp.json()
-            if isinstance(data, list):
-                self._units = data
-            else:
-                self._units = data.get("data", [])
-            self._units_loaded = True
-            self._isLoading = False
-            self.unitsChanged.emit()
-        except Exception as e:
-            self.errorOccurred.emit("خطأ في جلب الوحدات: " + str(e))
-            self._isLoading = False
+        self._dispatcher.cancel("units_more")
+        self._dispatcher.cancel("units_sync")
+        self._dispatcher.submit(
+            self._load_units, self._on_units_loaded,
+            lambda message: self.errorOccurred.emit("خطأ في جلب الوحدات: " + message),
+            key="units",
+        )
+
+    def _fetch_units(self, cursor=None):
+        # صفحة Keyset: الصفوف في الجسم ومؤشر الصفحة التالية في الترويسة X-Next-Cursor
+        params = {"per_page": UNITS_PAGE_SIZE, "keyset": "true"}
+        if cursor:
+            params["cursor"] = cursor
+        resp = api.get("/units/", params=params)
+        resp.raise_for_status()
+        data = resp.json()
+        units = data if isinstance(data, list) else data.get("data", [])
+        return units, resp.headers.get("X-Next-Cursor")
+
+    def _load_units(self):
+        # الرمز قبل الصفحة الأولى: ما يتغير بينهما يرجع في المزامنة التالية
+        token = self._sync.fetch_token()
+        return token, self._fetch_units()
+
+    def _on_units_loaded(self, result):
+        token, (units, next_cursor) = result
+        self._model.replace(units, next_cursor)
+        self._sync.invalidate()
+        self._sync.accept(token)
+        self._units_loaded = True
+        self.unitsChanged.emit()
+
+    def _fetch_more_units(self, cursor):
+        # يستدعيه النموذج عند وصول التمرير لنهاية القائمة
+        self._dispatcher.submit(
+            lambda: self._fetch_units(cursor), self._on_more_units, self._on_more_units_failed,
+            key="units_more",
+        )
+
+    def _on_more_units(self, result):
+        units, next_cursor = result
+        self._model.append_page(units, next_cursor)
+        self.unitsChanged.emit()
+
+    def _on_more_units_failed(self, message):
+        self._model.fetch_failed()
+        self.errorOccurred.emit("خطأ في جلب الوحدات: " + message)
 
     @Slot()
     def refresh(self):
-        """ تحديث فعلي من السيرفر مهما كان الكاش """
-        self._units_loaded = False
-        self.get_all_units(force_reload=True)
+        """ تحديث من السيرفر: التغييرات فقط منذ آخر مزامنة، أو تحميل كامل إذا لم يوجد رمز """
+        token = self._sync.token
+        if token is None:
+            self._units_loaded = False
+            self.get_all_units(force_reload=True)
+            return
+        self._dispatcher.submit(
+            lambda: self._sync.fetch_changes(token), self._on_units_synced,
+            lambda message: self.errorOccurred.emit("خطأ في تحديث الوحدات: " + message),
+            key="units_sync",
+        )
+
+    @Slot()
+    def on_remote_change(self):
+        """ حدث تغيير من السيرفر (EventStream): مزامنة تزايدية إذا كانت القائمة محملة """
+        if self._sync.token is not None:
+            self.refresh()
+
+    def _on_units_synced(self, data):
+        if data.get("reset"):
+            self._sync.invalidate()
+            self.refresh()
+            return
+        if self._sync.accept(data.get("token")):
+            self._model.merge(data.get("changed", []), data.get("deleted", []))
+            self.unitsChanged.emit()
 
     @Slot(int, result="QVariant")
     def get_unit_by_id(self, unit_id):
-        """ جلب تفاصيل وحدة معينة عند الحاجة فقط (lazy load) """
-        for u in self._units:
+        """ تفاصيل وحدة من الكاش إن وجدت، وإلا تُجلب في الخلفية ويُرسل unitsChanged عند وصولها """
+        for u in self._model.rows():
             if u["id"] == unit_id and ("attachments" in u and u["attachments"]):
                 return u  # التفاصيل موجودة بالكاش
-        # خلاف ذلك: اجلب من السيرفر
-        try:
-            resp = requests.get(f"http://localhost:8000/units/{unit_id}")
-            data = resp.json()
-            # حدّث الكاش
-            for idx, u in enumerate(self._units):
-                if u["id"] == unit_id:
-                    self._units[idx] = data
-                    break
-            else:
-                self._units.append(data)
-            self.unitsChanged.emit()
-            return data
-        except Exception as e:
-            self.errorOccurred.emit("خطأ في تفاصيل الوحدة: " + str(e))
-            return {}
+        self._dispatcher.submit(
+            lambda: api.get(f"/units/{unit_id}").json(),
+            lambda data: self._on_unit_details(unit_id, data),
+            lambda message: self.errorOccurred.emit("خطأ في تفاصيل الوحدة: " + message),
+            key=("unit", unit_id),
+        )
+        return {}
+
+    def _on_unit_details(self, unit_id, data):
+        # حدّث الكاش
+        self._model.upsert(data)
+        self.unitsChanged.emit()
 
     def _to_py_dict(self, jsvalue):
         # تحويل QJSValue/QVariant إلى dict بايثوني عادي
@@ -84,79 +155,88 @@ class UnitsApiHandler(QObject):
             return jsvalue
         return jsvalue
 
-    @Slot("QVariant", result="QVariant")
+    @Slot("QVariant")
     def add_unit(self, unit_data):
         """ إضافة وحدة وتحديث الكاش مباشرة (State Push) """
-        try:
-            unit_data = self._to_py_dict(unit_data)
-            resp = requests.post("http://localhost:8000/units/", json=unit_data)
-            data = resp.json()
-            if resp.ok:
-                if "unit" in data:
-                    self._units.append(data["unit"])
-                else:
-                    self._units_loaded = False  # في حال لم يرجع العنصر الجديد
-                    self.get_all_units(force_reload=True)
-                self.unitAdded.emit()
-                self.unitsChanged.emit()
-                return {"success": True, "unit_id": data.get("id")}
-            else:
-                return {"success": False, "error": data.get("detail")}
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {'success': False, 'error': str(e)}
-
-    @Slot(int, "QVariant", result="QVariant")
+        unit_data = self._to_py_dict(unit_data)
+        self._dispatcher.submit(
+            lambda: api.send("POST", "/units/", json=unit_data),
+            self._on_unit_added,
+            self.errorOccurred.emit,
+        )
+
+    def _on_unit_added(self, result):
+        ok, data = result
+        if not ok:
+            self.errorOccurred.emit(str(data.get("detail")))
+            return
+        if "unit" in data:
+            self._model.upsert(data["unit"])
+        else:
+            self.refresh()  # في حال لم يرجع العنصر الجديد
+        self.unitAdded.emit()
+        self.unitsChanged.emit()
+
+    @Slot(int, "QVariant")
     def update_unit(self, unit_id, unit_data):
         """ تعديل وحدة وتحديث الكاش مباشرة """
-        try:
-            unit_data = self._to_py_dict(unit_data)
-            resp = requests.put(f"http://localhost:8000/units/{unit_id}", json=unit_data)
-            data = resp.json()
-            if resp.ok:
-                # تحديث العنصر في الكاش مباشرة
-                for idx, u in enumerate(self._units):
-                    if u["id"] == unit_id:
-                        self._units[idx].update(unit_data)
-                        if "attachments" in data:
-                            self._units[idx]["attachments"] = data["attachments"]
-                        break
-                else:
-                    self._units_loaded = False
-                    self.get_all_units(force_reload=True)
-                self.unitUpdated.emit()
-                self.unitsChanged.emit()
-                return {"success": True}
-            else:
-                return {"success": False, "error": data.get("detail")}
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {'success': False, 'error': str(e)}
+        unit_data = self._to_py_dict(unit_data)
+        self._dispatcher.submit(
+            lambda: api.send("PUT", f"/units/{unit_id}", json=unit_data),
+            lambda result: self._on_unit_updated(unit_id, unit_data, result),
+            self.errorOccurred.emit,
+        )
 
-    @Slot(int, result="QVariant")
+    def _on_unit_updated(self, unit_id, unit_data, result):
+        ok, data = result
+        if not ok:
+            self.errorOccurred.emit(str(data.get("detail")))
+            return
+        # تحديث العنصر في الكاش مباشرة
+        changes = dict(unit_data)
+        for field in ("attachments", "owner_name"):
+            if field in data:
+                changes[field] = data[field]
+        if not self._model.update_fields(unit_id, changes):
+            self.refresh()
+        self.unitUpdated.emit()
+        self.unitsChanged.emit()
+
+    @Slot(int)
     def delete_unit(self, unit_id):
         """ حذف وحدة وتحديث الكاش مباشرة """
-        try:
-            resp = requests.delete(f"http://localhost:8000/units/{unit_id}")
-            if resp.ok:
-                self._units = [u for u in self._units if u["id"] != unit_id]
-                self.unitDeleted.emit()
-                self.unitsChanged.emit()
-                return {"success": True}
-            else:
-                data = resp.json()
-                return {"success": False, "error": data.get("detail")}
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {'success': False, 'error': str(e)}
+        self._dispatcher.submit(
+            lambda: api.send("DELETE", f"/units/{unit_id}"),
+            lambda result: self._on_unit_deleted(unit_id, result),
+            self.errorOccurred.emit,
+        )
 
-    @Slot(result="QVariant")
+    def _on_unit_deleted(self, unit_id, result):
+        ok, data = result
+        if not ok:
+            self.errorOccurred.emit(str(data.get("detail")))
+            return
+        self._model.remove_id(unit_id)
+        self.unitDeleted.emit()
+        self.unitsChanged.emit()
+
+    @Slot()
     def get_all_owners_for_dropdown(self):
-        """ تحميل قائمة الملاك للـ Dropdown فقط (دون الكاش) """
-        try:
-            resp = requests.get("http://localhost:8000/owners/")
-            data = resp.json()
-            owners = [{'value': o['id'], 'text': o['name']} for o in data] if isinstance(data, list) else []
-            return {'success': True, 'data': owners}
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+        """ تحميل قائمة الملاك (id, name) لقائمة الاختيار عند فتحها فقط، النتيجة عبر ownersForDropdownLoaded """
+        def fetch():
+            # كل صفحات Keyset (الطلبات مشروطة بـ ETag فالصفحات التي لم تتغير لا تُنقل ثانية)
+            owners, params = [], {"per_page": OWNERS_DROPDOWN_PAGE_SIZE, "keyset": "true"}
+            while True:
+                resp = api.get("/owners/", params=params)
+                resp.raise_for_status()
+                data = resp.json()
+                owners.extend({"id": o["id"], "name": o["name"]} for o in data.get("data", []))
+                if not data.get("next_cursor"):
+                    return owners
+                params["cursor"] = data["next_cursor"]
+        self._dispatcher.submit(
+            fetch,
+            lambda owners: self.ownersForDropdownLoaded.emit({'success': True, 'data': owners}),
+            lambda message: self.ownersForDropdownLoaded.emit({'success': False, 'error': message}),
+            key="owners_dropdown",
+        )
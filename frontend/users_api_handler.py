@@ -1,13 +1,19 @@
 from PySide6.QtCore import QObject, Slot, Signal, Property
-import requests
+from frontend.api_client import api
+from frontend.request_dispatcher import RequestDispatcher
 
 class UsersApiHandler(QObject):
     usersChanged = Signal()
+    userLoaded = Signal('QVariant')
     errorOccurred = Signal(str)
+    loadingChanged = Signal()
 
     def __init__(self):
         super().__init__()
         self._users = []
+        self._loaded = False
+        self._dispatcher = RequestDispatcher(self)
+        self._dispatcher.loadingChanged.connect(self.loadingChanged)
 
     def _to_py_dict(self, jsvalue):
         if hasattr(jsvalue, "toVariant"):
@@ -20,75 +26,62 @@ class UsersApiHandler(QObject):
             return jsvalue
         return jsvalue
 
-    @Slot(result="QVariant")
+    @Slot()
     def get_all_users(self):
-        try:
-            resp = requests.get("http://localhost:8000/users/")
-            data = resp.json()
-            self._users = data if isinstance(data, list) else data.get("data", [])
-            self.usersChanged.emit()
-            return self._users
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return []
-
-    @Slot(int, result="QVariant")
+        self._dispatcher.submit(self._fetch_users, self._on_users_loaded, self.errorOccurred.emit, key="users")
+
+    def _fetch_users(self):
+        data = api.get("/users/").json()
+        return data if isinstance(data, list) else data.get("data", [])
+
+    def _on_users_loaded(self, users):
+        self._users = users
+        self._loaded = True
+        self.usersChanged.emit()
+
+    @Slot()
+    def on_remote_change(self):
+        # حدث تغيير من السيرفر (EventStream): إعادة الجلب (طلب مشروط بـ ETag) إذا كانت القائمة معروضة
+        if self._loaded:
+            self.get_all_users()
+
+    @Slot(int)
     def get_user_by_id(self, user_id):
-        try:
-            resp = requests.get(f"http://localhost:8000/users/{user_id}")
-            return resp.json()
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {}
-
-    @Slot("QVariant", result="QVariant")
+        self._dispatcher.submit(
+            lambda: api.get(f"/users/{user_id}").json(),
+            self.userLoaded.emit, self.errorOccurred.emit, key=("user", user_id),
+        )
+
+    def _mutate(self, method, path, payload=None):
+        # إضافة/تعديل/حذف ثم إعادة تحميل القائمة (بدون مفتاح: لا يُلغى)
+        self._dispatcher.submit(
+            lambda: api.send(method, path, json=payload),
+            self._on_mutated, self.errorOccurred.emit,
+        )
+
+    def _on_mutated(self, result):
+        ok, data = result
+        self.get_all_users()
+        if not ok:
+            self.errorOccurred.emit(str(data))
+
+    @Slot("QVariant")
     def add_user(self, user_data):
-        try:
-            user_data = self._to_py_dict(user_data)
-            resp = requests.post("http://localhost:8000/users/", json=user_data)
-            data = resp.json()
-            self.get_all_users()
-            if resp.ok:
-                return {"success": True, "user_id": data.get("id")}
-            else:
-                self.errorOccurred.emit(str(data))
-                return {"success": False, "error": data.get("detail")}
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {'success': False, 'error': str(e)}
-
-    @Slot(int, "QVariant", result="QVariant")
+        self._mutate("POST", "/users/", self._to_py_dict(user_data))
+
+    @Slot(int, "QVariant")
     def update_user(self, user_id, user_data):
-        try:
-            user_data = self._to_py_dict(user_data)
-            resp = requests.put(f"http://localhost:8000/users/{user_id}", json=user_data)
-            data = resp.json()
-            self.get_all_users()
-            if resp.ok:
-                return {"success": True}
-            else:
-                self.errorOccurred.emit(str(data))
-                return {"success": False, "error": data.get("detail")}
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {'success': False, 'error': str(e)}
-
-    @Slot(int, result="QVariant")
+        self._mutate("PUT", f"/users/{user_id}", self._to_py_dict(user_data))
+
+    @Slot(int)
     def delete_user(self, user_id):
-        try:
-            resp = requests.delete(f"http://localhost:8000/users/{user_id}")
-            self.get_all_users()
-            if resp.ok:
-                return {"success": True}
-            else:
-                data = resp.json()
-                self.errorOccurred.emit(str(data))
-                return {"success": False, "error": data.get("detail")}
-        except Exception as e:
-            self.errorOccurred.emit(str(e))
-            return {'success': False, 'error': str(e)}
+        self._mutate("DELETE", f"/users/{user_id}")
 
     def users(self):
         return self._users
 
+    def isLoading(self):
+        return self._dispatcher.isLoading()
+
     usersList = Property('QVariant', users, notify=usersChanged)
+    isLoadingProp = Property(bool, isLoading, notify=loadingChanged)
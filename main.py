@@ -13,9 +13,11 @@ from frontend.dashboard_api_handler import DashboardApiHandler
 from frontend.invoices_api_handler import InvoicesApiHandler
 from frontend.login_api_handler import LoginApiHandler
 from frontend.owners_api_handler import OwnersApiHandler
+from frontend.reports_api_handler import ReportsApiHandler, REPORT_TABLES
 from frontend.tenants_api_handler import TenantsApiHandler
 from frontend.units_api_handler import UnitsApiHandler
 from frontend.users_api_handler import UsersApiHandler
+from frontend.event_stream import EventStream
 
 # ========== كلاس للتحقق من حالة Caps Lock ==========
 class CapsLockChecker(QObject):
@@ -91,6 +93,9 @@ if __name__ == "__main__":
     ownersApiHandler = OwnersApiHandler()
     engine.rootContext().setContextProperty("ownersApiHandler", ownersApiHandler)
 
+    reportsApiHandler = ReportsApiHandler()
+    engine.rootContext().setContextProperty("reportsApiHandler", reportsApiHandler)
+
     tenantsApiHandler = TenantsApiHandler()
     engine.rootContext().setContextProperty("tenantsApiHandler", tenantsApiHandler)
 
@@ -100,6 +105,23 @@ if __name__ == "__main__":
     usersApiHandler = UsersApiHandler()
     engine.rootContext().setContextProperty("usersApiHandler", usersApiHandler)
 
+    # ========== التحديث الحي: كل Handler يزامن عند تغير الجداول التي يعرضها ==========
+    eventStream = EventStream()
+    eventStream.route(("owners", "attachments"), ownersApiHandler.on_remote_change)
+    eventStream.route(("units", "owners", "attachments"), unitsApiHandler.on_remote_change)
+    eventStream.route(("tenants", "attachments"), tenantsApiHandler.on_remote_change)
+    eventStream.route(("contracts", "units", "tenants", "attachments"), contractsApiHandler.on_remote_change)
+    eventStream.route(("invoices", "attachments"), invoicesApiHandler.on_remote_change)
+    eventStream.route(("users",), usersApiHandler.on_remote_change)
+    eventStream.route(("dashboard_counters", "dashboard_buckets"), dashboardApiHandler.on_remote_change)
+    eventStream.route(REPORT_TABLES, reportsApiHandler.on_remote_change)
+    engine.rootContext().setContextProperty("eventStream", eventStream)
+    # /events يتطلب رمز الجلسة: الاشتراك يبدأ بعد تسجيل الدخول
+    loginApiHandler.loginSuccess.connect(eventStream.start)
+    # انتهاء الجلسة (401): لا إعادة اتصال برمز ميت، والواجهة تعود لصفحة الدخول (main.qml)
+    loginApiHandler.sessionExpired.connect(eventStream.stop)
+    app.aboutToQuit.connect(eventStream.stop)
+
     # ========== إنشاء وربط فاحص Caps Lock ==========
     capsLockChecker = CapsLockChecker()
     engine.rootContext().setContextProperty("capsLockChecker", capsLockChecker)